@@ -293,6 +293,11 @@ class BodhiClient(OpenIdBaseClient):
             rows_per_page (int): Limit the results to a certain number of rows per page
                 (min:1 max: 100 default: 20).
             page (int): Return a specific page of results.
+            cursor (basestring): Return the page after the one that gave this ``next_cursor``.
+                Unlike ``page``, it costs the server the same for every page, so it is the way to
+                go through all the results.
+            count (bool): Whether the server should count the results. Defaults to True for
+                ``page`` and False for ``cursor``, in which case ``total`` is None.
         Returns:
             munch.Munch: The response from Bodhi describing the query results.
         """
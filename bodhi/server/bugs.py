@@ -18,7 +18,10 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 """Defines utilities for accessing Bugzilla."""
 
+import errno
 import logging
+import socket
+import threading
 
 from collections import namedtuple
 from kitchen.text.converters import to_unicode
@@ -80,12 +83,54 @@ class InvalidComment(Exception):
     """Exception thrown when the comment posted is invalid (for example too long)."""
 
 
+def _unreachable(exception):
+    """
+    Return whether the given exception was raised because Bugzilla could not be connected to.
+
+    Nothing was sent to Bugzilla then, so the callers may retry the call.
+
+    Args:
+        exception (Exception): The exception a call to Bugzilla raised.
+    Returns:
+        bool: True if the call could not connect to Bugzilla.
+    """
+    if isinstance(exception, socket.gaierror):
+        return True
+    return isinstance(exception, socket.error) and exception.errno in (
+        errno.ECONNREFUSED, errno.EHOSTUNREACH, errno.ENETUNREACH)
+
+
 class Bugzilla(BugTracker):
-    """Provide methods for Bodhi's frequent Bugzilla operations."""
+    """
+    Provide methods for Bodhi's frequent Bugzilla operations.
+
+    Each thread connects with a Bugzilla client of its own, since the masher calls Bugzilla from
+    several threads at once and a client can't be shared between them.
+    """
 
     def __init__(self):
-        """Initialize self._bz as None."""
-        self._bz = None
+        """Initialize the storage of the Bugzilla clients of the threads."""
+        self._local = threading.local()
+
+    @property
+    def _bz(self):
+        """
+        Return the Bugzilla client of the current thread.
+
+        Returns:
+            bugzilla.base.Bugzilla or None: The client, or None if this thread hasn't connected.
+        """
+        return getattr(self._local, 'bz', None)
+
+    @_bz.setter
+    def _bz(self, bz):
+        """
+        Set the Bugzilla client of the current thread.
+
+        Args:
+            bz (bugzilla.base.Bugzilla or None): The client.
+        """
+        self._local.bz = bz
 
     def _connect(self):
         """Create a Bugzilla client instance and store it on self._bz."""
@@ -142,6 +187,8 @@ class Bugzilla(BugTracker):
         Args:
             bug_id (int): The id of the bug you wish to comment on.
             comment (basestring): The comment to add to the bug.
+        Raises:
+            socket.error: If Bugzilla could not be connected to, so that the call can be retried.
         """
         try:
             if len(comment) > 65535:
@@ -160,7 +207,9 @@ class Bugzilla(BugTracker):
         except InvalidComment:
             log.exception(
                 "Comment too long for bug #%d:  %s" % (bug_id, comment))
-        except Exception:
+        except Exception as e:
+            if _unreachable(e):
+                raise
             log.exception("Unable to add comment to bug #%d" % bug_id)
 
     def on_qa(self, bug_id, comment):
@@ -173,12 +222,16 @@ class Bugzilla(BugTracker):
         Args:
             bug_id (int): The bug id you wish to set to ON_QA.
             comment (basestring): The comment to be included with the state change.
+        Raises:
+            socket.error: If Bugzilla could not be connected to, so that the call can be retried.
         """
         log.debug("Setting Bug #%d to ON_QA" % bug_id)
         try:
             bug = self.bz.getbug(bug_id)
             bug.setstatus('ON_QA', comment=comment)
-        except Exception:
+        except Exception as e:
+            if _unreachable(e):
+                raise
             log.exception("Unable to alter bug #%d" % bug_id)
 
     def close(self, bug_id, versions, comment):
@@ -253,6 +306,8 @@ class Bugzilla(BugTracker):
 
         Args:
             bug_id (basestring or int): The bug you wish to mark MODIFIED.
+        Raises:
+            socket.error: If Bugzilla could not be connected to, so that the call can be retried.
         """
         try:
             bug = self.bz.getbug(bug_id)
@@ -262,7 +317,9 @@ class Bugzilla(BugTracker):
             if bug.bug_status not in ('MODIFIED', 'VERIFIED', 'CLOSED'):
                 log.info('Setting bug #%d status to MODIFIED' % bug_id)
                 bug.setstatus('MODIFIED')
-        except Exception:
+        except Exception as e:
+            if _unreachable(e):
+                raise
             log.exception("Unable to alter bug #%d" % bug_id)
 
 
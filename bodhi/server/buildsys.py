@@ -18,18 +18,24 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 """Define tools for interacting with the build system and a fake build system for development."""
 
-from threading import Lock
+from threading import Event, Lock, Thread
 import logging
+import sys
 import time
 from functools import wraps
 
 import koji
+from six.moves import queue
+import six
 
 
 log = logging.getLogger('bodhi')
 _buildsystem = None
 # URL of the koji hub
 _koji_hub = None
+# The states of Koji tasks that haven't finished yet.
+_UNFINISHED_TASK_STATES = (koji.TASK_STATES['FREE'], koji.TASK_STATES['OPEN'],
+                           koji.TASK_STATES['ASSIGNED'])
 
 
 def multicall_enabled(func):
@@ -128,6 +134,7 @@ class DevBuildsys(Buildsystem):
     __added__ = []
     __tagged__ = {}
     __rpms__ = []
+    __tasks__ = {}
 
     def __init__(self):
         """Initialize the DevBuildsys."""
@@ -163,6 +170,7 @@ class DevBuildsys(Buildsystem):
         cls.__added__ = []
         cls.__tagged__ = {}
         cls.__rpms__ = []
+        cls.__tasks__ = {}
 
     def multiCall(self):
         """Emulate Koji's multiCall."""
@@ -193,9 +201,27 @@ class DevBuildsys(Buildsystem):
         """Emulate Koji's taskFinished."""
         return True
 
+    @multicall_enabled
     def getTaskInfo(self, task):
-        """Emulate Koji's getTaskInfo."""
-        return {'state': koji.TASK_STATES['CLOSED']}
+        """
+        Emulate Koji's getTaskInfo.
+
+        Tasks are closed, unless DevBuildsys.__tasks__ maps them to a list of the states they
+        should have in turn. The last state of the list is kept once it is reached.
+
+        Args:
+            task (int): The id of the task.
+        Returns:
+            dict: The id and the state of the task.
+        """
+        states = DevBuildsys.__tasks__.get(task)
+        if not states:
+            state = koji.TASK_STATES['CLOSED']
+        elif len(states) > 1:
+            state = states.pop(0)
+        else:
+            state = states[0]
+        return {'id': task, 'state': state}
 
     def getTaskRequest(self, task_id):
         """Emulate Koji's getTaskRequest."""
@@ -285,6 +311,7 @@ class DevBuildsys(Buildsystem):
 
         return data
 
+    @multicall_enabled
     def listBuildRPMs(self, id, *args, **kw):
         """Emulate Koji's listBuildRPMs."""
         rpms = [{'arch': 'src',
@@ -577,15 +604,22 @@ def setup_buildsystem(settings):
         raise ValueError('Buildsys %s not known' % buildsys)
 
 
-def wait_for_tasks(tasks, session=None, sleep=300):
+def wait_for_tasks(tasks, session=None, sleep=300, min_sleep=1, progress=None):
     """
     Wait for a list of koji tasks to complete.
 
+    Each round of polling retrieves the states of all the unfinished tasks with a single multicall.
+    The rounds start min_sleep seconds apart, and the interval doubles after every round in which no
+    task finished, up to sleep seconds. The function returns as soon as the last task is done.
+
     Args:
         tasks (list): The return value of Koji's multiCall().
         session (koji.ClientSession or None): A Koji client session to use. If not provided, the
             function will acquire its own session.
-        sleep (int): How long to sleep between polls on Koji when waiting for tasks to complete.
+        sleep (int): The longest to sleep between polls on Koji when waiting for tasks to complete.
+        min_sleep (int): The shortest to sleep between polls on Koji.
+        progress (callable or None): If given, it is called after every round of polling with the
+            number of tasks that are done and the total number of tasks to wait for.
     Returns:
         list: A list of failed tasks. An empty list indicates that all tasks completed successfully.
     """
@@ -593,16 +627,264 @@ def wait_for_tasks(tasks, session=None, sleep=300):
     failed_tasks = []
     if not session:
         session = get_session()
+    pending = []
     for task in tasks:
         if not task:
             log.debug("Skipping task: %s" % task)
             continue
-        while not session.taskFinished(task):
-            time.sleep(sleep)
-        task_info = session.getTaskInfo(task)
-        if task_info['state'] != koji.TASK_STATES['CLOSED']:
-            log.error("Koji task %d failed" % task)
-            failed_tasks.append(task)
+        pending.append(task)
+
+    total = len(pending)
+    interval = min(min_sleep, sleep)
+    while pending:
+        unfinished, failed = _poll_tasks(session, pending)
+        failed_tasks.extend(failed)
+
+        if progress is not None:
+            progress(total - len(unfinished), total)
+        if unfinished:
+            time.sleep(interval)
+            if len(unfinished) == len(pending):
+                interval = min(interval * 2, sleep)
+        pending = unfinished
+
     log.debug("%d tasks completed successfully, %d tasks failed." % (
         len(tasks) - len(failed_tasks), len(failed_tasks)))
     return failed_tasks
+
+
+def _poll_tasks(session, tasks):
+    """
+    Retrieve the states of the given Koji tasks with a single multicall.
+
+    Args:
+        session (koji.ClientSession): A Koji client session to use.
+        tasks (list): The ids of the tasks.
+    Returns:
+        tuple: The list of the tasks that haven't finished yet, and the list of the tasks that
+            failed.
+    """
+    session.multicall = True
+    for task in tasks:
+        session.getTaskInfo(task)
+    results = session.multiCall()
+
+    unfinished = []
+    failed = []
+    for task, result in zip(tasks, results):
+        if isinstance(result, dict):
+            log.error("Koji task %d failed: %s" % (task, result.get('faultString')))
+            failed.append(task)
+        elif result[0]['state'] in _UNFINISHED_TASK_STATES:
+            unfinished.append(task)
+        elif result[0]['state'] != koji.TASK_STATES['CLOSED']:
+            log.error("Koji task %d failed" % task)
+            failed.append(task)
+    return unfinished, failed
+
+
+class _TagRequest(object):
+    """
+    The tag actions of one compose, submitted to a :class:`TagBatcher`.
+
+    Attributes:
+        actions (list): The actions, as (method name, args) tuples.
+        done (threading.Event): Set once all the actions are done.
+        error (tuple or None): The exc_info of an error that prevented the actions from being done.
+        failed_tasks (list): The tasks that failed, and the fault strings of the actions that Koji
+            refused.
+        progress (callable or None): Called with the number of actions that are done and the total
+            number of actions whenever some of them are done.
+        tasks (set): The tasks of the actions that haven't finished yet.
+    """
+
+    def __init__(self, actions, progress=None):
+        """
+        Initialize the _TagRequest.
+
+        Args:
+            actions (list): The actions, as (method name, args) tuples.
+            progress (callable or None): Called with the number of actions that are done and the
+                total number of actions whenever some of them are done.
+        """
+        self.actions = actions
+        self.done = Event()
+        self.error = None
+        self.failed_tasks = []
+        self.progress = progress
+        self.tasks = set()
+
+    def finish(self, task=None):
+        """
+        Record that the given task is done, and mark the request as done if it was the last one.
+
+        Args:
+            task (int or None): The task that is done, or None to only check whether any are left.
+        """
+        self.tasks.discard(task)
+        if self.progress is not None:
+            self.progress(len(self.actions) - len(self.tasks), len(self.actions))
+        if not self.tasks:
+            self.done.set()
+
+
+class TagBatcher(object):
+    """
+    Coalesce the asynchronous tag actions of concurrent composes into shared Koji multicalls.
+
+    Composes hand their tagBuild and moveBuild actions to :meth:`tag`, which blocks until they are
+    done. A worker thread collects the actions of all the composes that submit them within delay
+    seconds of each other, sends them to Koji in multicalls of up to batch_size actions, and then
+    waits for the tasks of every compose at once, polling them with a single multicall per round.
+    The results are handed back to each compose as soon as its own tasks are done, and actions that
+    are submitted meanwhile are sent right away.
+
+    Only actions that may be done in any order should be submitted, since a batch mixes the actions
+    of several composes. Builds that sorted_updates() says must be tagged in order are still tagged
+    one at a time by their compose.
+    """
+
+    def __init__(self, batch_size=500, delay=2, sleep=15, min_sleep=1, idle_timeout=60):
+        """
+        Initialize the TagBatcher.
+
+        Args:
+            batch_size (int): The most actions to send in a single multicall.
+            delay (float): How many seconds to wait for other composes' actions after receiving the
+                first ones.
+            sleep (int): The longest to sleep between polls on Koji when waiting for tasks.
+            min_sleep (int): The shortest to sleep between polls on Koji.
+            idle_timeout (float): How many seconds the worker thread waits for actions before it
+                exits. It is started again when more actions are submitted.
+        """
+        self.batch_size = batch_size
+        self.delay = delay
+        self.sleep = sleep
+        self.min_sleep = min_sleep
+        self.idle_timeout = idle_timeout
+        self._requests = queue.Queue()
+        self._lock = Lock()
+        self._thread = None
+
+    def tag(self, add, move, progress=None):
+        """
+        Tag and move the given builds in Koji, and wait for their tasks to be done.
+
+        Args:
+            add (list): (tag, build) tuples of the builds to tag.
+            move (list): (from_tag, to_tag, build) tuples of the builds to move.
+            progress (callable or None): If given, it is called from the worker thread with the
+                number of actions that are done and the total number of actions.
+        Returns:
+            list: The failed tasks, and the fault strings of the actions that Koji refused. An empty
+                list indicates that all the actions were successful.
+        """
+        actions = [('tagBuild', (tag, build)) for tag, build in add]
+        actions.extend(('moveBuild', (from_tag, to_tag, build)) for from_tag, to_tag, build in move)
+        if not actions:
+            return []
+
+        request = _TagRequest(actions, progress)
+        with self._lock:
+            self._requests.put(request)
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name='TagBatcher')
+                self._thread.daemon = True
+                self._thread.start()
+        # Event.wait() without a timeout can't be interrupted on Python 2.
+        while not request.done.wait(60):
+            pass
+        if request.error is not None:
+            six.reraise(*request.error)
+        return request.failed_tasks
+
+    def _collect(self, block):
+        """
+        Return the requests that were submitted since the last call.
+
+        Args:
+            block (bool): If True, wait for a request, and then for delay seconds for more.
+        Returns:
+            list or None: The new _TagRequests, or None if the worker thread should exit since
+                nothing was submitted for idle_timeout seconds.
+        """
+        requests = []
+        if block:
+            try:
+                requests.append(self._requests.get(timeout=self.idle_timeout))
+            except queue.Empty:
+                with self._lock:
+                    if self._requests.empty():
+                        self._thread = None
+                        return None
+                requests.append(self._requests.get())
+            time.sleep(self.delay)
+        while True:
+            try:
+                requests.append(self._requests.get_nowait())
+            except queue.Empty:
+                return requests
+
+    def _submit(self, session, requests, outstanding):
+        """
+        Send the actions of the given requests to Koji in multicalls of up to batch_size actions.
+
+        Args:
+            session (koji.ClientSession): A Koji client session to use.
+            requests (list): The _TagRequests to send.
+            outstanding (dict): A mapping of the tasks that are being waited on to their requests,
+                which the new tasks are added to.
+        """
+        actions = [(request, action) for request in requests for action in request.actions]
+        log.info('Sending %d tag actions of %d composes to Koji', len(actions), len(requests))
+        for i in range(0, len(actions), self.batch_size):
+            batch = actions[i:i + self.batch_size]
+            session.multicall = True
+            for request, (method, args) in batch:
+                getattr(session, method)(*args, force=True)
+            for (request, action), result in zip(batch, session.multiCall()):
+                if isinstance(result, dict):
+                    log.error('Koji refused %s%r: %s', action[0], action[1],
+                              result.get('faultString'))
+                    request.failed_tasks.append(result.get('faultString'))
+                elif result[0]:
+                    request.tasks.add(result[0])
+                    outstanding[result[0]] = request
+        for request in requests:
+            request.finish()
+
+    def _run(self):
+        """Send the actions of the submitted requests to Koji, and wait for their tasks."""
+        session = get_session()
+        outstanding = {}
+        interval = min(self.min_sleep, self.sleep)
+        while True:
+            requests = self._collect(block=not outstanding)
+            if requests is None:
+                return
+            try:
+                if requests:
+                    self._submit(session, requests, outstanding)
+                    interval = min(self.min_sleep, self.sleep)
+                if not outstanding:
+                    continue
+
+                unfinished, failed = _poll_tasks(session, list(outstanding))
+                for task in failed:
+                    outstanding[task].failed_tasks.append(task)
+                finished = set(outstanding) - set(unfinished)
+                for task in finished:
+                    outstanding.pop(task).finish(task)
+                if outstanding:
+                    time.sleep(interval)
+                    if not finished:
+                        interval = min(interval * 2, self.sleep)
+            except Exception:
+                log.exception('Unable to perform the tag actions of %d composes',
+                              len(set(requests) | set(outstanding.values())))
+                exc_info = sys.exc_info()
+                for request in set(requests) | set(outstanding.values()):
+                    request.error = exc_info
+                    request.done.set()
+                outstanding = {}
+                session = get_session()
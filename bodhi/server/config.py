@@ -53,6 +53,32 @@ def get_configfile():
     return configfile
 
 
+def _generate_choice_validator(choices):
+    """Return a function that ensures that a value is one of the given choices.
+
+    Args:
+        choices (list): The values that are allowed.
+    Returns:
+        function: A validator function that accepts an argument to be validated.
+    """
+    def _validate_choice(value):
+        """Ensure that value is one of the allowed choices, and return it as unicode.
+
+        Args:
+            value (basestring): The value to be validated.
+        Returns:
+            unicode: The value.
+        Raises:
+            ValueError: If value is not one of the allowed choices.
+        """
+        value = six.text_type(value)
+        if value not in choices:
+            raise ValueError('"{}" is not one of {}.'.format(value, ', '.join(choices)))
+        return value
+
+    return _validate_choice
+
+
 def _generate_list_validator(splitter=' ', validator=six.text_type):
     """Return a function that takes a value and interprets it to be a list with the given splitter.
 
@@ -355,6 +381,9 @@ class BodhiConfig(dict):
         'captcha.ttl': {
             'value': 300,
             'validator': int},
+        'compose_stage_workers': {
+            'value': 2,
+            'validator': int},
         'cors_connect_src': {
             'value': 'https://*.fedoraproject.org/ wss://hub.fedoraproject.org:9939/',
             'validator': six.text_type},
@@ -417,6 +446,9 @@ class BodhiConfig(dict):
         'fmn_url': {
             'value': 'https://apps.fedoraproject.org/notifications/',
             'validator': six.text_type},
+        'gating.workers': {
+            'value': 4,
+            'validator': int},
         'important_groups': {
             'value': ['proventesters', 'provenpackager,' 'releng', 'security_respons', 'packager',
                       'bodhiadmin'],
@@ -460,12 +492,18 @@ class BodhiConfig(dict):
         'mash_dir': {
             'value': None,
             'validator': _validate_none_or(_validate_path)},
+        'mash_execution_mode': {
+            'value': 'thread',
+            'validator': _generate_choice_validator(['thread', 'process'])},
         'mash_stage_dir': {
             'value': None,
             'validator': _validate_none_or(_validate_path)},
         'max_concurrent_mashes': {
             'value': 2,
             'validator': int},
+        'max_concurrent_mashes_per_release': {
+            'value': None,
+            'validator': _validate_none_or(int)},
         'max_update_length_for_ui': {
             'value': 30,
             'validator': int},
@@ -508,6 +546,21 @@ class BodhiConfig(dict):
         'pkgdb_url': {
             'value': 'https://admin.fedoraproject.org/pkgdb',
             'validator': six.text_type},
+        'post_push.backoff': {
+            'value': 1.0,
+            'validator': float},
+        'post_push.bugzilla_limit': {
+            'value': 4,
+            'validator': int},
+        'post_push.retries': {
+            'value': 3,
+            'validator': int},
+        'post_push.smtp_limit': {
+            'value': 4,
+            'validator': int},
+        'post_push.workers': {
+            'value': 8,
+            'validator': int},
         'prefer_ssl': {
             'value': None,
             'validator': _validate_none_or(bool)},
@@ -538,6 +591,21 @@ class BodhiConfig(dict):
         'resultsdb_api_url': {
             'value': 'https://taskotron.fedoraproject.org/resultsdb_api/',
             'validator': six.text_type},
+        'rpm_header_cache.max_age': {
+            'value': 30,
+            'validator': int},
+        'rpm_header_cache.path': {
+            'value': None,
+            'validator': _validate_none_or(six.text_type)},
+        'rpm_header_cache.size': {
+            'value': 2000,
+            'validator': int},
+        'sanity_check.sampling': {
+            'value': 'first',
+            'validator': _generate_choice_validator(['first', 'random', 'full'])},
+        'sanity_check.samples': {
+            'value': 10,
+            'validator': int},
         'session.secret': {
             'value': 'CHANGEME',
             'validator': _validate_secret},
@@ -563,9 +631,24 @@ class BodhiConfig(dict):
         'stats_blacklist': {
             'value': ['bodhi', 'anonymous', 'autoqa', 'taskotron'],
             'validator': _generate_list_validator()},
+        'sync_watcher.backoff': {
+            'value': 1.5,
+            'validator': float},
+        'sync_watcher.initial_interval': {
+            'value': 5,
+            'validator': float},
+        'sync_watcher.max_interval': {
+            'value': 200,
+            'validator': float},
         'system_users': {
             'value': ['bodhi', 'autoqa', 'taskotron'],
             'validator': _generate_list_validator()},
+        'tag_actions.batch_size': {
+            'value': 500,
+            'validator': int},
+        'tag_actions.delay': {
+            'value': 2,
+            'validator': float},
         'test_case_base_url': {
             'value': 'https://fedoraproject.org/wiki/',
             'validator': six.text_type},
@@ -597,9 +680,30 @@ class BodhiConfig(dict):
         'test_gating.url': {
             'value': '',
             'validator': six.text_type},
+        'updateinfo_incremental': {
+            'value': False,
+            'validator': _validate_bool},
+        'updateinfo_prefetch.chunk_size': {
+            'value': 500,
+            'validator': int},
+        'updateinfo_prefetch.workers': {
+            'value': 4,
+            'validator': int},
         'updateinfo_rights': {
             'value': 'Copyright (C) {} Red Hat, Inc. and others.'.format(datetime.now().year),
             'validator': six.text_type},
+        'updateinfo_rpm_cache.max_age': {
+            'value': 30,
+            'validator': int},
+        'updateinfo_rpm_cache.max_entries': {
+            'value': 100000,
+            'validator': int},
+        'updateinfo_rpm_cache.path': {
+            'value': None,
+            'validator': _validate_none_or(six.text_type)},
+        'updateinfo_verify': {
+            'value': False,
+            'validator': _validate_bool},
         'wiki_url': {
             'value': 'https://fedoraproject.org/w/api.php',
             'validator': six.text_type},
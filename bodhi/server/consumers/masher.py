@@ -24,33 +24,51 @@ comprised of a fedmsg consumer that launches threads for each repository being
 mashed.
 """
 
+from contextlib import contextmanager
+import bisect
+import copy
+import errno
 import functools
 import hashlib
+import itertools
 import json
 import glob
+import logging
+import multiprocessing
 import os
+import random
 import shutil
+import smtplib
+import socket
 import subprocess
+import sys
 import tempfile
 import threading
 import time
-import urllib2
 from datetime import datetime
+from multiprocessing.pool import ThreadPool
 
 import fedmsg.consumers
 import jinja2
-from six.moves import zip
+from six.moves import queue, zip
 import six
+from sqlalchemy.orm.exc import NoResultFound
 
-from bodhi.server import bugs, initialize_db, log, buildsys, notifications, mail
+from bodhi.server import bugs, initialize_db, log, buildsys, notifications, mail, sync
 from bodhi.server.config import config
 from bodhi.server.exceptions import BodhiException
-from bodhi.server.metadata import UpdateInfoMetadata
-from bodhi.server.models import (Compose, ComposeState, Update, UpdateRequest, UpdateType, Release,
-                                 UpdateStatus, ReleaseState, ContentType)
+from bodhi.server.metadata import load_updateinfo, UpdateInfoMetadata
+from bodhi.server.models import (Bug, Build, Compose, ComposeCheckpoint, ComposeState, Update,
+                                 UpdateRequest, UpdateType, Release, UpdateStatus, ReleaseState,
+                                 ContentType)
 from bodhi.server.util import sorted_updates, sanity_check_repodata, transactional_session_maker
 
 
+# The SHA256 digests of the Pungi config files that were written, keyed by their paths.
+_pungi_file_digests = {}
+_pungi_file_digests_lock = threading.Lock()
+
+
 def checkpoint(method):
     """
     Decorate a method for skipping sections of the mash when resuming.
@@ -70,8 +88,7 @@ def checkpoint(method):
             if retval is not None:
                 raise ValueError("checkpointed functions may not return stuff")
             # if it didn't raise an exception, mark the checkpoint
-            self._checkpoints[key] = True
-            self.save_state()
+            self.save_checkpoint(key)
         else:
             # cool!  we don't need to do anything, since we ran last time
             pass
@@ -104,6 +121,389 @@ def request_order_key(compose):
     return value
 
 
+class ComposeScheduler(object):
+    """
+    Run the MasherThreads of a push in a fixed number of slots, the most important composes first.
+
+    Composes wait in a queue ordered by :func:`request_order_key`, and then by the order they were
+    added in. Whenever a slot is free, the first compose in the queue whose release is under its
+    own limit is started, so a slow compose never keeps the other slots idle while composes are
+    waiting. Running composes are never interrupted.
+
+    Attributes:
+        max_running (int): How many composes may run at the same time.
+        max_running_per_release (int or None): How many composes of the same release may run at
+            the same time, or None for no limit other than max_running.
+        running (list): The (release_id, thread) tuples of the running composes.
+    """
+
+    def __init__(self, max_running, max_running_per_release=None, log=log):
+        """
+        Initialize the ComposeScheduler.
+
+        Args:
+            max_running (int): How many composes may run at the same time.
+            max_running_per_release (int or None): How many composes of the same release may run
+                at the same time, or None for no limit other than max_running.
+            log (logging.Logger): A logger to use.
+        """
+        self.max_running = max(max_running, 1)
+        self.max_running_per_release = max_running_per_release
+        self.log = log
+        self.running = []
+        self._queue = []
+        self._added = itertools.count()
+        self._finished = queue.Queue()
+
+    def add(self, compose, thread):
+        """
+        Queue a compose to be run.
+
+        Args:
+            compose (dict): A dictionary representation of the Compose, formatted like the output
+                of :meth:`Compose.__json__`.
+            thread (MasherThread): The thread that runs the compose. It must not be started yet.
+        """
+        thread.finished = self._finished
+        bisect.insort(self._queue, (request_order_key(compose), next(self._added), compose, thread))
+
+    def run(self):
+        """
+        Run all the queued composes, and wait for them to finish.
+
+        Returns:
+            list: The MasherThreads, in the order they finished in.
+        """
+        finished = []
+        while self._queue or self.running:
+            queued = len(self._queue)
+            self._start_ready()
+            if self._queue:
+                self.log.info('Waiting on %d mashes for a free slot, %d mashes queued',
+                              len(self.running), len(self._queue))
+            elif queued:
+                self.log.info('All of the mashes are running. Now waiting for the final results')
+            thread = self._finished.get()
+            self.running = [r for r in self.running if r[1] is not thread]
+            thread.join()
+            finished.append(thread)
+        return finished
+
+    def _start_ready(self):
+        """Start queued composes until the slots are full or no queued compose may start yet."""
+        for item in list(self._queue):
+            if len(self.running) >= self.max_running:
+                break
+            key, index, compose, thread = item
+            release_id = compose['release_id']
+            if self.max_running_per_release and len(
+                    [r for r in self.running if r[0] == release_id]) >= \
+                    self.max_running_per_release:
+                continue
+            self._queue.remove(item)
+            self.log.info('Now starting the %s mash of release %s with priority %s',
+                          compose['request'], release_id, key)
+            self.running.append((release_id, thread))
+            thread.start()
+
+
+class Stage(object):
+    """
+    A named step of a compose, to be run by a :class:`StageExecutor`.
+
+    Attributes:
+        name (basestring): The name of the stage. Stage timings are recorded under this name, and
+            other stages refer to it in their ``requires``.
+        func (callable): The callable that performs the stage. It receives no arguments, and its
+            return value is made available in :attr:`StageExecutor.results`.
+        requires (tuple): The names of the stages that must finish before this one can start.
+        pool (bool): If True, the stage runs in a worker thread with its own database session,
+            side by side with other stages. Otherwise it runs in the MasherThread itself.
+        state (ComposeState or None): If given, the Compose is moved to this state when the stage
+            starts.
+    """
+
+    def __init__(self, name, func, requires=(), pool=False, state=None):
+        """
+        Initialize the Stage.
+
+        Args:
+            name (basestring): The name of the stage.
+            func (callable): The callable that performs the stage.
+            requires (iterable): The names of the stages that must finish first.
+            pool (bool): Whether to run the stage in a worker thread.
+            state (ComposeState or None): The state to set on the Compose when the stage starts.
+        """
+        self.name = name
+        self.func = func
+        self.requires = tuple(requires)
+        self.pool = pool
+        self.state = state
+
+
+class StageExecutor(object):
+    """
+    Run a graph of :class:`Stages <Stage>` for a :class:`MasherThread`.
+
+    Each stage starts as soon as all the stages it requires are finished, in the order the stages
+    were given. Stages with ``pool`` set run in up to ``workers`` worker threads, so the Koji and
+    database heavy work that doesn't depend on Pungi can proceed while Pungi runs. All other
+    stages, and all changes to the Compose's state, happen in the MasherThread. Wall-clock timings
+    of each stage are recorded with :meth:`MasherThread.record_stage_timing`.
+
+    If a stage fails, no further stages are started, the stages that are already running are
+    allowed to finish, and the first exception is re-raised.
+
+    Attributes:
+        results (dict): A mapping of stage names to the values their funcs returned.
+    """
+
+    def __init__(self, masher, stages, workers):
+        """
+        Initialize the StageExecutor.
+
+        Args:
+            masher (MasherThread): The MasherThread whose stages are being run.
+            stages (list): A list of :class:`Stages <Stage>`.
+            workers (int): How many pool stages may run at the same time. If this is 0, pool
+                stages run in the MasherThread like the others.
+        Raises:
+            ValueError: If a stage requires a stage that isn't in the graph.
+        """
+        names = set(stage.name for stage in stages)
+        for stage in stages:
+            unknown = set(stage.requires) - names
+            if unknown:
+                raise ValueError('Stage %s requires unknown stages: %s' % (
+                    stage.name, ', '.join(sorted(unknown))))
+        self.masher = masher
+        self.stages = stages
+        self.workers = workers
+        self.results = {}
+        self._finished = queue.Queue()
+
+    def _run_in_worker(self, stage):
+        """
+        Run the given stage with its own database session, and report back to the executor.
+
+        Args:
+            stage (Stage): The stage to run.
+        """
+        start = time.time()
+        try:
+            with self.masher.worker_session():
+                result = stage.func()
+        except Exception:
+            self._finished.put((stage, None, sys.exc_info(), start, time.time()))
+        else:
+            self._finished.put((stage, result, None, start, time.time()))
+
+    def run(self):
+        """
+        Run all the stages.
+
+        Returns:
+            dict: A mapping of stage names to the values their funcs returned.
+        """
+        pending = list(self.stages)
+        done = set()
+        running = 0
+        error = None
+
+        while pending or running:
+            ready = [stage for stage in pending if done.issuperset(stage.requires)]
+            if error is None:
+                for stage in ready:
+                    if not stage.pool or not self.workers or running >= self.workers:
+                        continue
+                    if not running:
+                        # The worker's database session must see everything this thread did to the
+                        # updates so far, such as ejecting them from the compose.
+                        self.masher.db.commit()
+                    pending.remove(stage)
+                    self._start(stage)
+                    thread = threading.Thread(target=self._run_in_worker, args=(stage,),
+                                              name='%s-%s' % (self.masher.name, stage.name))
+                    thread.daemon = True
+                    thread.start()
+                    running += 1
+
+                inline = [stage for stage in ready if stage in pending and
+                          (not stage.pool or not self.workers)]
+                if inline:
+                    stage = inline[0]
+                    pending.remove(stage)
+                    self._start(stage)
+                    start = time.time()
+                    try:
+                        self.results[stage.name] = stage.func()
+                    except Exception:
+                        error = sys.exc_info()
+                    else:
+                        done.add(stage.name)
+                    self.masher.record_stage_timing(stage.name, start, time.time())
+                    continue
+
+            if not running:
+                # Either a stage failed, or every remaining stage waits on one that did.
+                break
+
+            stage, result, exc_info, start, end = self._finished.get()
+            running -= 1
+            self.masher.record_stage_timing(stage.name, start, end)
+            if exc_info is not None:
+                self.masher.log.error('Stage %s failed', stage.name, exc_info=exc_info)
+                if error is None:
+                    error = exc_info
+            else:
+                self.results[stage.name] = result
+                done.add(stage.name)
+
+        if error is not None:
+            six.reraise(*error)
+        if pending:
+            raise ValueError('Stages could not be run due to circular requirements: %s' % (
+                ', '.join(stage.name for stage in pending)))
+        return self.results
+
+    def _start(self, stage):
+        """
+        Log the start of the given stage and move the Compose to the stage's state, if it has one.
+
+        Args:
+            stage (Stage): The stage that is starting.
+        """
+        self.masher.log.info('Starting stage %s%s', stage.name,
+                             ' in the worker pool' if stage.pool and self.workers else '')
+        if stage.state is not None:
+            self.masher.save_state(stage.state)
+
+
+def _nothing_sent(exception):
+    """
+    Return whether the given exception was raised before a connection to a service was made.
+
+    Args:
+        exception (Exception): The exception a call to a service raised.
+    Returns:
+        bool: True if the call could not connect, so it can be retried without sending anything
+            twice.
+    """
+    if isinstance(exception, (smtplib.SMTPConnectError, socket.gaierror)):
+        return True
+    return isinstance(exception, socket.error) and exception.errno in (
+        errno.ECONNREFUSED, errno.EHOSTUNREACH, errno.ENETUNREACH)
+
+
+class PostPushPool(object):
+    """
+    Make the network calls of the post-push stages of composes in a bounded pool of threads.
+
+    The stages that comment on bugs and send e-mails about each update of a compose hand their
+    calls to :meth:`run`, which makes them in worker threads. At most ``workers`` calls run at once
+    across all the composes that share the pool, and at most the limit of a service, such as
+    ``bugzilla`` or ``smtp``, talk to that service at once. A call that could not connect to its
+    service is retried after ``backoff`` seconds, which double with every retry. Other failures
+    are not retried, since the call may already have commented or sent an e-mail.
+
+    The calls must not use the caller's database session. They are given the data they need, or
+    open sessions of their own.
+    """
+
+    def __init__(self, workers, limits, retries=3, backoff=1.0):
+        """
+        Initialize the PostPushPool.
+
+        Args:
+            workers (int): The most calls to make at once. With 0, the calls are made one at a time
+                in the calling thread.
+            limits (dict): A mapping of service names to the most calls to make to them at once.
+            retries (int): How many times to retry a call that raised.
+            backoff (float): How many seconds to wait before the first retry of a call.
+        """
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self._workers = threading.BoundedSemaphore(max(workers, 1))
+        self._limits = {service: threading.BoundedSemaphore(limit)
+                        for service, limit in limits.items()}
+
+    @classmethod
+    def from_config(cls):
+        """
+        Return a PostPushPool configured by the ``post_push`` settings.
+
+        Returns:
+            PostPushPool: The new pool.
+        """
+        return cls(
+            config.get('post_push.workers'),
+            {service: config.get('post_push.%s_limit' % service)
+             for service in ('bugzilla', 'smtp')},
+            config.get('post_push.retries'), config.get('post_push.backoff'))
+
+    def _call(self, service, func):
+        """
+        Make the given call, retrying it if it could not connect to its service.
+
+        Args:
+            service (basestring): The name of the service the call talks to.
+            func (callable): The call to make, without arguments.
+        Returns:
+            tuple: The return value of the call and None, or None and the exc_info of its last
+                failure.
+        """
+        limit = self._limits.get(service)
+        for attempt in range(self.retries + 1):
+            try:
+                # Wait for the service before taking a worker, so that the calls to a busy service
+                # don't hold up the calls to the others.
+                if limit is not None:
+                    limit.acquire()
+                try:
+                    with self._workers:
+                        return func(), None
+                finally:
+                    if limit is not None:
+                        limit.release()
+            except Exception as e:
+                if attempt == self.retries or not _nothing_sent(e):
+                    log.exception('Giving up on a call to %s after %d attempts', service,
+                                  attempt + 1)
+                    return None, sys.exc_info()
+                delay = self.backoff * 2 ** attempt
+                log.warning('A call to %s failed, retrying in %s seconds', service, delay,
+                            exc_info=True)
+                time.sleep(delay)
+
+    def run(self, calls):
+        """
+        Make the given calls, and wait for all of them to finish.
+
+        Args:
+            calls (list): (service, callable) tuples of the calls to make.
+        Returns:
+            list: The return values of the calls, in the order of the calls.
+        Raises:
+            Exception: The exception of the first call that still failed after its retries, once
+                all the calls are finished.
+        """
+        if not self.workers or len(calls) < 2:
+            outcomes = [self._call(service, func) for service, func in calls]
+        else:
+            pool = ThreadPool(min(self.workers, len(calls)))
+            try:
+                outcomes = pool.map(lambda call: self._call(*call), calls)
+            finally:
+                pool.close()
+                pool.join()
+
+        for result, exc_info in outcomes:
+            if exc_info is not None:
+                six.reraise(*exc_info)
+        return [result for result, exc_info in outcomes]
+
+
 class Masher(fedmsg.consumers.FedmsgConsumer):
     """
     The Bodhi Masher.
@@ -127,7 +527,7 @@ class Masher(fedmsg.consumers.FedmsgConsumer):
     - Send fedmsgs
     - mash
 
-    Things to do while we're waiting on mash:
+    Things to do while we're waiting on mash, in a pool of worker threads:
 
     - Add testing updates to updates-testing digest
     - Generate/update updateinfo.xml
@@ -175,6 +575,9 @@ class Masher(fedmsg.consumers.FedmsgConsumer):
 
         buildsys.setup_buildsystem(config)
         bugs.set_bugtracker()
+        self.tag_batcher = buildsys.TagBatcher(config.get('tag_actions.batch_size'),
+                                               config.get('tag_actions.delay'))
+        self.post_push_pool = PostPushPool.from_config()
         self.mash_dir = mash_dir
         prefix = hub.config.get('topic_prefix')
         env = hub.config.get('environment')
@@ -238,7 +641,7 @@ class Masher(fedmsg.consumers.FedmsgConsumer):
                 # Acknowledge that we've received the command to run these composes.
                 c.state = ComposeState.pending
 
-            return [c.__json__() for c in composes]
+            return [c.__json__(masher=True) for c in composes]
 
     def work(self, msg):
         """Begin the push process.
@@ -247,47 +650,34 @@ class Masher(fedmsg.consumers.FedmsgConsumer):
         threads for each reop tag being mashed.
 
         If there are any security updates in the push, then those repositories
-        will be executed before all others.
+        will be executed before all others. See :class:`ComposeScheduler`.
         """
         body = msg['body']['msg']
         resume = body.get('resume', False)
         agent = body.get('agent')
         notifications.publish(topic="mashtask.start", msg=dict(agent=agent), force=True)
 
-        results = []
-        # Important repos first, then normal
-        last_key = None
-        threads = []
+        scheduler = ComposeScheduler(config.get('max_concurrent_mashes'),
+                                     config.get('max_concurrent_mashes_per_release'), self.log)
         for compose in self._get_composes(body):
-            if ((last_key is not None and request_order_key(compose) != last_key) or
-                    (len(threads) >= config.get('max_concurrent_mashes'))):
-                # This means that after we submit all Stable+Security updates, we wait with kicking
-                # off the next series of mashes until that finishes.
-                self.log.info('Waiting on %d mashes for priority %s', len(threads), last_key)
-                for thread in threads:
-                    thread.join()
-                    for result in thread.results():
-                        results.append(result)
-                threads = []
-
-            last_key = request_order_key(compose)
-            self.log.info('Now starting mashes for priority %s', last_key)
-
             masher = get_masher(ContentType.from_string(compose['content_type']))
             if not masher:
                 self.log.error('Unsupported content type %s submitted for mashing. SKIPPING',
                                compose['content_type'])
                 continue
 
-            thread = masher(compose, agent, self.log, self.db_factory, self.mash_dir, resume)
-            threads.append(thread)
-            thread.start()
+            if config.get('mash_execution_mode') == 'process':
+                thread = MasherProcess(masher, compose, agent, self.log, self.db_factory,
+                                       self.mash_dir, resume)
+            else:
+                thread = masher(compose, agent, self.log, self.db_factory, self.mash_dir, resume,
+                                tag_batcher=self.tag_batcher,
+                                post_push_pool=self.post_push_pool)
+            scheduler.add(compose, thread)
 
-        self.log.info('All of the batches are running. Now waiting for the final results')
-        for thread in threads:
-            thread.join()
-            for result in thread.results():
-                results.append(result)
+        results = []
+        for thread in scheduler.run():
+            results.extend(thread.results())
 
         self.log.info('Push complete!  Summary follows:')
         for result in results:
@@ -310,13 +700,192 @@ def get_masher(content_type):
             return possible
 
 
+class MasherProcess(threading.Thread):
+    """
+    Run a compose with a MasherThread in a child process of its own.
+
+    The child process initializes its own database engine, Koji session and bug tracker, so that a
+    crash or a leak in one compose doesn't affect the others, and so that the CPU heavy parts of
+    the composes don't contend for the same interpreter. The log records and the results of the
+    child are streamed back and handled by this thread in the parent process. It can be scheduled
+    like a MasherThread by the :class:`ComposeScheduler`.
+    """
+
+    def __init__(self, masher_class, compose, agent, log, db_factory, mash_dir, resume=False):
+        """
+        Initialize the MasherProcess.
+
+        Args:
+            masher_class (type): The MasherThread subclass to run the compose with.
+            compose (dict): A dictionary representation of the Compose to run, formatted like the
+                output of :meth:`Compose.__json__`.
+            agent (basestring): The user who is executing the mash.
+            log (logging.Logger): A logger to use for this mash.
+            db_factory (bodhi.server.util.TransactionalSessionMaker): A DB session to use in this
+                process, to mark the Compose as failed if the child process crashes.
+            mash_dir (basestring): A path to a directory to generate the mash in.
+            resume (bool): Whether or not we are resuming a previous failed mash. Defaults to False.
+        """
+        super(MasherProcess, self).__init__()
+        self.masher_class = masher_class
+        self.agent = agent
+        self.log = log
+        self.db_factory = db_factory
+        self.mash_dir = mash_dir
+        self.resume = resume
+        self.exitcode = None
+        # A queue.Queue the thread puts itself on when it is done, set by the ComposeScheduler.
+        self.finished = None
+        self._compose = compose
+        self._results = []
+
+    def run(self):
+        """Start the child process, and handle the messages it sends until it exits."""
+        messages = multiprocessing.Queue()
+        process = multiprocessing.Process(
+            target=_run_masher_process,
+            args=(self.masher_class, self._compose, self.agent, self.log, self.mash_dir,
+                  self.resume, messages))
+        try:
+            process.start()
+            done = False
+            while not done:
+                try:
+                    kind, value = messages.get(timeout=1)
+                except queue.Empty:
+                    if process.is_alive():
+                        continue
+                    # The child may have sent its last messages right before exiting.
+                    try:
+                        kind, value = messages.get(timeout=1)
+                    except queue.Empty:
+                        break
+                if kind == 'log':
+                    logging.getLogger(value.name).handle(value)
+                elif kind == 'results':
+                    self._results = value
+                    done = True
+            process.join()
+            self.exitcode = process.exitcode
+            if self.exitcode:
+                self._mark_failed()
+        finally:
+            if self.finished is not None:
+                self.finished.put(self)
+
+    def results(self):
+        """
+        Yield log string messages about the results of this mash run.
+
+        Yields:
+            basestring: A string for human readers indicating the success of the mash.
+        """
+        if self._results:
+            for result in self._results:
+                yield result
+        else:
+            yield "  compose:  %s %s  exited with %s" % (
+                self._compose['release_id'], self._compose['request'], self.exitcode)
+
+    def _mark_failed(self):
+        """Mark the Compose as failed after its child process crashed."""
+        self.log.error('The mash process of the %s compose of release %s exited with %s',
+                       self._compose['request'], self._compose['release_id'], self.exitcode)
+        with self.db_factory() as session:
+            compose = Compose.from_dict(session, self._compose)
+            compose.error_message = u'The mash process exited with %s' % self.exitcode
+            compose.state = ComposeState.failed
+
+
+class _QueueLogHandler(logging.Handler):
+    """A logging handler that puts the records it handles on a multiprocessing.Queue."""
+
+    def __init__(self, messages):
+        """
+        Initialize the _QueueLogHandler.
+
+        Args:
+            messages (multiprocessing.Queue): The queue to put the records on.
+        """
+        super(_QueueLogHandler, self).__init__()
+        self.messages = messages
+
+    def emit(self, record):
+        """
+        Put the given record on the queue, in a form that can be pickled.
+
+        Args:
+            record (logging.LogRecord): The record to put on the queue.
+        """
+        try:
+            record.msg = record.getMessage()
+            record.args = None
+            if record.exc_info:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+                record.exc_info = None
+            self.messages.put(('log', record))
+        except Exception:
+            self.handleError(record)
+
+
+def _stream_logs(messages):
+    """
+    Replace the log handlers of this process with one that puts the records on the given queue.
+
+    Args:
+        messages (multiprocessing.Queue): The queue to put the records on.
+    """
+    root = logging.getLogger()
+    loggers = [root] + [l for l in logging.Logger.manager.loggerDict.values()
+                        if isinstance(l, logging.Logger)]
+    for logger in loggers:
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+    root.addHandler(_QueueLogHandler(messages))
+
+
+def _run_masher_process(masher_class, compose, agent, log, mash_dir, resume, messages):
+    """
+    Run a compose in a child process started by a MasherProcess.
+
+    The database engine, Koji session and bug tracker inherited from the parent process are not
+    used, since they are shared with it.
+
+    Args:
+        masher_class (type): The MasherThread subclass to run the compose with.
+        compose (dict): A dictionary representation of the Compose to run.
+        agent (basestring): The user who is executing the mash.
+        log (logging.Logger): A logger to use for this mash.
+        mash_dir (basestring): A path to a directory to generate the mash in.
+        resume (bool): Whether or not we are resuming a previous failed mash.
+        messages (multiprocessing.Queue): The queue to send the log records and the results on.
+    """
+    _stream_logs(messages)
+    initialize_db(config)
+    buildsys.teardown_buildsystem()
+    buildsys.setup_buildsystem(config)
+    bugs.set_bugtracker()
+
+    thread = masher_class(compose, agent, log, transactional_session_maker(), mash_dir, resume)
+    # The compose is run in the main thread of this process.
+    thread.run()
+    messages.put(('results', list(thread.results())))
+
+
 class MasherThread(threading.Thread):
-    """The base class that defines common things for all mashings."""
+    """
+    The base class that defines common things for all mashings.
+
+    The ``db`` and ``compose`` attributes are local to the thread that sets them, so that stages
+    run by the :class:`StageExecutor` in worker threads can use their own database session and
+    their own copy of the Compose through the same methods the MasherThread uses.
+    """
 
     ctype = None
     pungi_template_config_key = None
 
-    def __init__(self, compose, agent, log, db_factory, mash_dir, resume=False):
+    def __init__(self, compose, agent, log, db_factory, mash_dir, resume=False, tag_batcher=None,
+                 post_push_pool=None):
         """
         Initialize the MasherThread.
 
@@ -329,8 +898,17 @@ class MasherThread(threading.Thread):
                 mashing.
             mash_dir (basestring): A path to a directory to generate the mash in.
             resume (bool): Whether or not we are resuming a previous failed mash. Defaults to False.
+            tag_batcher (bodhi.server.buildsys.TagBatcher or None): If given, the builds that may be
+                tagged in any order are tagged through it, together with those of other composes.
+            post_push_pool (PostPushPool or None): The pool to make the network calls of the
+                post-push stages in. If None, a pool of the thread's own is created.
         """
         super(MasherThread, self).__init__()
+        self.tag_batcher = tag_batcher
+        if post_push_pool is None:
+            post_push_pool = PostPushPool.from_config()
+        self.post_push_pool = post_push_pool
+        self._local = threading.local()
         self.db_factory = db_factory
         self.log = log
         self.agent = agent
@@ -346,14 +924,131 @@ class MasherThread(threading.Thread):
         self.success = False
         self.devnull = None
         self._startyear = None
+        self._stage_timings = {}
+        # Stages in worker threads record their counters and progress too.
+        self._stage_lock = threading.Lock()
+        self._checkpoints = {}
+        self._progress = {}
+        # A queue.Queue the thread puts itself on when it is done, set by the ComposeScheduler.
+        self.finished = None
+
+    @property
+    def db(self):
+        """
+        Return the database session of the current thread.
+
+        Returns:
+            sqlalchemy.orm.session.Session or None: The session, or None if none has been set.
+        """
+        return getattr(self._local, 'db', None)
+
+    @db.setter
+    def db(self, value):
+        """
+        Set the database session of the current thread.
+
+        Args:
+            value (sqlalchemy.orm.session.Session or None): The session to use.
+        """
+        self._local.db = value
+
+    @property
+    def compose(self):
+        """
+        Return the Compose being run, as loaded by the current thread's database session.
+
+        Returns:
+            bodhi.server.models.Compose or None: The Compose, or None if none has been set.
+        """
+        return getattr(self._local, 'compose', None)
+
+    @compose.setter
+    def compose(self, value):
+        """
+        Set the Compose of the current thread.
+
+        Args:
+            value (bodhi.server.models.Compose or None): The Compose to use.
+        """
+        self._local.compose = value
+
+    def _load_compose(self, session):
+        """
+        Load the Compose being run, with what the masher needs of its updates loaded up front.
+
+        Args:
+            session (sqlalchemy.orm.session.Session): The session to load the Compose with.
+        Returns:
+            bodhi.server.models.Compose: The Compose.
+        """
+        return Compose.from_dict(session, self._compose,
+                                 Update.loading_profile('masher', via=Compose.updates))
+
+    @contextmanager
+    def worker_session(self):
+        """
+        Give the current worker thread its own database session and Compose for a stage.
+
+        The session is committed when the stage succeeds, and rolled back if it raises.
+        """
+        with self.db_factory() as session:
+            self.db = session
+            self.compose = self._load_compose(session)
+            try:
+                yield
+            finally:
+                self.compose = None
+                self.db = None
+
+    def record_stage_timing(self, name, start, end):
+        """
+        Record the wall-clock time a stage took. It is saved on the Compose by save_state().
+
+        Args:
+            name (basestring): The name of the stage.
+            start (float): When the stage started, as returned by time.time().
+            end (float): When the stage ended, as returned by time.time().
+        """
+        with self._stage_lock:
+            self._stage_timings.setdefault(name, {}).update({
+                'start': datetime.utcfromtimestamp(start).isoformat(),
+                'end': datetime.utcfromtimestamp(end).isoformat(),
+                'duration': round(end - start, 3)})
+        self.log.info('Stage %s took %.3f seconds', name, end - start)
+
+    def record_stage_progress(self, name, done, total):
+        """
+        Record how far a stage has got. It is saved on the Compose with the stage timings.
+
+        Args:
+            name (basestring): The name of the stage.
+            done (int): How many of the stage's items are done.
+            total (int): How many items the stage has.
+        """
+        with self._stage_lock:
+            self._stage_timings.setdefault(name, {})['progress'] = {'done': done, 'total': total}
+        self.log.info('Stage %s: %d of %d done', name, done, total)
+
+    def record_stage_counter(self, name, counter, amount=1):
+        """
+        Add to one of the counters of a stage. It is saved on the Compose with the stage timings.
+
+        Args:
+            name (basestring): The name of the stage.
+            counter (basestring): The name of the counter, such as ``builds_tagged``.
+            amount (int): How much to add to the counter.
+        """
+        with self._stage_lock:
+            counters = self._stage_timings.setdefault(name, {}).setdefault('counters', {})
+            counters[counter] = counters.get(counter, 0) + int(amount)
 
     def run(self):
         """Run the thread by managing a db transaction and calling work()."""
         try:
             with self.db_factory() as session:
                 self.db = session
-                self.compose = Compose.from_dict(session, self._compose)
-                self._checkpoints = json.loads(self.compose.checkpoints)
+                self.compose = self._load_compose(session)
+                self._read_checkpoints()
                 self.log.info('Starting masher type %s for %s with %d updates',
                               self, str(self.compose), len(self.compose.updates))
                 self.save_state(ComposeState.initializing)
@@ -369,6 +1064,8 @@ class MasherThread(threading.Thread):
         finally:
             self.compose = None
             self.db = None
+            if self.finished is not None:
+                self.finished.put(self)
 
     def results(self):
         """
@@ -417,57 +1114,63 @@ class MasherThread(threading.Thread):
             else:
                 self.save_state()
 
+            stages = []
             if self.compose.request is UpdateRequest.stable:
-                self.perform_gating()
-
-            self.determine_and_perform_tag_actions()
-
-            self.update_security_bugs()
-
-            self.expire_buildroot_overrides()
-            self.remove_pending_tags()
+                stages.append(Stage('perform_gating', self.perform_gating))
+            stages.extend([
+                Stage('determine_and_perform_tag_actions',
+                      self.determine_and_perform_tag_actions),
+                Stage('update_security_bugs', self.update_security_bugs),
+                Stage('expire_buildroot_overrides', self.expire_buildroot_overrides),
+                Stage('remove_pending_tags', self.remove_pending_tags)])
+            pre_mash = [stage.name for stage in stages]
 
             if not self.skip_mash:
-                mash_process = self.mash()
+                stages.append(Stage('mash', self.mash, requires=pre_mash))
 
             # Things we can do while we're mashing
-            self.generate_testing_digest()
+            stages.append(Stage('generate_testing_digest', self.generate_testing_digest,
+                                requires=pre_mash, pool=True))
 
             if not self.skip_mash:
-                uinfo = self.generate_updateinfo()
-
-                self.wait_for_mash(mash_process)
-
-                uinfo.insert_updateinfo(self.path)
-
-            if not self.skip_mash:
-                self.sanity_check_repo()
-                self.stage_repo()
-
-                # Wait for the repo to hit the master mirror
-                self.wait_for_sync()
-
-            self._mark_status_changes()
-            self.save_state(ComposeState.notifying)
-            # Send fedmsg notifications
-            self.send_notifications()
-
-            # Update bugzillas
-            self.modify_bugs()
-
-            # Add comments to updates
-            self.status_comments()
-
-            # Announce stable updates to the mailing list
-            self.send_stable_announcements()
-
-            # Email updates-testing digest
-            self.send_testing_digest()
-
-            self._unlock_updates()
-
-            self.check_all_karma_thresholds()
-            self.obsolete_older_updates()
+                stages.extend([
+                    Stage('generate_updateinfo', self.generate_updateinfo, requires=pre_mash,
+                          pool=True, state=ComposeState.updateinfo),
+                    Stage('wait_for_mash', lambda: self.wait_for_mash(executor.results['mash']),
+                          requires=['mash']),
+                    Stage('insert_updateinfo',
+                          lambda: self.insert_updateinfo(executor.results['generate_updateinfo']),
+                          requires=['wait_for_mash', 'generate_updateinfo']),
+                    Stage('sanity_check_repo', self.sanity_check_repo,
+                          requires=['insert_updateinfo']),
+                    Stage('stage_repo', self.stage_repo, requires=['sanity_check_repo']),
+                    # Wait for the repo to hit the master mirror
+                    Stage('wait_for_sync', self.wait_for_sync, requires=['stage_repo'])])
+
+            stages.append(Stage('_mark_status_changes', self._mark_status_changes,
+                                requires=[stage.name for stage in stages]))
+            stages.extend([
+                # Send fedmsg notifications
+                Stage('send_notifications', self.send_notifications, state=ComposeState.notifying,
+                      requires=['_mark_status_changes']),
+                # Update bugzillas
+                Stage('modify_bugs', self.modify_bugs, requires=['send_notifications']),
+                # Add comments to updates
+                Stage('status_comments', self.status_comments, requires=['modify_bugs']),
+                # Announce stable updates to the mailing list
+                Stage('send_stable_announcements', self.send_stable_announcements,
+                      requires=['status_comments']),
+                # Email updates-testing digest
+                Stage('send_testing_digest', self.send_testing_digest,
+                      requires=['send_stable_announcements']),
+                Stage('_unlock_updates', self._unlock_updates, requires=['send_testing_digest']),
+                Stage('check_all_karma_thresholds', self.check_all_karma_thresholds,
+                      requires=['_unlock_updates']),
+                Stage('obsolete_older_updates', self.obsolete_older_updates,
+                      requires=['check_all_karma_thresholds'])])
+
+            executor = StageExecutor(self, stages, config.get('compose_stage_workers'))
+            executor.run()
 
             self.save_state(ComposeState.success)
             self.success = True
@@ -481,11 +1184,19 @@ class MasherThread(threading.Thread):
             self.finish(self.success)
 
     def check_all_karma_thresholds(self):
-        """Run check_karma_thresholds() on testing Updates."""
+        """
+        Run check_karma_thresholds() on the testing Updates that reached a karma threshold.
+
+        The karma counters are stored on the Updates, which were loaded with the compose, so the
+        Updates that reached a threshold are found in memory before any of them is changed.
+        """
         if self.compose.request is UpdateRequest.testing:
             self.log.info('Determing if any testing updates reached the karma '
                           'thresholds during the push')
-            for update in self.compose.updates:
+            # Locked updates are checked anyway, so that the problem gets logged.
+            updates = [update for update in self.compose.updates
+                       if update.locked or update.reached_karma_threshold]
+            for update in updates:
                 try:
                     update.check_karma_thresholds(self.db, agent=u'bodhi')
                 except BodhiException:
@@ -498,13 +1209,34 @@ class MasherThread(threading.Thread):
             update.obsolete_older_updates(self.db)
 
     def perform_gating(self):
-        """Look for Updates that don't meet testing requirements, and eject them from the mash."""
+        """
+        Look for Updates that don't meet testing requirements, and eject them from the mash.
+
+        The requirements of up to ``gating.workers`` Updates are checked with Taskotron and Koji at
+        the same time, and then all the Updates that failed are ejected together.
+        """
         self.log.debug('Performing gating.')
-        for update in self.compose.updates:
-            result, reason = update.check_requirements(self.db, config)
+        updates = list(self.compose.updates)
+        # The data the checks need is read here, since the session of the compose must only be used
+        # by this thread. The checks themselves don't use the Updates.
+        checks = [update.requirements_check(config) for update in updates]
+        workers = min(config.get('gating.workers'), len(checks))
+        if workers > 1:
+            pool = ThreadPool(workers)
+            try:
+                results = pool.map(lambda check: check(), checks)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [check() for check in checks]
+
+        ejections = []
+        for update, (result, reason) in zip(updates, results):
             if not result:
                 self.log.warn("%s failed gating: %s" % (update.title, reason))
-                self.eject_from_mash(update, reason)
+                ejections.append((update, reason))
+        self.eject_updates_from_mash(ejections)
 
     def eject_from_mash(self, update, reason):
         """
@@ -515,30 +1247,50 @@ class MasherThread(threading.Thread):
             reason (basestring): A human readable explanation for the ejection, which is used in a
                 comment on the update, in a log message, and in a fedmsg.
         """
-        update.locked = False
-        text = '%s ejected from the push because %r' % (update.title, reason)
-        log.warn(text)
-        update.comment(self.db, text, author=u'bodhi')
-        # Remove the pending tag as well
-        if update.request is UpdateRequest.stable:
-            update.remove_tag(update.release.pending_stable_tag,
-                              koji=buildsys.get_session())
-        elif update.request is UpdateRequest.testing:
-            update.remove_tag(update.release.pending_testing_tag,
-                              koji=buildsys.get_session())
-        update.request = None
-        notifications.publish(
-            topic="update.eject",
-            msg=dict(
-                repo=self.id,
-                update=update,
-                reason=reason,
-                request=self.compose.request,
-                release=self.compose.release,
-                agent=self.agent,
-            ),
-            force=True,
-        )
+        self.eject_updates_from_mash([(update, reason)])
+
+    def eject_updates_from_mash(self, ejections):
+        """
+        Eject the given Updates from the current mash, removing their pending tags in one multicall.
+
+        Args:
+            ejections (list): A list of (update, reason) tuples, where reason is a human readable
+                explanation for the ejection of the Update, which is used in a comment on the
+                update, in a log message, and in a fedmsg.
+        """
+        if not ejections:
+            return
+
+        koji = buildsys.get_session()
+        koji.multicall = True
+        for update, reason in ejections:
+            update.locked = False
+            text = '%s ejected from the push because %r' % (update.title, reason)
+            log.warn(text)
+            update.comment(self.db, text, author=u'bodhi')
+            # Remove the pending tag as well
+            if update.request is UpdateRequest.stable:
+                update.remove_tag(update.release.pending_stable_tag, koji=koji)
+            elif update.request is UpdateRequest.testing:
+                update.remove_tag(update.release.pending_testing_tag, koji=koji)
+            update.request = None
+        for result in koji.multiCall():
+            if isinstance(result, dict):
+                self.log.error('Failed to remove a pending tag: %r', result)
+
+        for update, reason in ejections:
+            notifications.publish(
+                topic="update.eject",
+                msg=dict(
+                    repo=self.id,
+                    update=update,
+                    reason=reason,
+                    request=self.compose.request,
+                    release=self.compose.release,
+                    agent=self.agent,
+                ),
+                force=True,
+            )
 
     def init_state(self):
         """Create the mash_dir if it doesn't exist."""
@@ -554,15 +1306,67 @@ class MasherThread(threading.Thread):
             state (bodhi.server.models.ComposeState): If not ``None``, set the Compose's state
                 attribute to the given state. Defaults to ``None``.
         """
-        self.compose.checkpoints = json.dumps(self._checkpoints).decode('utf-8')
+        with self._stage_lock:
+            self.compose.stage_timings = json.dumps(self._stage_timings).decode('utf-8')
         if state is not None:
             self.compose.state = state
         self.db.commit()
         self.log.info('Compose object updated.')
 
+    def save_checkpoint(self, key, value=True):
+        """
+        Record that the compose reached the given checkpoint, and save the state.
+
+        The checkpoint is appended to the Compose's checkpoints, and the progress records of the
+        step it completes are deleted.
+
+        Args:
+            key (basestring): The name of the checkpoint, such as the name of the completed step.
+            value (object): A JSON serializable value to record. Defaults to True.
+        """
+        self._checkpoints[key] = value
+        prefix = '%s.' % key
+        for record in list(self.compose.checkpoints):
+            if record.progress and record.key.startswith(prefix):
+                self.compose.checkpoints.remove(record)
+                self._progress.pop(record.key, None)
+        self.compose.checkpoints.append(ComposeCheckpoint(
+            key=key, value=json.dumps(value).decode('utf-8')))
+        self.save_state()
+
+    def save_progress(self, step, name, value):
+        """
+        Record how far the given step has got, so a resumed compose can skip what was done.
+
+        Only the step's record of the given name is written, and it is replaced in place.
+
+        Args:
+            step (basestring): The name of the step.
+            name (basestring): The name of the progress record, such as ``tagged``.
+            value (object): A JSON serializable value to record.
+        """
+        key = '%s.%s' % (step, name)
+        self._progress[key] = value
+        value = json.dumps(value).decode('utf-8')
+        for record in self.compose.checkpoints:
+            if record.progress and record.key == key:
+                record.value = value
+                break
+        else:
+            self.compose.checkpoints.append(ComposeCheckpoint(key=key, value=value, progress=True))
+        self.db.commit()
+
+    def _read_checkpoints(self):
+        """Load the checkpoints and the progress records of the Compose."""
+        self._checkpoints = {}
+        self._progress = {}
+        for record in self.compose.checkpoints:
+            records = self._progress if record.progress else self._checkpoints
+            records[record.key] = json.loads(record.value)
+
     def load_state(self):
         """Load the state of this push so it can be resumed later if necessary."""
-        self._checkpoints = json.loads(self.compose.checkpoints)
+        self._read_checkpoints()
         self.log.info('Masher state loaded from %s', self.compose)
         self.log.info(self.compose.state)
         if 'completed_repo' in self._checkpoints:
@@ -578,16 +1382,20 @@ class MasherThread(threading.Thread):
 
     def finish(self, success):
         """
-        Clean up pungi configs if the mash was successful, and send logs and fedmsgs.
+        Send logs and fedmsgs about the end of the mash.
 
         Args:
             success (bool): True if the mash had been successful, False otherwise.
         """
-        if hasattr(self, '_pungi_conf_dir') and os.path.exists(self._pungi_conf_dir) and success:
-            # Let's clean up the pungi configs we wrote
-            shutil.rmtree(self._pungi_conf_dir)
-
         self.log.info('Thread(%s) finished.  Success: %r' % (self.id, success))
+        # The timings and counters of the stages, so the slow stages of composes can be tracked.
+        with self._stage_lock:
+            stages = copy.deepcopy(self._stage_timings)
+        notifications.publish(
+            topic="mashtask.stages",
+            msg=dict(repo=self.id, agent=self.agent, ctype=self.ctype.value, stages=stages),
+            force=True,
+        )
         notifications.publish(
             topic="mashtask.complete",
             msg=dict(success=success, repo=self.id, agent=self.agent, ctype=self.ctype.value),
@@ -609,6 +1417,13 @@ class MasherThread(threading.Thread):
         self._perform_tag_actions()
 
     def _determine_tag_actions(self):
+        actions = self._progress.get('determine_and_perform_tag_actions.actions')
+        if self.resume and actions is not None:
+            self.log.info('Resuming with the tag actions that were determined before')
+            for name, value in actions.items():
+                setattr(self, name, [tuple(action) for action in value])
+            return
+
         tag_types, tag_rels = Release.get_tags(self.db)
         # sync & async tagging batches
         for i, batch in enumerate(sorted_updates(self.compose.updates)):
@@ -647,31 +1462,93 @@ class MasherThread(threading.Thread):
                         self.add_tags_async.extend(add_tags)
                         self.move_tags_async.extend(move_tags)
 
+        # Record the actions once, so that the progress of _perform_tag_actions() can refer to them.
+        self.save_progress(
+            'determine_and_perform_tag_actions', 'actions',
+            {name: getattr(self, name) for name in ('add_tags_sync', 'move_tags_sync',
+                                                    'add_tags_async', 'move_tags_async')})
+
     def _perform_tag_actions(self):
         koji = buildsys.get_session()
+        # How many of the actions are done, counting the sync actions one by one in the order they
+        # are performed, and then the async actions all at once.
+        tagged = 0
+        if self.resume:
+            tagged = self._progress.get('determine_and_perform_tag_actions.tagged', 0)
+            if tagged:
+                self.log.info('Skipping the %d tag actions that were done before resuming', tagged)
+        offset = 0
         for i, batches in enumerate([(self.add_tags_sync, self.move_tags_sync),
                                      (self.add_tags_async, self.move_tags_async)]):
             add, move = batches
+            count = len(add) + len(move)
+            if count and tagged >= offset + count:
+                offset += count
+                continue
             if i == 0:
-                koji.multicall = False
+                self._perform_sync_tag_actions(koji, add, move, tagged - offset, offset)
+                offset += count
+                continue
+            if self.tag_batcher is not None:
+                failed_tasks = self.tag_batcher.tag(
+                    add, move, progress=functools.partial(self.record_stage_progress,
+                                                          'determine_and_perform_tag_actions'))
+                if failed_tasks:
+                    raise Exception("Failed to move builds: %s" % failed_tasks)
             else:
                 koji.multicall = True
-            for action in add:
-                tag, build = action
-                self.log.info("Adding tag %s to %s" % (tag, build))
-                koji.tagBuild(tag, build, force=True)
-            for action in move:
-                from_tag, to_tag, build = action
-                self.log.info('Moving %s from %s to %s' % (
-                              build, from_tag, to_tag))
-                koji.moveBuild(from_tag, to_tag, build, force=True)
-
-            if i != 0:
+                self._send_tag_actions(koji, add, move)
                 results = koji.multiCall()
-                failed_tasks = buildsys.wait_for_tasks([task[0] for task in results],
-                                                       koji, sleep=15)
+                failed_tasks = buildsys.wait_for_tasks(
+                    [task[0] for task in results], koji, sleep=15,
+                    progress=functools.partial(self.record_stage_progress,
+                                               'determine_and_perform_tag_actions'))
                 if failed_tasks:
                     raise Exception("Failed to move builds: %s" % failed_tasks)
+            if count:
+                self.record_stage_counter('determine_and_perform_tag_actions', 'builds_tagged',
+                                          count)
+            offset += count
+            self.save_progress('determine_and_perform_tag_actions', 'tagged', offset)
+
+    def _perform_sync_tag_actions(self, koji, add, move, skip, offset):
+        """
+        Tag and move the given builds one at a time, recording the progress after each of them.
+
+        Args:
+            koji (koji.ClientSession): A Koji client session to use.
+            add (list): (tag, build) tuples of the builds to tag.
+            move (list): (from_tag, to_tag, build) tuples of the builds to move.
+            skip (int): How many of the actions were done before the compose was resumed.
+            offset (int): How many actions were done before the given ones.
+        """
+        koji.multicall = False
+        for done in range(skip, len(add) + len(move)):
+            if done < len(add):
+                self._send_tag_actions(koji, [add[done]], [])
+            else:
+                self._send_tag_actions(koji, [], [move[done - len(add)]])
+            self.record_stage_counter('determine_and_perform_tag_actions', 'builds_tagged')
+            self.save_progress('determine_and_perform_tag_actions', 'tagged', offset + done + 1)
+
+    def _send_tag_actions(self, koji, add, move):
+        """
+        Call tagBuild and moveBuild on the given Koji session for the given builds.
+
+        Args:
+            koji (koji.ClientSession): A Koji client session to use.
+            add (list): (tag, build) tuples of the builds to tag.
+            move (list): (from_tag, to_tag, build) tuples of the builds to move.
+        """
+        for action in add:
+            tag, build = action
+            self.log.info("Adding tag %s to %s" % (tag, build))
+            koji.tagBuild(tag, build, force=True)
+        for action in move:
+            from_tag, to_tag, build = action
+            self.log.info('Moving %s from %s to %s' % (
+                          build, from_tag, to_tag))
+            koji.moveBuild(from_tag, to_tag, build, force=True)
 
     def expire_buildroot_overrides(self):
         """Expire any buildroot overrides that are in this push."""
@@ -715,7 +1592,12 @@ class MasherThread(threading.Thread):
         raise NotImplementedError
 
     def create_pungi_config(self):
-        """Create a temp dir and render the Pungi config templates into the dir."""
+        """
+        Render the Pungi config templates into the Pungi config dir of this repository.
+
+        The config dir is kept in the mash_dir between composes, and only the files whose content
+        changed since the previous compose of the repository are written.
+        """
         loader = jinja2.FileSystemLoader(searchpath=config.get('pungi.basepath'))
         env = jinja2.Environment(loader=loader,
                                  autoescape=False,
@@ -734,13 +1616,50 @@ class MasherThread(threading.Thread):
         config_template = config.get(self.pungi_template_config_key)
         template = env.get_template(config_template)
 
-        self._pungi_conf_dir = tempfile.mkdtemp(prefix='bodhi-pungi-%s-' % self.id)
+        self._pungi_conf_dir = os.path.join(self.mash_dir, 'pungi-configs', self.id)
+        if not os.path.exists(self._pungi_conf_dir):
+            os.makedirs(self._pungi_conf_dir)
 
-        with open(os.path.join(self._pungi_conf_dir, 'pungi.conf'), 'w') as conffile:
-            conffile.write(template.render())
+        self.write_pungi_file(self._pungi_conf_dir, 'pungi.conf', template.render())
 
         self.copy_additional_pungi_files(self._pungi_conf_dir, env)
 
+    def write_pungi_file(self, pungi_conf_dir, name, content):
+        """
+        Write a rendered Pungi config file, unless it already has the given content.
+
+        The SHA256 digests of the files that were written are cached, so an unchanged file is
+        neither written nor read again. Files that aren't in the cache yet are compared with the
+        content by their digest.
+
+        Args:
+            pungi_conf_dir (basestring): A path to the directory that Pungi's configs are being
+                written to.
+            name (basestring): The name of the file.
+            content (unicode): The rendered content of the file.
+        Returns:
+            bool: True if the file was written, False if it was already up to date.
+        """
+        path = os.path.join(pungi_conf_dir, name)
+        content = content.encode('utf-8')
+        digest = hashlib.sha256(content).hexdigest()
+        with _pungi_file_digests_lock:
+            cached = _pungi_file_digests.get(path)
+        if cached is None and os.path.exists(path):
+            with open(path, 'rb') as existing:
+                cached = hashlib.sha256(existing.read()).hexdigest()
+        if cached == digest and os.path.exists(path):
+            self.log.debug('%s is up to date', path)
+            with _pungi_file_digests_lock:
+                _pungi_file_digests[path] = digest
+            return False
+
+        with open(path, 'wb') as conffile:
+            conffile.write(content)
+        with _pungi_file_digests_lock:
+            _pungi_file_digests[path] = digest
+        return True
+
     def mash(self):
         """
         Launch the Pungi child process to "punge" the repository.
@@ -840,7 +1759,7 @@ class MasherThread(threading.Thread):
             raise Exception('We were unable to find a path with prefix %s in mashdir' % prefix)
         self.log.debug('Paths: %s', paths)
         self.path = paths[-1]
-        self._checkpoints['completed_repo'] = self.path
+        self.save_checkpoint('completed_repo', self.path)
 
     def _mark_status_changes(self):
         """Mark each update's status as fulfilling its request."""
@@ -890,17 +1809,35 @@ class MasherThread(threading.Thread):
         """
         Create the updateinfo.xml file for this repository.
 
+        If ``updateinfo_incremental`` is enabled, the records of the compose that is still staged
+        for this repository are reused for the updates that haven't changed since.
+
         Returns:
             bodhi.server.metadata.UpdateInfoMetadata: The updateinfo model that was created for this
                 repository.
         """
         self.log.info('Generating updateinfo for %s' % self.compose.release.name)
-        self.save_state(ComposeState.updateinfo)
+        previous = None
+        if config.get('updateinfo_incremental'):
+            # stage_repo() hasn't run yet, so the staged compose is the previous one.
+            previous = load_updateinfo(os.path.join(config.get('mash_stage_dir'), self.id))
         uinfo = UpdateInfoMetadata(self.compose.release, self.compose.request,
-                                   self.db, self.mash_dir)
+                                   self.db, self.mash_dir, previous=previous,
+                                   verify=config.get('updateinfo_verify'))
+        self.record_stage_counter('generate_updateinfo', 'rpms_fetched', uinfo.fetched_rpms)
         self.log.info('Updateinfo generation for %s complete' % self.compose.release.name)
         return uinfo
 
+    def insert_updateinfo(self, uinfo):
+        """
+        Add the given updateinfo to the mashed repository.
+
+        Args:
+            uinfo (bodhi.server.metadata.UpdateInfoMetadata): The updateinfo to add.
+        """
+        compressed = uinfo.insert_updateinfo(self.path)
+        self.record_stage_counter('insert_updateinfo', 'bytes_compressed', compressed)
+
     def sanity_check_repo(self):
         """Sanity check our repo.
 
@@ -911,57 +1848,150 @@ class MasherThread(threading.Thread):
         we get a repository with either hardlinks or copied files.
         This means that we when we go and sync generated repositories out, we do not need to take
         special case to copy the target files rather than symlinks.
+
+        The arches are checked at the same time, each downloading its repodata to a directory of its
+        own in a shared scratch directory. Every arch is checked even if another one fails, and the
+        first failure is raised once they are all done.
+
+        Returns:
+            dict: A mapping of arch names to the results of their checks, as returned by
+                _sanity_check_arch().
         """
         self.log.info("Running sanity checks on %s" % self.path)
 
-        arches = os.listdir(os.path.join(self.path, 'compose', 'Everything'))
-        for arch in arches:
-            # sanity check our repodata
-            try:
-                if arch == 'source':
-                    repodata = os.path.join(self.path, 'compose',
-                                            'Everything', arch, 'tree', 'repodata')
-                else:
-                    repodata = os.path.join(self.path, 'compose',
-                                            'Everything', arch, 'os', 'repodata')
-                sanity_check_repodata(repodata)
-            except Exception:
-                self.log.exception("Repodata sanity check failed!")
-                raise
+        arches = sorted(os.listdir(os.path.join(self.path, 'compose', 'Everything')))
+        scratch = tempfile.mkdtemp(prefix='bodhi-sanity-')
 
-            # make sure that pungi didn't symlink our packages
+        def check(arch):
             try:
-                if arch == 'source':
-                    dirs = [('tree', 'Packages')]
-                else:
-                    dirs = [('debug', 'tree', 'Packages'), ('os', 'Packages')]
-
-                # Example of full path we are checking:
-                # self.path/compose/Everything/os/Packages/s/something.rpm
-                for checkdir in dirs:
-                    checkdir = os.path.join(self.path, 'compose', 'Everything', arch, *checkdir)
-                    subdirs = os.listdir(checkdir)
-                    # subdirs is the self.path/compose/Everything/os/Packages/{a,b,c,...}/ dirs
-                    #
-                    # Let's check the first file in each subdir. If they are correct, we'll assume
-                    # the rest is correct
-                    # This is to avoid tons and tons of IOPS for a bunch of files put in in the
-                    # same way
-                    for subdir in subdirs:
-                        for checkfile in os.listdir(os.path.join(checkdir, subdir)):
-                            if not checkfile.endswith('.rpm'):
-                                continue
-                            if os.path.islink(os.path.join(checkdir, subdir, checkfile)):
-                                self.log.error('Pungi out directory contains at least one '
-                                               'symlink at %s', checkfile)
-                                raise Exception('Symlinks found')
-                            # We have checked the first rpm in the subdir
-                            break
+                return self._sanity_check_arch(arch, os.path.join(scratch, arch)), None
             except Exception:
-                self.log.exception('Unable to check pungi mashed repositories')
-                raise
+                return None, sys.exc_info()
 
-        return True
+        pool = ThreadPool(len(arches) or 1)
+        try:
+            outcomes = pool.map(check, arches)
+        finally:
+            pool.close()
+            pool.join()
+            shutil.rmtree(scratch)
+
+        results = {}
+        for arch, (result, exc_info) in zip(arches, outcomes):
+            if exc_info is not None:
+                continue
+            results[arch] = result
+            self.log.info(
+                'Sanity checked %s in %.2fs: repodata in %.2fs, %d of %d packages in %.2fs',
+                arch, result['duration'], result['repodata_duration'], result['packages_checked'],
+                result['packages'], result['packages_duration'])
+        for result, exc_info in outcomes:
+            if exc_info is not None:
+                six.reraise(*exc_info)
+
+        return results
+
+    def _sanity_check_arch(self, arch, destdir):
+        """
+        Check the repodata of the given arch, and a sample of its packages for symlinks.
+
+        This is called from worker threads, so it doesn't touch the database.
+
+        Args:
+            arch (basestring): The name of an arch directory of the compose, such as x86_64.
+            destdir (basestring): A directory that doesn't exist yet, for the repodata to be
+                downloaded to.
+        Returns:
+            dict: The result of the checks, with the keys ``arch``, ``packages`` (the number of
+                packages found), ``packages_checked`` (the number of them that were checked for
+                symlinks), and the durations in seconds ``repodata_duration``,
+                ``packages_duration`` and ``duration``.
+        Raises:
+            bodhi.server.exceptions.RepodataException: If the repodata is not valid.
+            Exception: If a symlink was found.
+            OSError: If a Packages directory is missing.
+        """
+        start = time.time()
+        result = {'arch': arch}
+
+        # sanity check our repodata
+        try:
+            if arch == 'source':
+                repodata = os.path.join(self.path, 'compose',
+                                        'Everything', arch, 'tree', 'repodata')
+            else:
+                repodata = os.path.join(self.path, 'compose',
+                                        'Everything', arch, 'os', 'repodata')
+            os.mkdir(destdir)
+            sanity_check_repodata(repodata, destdir)
+        except Exception:
+            self.log.exception("Repodata sanity check failed!")
+            raise
+        result['repodata_duration'] = time.time() - start
+
+        # make sure that pungi didn't symlink our packages
+        packages_start = time.time()
+        result['packages'] = result['packages_checked'] = 0
+        try:
+            if arch == 'source':
+                dirs = [('tree', 'Packages')]
+            else:
+                dirs = [('debug', 'tree', 'Packages'), ('os', 'Packages')]
+
+            # Example of full path we are checking:
+            # self.path/compose/Everything/os/Packages/s/something.rpm
+            for checkdir in dirs:
+                checkdir = os.path.join(self.path, 'compose', 'Everything', arch, *checkdir)
+                total, sample = self._sample_packages(checkdir)
+                result['packages'] += total
+                result['packages_checked'] += len(sample)
+                for checkfile in sample:
+                    if os.path.islink(checkfile):
+                        self.log.error('Pungi out directory contains at least one '
+                                       'symlink at %s', os.path.basename(checkfile))
+                        raise Exception('Symlinks found')
+        except Exception:
+            self.log.exception('Unable to check pungi mashed repositories')
+            raise
+        result['packages_duration'] = time.time() - packages_start
+
+        result['duration'] = time.time() - start
+        return result
+
+    @staticmethod
+    def _sample_packages(checkdir):
+        """
+        Choose the packages of a Packages directory to check for symlinks.
+
+        Pungi puts all the packages of a compose in place the same way, so checking a sample of them
+        avoids tons and tons of IOPS. The sample is chosen according to ``sanity_check.sampling``:
+        ``first`` is the first package of each subdirectory, ``random`` is up to
+        ``sanity_check.samples`` packages chosen at random, and ``full`` is every package.
+
+        Args:
+            checkdir (basestring): A Packages directory, whose subdirectories contain the packages,
+                such as self.path/compose/Everything/x86_64/os/Packages.
+        Returns:
+            tuple: The number of packages in checkdir, and a list of the paths of the packages to
+                check.
+        """
+        sampling = config.get('sanity_check.sampling')
+        total = 0
+        sample = []
+        # subdirs is the self.path/compose/Everything/os/Packages/{a,b,c,...}/ dirs
+        for subdir in sorted(os.listdir(checkdir)):
+            subdir = os.path.join(checkdir, subdir)
+            packages = [os.path.join(subdir, f) for f in sorted(os.listdir(subdir))
+                        if f.endswith('.rpm')]
+            total += len(packages)
+            if sampling == 'first':
+                sample.extend(packages[:1])
+            else:
+                sample.extend(packages)
+
+        if sampling == 'random':
+            sample = random.sample(sample, min(config.get('sanity_check.samples'), len(sample)))
+        return total, sample
 
     def stage_repo(self):
         """Symlink our updates repository into the staging directory."""
@@ -977,7 +2007,11 @@ class MasherThread(threading.Thread):
 
     def wait_for_sync(self):
         """
-        Block until our repomd.xml hits the master mirror.
+        Block until our repomd.xml hits the master mirror for every arch.
+
+        All arches are watched concurrently by a :class:`bodhi.server.sync.SyncWatcher`, which can
+        also be told that the repository is synchronized by a message to the
+        :class:`bodhi.server.consumers.synced.SyncedHandler`.
 
         Raises:
             Exception: If no folder other than "source" was found in the mash_path.
@@ -989,46 +2023,34 @@ class MasherThread(threading.Thread):
             force=True,
         )
         mash_path = os.path.join(self.path, 'compose', 'Everything')
-        checkarch = None
-        # Find the first non-source arch to check against
-        for arch in os.listdir(mash_path):
-            if arch == 'source':
-                continue
-            checkarch = arch
-            break
-        if not checkarch:
+        arches = [arch for arch in sorted(os.listdir(mash_path)) if arch != 'source']
+        if not arches:
             raise Exception('Not found an arch to wait_for_sync with')
 
-        repomd = os.path.join(mash_path, arch, 'os', 'repodata', 'repomd.xml')
-        if not os.path.exists(repomd):
-            self.log.error('Cannot find local repomd: %s', repomd)
-            return
-
-        master_repomd_url = self._get_master_repomd_url(arch)
-
-        with open(repomd) as repomdf:
-            checksum = hashlib.sha1(repomdf.read()).hexdigest()
-        while True:
-            try:
-                self.log.info('Polling %s' % master_repomd_url)
-                masterrepomd = urllib2.urlopen(master_repomd_url)
-            except (urllib2.URLError, urllib2.HTTPError):
-                self.log.exception('Error fetching repomd.xml')
-                time.sleep(200)
+        targets = []
+        for arch in arches:
+            repomd = os.path.join(mash_path, arch, 'os', 'repodata', 'repomd.xml')
+            if not os.path.exists(repomd):
+                self.log.error('Cannot find local repomd: %s', repomd)
                 continue
-            newsum = hashlib.sha1(masterrepomd.read()).hexdigest()
-            if newsum == checksum:
-                self.log.info("master repomd.xml matches!")
-                notifications.publish(
-                    topic="mashtask.sync.done",
-                    msg=dict(repo=self.id, agent=self.agent),
-                    force=True,
-                )
-                return
 
-            self.log.debug("master repomd.xml doesn't match! %s != %s for %r",
-                           checksum, newsum, self.id)
-            time.sleep(200)
+            with open(repomd) as repomdf:
+                checksum = hashlib.sha1(repomdf.read()).hexdigest()
+            targets.append(sync.SyncTarget(arch, self._get_master_repomd_url(arch), checksum))
+        if not targets:
+            return
+
+        try:
+            sync.SyncWatcher(self.id, targets, log=self.log).wait()
+        finally:
+            self.record_stage_counter('wait_for_sync', 'mirror_polls',
+                                      sum(target.polls for target in targets))
+        self.log.info("master repomd.xml matches!")
+        notifications.publish(
+            topic="mashtask.sync.done",
+            msg=dict(repo=self.id, agent=self.agent),
+            force=True,
+        )
 
     def send_notifications(self):
         """Send fedmsgs to announce completion of mashing for each update."""
@@ -1037,6 +2059,8 @@ class MasherThread(threading.Thread):
             agent = os.getlogin()
         except OSError:  # this can happen when building on koji
             agent = u'masher'
+        # The fedmsgs are published by this thread, so that they all go out through the sockets
+        # the masher has already opened.
         for update in self.compose.updates:
             topic = u'update.complete.%s' % update.request
             notifications.publish(
@@ -1049,24 +2073,66 @@ class MasherThread(threading.Thread):
     def modify_bugs(self):
         """Mark bugs on each Update as modified."""
         self.log.info('Updating bugs')
+        # Each bug gets its own call, so that retrying one never comments on another bug twice.
+        calls = []
         for update in self.compose.updates:
-            self.log.debug('Modifying bugs for %s', update.title)
-            update.modify_bugs()
+            for bug in update.bugs:
+                calls.append(('bugzilla', self._update_call(update, 'modify_bug', bug)))
+        self.post_push_pool.run(calls)
 
     @checkpoint
     def status_comments(self):
         """Add bodhi system comments to each update."""
         self.log.info('Commenting on updates')
-        for update in self.compose.updates:
-            update.status_comment(self.db)
+        # The comments are written with this thread's session, and only their e-mails are sent by
+        # the post-push workers.
+        outbox = []
+        with mail.collect(outbox):
+            for update in self.compose.updates:
+                update.status_comment(self.db)
+        self.post_push_pool.run(
+            [('smtp', functools.partial(mail._send_mail, *message)) for message in outbox])
 
     @checkpoint
     def send_stable_announcements(self):
         """Send the stable announcement e-mails out."""
         self.log.info('Sending stable update announcements')
+        calls = []
         for update in self.compose.updates:
             if update.request is UpdateRequest.stable:
-                update.send_update_notice()
+                calls.append(('smtp', self._update_call(update, 'send_update_notice')))
+        self.post_push_pool.run(calls)
+
+    def _update_call(self, update, method, bug=None):
+        """
+        Return a callable that calls the given method of the given Update for the post-push pool.
+
+        When the pool has workers, the method is called on the Update as loaded by a database
+        session of the worker's own, which is committed once the method returns. The method must
+        only read from the database, aside from queuing fedmsgs.
+
+        Args:
+            update (bodhi.server.models.Update): The Update.
+            method (basestring): The name of the method to call.
+            bug (bodhi.server.models.Bug or None): A Bug to pass to the method, if any.
+        Returns:
+            callable: A callable that calls the method without arguments.
+        """
+        if not self.post_push_pool.workers:
+            if bug is None:
+                return getattr(update, method)
+            return functools.partial(getattr(update, method), bug)
+
+        update_id = update.id
+        bug_id = None if bug is None else bug.bug_id
+
+        def call():
+            self.log.debug('Calling %s on update %d', method, update_id)
+            with self.db_factory() as session:
+                args = [] if bug_id is None else [session.query(Bug).filter_by(bug_id=bug_id).one()]
+                getattr(session.query(Update).get(update_id), method)(*args)
+
+        return call
 
     @checkpoint
     def send_testing_digest(self):
@@ -1077,7 +2143,7 @@ class MasherThread(threading.Thread):
         testhead = u'The following builds have been pushed to %s updates-testing\n\n'
 
         for prefix, content in six.iteritems(self.testing_digest):
-            release = self.db.query(Release).filter_by(long_name=prefix).one()
+            release = self._get_release(prefix)
             test_list_key = '%s_test_announce_list' % (
                 release.id_prefix.lower().replace('-', '_'))
             test_list = config.get(test_list_key)
@@ -1119,6 +2185,22 @@ class MasherThread(threading.Thread):
             mail.send_mail(config.get('bodhi_email'), test_list,
                            '%s updates-testing report' % prefix, maildata)
 
+    def _get_release(self, long_name):
+        """
+        Return the release with the given long name.
+
+        Args:
+            long_name (basestring): The long_name of a Release, such as 'Fedora 27'.
+        Returns:
+            bodhi.server.models.Release: The matching release.
+        Raises:
+            sqlalchemy.orm.exc.NoResultFound: If there is no release with that long name.
+        """
+        release = Release.get(long_name, self.db)
+        if release is None or release.long_name != long_name:
+            raise NoResultFound('There is no release named %s' % long_name)
+        return release
+
     def get_security_updates(self, release):
         """
         Return an iterable of security updates in the given release.
@@ -1129,7 +2211,7 @@ class MasherThread(threading.Thread):
         Returns:
             iterable: An iterable of security Update objects from the given release.
         """
-        release = self.db.query(Release).filter_by(long_name=release).one()
+        release = self._get_release(release)
         updates = self.db.query(Update).filter(
             Update.type == UpdateType.security,
             Update.status == UpdateStatus.testing,
@@ -1152,7 +2234,7 @@ class MasherThread(threading.Thread):
         Return:
             list: The list of unapproved critical path updates for the given release.
         """
-        release = self.db.query(Release).filter_by(long_name=release).one()
+        release = self._get_release(release)
         updates = self.db.query(Update).filter_by(
             critpath=True,
             status=UpdateStatus.testing,
@@ -1228,8 +2310,7 @@ class RPMMasherThread(MasherThread):
         """
         variants_template = template_env.get_template('variants.rpm.xml.j2')
 
-        with open(os.path.join(pungi_conf_dir, 'variants.xml'), 'w') as variantsfile:
-            variantsfile.write(variants_template.render())
+        self.write_pungi_file(pungi_conf_dir, 'variants.xml', variants_template.render())
 
 
 class ModuleMasherThread(MasherThread):
@@ -1237,6 +2318,8 @@ class ModuleMasherThread(MasherThread):
 
     ctype = ContentType.module
     pungi_template_config_key = 'pungi.conf.module'
+    # How many nvrs are fetched from the database at once while the module list is generated.
+    nvr_chunk_size = 1000
 
     def copy_additional_pungi_files(self, pungi_conf_dir, template_env):
         """
@@ -1252,8 +2335,8 @@ class ModuleMasherThread(MasherThread):
 
         module_list = self._generate_module_list()
 
-        with open(os.path.join(pungi_conf_dir, 'module-variants.xml'), 'w') as variantsfile:
-            variantsfile.write(template.render(modules=module_list))
+        self.write_pungi_file(pungi_conf_dir, 'module-variants.xml',
+                              template.render(modules=module_list))
 
     def generate_testing_digest(self):
         """Temporarily disable testing digests for modules.
@@ -1274,17 +2357,16 @@ class ModuleMasherThread(MasherThread):
         """
         newest_builds = {}
         # we loop through builds so we get rid of older builds and get only
-        # a dict with the newest builds
-        for build in self.compose.release.builds:
-            nsv = build.nvr.rsplit('-', 1)
-            ns = nsv[0]
-            version = nsv[1]
-
-            if ns in newest_builds:
-                curr_version = newest_builds[ns]
-                if int(curr_version) < int(version):
-                    newest_builds[ns] = version
-            else:
+        # a dict with the newest builds. Only their nvrs are needed, so they are streamed by
+        # themselves instead of loading every Build of the release and its Update. The newest
+        # version of each name-stream can't be picked in SQL, since splitting an nvr on its last
+        # dash needs functions that differ between PostgreSQL and SQLite.
+        nvrs = self.db.query(Build.nvr).filter(
+            Build.release_id == self.compose.release.id,
+            Build.type == ContentType.module).yield_per(self.nvr_chunk_size)
+        for nvr, in nvrs:
+            ns, version = nvr.rsplit('-', 1)
+            if ns not in newest_builds or int(newest_builds[ns]) < int(version):
                 newest_builds[ns] = version
 
         # make sure that the modules we want to update get their correct versions
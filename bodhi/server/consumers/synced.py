@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2018 Red Hat, Inc. and others.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+The "synced handler".
+
+This module is responsible for telling the masher that a repository has reached the master mirror,
+so that the masher doesn't have to wait for its next poll of the mirror to find out.
+"""
+
+import logging
+import pprint
+
+import fedmsg.consumers
+
+from bodhi.server import sync
+
+
+log = logging.getLogger('bodhi')
+
+
+class SyncedHandler(fedmsg.consumers.FedmsgConsumer):
+    """
+    The Bodhi Synced Handler.
+
+    A fedmsg listener waiting for messages announcing that a repository was synchronized to the
+    master mirror. It must run in the same fedmsg-hub as the :class:`Masher
+    <bodhi.server.consumers.masher.Masher>`, since the masher runs its own consumer serially and
+    cannot receive messages while it is composing.
+    """
+
+    config_key = 'synced_handler'
+
+    def __init__(self, hub, *args, **kwargs):
+        """
+        Initialize the SyncedHandler, configuring its topic.
+
+        Args:
+            hub (moksha.hub.hub.CentralMokshaHub): The hub this handler is consuming messages from.
+                It is used to look up the hub config.
+        """
+        self.topic = hub.config.get('synced_handler_topics', [])
+
+        super(SyncedHandler, self).__init__(hub, *args, **kwargs)
+        log.info('Bodhi synced handler listening on:\n'
+                 '%s' % pprint.pformat(self.topic))
+
+    def consume(self, message):
+        """
+        Handle fedmsgs arriving with the configured topics.
+
+        Example message format::
+            {
+                u'body': {
+                    u'topic': u'org.fedoraproject.prod.bodhi.mirror.synced',
+                    u'msg': {
+                        u'repo': u'f27-updates-testing',
+                        u'arch': u'x86_64',
+                    },
+                },
+            }
+
+        The arch key is optional. When it is missing, all arches of the repository are considered
+        to be synchronized.
+
+        Args:
+            message (dict): The incoming fedmsg in the format described above.
+        """
+        msg = message['body']['msg']
+        repo = msg.get('repo')
+        if not repo:
+            log.warn('Ignoring synced message without a repo: %r', msg)
+            return
+
+        if sync.notify_synced(repo, msg.get('arch')):
+            log.info('%s was announced as synced to the master mirror', repo)
@@ -18,8 +18,10 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
 # 02110-1301, USA.
 """A collection of utilities for sending e-mail to Bodhi users."""
+from contextlib import contextmanager
 from textwrap import wrap
 import smtplib
+import threading
 
 from kitchen.iterutils import iterate
 from kitchen.text.converters import to_unicode, to_bytes
@@ -30,6 +32,10 @@ from bodhi.server.config import config
 from bodhi.server.util import get_rpm_header
 
 
+# The outbox of the current thread, if it collects its e-mails instead of sending them.
+_local = threading.local()
+
+
 #
 # All of the email messages that bodhi is going to be sending around.
 #
@@ -427,7 +433,7 @@ def get_template(update, use_template='fedora_errata_template'):
             elif len(text) != 1:
                 oldtime = oldtime[0]
             info['changelog'] = u"ChangeLog:\n\n%s%s" % \
-                (to_unicode(build.get_changelog(oldtime)), line)
+                (to_unicode(build.get_changelog(oldtime, rpm_header=h)), line)
 
         try:
             templates.append((info['subject'], use_template % info))
@@ -442,6 +448,26 @@ def get_template(update, use_template='fedora_errata_template'):
     return templates
 
 
+@contextmanager
+def collect(outbox):
+    """
+    Collect the e-mails the current thread sends within the context, instead of sending them.
+
+    This lets a caller that holds a database session render e-mails with it, and leave connecting
+    to the SMTP server to other threads. Each e-mail is appended to the outbox as the arguments of
+    :func:`_send_mail`.
+
+    Args:
+        outbox (list): The list to append (from_addr, to_addr, body) tuples to.
+    """
+    previous = getattr(_local, 'outbox', None)
+    _local.outbox = outbox
+    try:
+        yield outbox
+    finally:
+        _local.outbox = previous
+
+
 def _send_mail(from_addr, to_addr, body):
     """
     Send emails with smtplib. This is a lower level function than send_e-mail().
@@ -502,6 +528,12 @@ def send_mail(from_addr, to_addr, subject, body_text, headers=None):
     msg += ['Subject: %s' % subject, '', body_text]
     body = to_bytes('\r\n'.join(msg))
 
+    outbox = getattr(_local, 'outbox', None)
+    if outbox is not None:
+        log.debug('Collecting mail to %s: %s', to_addr, subject)
+        outbox.append((from_addr, to_addr, body))
+        return
+
     log.info('Sending mail to %s: %s', to_addr, subject)
     _send_mail(from_addr, to_addr, body)
 
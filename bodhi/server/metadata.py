@@ -17,13 +17,17 @@
 # with this program; if not, write to the Free Software Foundation, Inc.,
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 """Create metadata files when mashing repositories."""
+from multiprocessing.pool import ThreadPool
+import difflib
+import hashlib
+import json
 import logging
 import os
-import shelve
 import shutil
 import tempfile
 
 from kitchen.text.converters import to_bytes
+from sqlalchemy.orm import defaultload, lazyload
 import createrepo_c as cr
 import six
 
@@ -37,10 +41,55 @@ __version__ = '2.0'
 log = logging.getLogger(__name__)
 
 
+def load_updateinfo(compose_path):
+    """
+    Load the updateinfo that was inserted into the given compose, if there is any.
+
+    Args:
+        compose_path (basestring): The path to a compose.
+    Returns:
+        createrepo_c.UpdateInfo or None: The updateinfo of the first architecture of the compose, or
+            None if the compose has no updateinfo or it could not be read.
+    """
+    repo_path = os.path.join(compose_path, 'compose', 'Everything')
+    if not os.path.isdir(repo_path):
+        return None
+    for arch in sorted(os.listdir(repo_path)):
+        if arch == 'source':
+            continue
+        repo = os.path.join(repo_path, arch, 'os')
+        try:
+            repomd = cr.Repomd(os.path.join(repo, 'repodata', 'repomd.xml'))
+            for record in repomd.records:
+                if record.type == 'updateinfo':
+                    return cr.UpdateInfo(os.path.join(repo, record.location_href))
+        except Exception:
+            log.exception('Unable to load the updateinfo of %s' % repo)
+            return None
+    return None
+
+
+def _truncate(date):
+    """
+    Drop the microseconds of the given date, which updateinfo.xml doesn't store.
+
+    Args:
+        date (datetime.datetime or None): The date to truncate.
+    Returns:
+        datetime.datetime or None: The date without microseconds.
+    """
+    if date is None:
+        return None
+    return date.replace(microsecond=0)
+
+
 def modifyrepo(comp_type, compose_path, filetype, extension, source):
     """
     Inject a file into the repodata for each architecture with the help of createrepo_c.
 
+    The file is compressed only once, and the compressed file is then copied into the repodata of
+    all architectures at the same time.
+
     Args:
         compose_path (basestring): The path to the compose where the metadata will be inserted.
         filetype (basestring): What type of metadata will be inserted by createrepo_c.
@@ -49,18 +98,22 @@ def modifyrepo(comp_type, compose_path, filetype, extension, source):
         extension (basestring): The file extension (xml, sqlite).
         source (basestring): A file path. File holds the dump of metadata until
             copied to the repodata folder.
+    Returns:
+        int: The size of the file that was compressed, in bytes.
     """
     repo_path = os.path.join(compose_path, 'compose', 'Everything')
-    for arch in os.listdir(repo_path):
+    repodatas = []
+    for arch in sorted(os.listdir(repo_path)):
         if arch == 'source':
-            repodata = os.path.join(repo_path, arch, 'tree', 'repodata')
+            repodatas.append(os.path.join(repo_path, arch, 'tree', 'repodata'))
         else:
-            repodata = os.path.join(repo_path, arch, 'os', 'repodata')
-        log.info('Inserting %s.%s into %s', filetype, extension, repodata)
-        target_fname = os.path.join(repodata, '%s.%s' % (filetype, extension))
+            repodatas.append(os.path.join(repo_path, arch, 'os', 'repodata'))
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        target_fname = os.path.join(tmp_dir, '%s.%s' % (filetype, extension))
         shutil.copyfile(source, target_fname)
-        repomd_xml = os.path.join(repodata, 'repomd.xml')
-        repomd = cr.Repomd(repomd_xml)
+        size = os.path.getsize(target_fname)
         # create a new record for our repomd.xml
         rec = cr.RepomdRecord(filetype, target_fname)
         # compress our metadata file with the comp_type
@@ -69,12 +122,254 @@ def modifyrepo(comp_type, compose_path, filetype, extension, source):
         rec_comp.rename_file()
         # set type of metadata
         rec_comp.type = filetype
-        # insert metadata about our metadata in repomd.xml
-        repomd.set_record(rec_comp)
-        with open(repomd_xml, 'w') as repomd_file:
-            repomd_file.write(repomd.xml_dump())
         os.unlink(target_fname)
 
+        pool = ThreadPool(len(repodatas) or 1)
+        try:
+            pool.map(lambda repodata: _insert_record(repodata, rec_comp), repodatas)
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        shutil.rmtree(tmp_dir)
+    return size
+
+
+def _insert_record(repodata, record):
+    """
+    Copy the compressed metadata file of the given record into repodata, and add it to repomd.xml.
+
+    Args:
+        repodata (basestring): The path to a repodata directory.
+        record (createrepo_c.RepomdRecord): The record of a compressed metadata file, which must
+            have been filled with SHA256 checksums.
+    Raises:
+        ValueError: If the copy of the compressed metadata file doesn't match the record's checksum.
+    """
+    log.info('Inserting %s into %s', os.path.basename(record.location_href), repodata)
+    target_fname = os.path.join(repodata, os.path.basename(record.location_href))
+    shutil.copyfile(record.location_real, target_fname)
+    checksum = hashlib.sha256()
+    with open(target_fname, 'rb') as target:
+        for chunk in iter(lambda: target.read(1024 * 1024), b''):
+            checksum.update(chunk)
+    if checksum.hexdigest() != record.checksum:
+        os.unlink(target_fname)
+        raise ValueError('The checksum of %s is %s, but %s was expected' % (
+            target_fname, checksum.hexdigest(), record.checksum))
+
+    repomd_xml = os.path.join(repodata, 'repomd.xml')
+    repomd = cr.Repomd(repomd_xml)
+    # insert metadata about our metadata in repomd.xml
+    repomd.set_record(record)
+    with open(repomd_xml, 'w') as repomd_file:
+        repomd_file.write(repomd.xml_dump())
+
+
+class RPMCache(object):
+    """
+    A persistent cache of the RPMs that Koji lists for each build, shared by all MasherThreads.
+
+    The RPMs are kept in a :class:`bodhi.server.util.SQLiteCache` at ``updateinfo_rpm_cache.path``,
+    or in the mash dir if it isn't set, so any number of threads and processes can use it at the
+    same time, each with its own RPMCache. Only the fields of the RPMs that the updateinfo needs
+    are stored. When the cache is closed, entries that haven't been used for
+    ``updateinfo_rpm_cache.max_age`` days are evicted, and so are the least recently used entries
+    beyond the first ``updateinfo_rpm_cache.max_entries``.
+
+    Attributes:
+        hits (int): How many lookups found their build in the cache.
+        misses (int): How many lookups didn't find their build in the cache.
+        evicted (int): How many builds were evicted from the cache.
+    """
+
+    # The fields of Koji's RPM dictionaries that are stored, in the order they are stored in. The
+    # nvr is derived from the first three.
+    fields = ('name', 'version', 'release', 'epoch', 'arch')
+
+    def __init__(self, path, max_entries=None, max_age=None):
+        """
+        Open the cache, creating it if it doesn't exist yet.
+
+        Args:
+            path (basestring): The path of the SQLite database.
+            max_entries (int or None): How many builds to keep. Defaults to the
+                ``updateinfo_rpm_cache.max_entries`` setting.
+            max_age (int or None): How many days to keep builds that aren't used. Defaults to the
+                ``updateinfo_rpm_cache.max_age`` setting.
+        """
+        if max_entries is None:
+            max_entries = config.get('updateinfo_rpm_cache.max_entries')
+        if max_age is None:
+            max_age = config.get('updateinfo_rpm_cache.max_age')
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._db = util.SQLiteCache(path, 'build_rpms')
+
+    def get(self, nvr):
+        """
+        Return the RPMs of the given build, or None if it isn't cached.
+
+        Args:
+            nvr (basestring): The nvr of the build.
+        Returns:
+            list or None: A list of dictionaries describing the subpackages of the build.
+        """
+        return self.get_many([nvr]).get(nvr)
+
+    def get_many(self, nvrs):
+        """
+        Return the RPMs of the given builds that are cached, and mark them as recently used.
+
+        Args:
+            nvrs (list): The nvrs of the builds to look up.
+        Returns:
+            dict: A mapping of nvrs to lists of dictionaries describing the subpackages of the
+                build, for each of the builds that is cached.
+        """
+        found = dict((nvr, self._expand(rpms))
+                     for nvr, rpms in self._db.get_many(nvrs).items())
+        self.hits += len(found)
+        self.misses += len(nvrs) - len(found)
+        return found
+
+    def set(self, nvr, rpms):
+        """
+        Store the RPMs of the given build.
+
+        Args:
+            nvr (basestring): The nvr of the build.
+            rpms (list): A list of dictionaries describing the subpackages of the build, as
+                returned by Koji's listBuildRPMs.
+        """
+        self.set_many({nvr: rpms})
+
+    def set_many(self, rpms):
+        """
+        Store the RPMs of the given builds.
+
+        Args:
+            rpms (dict): A mapping of nvrs to lists of dictionaries describing the subpackages of
+                the build, as returned by Koji's listBuildRPMs.
+        """
+        self._db.set_many(dict((nvr, self._compact(build_rpms))
+                               for nvr, build_rpms in rpms.items()))
+
+    def evict(self):
+        """
+        Evict the builds that are too old, and the least recently used ones beyond max_entries.
+
+        Returns:
+            int: The number of builds that were evicted.
+        """
+        evicted = self._db.evict(self.max_age, self.max_entries)
+        self.evicted += evicted
+        return evicted
+
+    def close(self):
+        """Evict old builds, log the statistics of this RPMCache and close the database."""
+        self.evict()
+        log.info('RPM cache %s: %d hits, %d misses, %d evicted' % (
+            self.path, self.hits, self.misses, self.evicted))
+        self._db.close()
+
+    @classmethod
+    def _compact(cls, rpms):
+        """
+        Serialize the fields of the given RPMs that the cache stores.
+
+        Args:
+            rpms (list): A list of dictionaries describing RPMs.
+        Returns:
+            basestring: The serialized RPMs.
+        """
+        return json.dumps([[rpm[field] for field in cls.fields] for rpm in rpms],
+                          separators=(',', ':'))
+
+    @classmethod
+    def _expand(cls, data):
+        """
+        Deserialize RPMs that were serialized by _compact().
+
+        Args:
+            data (basestring): The serialized RPMs.
+        Returns:
+            list: A list of dictionaries describing the RPMs.
+        """
+        rpms = []
+        for values in json.loads(data):
+            rpm = dict((field, str(value) if isinstance(value, six.string_types) else value)
+                       for field, value in zip(cls.fields, values))
+            rpm['nvr'] = '%(name)s-%(version)s-%(release)s' % rpm
+            rpms.append(rpm)
+        return rpms
+
+
+class UpdateInfoWriter(object):
+    """
+    Write an updateinfo.xml file one record at a time.
+
+    This stands in for a createrepo_c.UpdateInfo, but each record is serialized to disk as soon as
+    it is appended instead of being kept in memory, so only one record is held at a time no matter
+    how large the repository is.
+
+    Attributes:
+        path (basestring): The path of the updateinfo.xml file.
+        count (int): The number of records that were written.
+    """
+
+    def __init__(self, dir=None):
+        """
+        Create a new, empty updateinfo.xml file.
+
+        Args:
+            dir (basestring or None): The directory to create the file in. Defaults to the system's
+                temporary directory.
+        """
+        # createrepo_c refuses to overwrite files, so the file goes in a directory of its own.
+        self._dir = tempfile.mkdtemp(prefix='updateinfo-', dir=dir)
+        self.path = os.path.join(self._dir, 'updateinfo.xml')
+        self._file = cr.UpdateInfoXmlFile(self.path, cr.NO_COMPRESSION)
+        self.count = 0
+
+    def append(self, record):
+        """
+        Write the given record to the file.
+
+        Args:
+            record (createrepo_c.UpdateRecord): The record to write.
+        """
+        self._file.add_chunk(cr.xml_dump_updaterecord(record))
+        self.count += 1
+
+    def close(self):
+        """Finish the file. Nothing can be appended afterwards."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        """Finish the file and delete it."""
+        self.close()
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+    @property
+    def updates(self):
+        """
+        Finish the file and read its records back.
+
+        This loads all of the records into memory, so it is only meant for tests and verification.
+
+        Returns:
+            list: A list of createrepo_c.UpdateRecords.
+        """
+        self.close()
+        return cr.UpdateInfo(self.path).updates
+
 
 class UpdateInfoMetadata(object):
     """
@@ -83,9 +378,21 @@ class UpdateInfoMetadata(object):
     It is generated during push time by the bodhi masher based on koji tags
     and is injected into the yum repodata using the `modifyrepo_c` tool,
     which is included in the `createrepo_c` package.
+
+    When the updateinfo of the previous compose is given, its records are reused for every update
+    whose dates, status, builds, bugs, bug titles and CVEs haven't changed since, as long as the
+    rights haven't changed either, and only the other updates are generated again.
+
+    Attributes:
+        fetched_rpms (int): How many RPMs were retrieved from Koji, rather than from the RPMCache.
     """
 
-    def __init__(self, release, request, db, mashdir, close_shelf=True):
+    # How many Builds are queried at once. This keeps the IN clauses within SQLite's limit of 999
+    # parameters.
+    query_chunk_size = 500
+
+    def __init__(self, release, request, db, mashdir, close_cache=True, previous=None,
+                 verify=False):
         """
         Initialize the UpdateInfoMetadata object.
 
@@ -94,8 +401,12 @@ class UpdateInfoMetadata(object):
             request (bodhi.server.models.UpdateRequest): The Request that is being mashed.
             db (): A database session to be used for queries.
             mashdir (basestring): A path to the mashdir.
-            close_shelf (bool): Whether to close the shelve, which is used to cache updateinfo
-                between mashes.
+            close_cache (bool): Whether to close the RPMCache, which is used to cache the RPMs of
+                builds between mashes.
+            previous (createrepo_c.UpdateInfo or None): The updateinfo of the previous compose of
+                this repository. If given, its records are reused where possible.
+            verify (bool): Whether to compare the result with an updateinfo generated from
+                scratch. See :meth:`verify`.
         """
         self.request = request
         if request is UpdateRequest.stable:
@@ -107,11 +418,12 @@ class UpdateInfoMetadata(object):
         self.updates = set()
         self.builds = {}
         self._from = config.get('bodhi_email')
-        self.shelf = shelve.open(os.path.join(mashdir, '%s.shelve' % self.tag))
+        self.rpm_cache = RPMCache(config.get('updateinfo_rpm_cache.path') or
+                                  os.path.join(mashdir, 'rpm-cache.sqlite'))
+        self._rpms = {}
+        self.fetched_rpms = 0
         self._fetch_updates()
 
-        self.uinfo = cr.UpdateInfo()
-
         self.comp_type = cr.XZ
 
         if release.id_prefix == u'FEDORA-EPEL':
@@ -119,14 +431,33 @@ class UpdateInfoMetadata(object):
             # compression, so use the lowest common denominator for now.
             self.comp_type = cr.BZ2
 
-        self.uinfo = cr.UpdateInfo()
+        self._mashdir = mashdir
+        self.uinfo = UpdateInfoWriter(mashdir)
+        records = {}
+        if previous is not None:
+            records = dict((record.id, record) for record in previous.updates)
+        stale = []
         for update in self.updates:
             if not update.alias:
                 update.assign_alias()
+            record = records.get(update.alias)
+            if record is not None and self._is_current(update, record):
+                self.uinfo.append(record)
+            else:
+                stale.append(update)
+        if previous is not None:
+            log.info('Reusing %d of %d updateinfo records of the previous compose' % (
+                len(self.updates) - len(stale), len(self.updates)))
+
+        self._prefetch_rpms(stale)
+        for update in stale:
             self.add_update(update)
 
-        if close_shelf:
-            self.shelf.close()
+        if verify:
+            self.verify()
+
+        if close_cache:
+            self.rpm_cache.close()
 
     def _fetch_updates(self):
         """Based on our given koji tag, populate a list of Update objects."""
@@ -134,9 +465,10 @@ class UpdateInfoMetadata(object):
         kojiBuilds = get_session().listTagged(self.tag, latest=True)
         nonexistent = []
         log.debug("%d builds found" % len(kojiBuilds))
+        build_objs = self._query_builds([six.text_type(build['nvr']) for build in kojiBuilds])
         for build in kojiBuilds:
             self.builds[build['nvr']] = build
-            build_obj = self.db.query(Build).filter_by(nvr=six.text_type(build['nvr'])).first()
+            build_obj = build_objs.get(six.text_type(build['nvr']))
             if build_obj:
                 if build_obj.update:
                     self.updates.add(build_obj.update)
@@ -148,6 +480,178 @@ class UpdateInfoMetadata(object):
             log.warning("Couldn't find the following koji builds tagged as "
                         "%s in bodhi: %s" % (self.tag, nonexistent))
 
+    @staticmethod
+    def _is_current(update, record):
+        """
+        Return whether the given updateinfo record still describes the given update.
+
+        Args:
+            update (bodhi.server.models.Update): The update.
+            record (createrepo_c.UpdateRecord): A record for the update from a previous compose.
+        Returns:
+            bool: True if the record's rights, dates, status, builds, bugs, bug titles and CVEs
+                match the update.
+        """
+        builds = set('%s-%s-%s' % (pkg.name, pkg.version, pkg.release)
+                     for collection in record.collections for pkg in collection.packages
+                     if pkg.arch == 'src')
+        # The titles of bugs are updated from Bugzilla, without changing the update.
+        references = set((ref.type, ref.id, ref.title if ref.type == 'bugzilla' else None)
+                         for ref in record.references)
+        expected_references = set(
+            [('bugzilla', str(bug.bug_id), to_bytes(bug.title)) for bug in update.bugs] +
+            [('cve', str(cve.cve_id), None) for cve in update.cves])
+        # The rights carry the current year.
+        return (record.rights == config.get('updateinfo_rights') and
+                record.updated_date == _truncate(update.date_modified) and
+                record.issued_date == _truncate(update.date_pushed) and
+                record.status == update.status.value and
+                builds == set(build.nvr for build in update.builds) and
+                references == expected_references)
+
+    def verify(self):
+        """
+        Compare the updateinfo with one that is generated from scratch, and keep the latter.
+
+        Every record that differs between the two is logged as a warning, along with a diff.
+
+        Returns:
+            list: The ids of the records that differ.
+        """
+        incremental = self.uinfo
+        self.uinfo = UpdateInfoWriter(self._mashdir)
+        self._prefetch_rpms(self.updates)
+        for update in self.updates:
+            self.add_update(update)
+
+        actual = self._dump_records(incremental)
+        expected = self._dump_records(self.uinfo)
+        incremental.remove()
+        mismatched = sorted(
+            id for id in set(actual) | set(expected) if actual.get(id) != expected.get(id))
+        for id in mismatched:
+            diff = difflib.unified_diff(
+                actual.get(id, '').splitlines(True), expected.get(id, '').splitlines(True),
+                'incremental', 'full')
+            log.warning('Updateinfo record %s differs from a full rebuild:\n%s' % (
+                id, ''.join(diff)))
+        log.info('Verified the updateinfo of %s: %d of %d records differ from a full rebuild' % (
+            self.tag, len(mismatched), len(expected)))
+        return mismatched
+
+    @staticmethod
+    def _dump_records(uinfo):
+        """
+        Serialize each record of the given updateinfo on its own.
+
+        Args:
+            uinfo (UpdateInfoWriter): The updateinfo to serialize.
+        Returns:
+            dict: A mapping of record ids to their XML.
+        """
+        return dict((record.id, cr.xml_dump_updaterecord(record)) for record in uinfo.updates)
+
+    def _query_builds(self, nvrs):
+        """
+        Query the Builds with the given nvrs, along with what the updateinfo needs of their Updates.
+
+        The Builds are queried in chunks of ``query_chunk_size`` nvrs. Their Updates' bugs and
+        CVEs are loaded with one query per chunk each, and the Updates' comments, which the
+        updateinfo doesn't need, are not loaded at all.
+
+        Args:
+            nvrs (list): The nvrs of the Builds to query.
+        Returns:
+            dict: A mapping of nvrs to the Builds that were found.
+        """
+        build_objs = {}
+        for i in range(0, len(nvrs), self.query_chunk_size):
+            query = self.db.query(Build).filter(
+                Build.nvr.in_(nvrs[i:i + self.query_chunk_size])).options(
+                lazyload('override'),
+                defaultload('update').lazyload('comments'),
+                defaultload('update').subqueryload('bugs'),
+                defaultload('update').subqueryload('cves'))
+            for build_obj in query:
+                build_objs[build_obj.nvr] = build_obj
+        return build_objs
+
+    def _prefetch_rpms(self, updates):
+        """
+        Retrieve the RPMs of all builds of the given updates from the RPMCache, or from Koji.
+
+        The uncached NVRs are split into chunks of ``updateinfo_prefetch.chunk_size`` builds, and
+        each chunk is retrieved with Koji multicalls. Up to ``updateinfo_prefetch.workers`` chunks
+        are retrieved at the same time. Builds that Koji fails to return are left uncached, so that
+        get_rpms() tries them again one at a time.
+
+        Args:
+            updates (iterable): The updates whose builds' RPMs should be retrieved.
+        """
+        nvrs = sorted(set(build.nvr for update in updates for build in update.builds))
+        self._rpms.update(self.rpm_cache.get_many(nvrs))
+        nvrs = [nvr for nvr in nvrs if nvr not in self._rpms]
+        if not nvrs:
+            return
+
+        chunk_size = config.get('updateinfo_prefetch.chunk_size')
+        chunks = [nvrs[i:i + chunk_size] for i in range(0, len(nvrs), chunk_size)]
+        workers = min(config.get('updateinfo_prefetch.workers'), len(chunks))
+        log.debug('Prefetching the RPMs of %d builds in %d chunks' % (len(nvrs), len(chunks)))
+        if workers > 1:
+            pool = ThreadPool(workers)
+            try:
+                results = pool.map(self._fetch_rpms, chunks)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [self._fetch_rpms(chunk) for chunk in chunks]
+
+        # The RPMCache's connection belongs to this thread, so it is only written to from here.
+        for rpms in results:
+            self.rpm_cache.set_many(rpms)
+            self._rpms.update(rpms)
+            self.fetched_rpms += sum(len(build_rpms) for build_rpms in rpms.values())
+
+    def _fetch_rpms(self, nvrs):
+        """
+        Retrieve the RPMs of the given builds from Koji with multicalls.
+
+        This is called from worker threads, so it uses its own Koji session and doesn't touch the
+        database or the RPMCache.
+
+        Args:
+            nvrs (list): The nvrs of the builds to retrieve.
+        Returns:
+            dict: A mapping of nvrs to lists of dictionaries describing the subpackages of the
+                build, for each build that Koji returned.
+        """
+        koji = get_session()
+        buildids = [(nvr, self.builds[nvr]['id']) for nvr in nvrs if nvr in self.builds]
+
+        unknown = [nvr for nvr in nvrs if nvr not in self.builds]
+        if unknown:
+            koji.multicall = True
+            for nvr in unknown:
+                koji.getBuild(nvr)
+            for nvr, result in zip(unknown, koji.multiCall()):
+                if isinstance(result, dict) or not result[0]:
+                    log.warning('Unable to prefetch the build of %s: %r' % (nvr, result))
+                    continue
+                buildids.append((nvr, result[0]['id']))
+
+        koji.multicall = True
+        for nvr, buildid in buildids:
+            koji.listBuildRPMs(buildid)
+        rpms = {}
+        for (nvr, buildid), result in zip(buildids, koji.multiCall()):
+            if isinstance(result, dict):
+                log.warning('Unable to prefetch the RPMs of %s: %r' % (nvr, result))
+                continue
+            rpms[nvr] = result[0]
+        return rpms
+
     def get_rpms(self, koji, nvr):
         """
         Retrieve the given RPM nvr from the cache if available, or from Koji if not available.
@@ -159,16 +663,20 @@ class UpdateInfoMetadata(object):
             list: A list of dictionaries describing all the subpackages that are part of the given
                 nvr.
         """
-        if str(nvr) in self.shelf:
-            return self.shelf[str(nvr)]
+        if nvr in self._rpms:
+            return self._rpms[nvr]
 
-        if nvr in self.builds:
-            buildid = self.builds[nvr]['id']
-        else:
-            buildid = koji.getBuild(nvr)['id']
+        rpms = self.rpm_cache.get(nvr)
+        if rpms is None:
+            if nvr in self.builds:
+                buildid = self.builds[nvr]['id']
+            else:
+                buildid = koji.getBuild(nvr)['id']
 
-        rpms = koji.listBuildRPMs(buildid)
-        self.shelf[str(nvr)] = rpms
+            rpms = koji.listBuildRPMs(buildid)
+            self.rpm_cache.set(nvr, rpms)
+            self.fetched_rpms += len(rpms)
+        self._rpms[nvr] = rpms
         return rpms
 
     def add_update(self, update):
@@ -259,13 +767,14 @@ class UpdateInfoMetadata(object):
 
     def insert_updateinfo(self, compose_path):
         """
-        Add the updateinfo.xml file to the repository.
+        Add the updateinfo.xml file to the repository, and delete our copy of it.
 
         Args:
             compose_path (basestring): The path to the compose where the metadata will be inserted.
+        Returns:
+            int: The size of the updateinfo.xml file that was compressed, in bytes.
         """
-        fd, tmp_file_path = tempfile.mkstemp()
-        os.write(fd, self.uinfo.xml_dump().encode('utf-8'))
-        os.close(fd)
-        modifyrepo(self.comp_type, compose_path, 'updateinfo', 'xml', tmp_file_path)
-        os.unlink(tmp_file_path)
+        self.uinfo.close()
+        size = modifyrepo(self.comp_type, compose_path, 'updateinfo', 'xml', self.uinfo.path)
+        self.uinfo.remove()
+        return size
@@ -0,0 +1,44 @@
+# Copyright (c) 2018 Red Hat, Inc.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+Add a stage_timings column to the composes table.
+
+Revision ID: 3c2a0f6e1d4b
+Revises: 2616c86d8ac6
+Create Date: 2018-01-22 14:02:31.204117
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c2a0f6e1d4b'
+down_revision = '2616c86d8ac6'
+
+
+def upgrade():
+    """Add the composes.stage_timings column."""
+    op.add_column(
+        'composes',
+        sa.Column('stage_timings', sa.UnicodeText(), nullable=False, server_default=u'{}'))
+    op.alter_column('composes', 'stage_timings', server_default=None)
+
+
+def downgrade():
+    """Drop the composes.stage_timings column."""
+    op.drop_column('composes', 'stage_timings')
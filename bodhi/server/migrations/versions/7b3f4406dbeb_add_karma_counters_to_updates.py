@@ -0,0 +1,126 @@
+# Copyright (c) 2018 Red Hat, Inc.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+Add karma and comment counters to updates.
+
+Revision ID: 7b3f4406dbeb
+Revises: b1a801e1605e
+Create Date: 2018-02-05 14:21:08.630214
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b3f4406dbeb'
+down_revision = 'b1a801e1605e'
+
+
+COUNTERS = ('karma', 'positive_karma', 'negative_karma', 'comment_count')
+UPDATE_BATCH_SIZE = 1000
+
+
+def _count(comments):
+    """
+    Compute the counters of an update from its comments, like Update.count_karma() does.
+
+    Args:
+        comments (list): 4-tuples of the karma, the anonymous flag, whether it is a karma reset
+            event and the author name of each comment of the update, oldest first.
+    Returns:
+        dict: The values of the counter columns.
+    """
+    positive_karma = 0
+    negative_karma = 0
+    users_counted = set()
+    for karma, anonymous, reset, author in reversed(comments):
+        if reset:
+            # The older comments don't count.
+            break
+        if karma and not anonymous and author not in users_counted:
+            users_counted.add(author)
+            if karma > 0:
+                positive_karma += karma
+            else:
+                negative_karma += karma
+    return {'karma': positive_karma + negative_karma, 'positive_karma': positive_karma,
+            'negative_karma': negative_karma, 'comment_count': len(comments)}
+
+
+def upgrade():
+    """Add the counter columns to the updates table, and compute them from the comments."""
+    for name in COUNTERS:
+        op.add_column('updates', sa.Column(name, sa.Integer(), server_default='0', nullable=False))
+
+    # Build fake mini versions of the tables so we can form the SELECT and UPDATE statements.
+    updates = sa.sql.table('updates', sa.sql.column('id', sa.Integer),
+                           *[sa.sql.column(name, sa.Integer) for name in COUNTERS])
+    comments = sa.sql.table(
+        'comments', sa.sql.column('id', sa.Integer), sa.sql.column('update_id', sa.Integer),
+        sa.sql.column('user_id', sa.Integer), sa.sql.column('karma', sa.Integer),
+        sa.sql.column('anonymous', sa.Boolean), sa.sql.column('text', sa.UnicodeText),
+        sa.sql.column('timestamp', sa.DateTime))
+    users = sa.sql.table('users', sa.sql.column('id', sa.Integer),
+                         sa.sql.column('name', sa.Unicode))
+
+    # Builds being added to or removed from an update are announced by bodhi, and reset its karma.
+    reset = sa.case([(sa.and_(users.c.name == u'bodhi',
+                              sa.or_(comments.c.text.like(u'%New build%'),
+                                     comments.c.text.like(u'%Removed build%'))), 1)], else_=0)
+
+    connection = op.get_bind()
+    # The comments are streamed rather than fetched all at once.
+    rows = connection.execution_options(stream_results=True).execute(
+        sa.select([comments.c.update_id, comments.c.karma, comments.c.anonymous, reset,
+                   users.c.name])
+        .select_from(comments.outerjoin(users, comments.c.user_id == users.c.id))
+        .where(comments.c.update_id.isnot(None))
+        .order_by(comments.c.update_id, comments.c.timestamp, comments.c.id))
+
+    # The counters of UPDATE_BATCH_SIZE updates are stored with each executemany().
+    store = updates.update().where(updates.c.id == sa.bindparam('update_id')).values(
+        dict((name, sa.bindparam('new_%s' % name)) for name in COUNTERS))
+    batch = []
+
+    def count(update_id, update_comments):
+        counters = _count(update_comments)
+        batch.append(dict([('update_id', update_id)] + [
+            ('new_%s' % name, value) for name, value in counters.items()]))
+        if len(batch) >= UPDATE_BATCH_SIZE:
+            connection.execute(store, batch)
+            del batch[:]
+
+    update_id = None
+    update_comments = []
+    for row in rows:
+        if row[0] != update_id:
+            if update_comments:
+                count(update_id, update_comments)
+            update_id = row[0]
+            update_comments = []
+        update_comments.append(tuple(row[1:]))
+    if update_comments:
+        count(update_id, update_comments)
+    if batch:
+        connection.execute(store, batch)
+
+
+def downgrade():
+    """Drop the counter columns from the updates table."""
+    for name in reversed(COUNTERS):
+        op.drop_column('updates', name)
@@ -0,0 +1,87 @@
+# Copyright (c) 2018 Red Hat, Inc.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+Move the checkpoints of composes to the new compose_checkpoints table.
+
+Revision ID: 8e9dc57e082d
+Revises: 3c2a0f6e1d4b
+Create Date: 2018-01-29 16:44:12.583410
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '8e9dc57e082d'
+down_revision = '3c2a0f6e1d4b'
+
+
+def upgrade():
+    """Create the compose_checkpoints table and move the composes.checkpoints column into it."""
+    checkpoints = op.create_table(
+        'compose_checkpoints',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('release_id', sa.Integer(), nullable=False),
+        sa.Column(
+            'request',
+            postgresql.ENUM('unpush', 'testing', 'revoke', 'obsolete', 'stable', 'batched',
+                            name='ck_update_request', create_type=False),
+            nullable=False),
+        sa.Column('key', sa.UnicodeText(), nullable=False),
+        sa.Column('value', sa.UnicodeText(), nullable=False),
+        sa.Column('progress', sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(['release_id', 'request'],
+                                ['composes.release_id', 'composes.request'], ),
+        sa.PrimaryKeyConstraint('id'))
+
+    rows = []
+    composes = op.get_bind().execute('SELECT release_id, request, checkpoints FROM composes')
+    for release_id, request, compose_checkpoints in composes:
+        for key, value in json.loads(compose_checkpoints).items():
+            rows.append({'release_id': release_id, 'request': request, 'key': key,
+                         'value': json.dumps(value), 'progress': False})
+    if rows:
+        op.bulk_insert(checkpoints, rows)
+
+    op.drop_column('composes', 'checkpoints')
+
+
+def downgrade():
+    """Move the compose_checkpoints table back into the composes.checkpoints column."""
+    op.add_column(
+        'composes',
+        sa.Column('checkpoints', sa.UnicodeText(), nullable=False, server_default=u'{}'))
+    op.alter_column('composes', 'checkpoints', server_default=None)
+
+    bind = op.get_bind()
+    composes = {}
+    rows = bind.execute(
+        'SELECT release_id, request, key, value FROM compose_checkpoints '
+        'WHERE NOT progress ORDER BY id')
+    for release_id, request, key, value in rows:
+        composes.setdefault((release_id, request), {})[key] = json.loads(value)
+    for (release_id, request), compose_checkpoints in composes.items():
+        bind.execute(
+            sa.text('UPDATE composes SET checkpoints = :checkpoints '
+                    'WHERE release_id = :release_id AND request = :request'),
+            checkpoints=json.dumps(compose_checkpoints), release_id=release_id, request=request)
+
+    op.drop_table('compose_checkpoints')
@@ -0,0 +1,40 @@
+# Copyright (c) 2018 Red Hat, Inc.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+Add an index for the release of builds.
+
+Revision ID: b1a801e1605e
+Revises: 8e9dc57e082d
+Create Date: 2018-01-31 10:12:37.419532
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b1a801e1605e'
+down_revision = '8e9dc57e082d'
+
+
+def upgrade():
+    """Add an index to the release_id column on the builds table."""
+    op.create_index(op.f('ix_builds_release_id'), 'builds', ['release_id'], unique=False)
+
+
+def downgrade():
+    """Drop the index to the release_id column on the builds table."""
+    op.drop_index(op.f('ix_builds_release_id'), table_name='builds')
@@ -0,0 +1,46 @@
+# Copyright (c) 2018 Red Hat, Inc.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+Add the release_stamp table, which counts the edits of the releases.
+
+Revision ID: d2a9bc3be2b1
+Revises: 7b3f4406dbeb
+Create Date: 2018-02-08 10:12:47.201338
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a9bc3be2b1'
+down_revision = '7b3f4406dbeb'
+
+
+def upgrade():
+    """Create the release_stamp table with its single row."""
+    release_stamp = op.create_table(
+        'release_stamp',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('stamp', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'))
+    op.bulk_insert(release_stamp, [{'id': 1, 'stamp': 0}])
+
+
+def downgrade():
+    """Drop the release_stamp table."""
+    op.drop_table('release_stamp')
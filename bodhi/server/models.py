@@ -22,6 +22,7 @@ from collections import defaultdict
 from datetime import datetime
 from textwrap import wrap
 import copy
+import functools
 import hashlib
 import json
 import os
@@ -33,11 +34,13 @@ import uuid
 from pkgdb2client import PkgDB
 from simplemediawiki import MediaWiki
 from six.moves.urllib.parse import quote
-from sqlalchemy import (and_, Boolean, Column, DateTime, event, ForeignKey,
+from sqlalchemy import (and_, Boolean, Column, DateTime, event, ForeignKey, ForeignKeyConstraint,
                         Integer, or_, Table, Unicode, UnicodeText, UniqueConstraint)
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import class_mapper, relationship, backref, validates
+from sqlalchemy.orm import (class_mapper, relationship, backref, validates, Mapper,
+                            subqueryload)
 from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy.orm.session import Session as SessionBase
 from sqlalchemy.orm.properties import RelationshipProperty
 from sqlalchemy.sql import text
 from sqlalchemy.types import SchemaType, TypeDecorator, Enum
@@ -274,6 +277,99 @@ class DeclEnumType(SchemaType, TypeDecorator):
             t.impl.drop(bind=bind, checkfirst=checkfirst)
 
 
+class JSONPlan(object):
+    """
+    The fields that :meth:`BodhiBase._to_json` serializes for a model class.
+
+    Walking a model's mapper for its columns and relationships is costly, so it is done once per
+    class and reused for every instance that is serialized. Use :func:`get_json_plan` to get the
+    plan of a class.
+
+    Attributes:
+        exclude (tuple): The ``__exclude_columns__`` of the class that the plan was made with.
+        extras (tuple): The ``__include_extras__`` of the class that the plan was made with.
+        columns (tuple): The names of the column attributes to serialize.
+        relationships (tuple): 2-tuples of the name of each relationship to serialize and the
+            model class it refers to.
+    """
+
+    def __init__(self, klass):
+        """
+        Make the plan for the given model class.
+
+        Args:
+            klass (BodhiBase): The mapped class to make the plan for.
+        """
+        self.exclude = klass.__exclude_columns__
+        self.extras = klass.__include_extras__
+        exclude = frozenset(self.exclude)
+        columns = []
+        relationships = []
+        for prop in class_mapper(klass).iterate_properties:
+            if prop.key in exclude:
+                continue
+            if isinstance(prop, RelationshipProperty):
+                relationships.append((prop.key, prop.mapper.class_))
+            elif not prop.key.startswith('_'):
+                columns.append(prop.key)
+        self.columns = tuple(columns)
+        self.relationships = tuple(relationships)
+
+    def is_current(self, klass):
+        """
+        Return whether the plan still matches the given class's excluded columns and extras.
+
+        Args:
+            klass (BodhiBase): The mapped class the plan was made for.
+        Returns:
+            bool: False if ``__exclude_columns__`` or ``__include_extras__`` were replaced.
+        """
+        return (self.exclude is klass.__exclude_columns__ and
+                self.extras is klass.__include_extras__)
+
+
+# Maps model classes to their JSONPlan. Plans are made on first use, and are dropped whenever
+# mappers are configured since new mappers may add relationships (backrefs) to existing classes.
+_json_plans = {}
+
+
+def get_json_plan(klass):
+    """
+    Return the :class:`JSONPlan` of the given model class, making it if needed.
+
+    Args:
+        klass (BodhiBase): The mapped class to get the plan of.
+    Returns:
+        JSONPlan: The plan of the class.
+    """
+    plan = _json_plans.get(klass)
+    if plan is None or not plan.is_current(klass):
+        plan = _json_plans[klass] = JSONPlan(klass)
+    return plan
+
+
+@event.listens_for(Mapper, 'after_configured')
+def _clear_json_plans():
+    """Drop the JSON plans, as the newly configured mappers may have changed existing classes."""
+    _json_plans.clear()
+
+
+def _json_value(value):
+    """
+    Convert the given attribute value to a type that can be serialized to JSON.
+
+    Args:
+        value (object): The value of a model attribute.
+    Returns:
+        object: Datetimes as formatted strings, EnumSymbols as their text, or value unaltered.
+    """
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, EnumSymbol):
+        return six.text_type(value)
+    return value
+
+
 class BodhiBase(object):
     """
     Base class for the SQLAlchemy model base class.
@@ -282,6 +378,8 @@ class BodhiBase(object):
         __exclude_columns__ (tuple): A list of columns to exclude from JSON
         __include_extras__ (tuple): A list of methods or attrs to include in JSON
         __get_by__ (tuple): A list of columns that :meth:`.get` will query.
+        __loading_profiles__ (dict): Maps the names of the ways the model is queried to the dotted
+            paths of the relationships those queries need loaded. See :meth:`.loading_profile`.
         id (int): An integer id that serves as the default primary key.
         query (sqlalchemy.orm.query.Query): a class property which produces a
             Query object against the class and the current Session when called.
@@ -290,27 +388,59 @@ class BodhiBase(object):
     __exclude_columns__ = ('id',)
     __include_extras__ = tuple()
     __get_by__ = ()
+    __loading_profiles__ = {}
 
     id = Column(Integer, primary_key=True)
 
     query = Session.query_property()
 
     @classmethod
-    def get(cls, id, db):
+    def get(cls, id, db, options=()):
         """
         Return an instance of the model by using its __get_by__ attribute with id.
 
         Args:
             id (object): An attribute to look up the model by.
             db (sqlalchemy.orm.session.Session): A database session.
+            options (iterable): Loader options to query the model with, such as those returned by
+                :meth:`.loading_profile`.
         Returns:
             BodhiBase or None: An instance of the model that matches the id, or ``None`` if no match
             was found.
         """
-        return db.query(cls).filter(or_(
+        return db.query(cls).options(*options).filter(or_(
             getattr(cls, col) == id for col in cls.__get_by__
         )).first()
 
+    @classmethod
+    def loading_profile(cls, name, via=None):
+        """
+        Return loader options that eagerly load the relationships of one of the loading profiles.
+
+        Each relationship is loaded with a query of its own, so loading the collections of many
+        models doesn't multiply the rows that the main query returns.
+
+        Args:
+            name (basestring): The name of the profile in ``__loading_profiles__``, such as
+                ``list``.
+            via (sqlalchemy.orm.attributes.InstrumentedAttribute or None): If the models are
+                loaded through a relationship of another model, such as ``Compose.updates``, that
+                relationship. It is loaded eagerly as well.
+        Returns:
+            list: Loader options to pass to :meth:`sqlalchemy.orm.query.Query.options`.
+        Raises:
+            KeyError: If the model has no such profile.
+        """
+        options = []
+        for path in cls.__loading_profiles__[name]:
+            option = None if via is None else subqueryload(via)
+            for key in path.split('.'):
+                option = subqueryload(key) if option is None else option.subqueryload(key)
+            options.append(option)
+        if via is not None and not options:
+            options.append(subqueryload(via))
+        return options
+
     def __getitem__(self, key):
         """
         Define a dictionary like interface for the models.
@@ -346,39 +476,39 @@ class BodhiBase(object):
 
     @classmethod
     def _to_json(cls, obj, seen=None, request=None, anonymize=False):
-        if not seen:
-            seen = []
+        """
+        Return a JSON representation of the given model, following its class's :class:`JSONPlan`.
+
+        Args:
+            obj (BodhiBase): The model to serialize.
+            seen (collection or None): The model classes that were already serialized on the way
+                to obj. Relationships to them are not expanded.
+            request (pyramid.util.Request or None): The current web request, or None.
+            anonymize (bool): If True, scrub out some information using the model's
+                ``__anonymity_map__``. Defaults to False.
+        Returns:
+            dict or None: A JSON representation of obj, or None if obj is falsey.
+        """
         if not obj:
             return
+        seen = frozenset(seen or ())
+        plan = get_json_plan(type(obj))
 
-        exclude = getattr(obj, '__exclude_columns__', [])
-        properties = list(class_mapper(type(obj)).iterate_properties)
-        rels = [p.key for p in properties if isinstance(p, RelationshipProperty)]
-        attrs = [p.key for p in properties if p.key not in rels]
-        d = dict([(attr, getattr(obj, attr)) for attr in attrs
-                  if attr not in exclude and not attr.startswith('_')])
+        d = {}
+        for attr in plan.columns:
+            d[attr] = _json_value(getattr(obj, attr))
 
-        extras = getattr(obj, '__include_extras__', [])
-        for name in extras:
+        for name in plan.extras:
             attribute = getattr(obj, name)
             if callable(attribute):
                 attribute = attribute(request)
-            d[name] = attribute
+            d[name] = _json_value(attribute)
 
-        for attr in rels:
-            if attr in exclude:
-                continue
-            target = getattr(type(obj), attr).property.mapper.class_
+        for attr, target in plan.relationships:
             if target in seen:
                 continue
             d[attr] = cls._expand(obj, getattr(obj, attr), seen, request)
 
-        for key, value in six.iteritems(d):
-            if isinstance(value, datetime):
-                d[key] = value.strftime('%Y-%m-%d %H:%M:%S')
-            if isinstance(value, EnumSymbol):
-                d[key] = six.text_type(value)
-
         # If explicitly asked to, we will overwrite some fields if the
         # corresponding condition of each evaluates to True.
         # This is primarily for anonymous Comments.  We want to serialize
@@ -399,7 +529,7 @@ class BodhiBase(object):
         Args:
             obj (BodhiBase): The object we are trying to describe a relationship on.
             relation (object): A relationship attribute on obj we are trying to learn about.
-            seen (list): A list of objects we have already recursed over.
+            seen (collection): The model classes we have already recursed over.
             req (pyramid.util.Request): The current request.
         Returns:
             object: The to_json() or the id of a sqlalchemy relationship.
@@ -409,7 +539,7 @@ class BodhiBase(object):
         if hasattr(relation, '__iter__'):
             return [cls._expand(obj, item, seen, req) for item in relation]
         if type(relation) not in seen:
-            return cls._to_json(relation, seen + [type(obj)], req)
+            return cls._to_json(relation, frozenset(seen).union((type(obj),)), req)
         else:
             return relation.id
 
@@ -746,6 +876,92 @@ user_package_table = Table(
     Column('user_id', Integer, ForeignKey('users.id')),
     Column('package_id', Integer, ForeignKey('packages.id')))
 
+# A single row counting the edits of the releases, which tells every process whether its
+# ReleaseRegistry is out of date.
+release_stamp_table = Table(
+    'release_stamp', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('stamp', Integer, nullable=False))
+
+
+class ReleaseRegistry(object):
+    """
+    An in-memory index of the releases by name, long name, dist tag, version and koji tag.
+
+    The registry only holds the ids of the releases, so it can be shared by the sessions of all the
+    requests and threads of a process. The releases themselves come from the session that looks them
+    up, which has them in its identity map after the first lookup. A registry is built for a value
+    of the release stamp, which is increased by every flush that creates, edits or deletes releases.
+
+    Attributes:
+        stamp (int): The release stamp the registry was built for.
+        ids (dict): Maps the names, long names and dist tags of the releases to their ids.
+        ids_by_name (dict): Maps the names of the releases to their ids.
+        ids_by_version (dict): Maps the versions of the releases to the id of the oldest release
+            with that version.
+        states (dict): Maps the ids of the releases to their :class:`ReleaseState`.
+        tags (tuple): The 2-tuple returned by :meth:`Release.get_tags`.
+        all_releases (defaultdict): The mapping returned by :meth:`Release.all_releases`.
+    """
+
+    def __init__(self, stamp, releases):
+        """
+        Index the given releases.
+
+        Args:
+            stamp (int): The release stamp the releases were queried at.
+            releases (list): All the :class:`Releases <Release>`.
+        """
+        self.stamp = stamp
+        self.ids = {}
+        self.ids_by_name = {}
+        self.ids_by_version = {}
+        self.states = {}
+        tag_types = {'candidate': [], 'testing': [], 'stable': [], 'override': [],
+                     'pending_testing': [], 'pending_stable': []}
+        tag_rels = {}  # tag -> release lookup
+        for release in sorted(releases, key=lambda r: r.id):
+            for col in Release.__get_by__:
+                self.ids.setdefault(getattr(release, col), release.id)
+            self.ids_by_name[release.name] = release.id
+            self.ids_by_version.setdefault(release.version, release.id)
+            self.states[release.id] = release.state
+            for key in tag_types:
+                tag = getattr(release, '%s_tag' % key)
+                tag_types[key].append(tag)
+                tag_rels[tag] = release.name
+        self.tags = (tag_types, tag_rels)
+
+        self.all_releases = defaultdict(list)
+        for release in sorted(releases, key=lambda r: r.name, reverse=True):
+            self.all_releases[release.state.value].append(release.__json__())
+
+    def find(self, name):
+        """
+        Return the id of the release that is referred to by name, in upper case or by version.
+
+        Args:
+            name (basestring): A release name, such as 'F27' or 'f27', or a version, such as '27'.
+        Returns:
+            int or None: The id of the release, or None if there is no such release.
+        """
+        for key in (name, name.upper()):
+            if key in self.ids_by_name:
+                return self.ids_by_name[key]
+        return self.ids_by_version.get(name)
+
+    def in_states(self, *states):
+        """
+        Return the ids of the releases that are in any of the given states.
+
+        Args:
+            states (ReleaseState): The states to select the releases with.
+        Returns:
+            list: The ids of the releases, in ascending order.
+        """
+        return sorted(
+            release_id for release_id, state in self.states.items() if state in states)
+
 
 class Release(Base):
     """
@@ -847,6 +1063,65 @@ class Release(Base):
         """
         return ' '.join(self.long_name.split()[:-1])
 
+    @classmethod
+    def get(cls, id, db, options=()):
+        """
+        Return the release that matches id with its name, long name or dist tag.
+
+        Args:
+            id (object): The name, long name or dist tag of the release.
+            db (sqlalchemy.orm.session.Session): A database session.
+            options (iterable): Loader options to query the release with.
+        Returns:
+            Release or None: The release, or ``None`` if no match was found.
+        """
+        release_id = cls.registry(db).ids.get(id)
+        if release_id is None:
+            return None
+        return db.query(cls).options(*options).get(release_id)
+
+    @classmethod
+    def find(cls, name, session):
+        """
+        Return the release that matches name with its name, upper cased name or version.
+
+        Args:
+            name (basestring): A release name, such as 'F27' or 'f27', or a version, such as '27'.
+            session (sqlalchemy.orm.session.Session): A database session.
+        Returns:
+            Release or None: The release, or ``None`` if no match was found.
+        """
+        release_id = cls.registry(session).find(name)
+        if release_id is None:
+            return None
+        return session.query(cls).get(release_id)
+
+    @classmethod
+    def registry(cls, session):
+        """
+        Return the release registry, rebuilt if the releases were edited since it was built.
+
+        The release stamp is only checked by the first call in each transaction of the session, so
+        all the lookups of a web request share the same registry. Registries built from releases
+        that were edited in an uncommitted transaction are only used by that transaction's session.
+
+        Args:
+            session (sqlalchemy.orm.session.Session): A database session.
+        Returns:
+            ReleaseRegistry: The registry of the releases.
+        """
+        registry = session.info.get('release_registry')
+        if registry is None:
+            stamp = session.query(release_stamp_table.c.stamp).scalar() or 0
+            registry = cls._registry
+            if registry is None or registry.stamp != stamp:
+                registry = ReleaseRegistry(stamp, session.query(cls).all())
+                if not session.info.get('releases_edited'):
+                    cls._registry = registry
+            session.info['release_registry'] = registry
+        return registry
+    _registry = None
+
     @classmethod
     def all_releases(cls, session):
         """
@@ -858,14 +1133,7 @@ class Release(Base):
             defaultdict: Mapping strings of :class:`ReleaseState` names to lists of dictionaries
             that describe the releases in those states.
         """
-        if cls._all_releases:
-            return cls._all_releases
-        releases = defaultdict(list)
-        for release in session.query(cls).order_by(cls.name.desc()).all():
-            releases[release.state.value].append(release.__json__())
-        cls._all_releases = releases
-        return cls._all_releases
-    _all_releases = None
+        return cls.registry(session).all_releases
 
     @classmethod
     def get_tags(cls, session):
@@ -880,19 +1148,7 @@ class Release(Base):
             releases that correspond to those tag semantics. The second element maps each koji tag
             to the release's name that uses it.
         """
-        if cls._tag_cache:
-            return cls._tag_cache
-        data = {'candidate': [], 'testing': [], 'stable': [], 'override': [],
-                'pending_testing': [], 'pending_stable': []}
-        tags = {}  # tag -> release lookup
-        for release in session.query(cls).all():
-            for key in data:
-                tag = getattr(release, '%s_tag' % key)
-                data[key].append(tag)
-                tags[tag] = release.name
-        cls._tag_cache = (data, tags)
-        return cls._tag_cache
-    _tag_cache = None
+        return cls.registry(session).tags
 
     @classmethod
     def from_tags(cls, tags, session):
@@ -905,14 +1161,55 @@ class Release(Base):
         Returns:
             Release or None: The first release found that matches the first tag. If no release is
                 found, ``None`` is returned.
+        Raises:
+            KeyError: If one of the tags isn't the tag of a release.
         """
-        tag_types, tag_rels = cls.get_tags(session)
+        registry = cls.registry(session)
+        tag_types, tag_rels = registry.tags
         for tag in tags:
-            release = session.query(cls).filter_by(name=tag_rels[tag]).first()
+            release = session.query(cls).get(registry.ids_by_name[tag_rels[tag]])
             if release:
                 return release
 
 
+@event.listens_for(SessionBase, 'after_flush')
+def _bump_release_stamp(session, flush_context):
+    """
+    Increase the release stamp if the flush created, edited or deleted releases.
+
+    Args:
+        session (sqlalchemy.orm.session.Session): The session that was flushed.
+        flush_context (sqlalchemy.orm.unitofwork.UOWTransaction): Unused.
+    """
+    edited = [obj for obj in list(session.new) + list(session.deleted)
+              if isinstance(obj, Release)] or \
+        [obj for obj in session.dirty
+         if isinstance(obj, Release) and session.is_modified(obj, include_collections=False)]
+    if not edited:
+        return
+
+    connection = session.connection()
+    result = connection.execute(
+        release_stamp_table.update().values(stamp=release_stamp_table.c.stamp + 1))
+    if not result.rowcount:
+        connection.execute(release_stamp_table.insert().values(id=1, stamp=1))
+    session.info.pop('release_registry', None)
+    session.info['releases_edited'] = True
+
+
+@event.listens_for(SessionBase, 'after_commit')
+@event.listens_for(SessionBase, 'after_rollback')
+def _forget_release_registry(session):
+    """
+    Make the next transaction of the session check the release stamp again.
+
+    Args:
+        session (sqlalchemy.orm.session.Session): The session that ended a transaction.
+    """
+    session.info.pop('release_registry', None)
+    session.info.pop('releases_edited', None)
+
+
 class TestCase(Base):
     """
     Represents test cases from the wiki.
@@ -1205,7 +1502,7 @@ class Build(Base):
 
     nvr = Column(Unicode(100), unique=True, nullable=False)
     package_id = Column(Integer, ForeignKey('packages.id'), nullable=False)
-    release_id = Column(Integer, ForeignKey('releases.id'))
+    release_id = Column(Integer, ForeignKey('releases.id'), index=True)
     signed = Column(Boolean, default=False, nullable=False)
     update_id = Column(Integer, ForeignKey('updates.id'))
     ci_url = Column(UnicodeText, default=None, nullable=True)
@@ -1381,17 +1678,20 @@ class RpmBuild(Build):
                 break
         return latest
 
-    def get_changelog(self, timelimit=0):
+    def get_changelog(self, timelimit=0, rpm_header=None):
         """
         Retrieve the RPM changelog of this package since it's last update, or since timelimit.
 
         Args:
             timelimit (int): Timestamp, specified as the number of seconds since 1970-01-01 00:00:00
                 UTC.
+            rpm_header (dict or None): The RPM header of this build, if the caller already has it.
+                If None, it is retrieved with get_rpm_header().
         Return:
             str: The RpmBuild's changelog.
         """
-        rpm_header = get_rpm_header(self.nvr)
+        if rpm_header is None:
+            rpm_header = get_rpm_header(self.nvr)
         descrip = rpm_header['changelogtext']
         if not descrip:
             return ""
@@ -1493,12 +1793,31 @@ class Update(Base):
             (e.g. 2 of 32 required tests failed).
         compose (Compose): The :class:`Compose` that this update is currently being mashed in. The
             update is locked if this is defined.
+        karma (int): The update's current karma, the sum of positive_karma and negative_karma.
+        positive_karma (int): The sum of the positive karma that counts towards the update's karma.
+        negative_karma (int): The sum of the negative karma that counts towards the update's karma.
+        comment_count (int): The number of comments on the update.
     """
 
     __tablename__ = 'updates'
     __exclude_columns__ = ('id', 'user_id', 'release_id', 'cves')
     __include_extras__ = ('meets_testing_requirements', 'url',)
     __get_by__ = ('title', 'alias')
+    # The comments and builds aren't loaded with every update, since most queries for updates only
+    # need a few of them, or none at all. The queries that do need them use these.
+    __loading_profiles__ = {
+        # Pages of updates, which serialize them whole.
+        'list': ('builds', 'bugs', 'user', 'comments', 'comments.user', 'comments.user.groups',
+                 'comments.bug_feedback', 'comments.testcase_feedback'),
+        # A single update, with the test cases of its packages.
+        'detail': ('builds', 'builds.package.test_cases', 'bugs', 'user', 'comments',
+                   'comments.user', 'comments.user.groups', 'comments.bug_feedback',
+                   'comments.testcase_feedback'),
+        # The updates of a compose, which the masher tags, serializes and comments on.
+        'masher': ('builds', 'bugs', 'cves', 'user', 'comments', 'comments.user'),
+        # Updates that are checked against the builds of a request.
+        'validator': ('builds',),
+    }
 
     title = Column(UnicodeText, unique=True, default=None, index=True)
 
@@ -1547,10 +1866,9 @@ class Update(Base):
     release = relationship('Release', lazy='joined')
 
     # One-to-many relationships
-    comments = relationship('Comment', backref=backref('update', lazy='joined'), lazy='joined',
+    comments = relationship('Comment', backref=backref('update', lazy='joined'),
                             order_by='Comment.timestamp')
-    builds = relationship('Build', backref=backref('update', lazy='joined'), lazy='joined',
-                          order_by='Build.nvr')
+    builds = relationship('Build', backref=backref('update', lazy='joined'), order_by='Build.nvr')
     # If the update is locked and a Compose exists for the same release and request, this will be
     # set to that Compose.
     compose = relationship(
@@ -1570,6 +1888,13 @@ class Update(Base):
     test_gating_status = Column(TestGatingStatus.db_type(), default=None, nullable=True)
     greenwave_summary_string = Column(Unicode(255))
 
+    # Counters that are kept up to date as comments are added to or removed from the update. See
+    # Update.count_karma() for how they are computed.
+    karma = Column(Integer, default=0, nullable=False)
+    positive_karma = Column(Integer, default=0, nullable=False)
+    negative_karma = Column(Integer, default=0, nullable=False)
+    comment_count = Column(Integer, default=0, nullable=False)
+
     # WARNING: consumers/masher.py assumes that this validation is performed!
     @validates('builds')
     def validate_builds(self, key, build):
@@ -1634,31 +1959,38 @@ class Update(Base):
         return days if days else 0
 
     @property
-    def karma(self):
+    def _composite_karma(self):
         """
-        Calculate and return the karma for the Update.
+        Return a 2-tuple of the positive and negative karma.
 
-        :return: The Update's current karma.
-        :rtype:  int
+        The total karma is simply the sum of the two elements of this 2-tuple. They are stored on
+        the update, and kept up to date as comments are added or removed.
+
+        Returns:
+            tuple: A 2-tuple of (positive_karma, negative_karma).
         """
-        positive_karma, negative_karma = self._composite_karma
-        return positive_karma + negative_karma
+        return self.positive_karma, self.negative_karma
 
-    @property
-    def _composite_karma(self):
+    def count_karma(self, comments=None):
         """
-        Calculate and return a 2-tuple of the positive and negative karma.
+        Compute the karma and comment counters of the update from its comments.
 
-        Sums the positive karma comments, and then sums the negative karma comments. The total karma
-        is simply the sum of the two elements of this 2-tuple.
+        Sums the positive karma comments, and then sums the negative karma comments. Only the
+        last comment with karma of each user since the most recent karma reset event counts.
 
+        Args:
+            comments (list or None): The comments to count, oldest first. Defaults to the update's
+                comments.
         Returns:
-            tuple: A 2-tuple of (positive_karma, negative_karma).
+            dict: The computed values of the ``karma``, ``positive_karma``, ``negative_karma`` and
+                ``comment_count`` columns.
         """
+        if comments is None:
+            comments = self.comments
         positive_karma = 0
         negative_karma = 0
         users_counted = set()
-        for comment in self.comments_since_karma_reset:
+        for comment in self._comments_since_karma_reset(comments):
             if comment.karma and not comment.anonymous and comment.user.name not in users_counted:
                 # Make sure we only count the last comment this user made
                 users_counted.add(comment.user.name)
@@ -1667,7 +1999,88 @@ class Update(Base):
                 else:
                     negative_karma += comment.karma
 
-        return positive_karma, negative_karma
+        return {'karma': positive_karma + negative_karma, 'positive_karma': positive_karma,
+                'negative_karma': negative_karma, 'comment_count': len(comments)}
+
+    @staticmethod
+    def init_counters(target, args, kwargs):
+        """
+        Zero the karma and comment counters of a new update, before it gets any comments.
+
+        Args:
+            target (Update): The update that is being constructed.
+            args (tuple): The positional arguments passed to the constructor.
+            kwargs (dict): The keyword arguments passed to the constructor.
+        """
+        for key in ('karma', 'positive_karma', 'negative_karma', 'comment_count'):
+            setattr(target, key, 0)
+
+    @staticmethod
+    def comment_appended(target, value, initiator):
+        """
+        Update the karma and comment counters when a comment is added to the update.
+
+        The counters are updated from the new comment alone, unless it has karma. Then the
+        comments since the karma reset are searched for an earlier karma of its author, which it
+        replaces.
+
+        Args:
+            target (Update): The update that the comment was added to.
+            value (Comment): The new comment.
+            initiator (sqlalchemy.orm.attributes.Event): The event object that is initiating this
+                change.
+        """
+        target.comment_count += 1
+        if Update._resets_karma(value):
+            target.karma = target.positive_karma = target.negative_karma = 0
+            return
+        if not value.karma or value.anonymous:
+            return
+
+        comments = [c for c in target.comments if c is not value]
+        for comment in Update._comments_since_karma_reset(comments):
+            if (comment.karma and not comment.anonymous and
+                    comment.user.name == value.user.name):
+                Update._count_karma(target, comment.karma, -1)
+                break
+        Update._count_karma(target, value.karma, 1)
+
+    @staticmethod
+    def comment_removed(target, value, initiator):
+        """
+        Update the karma and comment counters when a comment is removed from the update.
+
+        The karma is only counted again if the removed comment had karma or reset it, and then
+        only over the comments since the karma reset.
+
+        Args:
+            target (Update): The update that the comment was removed from.
+            value (Comment): The removed comment.
+            initiator (sqlalchemy.orm.attributes.Event): The event object that is initiating this
+                change.
+        """
+        target.comment_count -= 1
+        if (value.karma and not value.anonymous) or Update._resets_karma(value):
+            comments = [c for c in target.comments if c is not value]
+            for key, count in six.iteritems(target.count_karma(comments)):
+                if key != 'comment_count':
+                    setattr(target, key, count)
+
+    @staticmethod
+    def _count_karma(target, karma, sign):
+        """
+        Add the karma of a comment to the karma counters of an update, or take it away.
+
+        Args:
+            target (Update): The update the comment is on.
+            karma (int): The karma of the comment.
+            sign (int): 1 to add the karma, or -1 to take it away.
+        """
+        target.karma += sign * karma
+        if karma > 0:
+            target.positive_karma += sign * karma
+        else:
+            target.negative_karma += sign * karma
 
     @property
     def comments_since_karma_reset(self):
@@ -1679,12 +2092,23 @@ class Update(Base):
         Returns:
             generator: :class:`Comments <Comment>` since the karma reset.
         """
+        return self._comments_since_karma_reset(self.comments)
+
+    @staticmethod
+    def _comments_since_karma_reset(comments):
+        """
+        Generate the given comments that are since the most recent karma reset event.
+
+        Args:
+            comments (list): :class:`Comments <Comment>` of an update, oldest first.
+        Returns:
+            generator: The :class:`Comments <Comment>` since the karma reset, newest first.
+        """
         # We want to traverse the comments in reverse order so we only consider
         # the most recent comments from any given user and only the comments
         # since the most recent karma reset event.
-        for comment in reversed(self.comments):
-            if (comment.user.name == u'bodhi' and
-                    ('New build' in comment.text or 'Removed build' in comment.text)):
+        for comment in reversed(comments):
+            if Update._resets_karma(comment):
                 # We only want to consider comments since the most recent karma
                 # reset, which happens whenever a build is added or removed
                 # from an Update. Since we are traversing the comments in
@@ -1693,6 +2117,19 @@ class Update(Base):
                 break
             yield comment
 
+    @staticmethod
+    def _resets_karma(comment):
+        """
+        Return whether the given comment is a karma reset event.
+
+        Args:
+            comment (Comment): A comment of an update.
+        Returns:
+            bool: ``True`` if bodhi wrote the comment about a build being added or removed.
+        """
+        return (comment.user.name == u'bodhi' and
+                ('New build' in comment.text or 'Removed build' in comment.text))
+
     @staticmethod
     def contains_critpath_component(builds, release_name):
         """
@@ -2505,26 +2942,32 @@ class Update(Base):
 
         This typically gets called by the Masher at the end.
         """
+        for bug in self.bugs:
+            self.modify_bug(bug)
+
+    def modify_bug(self, bug):
+        """
+        Comment on or close one of this update's bugs as necessary.
+
+        Args:
+            bug (Bug): The bug to modify.
+        """
         if self.status is UpdateStatus.testing:
-            for bug in self.bugs:
-                log.debug('Adding testing comment to bugs for %s', self.title)
-                bug.testing(self)
+            log.debug('Adding testing comment to bugs for %s', self.title)
+            bug.testing(self)
         elif self.status is UpdateStatus.stable:
             if not self.close_bugs:
-                for bug in self.bugs:
-                    log.debug('Adding stable comment to bugs for %s', self.title)
-                    bug.add_comment(self)
+                log.debug('Adding stable comment to bugs for %s', self.title)
+                bug.add_comment(self)
             else:
                 if self.type is UpdateType.security:
                     # Only close the tracking bugs
                     # https://github.com/fedora-infra/bodhi/issues/368#issuecomment-135155215
-                    for bug in self.bugs:
-                        if not bug.parent:
-                            log.debug("Closing tracker bug %d" % bug.bug_id)
-                            bug.close_bug(self)
-                else:
-                    for bug in self.bugs:
+                    if not bug.parent:
+                        log.debug("Closing tracker bug %d" % bug.bug_id)
                         bug.close_bug(self)
+                else:
+                    bug.close_bug(self)
 
     def status_comment(self, db):
         """
@@ -2991,11 +3434,26 @@ class Update(Base):
             tuple: A tuple containing (result, reason) where result is a bool
                 and reason is a str.
         """
+        return self.requirements_check(settings)()
+
+    def requirements_check(self, settings):
+        """
+        Return a function that checks that the update meets its self-prescribed policy.
+
+        Everything the check needs from the update is read right away, so the returned function
+        uses neither the update nor its database session, and can be called from another thread.
+
+        Args:
+            settings (bodhi.server.config.BodhiConfig): Bodhi's settings.
+        Returns:
+            callable: A function without arguments, which returns the (result, reason) tuple of
+                :meth:`check_requirements`.
+        """
         requirements = tokenize(self.requirements or '')
         requirements = list(requirements)
 
         if not requirements:
-            return True, "No checks required."
+            return lambda: (True, "No checks required.")
 
         try:
             # https://github.com/fedora-infra/bodhi/issues/362
@@ -3003,11 +3461,33 @@ class Update(Base):
         except Exception as e:
             log.exception("Failed to determine last_modified from %r : %r",
                           self.last_modified, str(e))
-            return False, "Failed to determine last_modified: %r" % str(e)
+            reason = "Failed to determine last_modified: %r" % str(e)
+            return lambda: (False, reason)
 
+        gating_failed = config.get('test_gating.required') and not self.test_gating_passed
+        return functools.partial(
+            self._check_requirements, settings, self.alias, since, requirements,
+            [build.nvr for build in self.builds], gating_failed)
+
+    @staticmethod
+    def _check_requirements(settings, alias, since, requirements, nvrs, gating_failed):
+        """
+        Check the Taskotron results of an update and of its builds against its requirements.
+
+        Args:
+            settings (bodhi.server.config.BodhiConfig): Bodhi's settings.
+            alias (basestring): The alias of the update.
+            since (basestring): The ISO formatted time the update was last modified at.
+            requirements (list): The names of the required test cases.
+            nvrs (list): The NVRs of the builds of the update.
+            gating_failed (bool): Whether the update failed the required test gating.
+        Returns:
+            tuple: A tuple containing (result, reason) where result is a bool
+                and reason is a str.
+        """
         try:
             # query results for this update
-            query = dict(type='bodhi_update', item=self.alias, since=since,
+            query = dict(type='bodhi_update', item=alias, since=since,
                          testcases=','.join(requirements))
             results = list(bodhi.server.util.taskotron_results(settings, **query))
 
@@ -3015,23 +3495,23 @@ class Update(Base):
             # retrieve timestamp for each build so that queries can be optimized
             koji = buildsys.get_session()
             koji.multicall = True
-            for build in self.builds:
-                koji.getBuild(build.nvr)
+            for nvr in nvrs:
+                koji.getBuild(nvr)
             buildinfos = koji.multiCall()
 
-            for index, build in enumerate(self.builds):
+            for index, nvr in enumerate(nvrs):
                 multicall_response = buildinfos[index]
                 if (not isinstance(multicall_response, list) or
                         not isinstance(multicall_response[0], dict)):
                     msg = ("Error retrieving data from Koji for %r: %r" %
-                           (build.nvr, multicall_response))
+                           (nvr, multicall_response))
                     log.error(msg)
                     raise TypeError(msg)
 
                 buildinfo = multicall_response[0]
                 ts = datetime.utcfromtimestamp(buildinfo['completion_ts']).isoformat()
 
-                query = dict(type='koji_build', item=build.nvr, since=ts,
+                query = dict(type='koji_build', item=nvr, since=ts,
                              testcases=','.join(requirements))
                 build_results = list(bodhi.server.util.taskotron_results(settings, **query))
                 results.extend(build_results)
@@ -3058,7 +3538,7 @@ class Update(Base):
                     return False, "Required task %s returned %s" % (
                         latest['testcase']['name'], latest['outcome'])
 
-        if config.get('test_gating.required') and not self.test_gating_passed:
+        if gating_failed:
             return (False, "Required tests did not pass on this update")
 
         # TODO - check require_bugs and require_testcases also?
@@ -3123,6 +3603,27 @@ class Update(Base):
                     topic='update.karma.threshold.reach',
                     msg=dict(update=self, status='unstable'))
 
+    @property
+    def reached_karma_threshold(self):
+        """
+        Return whether :meth:`check_karma_thresholds` would change anything about this update.
+
+        Only the karma counters and the settings of the update are read, so checking many updates
+        doesn't need any query.
+
+        Returns:
+            bool: True if the update is in testing or pending, and either has negative karma while
+                it will be pushed automatically, or has reached one of its karma thresholds.
+        """
+        if self.status not in (UpdateStatus.testing, UpdateStatus.pending):
+            return False
+        if self.autokarma and self._composite_karma[1] != 0 and self.status is \
+                UpdateStatus.testing and self.request is not UpdateRequest.stable:
+            return True
+        if self.stable_karma and self.karma >= self.stable_karma:
+            return True
+        return bool(self.unstable_karma and self.karma <= self.unstable_karma)
+
     @property
     def builds_json(self):
         """
@@ -3386,8 +3887,6 @@ class Update(Base):
         # Also, put the update submitter's name in the same place we put
         # it for bodhi1 to make fedmsg.meta compat much more simple.
         result['submitter'] = result['user']['name']
-        # Include the karma total in the results
-        result['karma'] = self.karma
         # Also, the Update content_type (derived from the builds content_types)
         result['content_type'] = self.content_type.value if self.content_type else None
 
@@ -3408,6 +3907,11 @@ class Update(Base):
         return result
 
 
+event.listen(Update, 'init', Update.init_counters)
+event.listen(Update.comments, 'append', Update.comment_appended)
+event.listen(Update.comments, 'remove', Update.comment_removed)
+
+
 class Compose(Base):
     """
     Express the status of an in-progress compose job.
@@ -3423,8 +3927,9 @@ class Compose(Base):
         __exclude_columns__ (tuple): A tuple of columns to exclude when __json__() is called.
         __include_extras__ (tuple): A tuple of attributes to add when __json__() is called.
         __tablename__ (str): The name of the table in the database.
-        checkpoints (unicode): A JSON serialized object describing the checkpoints the masher has
-            reached.
+        checkpoints (sqlalchemy.orm.collections.InstrumentedList): The
+            :class:`ComposeCheckpoints <ComposeCheckpoint>` the masher has recorded, in the order
+            they were recorded.
         date_created (datetime.datetime): The time this Compose was created.
         error_message (unicode): An error message indicating what happened if the Compose failed.
         id (None): We don't want the superclass's primary key since we will use a natural primary
@@ -3435,13 +3940,16 @@ class Compose(Base):
             the primary key, with the other half being the ``release_id``.
         release (Release): The release that is being composed.
         state_date (datetime.datetime): The time of the most recent change to the state attribute.
+        stage_timings (unicode): A JSON serialized object mapping the names of the compose stages
+            that have run to their start and end times and their durations in seconds, and the
+            stages that report their progress to how many of their items are done.
         state (ComposeState): The state of the compose.
         updates (sqlalchemy.orm.collections.InstrumentedList): An iterable of updates included in
             this compose.
     """
 
     __exclude_columns__ = ('checkpoints', 'error_message', 'date_created', 'state_date', 'release',
-                           'state', 'updates')
+                           'stage_timings', 'state', 'updates')
     # We need to include these so the masher can collate the Composes and so it can pick the right
     # masher class to use.
     __include_extras__ = ('content_type', 'security',)
@@ -3456,12 +3964,14 @@ class Compose(Base):
     id = None
     # We could use the JSON type here, but that would require PostgreSQL >= 9.2.0. We don't really
     # need the ability to query inside this so the JSONB type probably isn't useful.
-    checkpoints = Column(UnicodeText, nullable=False, default=u'{}')
+    stage_timings = Column(UnicodeText, nullable=False, default=u'{}')
     error_message = Column(UnicodeText)
     date_created = Column(DateTime, nullable=False, default=datetime.utcnow)
     state_date = Column(DateTime, nullable=False, default=datetime.utcnow)
 
     release = relationship('Release', backref='composes')
+    checkpoints = relationship('ComposeCheckpoint', backref='compose',
+                               order_by='ComposeCheckpoint.id', cascade='all, delete-orphan')
     state = Column(ComposeState.db_type(), nullable=False, default=ComposeState.requested)
 
     @property
@@ -3476,19 +3986,59 @@ class Compose(Base):
         if self.updates:
             return self.updates[0].content_type
 
+    @property
+    def stages(self):
+        """
+        Return the timings, progress and counters of the stages of this compose.
+
+        Returns:
+            dict: A mapping of the names of the stages that have run or are running to dictionaries
+                with their ``start`` and ``end`` times and ``duration`` in seconds, and with their
+                ``progress`` and ``counters`` if they recorded any.
+        """
+        return json.loads(self.stage_timings)
+
+    def __json__(self, request=None, anonymize=False, masher=False):
+        """
+        Return a JSON representation of this compose.
+
+        Args:
+            request (pyramid.util.Request or None): The current web request, or None. Passed on to
+                :meth:`BodhiBase.__json__`.
+            anonymize (bool): Whether to anonymize the results. Passed on to
+                :meth:`BodhiBase.__json__`.
+            masher (bool): If True, only include what the masher needs to find and collate the
+                compose, for the messages that ask the masher to run it.
+        Returns:
+            dict: A JSON representation of this compose.
+        """
+        result = super(Compose, self).__json__(request=request, anonymize=anonymize)
+        if masher:
+            return result
+        result.update({
+            'date_created': self.date_created.strftime('%Y-%m-%d %H:%M:%S'),
+            'error_message': self.error_message,
+            'release_name': self.release.name,
+            'stages': self.stages,
+            'state': six.text_type(self.state),
+            'state_date': self.state_date.strftime('%Y-%m-%d %H:%M:%S'),
+            'update_count': len(self.updates)})
+        return result
+
     @classmethod
-    def from_dict(cls, db, compose):
+    def from_dict(cls, db, compose, options=()):
         """
         Return a :class:`Compose` instance from the given dict representation of it.
 
         Args:
             db (sqlalchemy.orm.session.Session): A database session to use to query for the compose.
             compose (dict): A dictionary representing the compose, in the format returned by
-                :meth:`Compose.__json__`.
+                :meth:`Compose.__json__` with ``masher`` set.
+            options (iterable): Loader options to query the compose with.
         Returns:
             bodhi.server.models.Compose: The requested compose instance.
         """
-        return db.query(cls).filter_by(
+        return db.query(cls).options(*options).filter_by(
             release_id=compose['release_id'],
             request=UpdateRequest.from_string(compose['request'])).one()
 
@@ -3595,6 +4145,37 @@ class Compose(Base):
 event.listen(Compose.state, 'set', Compose.update_state_date, active_history=True)
 
 
+class ComposeCheckpoint(Base):
+    """
+    Record a checkpoint that a compose reached, or how far it got inside one of its steps.
+
+    The masher appends a checkpoint for every step it completes, so a resumed compose can skip it.
+    Progress records are kept up to date while their step runs, so a resumed compose can skip the
+    part of the step that was already done, and are deleted once the step completes.
+
+    Attributes:
+        __tablename__ (str): The name of the table in the database.
+        compose (Compose): The compose this checkpoint belongs to.
+        key (unicode): The name of the checkpoint. The keys of progress records are the name of
+            their step and the name of the progress, separated by a dot.
+        progress (bool): Whether this records the progress of a step that hasn't completed yet.
+        release_id (int): The primary key of the :class:`Release` of the compose.
+        request (UpdateRequest): The request of the compose.
+        value (unicode): The JSON serialized value of the checkpoint.
+    """
+
+    __tablename__ = 'compose_checkpoints'
+    __table_args__ = (
+        ForeignKeyConstraint(['release_id', 'request'],
+                             ['composes.release_id', 'composes.request']),)
+
+    release_id = Column(Integer, nullable=False)
+    request = Column(UpdateRequest.db_type(), nullable=False)
+    key = Column(UnicodeText, nullable=False)
+    value = Column(UnicodeText, nullable=False)
+    progress = Column(Boolean, nullable=False, default=False)
+
+
 # Used for many-to-many relationships between karma and a bug
 class BugKarma(Base):
     """
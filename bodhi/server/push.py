@@ -151,7 +151,7 @@ def push(username, cert_prefix, **kwargs):
         else:
             click.echo('\nThere are no updates to push.')
 
-        composes = [c.__json__() for c in composes]
+        composes = [c.__json__(masher=True) for c in composes]
 
     if composes:
         click.echo('\nSending masher.start fedmsg')
@@ -184,26 +184,23 @@ def _filter_releases(session, query, releases=None):
 
     :returns:        A filtered version of query with an additional filter based on releases.
     """
-    # We will store models.Release object here that we want to filter by
-    _releases = []
+    # We will store the ids of the releases here that we want to filter by
+    release_ids = []
 
     if releases:
         for r in releases.split(','):
-            release = session.query(Release).filter(
-                or_(Release.name == r,
-                    Release.name == r.upper(),
-                    Release.version == r)).first()
+            release = Release.find(r, session)
             if not release:
                 raise click.BadParameter('Unknown release: %s' % r)
             else:
-                _releases.append(release)
+                release_ids.append(release.id)
     else:
         # Since the user didn't ask for specific Releases, let's just filter for releases that are
         # current or pending.
-        _releases = session.query(Release).filter(or_(Release.state == ReleaseState.current,
-                                                      Release.state == ReleaseState.pending))
+        release_ids = Release.registry(session).in_states(ReleaseState.current,
+                                                          ReleaseState.pending)
 
-    return query.filter(or_(*[Update.release == r for r in _releases]))
+    return query.filter(or_(*[Update.release_id == r for r in release_ids]))
 
 
 if __name__ == '__main__':
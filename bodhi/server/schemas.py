@@ -72,6 +72,22 @@ class CVE(colander.String):
         return value
 
 
+class Cursor(colander.String):
+    """A String schema to validate a pagination cursor, and decode it."""
+
+    def deserialize(self, node, cstruct):
+        """Parse the ordering value and the row id out of a given API cursor parameter."""
+        value = super(Cursor, self).deserialize(node, cstruct)
+
+        if value is colander.null:
+            return value
+
+        try:
+            return util.decode_cursor(value)
+        except ValueError:
+            raise colander.Invalid(node, '"%s" is not a valid cursor' % value)
+
+
 class CVEs(colander.SequenceSchema):
     """A SequenceSchema to validate a list of CVE objects."""
 
@@ -274,6 +290,22 @@ class PaginatedSchema(colander.MappingSchema):
     )
 
 
+class CursorPaginatedSchema(PaginatedSchema):
+    """A mixin class used by schemas to also provide cursor based pagination for API endpoints."""
+
+    cursor = colander.SchemaNode(
+        Cursor(),
+        location="querystring",
+        missing=None,
+    )
+
+    count = colander.SchemaNode(
+        colander.Boolean(true_choices=('true', '1')),
+        location="querystring",
+        missing=None,
+    )
+
+
 class SearchableSchema(colander.MappingSchema):
     """A mixin class used by schemas to provide search support for API endpoints."""
 
@@ -290,7 +322,7 @@ class SearchableSchema(colander.MappingSchema):
     )
 
 
-class ListReleaseSchema(PaginatedSchema):
+class ListReleaseSchema(CursorPaginatedSchema):
     """
     An API schema for listing releases.
 
@@ -455,7 +487,7 @@ class ListUserSchema(PaginatedSchema, SearchableSchema):
     )
 
 
-class ListUpdateSchema(PaginatedSchema, SearchableSchema, Cosmetics):
+class ListUpdateSchema(CursorPaginatedSchema, SearchableSchema, Cosmetics):
     """An API schema for bodhi.server.services.updates.query_updates()."""
 
     alias = Builds(
@@ -640,7 +672,7 @@ class ListPackageSchema(PaginatedSchema, SearchableSchema):
     )
 
 
-class ListBuildSchema(PaginatedSchema):
+class ListBuildSchema(CursorPaginatedSchema):
     """An API schema for bodhi.server.services.builds.query_builds()."""
 
     nvr = colander.SchemaNode(
@@ -680,7 +712,7 @@ class UpdateRequestSchema(CSRFProtectedSchema, colander.MappingSchema):
     )
 
 
-class ListCommentSchema(PaginatedSchema, SearchableSchema):
+class ListCommentSchema(CursorPaginatedSchema, SearchableSchema):
     """An API schema for bodhi.server.services.comments.query_comments()."""
 
     updates = Updates(
@@ -728,7 +760,7 @@ class ListCommentSchema(PaginatedSchema, SearchableSchema):
     )
 
 
-class ListOverrideSchema(PaginatedSchema, SearchableSchema, Cosmetics):
+class ListOverrideSchema(CursorPaginatedSchema, SearchableSchema, Cosmetics):
     """An API schema for bodhi.server.services.overrides.query_overrides()."""
 
     builds = Builds(
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2018 Red Hat, Inc.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""
+Check the karma and comment counters that are stored on the updates.
+
+The counters are kept up to date as comments are written. This recomputes them from the comments of
+each update, and reports (and optionally repairs) the ones that differ.
+"""
+import sys
+
+import click
+from sqlalchemy.orm import subqueryload
+
+from bodhi.server import config, initialize_db, models, Session
+
+
+# The updates are checked in chunks of this many, each with the comments and their authors loaded
+# by a few queries, and then dropped from the session.
+CHUNK_SIZE = 500
+
+
+@click.command()
+@click.option('--fix', is_flag=True,
+              help='Store the recomputed counters of the updates that differ.')
+@click.version_option(message='%(version)s')
+def check(fix):
+    """Check the karma and comment counters of every update against their comments."""
+    initialize_db(config.config)
+    session = Session()
+
+    differing = 0
+    last_id = 0
+    while True:
+        updates = session.query(models.Update)\
+            .options(subqueryload(models.Update.comments).joinedload(models.Comment.user))\
+            .filter(models.Update.id > last_id)\
+            .order_by(models.Update.id).limit(CHUNK_SIZE).all()
+        if not updates:
+            break
+        last_id = updates[-1].id
+
+        for update in updates:
+            counters = update.count_karma()
+            wrong = sorted((key, getattr(update, key), value) for key, value in counters.items()
+                           if getattr(update, key) != value)
+            if not wrong:
+                continue
+            differing += 1
+            click.echo('{}: {}'.format(update.title, ', '.join(
+                '{} is {} instead of {}'.format(*counter) for counter in wrong)))
+            if fix:
+                for key, stored, value in wrong:
+                    setattr(update, key, value)
+
+        if fix:
+            session.commit()
+        session.expunge_all()
+
+    if not fix and differing:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    check()
@@ -17,8 +17,6 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 """Print a simple human-readable report about existing Compose objects."""
-import json
-
 import click
 
 from bodhi.server import buildsys, config, initialize_db, models
@@ -38,5 +36,6 @@ def monitor():
         for attr in ('state', 'state_date', 'security', 'error_message'):
             if getattr(c, attr) is not None:
                 click.echo('\t%s: %s' % (attr, getattr(c, attr)))
-        click.echo('\tcheckpoints: %s' % ', '.join(json.loads(c.checkpoints).keys()))
+        click.echo('\tcheckpoints: %s' % ', '.join(
+            checkpoint.key for checkpoint in c.checkpoints if not checkpoint.progress))
         click.echo('\tlen(updates): %s\n' % len(c.updates))
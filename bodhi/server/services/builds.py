@@ -17,11 +17,9 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 """Define service endpoint for retrieving Builds."""
-import math
 
 from cornice import Service
 from pyramid.exceptions import HTTPNotFound
-from sqlalchemy import func, distinct
 from sqlalchemy.sql import or_
 
 from bodhi.server.models import Update, Build, Package, Release
@@ -30,6 +28,7 @@ from bodhi.server.validators import (colander_querystring_validator, validate_up
 import bodhi.server.schemas
 import bodhi.server.security
 import bodhi.server.services.errors
+import bodhi.server.util
 
 
 build = Service(name='build', path='/builds/{nvr}', description='Koji builds',
@@ -75,6 +74,8 @@ def query_builds(request):
         releases: A space or comma separated list of release ids to limit builds by.
         page: Which page of search results are desired.
         rows_per_pags: How many results per page are desired.
+        cursor: The next_cursor of the previous page, to seek to the next page instead.
+        count: Whether to count the builds. Defaults to true for pages and false for cursors.
 
     Args:
         request (pyramid.request): The current request, containing the search criteria documented
@@ -85,7 +86,8 @@ def query_builds(request):
             page: The current page.
             pages: The total number of pages.
             rows_per_page: The number of rows per page.
-            total: The number of builds that match the search criteria.
+            total: The number of builds that match the search criteria, if they were counted.
+            next_cursor: The cursor of the next page, or None if this is the last one.
     """
     db = request.db
     data = request.validated
@@ -113,22 +115,4 @@ def query_builds(request):
         query = query.join(Build.release)
         query = query.filter(or_(*[Release.id == r.id for r in releases]))
 
-    # We can't use ``query.count()`` here because it is naive with respect to
-    # all the joins that we're doing above.
-    count_query = query.with_labels().statement\
-        .with_only_columns([func.count(distinct(Build.nvr))])\
-        .order_by(None)
-    total = db.execute(count_query).scalar()
-
-    page = data.get('page')
-    rows_per_page = data.get('rows_per_page')
-    pages = int(math.ceil(total / float(rows_per_page)))
-    query = query.offset(rows_per_page * (page - 1)).limit(rows_per_page)
-
-    return dict(
-        builds=query.all(),
-        page=page,
-        pages=pages,
-        rows_per_page=rows_per_page,
-        total=total,
-    )
+    return bodhi.server.util.paginate(request, query, Build, 'builds')
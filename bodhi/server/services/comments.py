@@ -18,12 +18,9 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 """Define the service endpoints that handle Comments."""
 
-import math
-
 from cornice import Service
 from cornice.validators import colander_body_validator
 from pyramid.httpexceptions import HTTPBadRequest
-from sqlalchemy import func, distinct
 from sqlalchemy.sql import or_
 
 from bodhi.server import log
@@ -45,6 +42,7 @@ import bodhi.server.captcha
 import bodhi.server.schemas
 import bodhi.server.security
 import bodhi.server.services.errors
+import bodhi.server.util
 
 
 comment = Service(
@@ -120,7 +118,8 @@ def query_comments(request):
             page: The current page number.
             pages: The total number of pages.
             rows_per_page: The number of rows per page.
-            total: The number of items matching the search terms.
+            total: The number of items matching the search terms, if they were counted.
+            next_cursor: The cursor of the next page, or None if this is the last one.
             chrome: A boolean indicating whether to paginate or not.
     """
     db = request.db
@@ -166,28 +165,12 @@ def query_comments(request):
     if user is not None:
         query = query.filter(Comment.user == user)
 
-    query = query.order_by(Comment.timestamp.desc())
-
-    # We can't use ``query.count()`` here because it is naive with respect to
-    # all the joins that we're doing above.
-    count_query = query.with_labels().statement\
-        .with_only_columns([func.count(distinct(Comment.id))])\
-        .order_by(None)
-    total = db.execute(count_query).scalar()
-
-    page = data.get('page')
-    rows_per_page = data.get('rows_per_page')
-    pages = int(math.ceil(total / float(rows_per_page)))
-    query = query.offset(rows_per_page * (page - 1)).limit(rows_per_page)
-
-    return dict(
-        comments=query.all(),
-        page=page,
-        pages=pages,
-        rows_per_page=rows_per_page,
-        total=total,
+    result = bodhi.server.util.paginate(request, query, Comment, 'comments',
+                                         order_by=Comment.timestamp)
+    result.update(
         chrome=data.get('chrome'),
     )
+    return result
 
 
 @comments.post(schema=bodhi.server.schemas.SaveCommentSchema,
@@ -51,17 +51,32 @@ class Compose(object):
         """
         return [(Allow, Everyone, 'view_composes')]
 
+    @view(accept=('application/json', 'text/json'), renderer='json',
+          cors_origins=security.cors_origins_ro, error_handler=errors.json_handler,
+          permission='view_composes')
+    @view(accept=('application/javascript'), renderer='jsonp',
+          cors_origins=security.cors_origins_ro, error_handler=errors.jsonp_handler,
+          permission='view_composes')
     @view(accept=('text/html',), renderer='composes.html', cors_origins=security.cors_origins_ro,
           permission='view_composes')
     def collection_get(self):
         """
         List composes.
 
+        The JSON representation of each compose includes its state and the timings, progress and
+        counters of its stages.
+
         Returns:
             dict: A dictionary mapping the key 'composes' to an iterable of all Compose objects.
         """
         return {'composes': sorted(models.Compose.query.all())}
 
+    @view(accept=('application/json', 'text/json'), renderer='json',
+          cors_origins=security.cors_origins_ro, error_handler=errors.json_handler,
+          permission='view_composes')
+    @view(accept=('application/javascript'), renderer='jsonp',
+          cors_origins=security.cors_origins_ro, error_handler=errors.jsonp_handler,
+          permission='view_composes')
     @view(accept=('text/html',), renderer='compose.html', cors_origins=security.cors_origins_ro,
           permission='view_composes')
     def get(self):
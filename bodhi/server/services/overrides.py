@@ -18,19 +18,17 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 """Define API endpoints for managing and searching buildroot overrides."""
 
-import math
-
 from cornice import Service
 from cornice.validators import colander_body_validator
 from pyramid.exceptions import HTTPNotFound
 
-from sqlalchemy import func, distinct
 from sqlalchemy.sql import or_
 
 from bodhi.server import log, security
 from bodhi.server.models import Build, BuildrootOverride, Package, Release, User
 import bodhi.server.schemas
 import bodhi.server.services.errors
+import bodhi.server.util
 from bodhi.server.validators import (
     colander_querystring_validator,
     validate_override_builds,
@@ -139,7 +137,8 @@ def query_overrides(request):
             page: The current page number in the results.
             pages: The number of pages of results that match the query.
             rows_per_page: The number of rows on the page.
-            total: The total number of overrides that match the criteria.
+            total: The total number of overrides that match the criteria, if they were counted.
+            next_cursor: The cursor of the next page, or None if this is the last one.
             chrome: The caller supplied chrome.
             display_user: The current username.
     """
@@ -185,29 +184,13 @@ def query_overrides(request):
     if submitter is not None:
         query = query.filter(BuildrootOverride.submitter == submitter)
 
-    query = query.order_by(BuildrootOverride.submission_date.desc())
-
-    # We can't use ``query.count()`` here because it is naive with respect to
-    # all the joins that we're doing above.
-    count_query = query.with_labels().statement\
-        .with_only_columns([func.count(distinct(BuildrootOverride.id))])\
-        .order_by(None)
-    total = db.execute(count_query).scalar()
-
-    page = data.get('page')
-    rows_per_page = data.get('rows_per_page')
-    pages = int(math.ceil(total / float(rows_per_page)))
-    query = query.offset(rows_per_page * (page - 1)).limit(rows_per_page)
-
-    return dict(
-        overrides=query.all(),
-        page=page,
-        pages=pages,
-        rows_per_page=rows_per_page,
-        total=total,
+    result = bodhi.server.util.paginate(request, query, BuildrootOverride, 'overrides',
+                                         order_by=BuildrootOverride.submission_date)
+    result.update(
         chrome=data.get('chrome'),
         display_user=data.get('display_user'),
     )
+    return result
 
 
 @overrides.post(schema=bodhi.server.schemas.SaveOverrideSchema,
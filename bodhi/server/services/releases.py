@@ -18,12 +18,9 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 """Defines API endpoints related to Release objects."""
 
-import math
-
 from cornice import Service
 from cornice.validators import colander_body_validator
 from pyramid.exceptions import HTTPNotFound
-from sqlalchemy import func, distinct
 from sqlalchemy.sql import or_
 
 from bodhi.server import log, security
@@ -46,6 +43,7 @@ from bodhi.server.validators import (
 )
 import bodhi.server.schemas
 import bodhi.server.services.errors
+import bodhi.server.util
 
 
 release = Service(name='release', path='/releases/{name}',
@@ -233,7 +231,8 @@ def query_releases_json(request):
             page: The current page.
             pages: The total number of pages.
             rows_per_page: The number of rown on a page.
-            total: The number of matching results.
+            total: The number of matching results, if they were counted.
+            next_cursor: The cursor of the next page, or None if this is the last one.
     """
     db = request.db
     data = request.validated
@@ -260,25 +259,7 @@ def query_releases_json(request):
         query = query.join(Release.builds).join(Build.package)
         query = query.filter(or_(*[Package.id == p.id for p in packages]))
 
-    # We can't use ``query.count()`` here because it is naive with respect to
-    # all the joins that we're doing above.
-    count_query = query.with_labels().statement\
-        .with_only_columns([func.count(distinct(Release.id))])\
-        .order_by(None)
-    total = db.execute(count_query).scalar()
-
-    page = data.get('page')
-    rows_per_page = data.get('rows_per_page')
-    pages = int(math.ceil(total / float(rows_per_page)))
-    query = query.offset(rows_per_page * (page - 1)).limit(rows_per_page)
-
-    return dict(
-        releases=query.all(),
-        page=page,
-        pages=pages,
-        rows_per_page=rows_per_page,
-        total=total,
-    )
+    return bodhi.server.util.paginate(request, query, Release, 'releases')
 
 
 @releases.post(schema=bodhi.server.schemas.SaveReleaseSchema,
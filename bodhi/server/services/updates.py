@@ -19,11 +19,9 @@
 """Defines service endpoints pertaining to Updates."""
 
 import copy
-import math
 
 from cornice import Service
 from cornice.validators import colander_body_validator
-from sqlalchemy import func, distinct
 from sqlalchemy.sql import or_
 
 from bodhi.server import log, security
@@ -241,12 +239,13 @@ def query_updates(request):
             page: The current page.
             pages: The total number of pages.
             rows_per_page: How many results on on the page.
-            total: The total number of updates matching the query.
+            total: The total number of updates matching the query, if they were counted.
+            next_cursor: The cursor of the next page, or None if this is the last one.
             package: The package corresponding to the first update found in the search.
     """
     db = request.db
     data = request.validated
-    query = db.query(Update)
+    query = db.query(Update).options(*Update.loading_profile('list'))
 
     approved_since = data.get('approved_since')
     if approved_since is not None:
@@ -373,31 +372,15 @@ def query_updates(request):
     if alias is not None:
         query = query.filter(or_(*[Update.alias == a for a in alias]))
 
-    query = query.order_by(Update.date_submitted.desc())
-
-    # We can't use ``query.count()`` here because it is naive with respect to
-    # all the joins that we're doing above.
-    count_query = query.with_labels().statement\
-        .with_only_columns([func.count(distinct(Update.id))])\
-        .order_by(None)
-    total = db.execute(count_query).scalar()
-
-    page = data.get('page')
-    rows_per_page = data.get('rows_per_page')
-    pages = int(math.ceil(total / float(rows_per_page)))
-    query = query.offset(rows_per_page * (page - 1)).limit(rows_per_page)
-
-    return dict(
-        updates=query.all(),
-        page=page,
-        pages=pages,
-        rows_per_page=rows_per_page,
-        total=total,
+    result = bodhi.server.util.paginate(request, query, Update, 'updates',
+                                         order_by=Update.date_submitted)
+    result.update(
         chrome=data.get('chrome'),
         display_user=data.get('display_user', False),
         display_request=data.get('display_request', True),
         package=package,
     )
+    return result
 
 
 @updates.post(schema=bodhi.server.schemas.SaveUpdateSchema,
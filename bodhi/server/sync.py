@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2018 Red Hat, Inc. and others.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+Watch the master mirror until freshly composed repositories have been synchronized to it.
+
+The masher hands a :class:`SyncWatcher` the expected repomd.xml checksum and master mirror URL for
+every architecture of a repository. Each architecture is polled from its own thread with
+conditional HTTP requests, and the interval between polls grows from a few seconds up to a
+ceiling while nothing changes. A watcher can also be told that its repository is synchronized
+through :func:`notify_synced`, which the :class:`bodhi.server.consumers.synced.SyncedHandler` calls
+when a message arrives saying so.
+"""
+
+from email.utils import formatdate
+import hashlib
+import logging
+import threading
+import time
+
+from six.moves import BaseHTTPServer, socketserver, urllib
+
+from bodhi.server.config import config
+
+
+log = logging.getLogger('bodhi')
+
+# The SyncWatchers that are currently waiting, keyed by the repository they are waiting for.
+_watchers = {}
+_watchers_lock = threading.Lock()
+
+
+def notify_synced(repo, arch=None):
+    """
+    Tell the SyncWatcher waiting on the given repository that the repository is synchronized.
+
+    Args:
+        repo (basestring): The repository that has been synchronized, e.g., f27-updates-testing.
+        arch (basestring or None): If given, only this architecture is marked as synchronized.
+            If None (the default), all architectures are marked as synchronized.
+    Returns:
+        bool: True if a SyncWatcher was waiting on the repository, False otherwise.
+    """
+    with _watchers_lock:
+        watcher = _watchers.get(repo)
+    if watcher is None:
+        log.debug('No sync watcher is waiting on %s', repo)
+        return False
+    watcher.mark_synced(arch)
+    return True
+
+
+class SyncTarget(object):
+    """
+    Track the polling state of a single architecture of a repository on the master mirror.
+
+    Attributes:
+        arch (basestring): The architecture being watched.
+        url (basestring): The master mirror URL of the architecture's repomd.xml.
+        checksum (basestring): The expected SHA1 hex digest of repomd.xml.
+        etag (basestring or None): The ETag the mirror last returned, if any.
+        last_modified (basestring or None): The Last-Modified header the mirror last returned.
+        last_checksum (basestring or None): The SHA1 hex digest of the last repomd.xml the mirror
+            returned.
+        polls (int): How many requests have been made to the mirror.
+        synced (threading.Event): Set once the architecture is known to be synchronized.
+    """
+
+    def __init__(self, arch, url, checksum):
+        """
+        Initialize the SyncTarget.
+
+        Args:
+            arch (basestring): The architecture being watched.
+            url (basestring): The master mirror URL of the architecture's repomd.xml.
+            checksum (basestring): The expected SHA1 hex digest of repomd.xml.
+        """
+        self.arch = arch
+        self.url = url
+        self.checksum = checksum
+        self.etag = None
+        self.last_modified = None
+        self.last_checksum = None
+        self.polls = 0
+        self.synced = threading.Event()
+
+    def __repr__(self):
+        """
+        Return a string representation of the SyncTarget.
+
+        Returns:
+            basestring: A string representation of the SyncTarget.
+        """
+        return '<SyncTarget %s %s>' % (self.arch, self.url)
+
+
+class SyncWatcher(object):
+    """
+    Wait for all architectures of a repository to appear on the master mirror.
+
+    Every architecture is polled concurrently. A request carries the ETag and Last-Modified values
+    of the previous response, so a mirror that hasn't changed answers with a cheap
+    304 Not Modified. The interval between polls starts at ``sync_watcher.initial_interval``
+    seconds, is multiplied by ``sync_watcher.backoff`` after each poll that shows no change, and
+    never exceeds ``sync_watcher.max_interval``. When the mirror serves a changed but still
+    mismatching repomd.xml, a sync is in progress and the interval drops back to its initial
+    value.
+    """
+
+    def __init__(self, repo, targets, log=log, initial_interval=None, max_interval=None,
+                 backoff=None):
+        """
+        Initialize the SyncWatcher.
+
+        Args:
+            repo (basestring): The name of the repository being watched, e.g.,
+                f27-updates-testing. This is the key that :func:`notify_synced` uses.
+            targets (list): A list of :class:`SyncTarget` objects, one per architecture.
+            log (logging.Logger): A logger to use while watching.
+            initial_interval (float or None): Seconds to wait after the first poll. Defaults to the
+                ``sync_watcher.initial_interval`` setting.
+            max_interval (float or None): The longest the watcher will wait between polls.
+                Defaults to the ``sync_watcher.max_interval`` setting.
+            backoff (float or None): The factor the interval is multiplied by after each poll that
+                shows no change. Defaults to the ``sync_watcher.backoff`` setting.
+        """
+        self.repo = repo
+        self.targets = targets
+        self.log = log
+        if initial_interval is None:
+            initial_interval = config.get('sync_watcher.initial_interval')
+        if max_interval is None:
+            max_interval = config.get('sync_watcher.max_interval')
+        if backoff is None:
+            backoff = config.get('sync_watcher.backoff')
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+
+    def mark_synced(self, arch=None):
+        """
+        Mark the given architecture, or all architectures, as synchronized.
+
+        Args:
+            arch (basestring or None): The architecture to mark. If None, all are marked.
+        """
+        for target in self.targets:
+            if arch is None or target.arch == arch:
+                self.log.info('%s %s was announced as synced', self.repo, target.arch)
+                target.synced.set()
+
+    def next_interval(self, interval, changed):
+        """
+        Return how long to wait before polling again.
+
+        Args:
+            interval (float): The interval that was used before the latest poll.
+            changed (bool): Whether the latest poll showed that the mirror's repomd.xml changed.
+        Returns:
+            float: The number of seconds to wait before the next poll.
+        """
+        if changed:
+            return self.initial_interval
+        return min(interval * self.backoff, self.max_interval)
+
+    def poll(self, target):
+        """
+        Make a single conditional request for the target's repomd.xml.
+
+        Args:
+            target (SyncTarget): The architecture to poll.
+        Returns:
+            tuple: A 2-tuple of booleans. The first is True if the mirror serves the expected
+                repomd.xml. The second is True if the mirror's content changed since the previous
+                poll.
+        Raises:
+            urllib.error.URLError: If the mirror could not be reached, or if it returned an error
+                other than 304 Not Modified.
+        """
+        request = urllib.request.Request(target.url)
+        if target.etag:
+            request.add_header('If-None-Match', target.etag)
+        if target.last_modified:
+            request.add_header('If-Modified-Since', target.last_modified)
+
+        target.polls += 1
+        self.log.debug('Polling %s', target.url)
+        try:
+            response = urllib.request.urlopen(request)
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return False, False
+            raise
+
+        try:
+            newsum = hashlib.sha1(response.read()).hexdigest()
+            headers = response.info()
+        finally:
+            response.close()
+        changed = newsum != target.last_checksum
+        target.last_checksum = newsum
+        target.etag = headers.get('ETag')
+        target.last_modified = headers.get('Last-Modified')
+
+        if newsum == target.checksum:
+            return True, True
+        self.log.debug("master repomd.xml doesn't match! %s != %s for %s %s",
+                       target.checksum, newsum, self.repo, target.arch)
+        return False, changed
+
+    def watch(self, target):
+        """
+        Poll the target until it is synchronized or is announced as synchronized.
+
+        Args:
+            target (SyncTarget): The architecture to watch.
+        """
+        interval = self.initial_interval
+        while not target.synced.is_set():
+            try:
+                matched, changed = self.poll(target)
+            except urllib.error.URLError:
+                self.log.exception('Error fetching repomd.xml')
+                matched, changed = False, False
+            if matched:
+                self.log.info('master repomd.xml matches for %s after %d polls!', target.arch,
+                              target.polls)
+                target.synced.set()
+                break
+            interval = self.next_interval(interval, changed)
+            target.synced.wait(interval)
+
+    def wait(self):
+        """Block until every target is synchronized."""
+        with _watchers_lock:
+            _watchers[self.repo] = self
+        start = time.time()
+        try:
+            threads = []
+            for target in self.targets:
+                thread = threading.Thread(target=self.watch, args=(target,),
+                                          name='%s-sync-%s' % (self.repo, target.arch))
+                thread.daemon = True
+                thread.start()
+                threads.append(thread)
+            for thread in threads:
+                thread.join()
+        finally:
+            with _watchers_lock:
+                if _watchers.get(self.repo) is self:
+                    del _watchers[self.repo]
+        self.log.info('%s synced to the master mirror in %.1f seconds (%d polls)', self.repo,
+                      time.time() - start, sum(t.polls for t in self.targets))
+
+
+class DevMirror(object):
+    """
+    A local HTTP stand-in for the master mirror, used during development and testing.
+
+    Files are published into memory with :meth:`publish` and served from
+    ``http://127.0.0.1:<port>/<path>``. Responses carry ETag and Last-Modified headers and
+    conditional requests are answered with 304 Not Modified, just like the real master mirror does.
+
+    Attributes:
+        requests (list): A list of (time, path, status) tuples, one for each request served.
+    """
+
+    def __init__(self):
+        """Initialize the DevMirror."""
+        self.files = {}
+        self.requests = []
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        """
+        Return the base URL of the running mirror.
+
+        Returns:
+            basestring: The URL the mirror is serving on.
+        """
+        return 'http://127.0.0.1:%d' % self._server.server_address[1]
+
+    def publish(self, path, content):
+        """
+        Publish content at the given path, as an rsync to the master mirror would.
+
+        Args:
+            path (basestring): The path to serve the content at, e.g., /f27/x86_64/repomd.xml.
+            content (str): The content to serve.
+        """
+        with self._lock:
+            self.files[path] = (content, hashlib.sha1(content).hexdigest(),
+                                formatdate(time.time(), usegmt=True))
+
+    def start(self):
+        """Start serving on a free local port in a background thread."""
+        mirror = self
+
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+            def do_GET(self):
+                with mirror._lock:
+                    published = mirror.files.get(self.path)
+                if published is None:
+                    status = 404
+                else:
+                    content, etag, last_modified = published
+                    # As in RFC 7232, If-None-Match takes precedence over If-Modified-Since.
+                    if self.headers.get('If-None-Match'):
+                        not_modified = self.headers.get('If-None-Match') == etag
+                    else:
+                        not_modified = self.headers.get('If-Modified-Since') == last_modified
+                    if not_modified:
+                        status = 304
+                    else:
+                        status = 200
+                mirror.requests.append((time.time(), self.path, status))
+                self.send_response(status)
+                if published is not None:
+                    self.send_header('ETag', etag)
+                    self.send_header('Last-Modified', last_modified)
+                if status == 200:
+                    self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                if status == 200:
+                    self.wfile.write(content)
+
+            def log_message(self, *args):
+                pass
+
+        class Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+            daemon_threads = True
+
+        self._server = Server(('127.0.0.1', 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, name='dev-mirror')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving."""
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
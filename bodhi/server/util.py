@@ -20,15 +20,20 @@
 
 from collections import defaultdict
 from contextlib import contextmanager
+from datetime import datetime
+import base64
 import collections
 import functools
 import hashlib
 import json
+import math
 import os
 import pkg_resources
 import socket
+import sqlite3
 import subprocess
 import tempfile
+import threading
 import time
 import urllib
 
@@ -42,7 +47,9 @@ import librepo
 import markdown
 import requests
 import rpm
+from six.moves import cPickle as pickle
 from six.moves import map
+from sqlalchemy import and_, distinct, func, or_
 import six
 
 from bodhi.server import log, buildsys, Session
@@ -60,10 +67,252 @@ def header(x):
     return u"%s\n     %s\n%s\n" % ('=' * 80, x, '=' * 80)
 
 
+class SQLiteCache(object):
+    """
+    A table of serialized values in a SQLite database, which any number of threads and processes
+    can share.
+
+    Each thread uses a connection of its own. Every value remembers when it was last used, so that
+    the values that haven't been used for a while can be evicted. Reads don't write to the
+    database: the times the values were used are written in batches of ``batch_size``, and by
+    :meth:`flush`, :meth:`evict` and :meth:`close`.
+    """
+
+    # The number of keys to look up with a single query, which must stay below SQLite's limit of
+    # 999 parameters. It is also how many use times are written at once.
+    batch_size = 500
+
+    def __init__(self, path, table):
+        """
+        Open the table, creating it if it doesn't exist yet.
+
+        Args:
+            path (basestring): The path of the SQLite database.
+            table (basestring): The name of the table to keep the values in.
+        """
+        self.path = path
+        self.table = table
+        # SQLite connections can't be shared between threads.
+        self._local = threading.local()
+        # The keys that were read since the last flush(), and when.
+        self._used = {}
+        self._lock = threading.Lock()
+        with self._connection() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS %s '
+                '(key TEXT PRIMARY KEY, value BLOB NOT NULL, last_used REAL NOT NULL)' % table)
+            conn.execute('CREATE INDEX IF NOT EXISTS %s_last_used ON %s (last_used)' % (
+                table, table))
+
+    def _connection(self):
+        """
+        Return the current thread's connection to the database, connecting if necessary.
+
+        Returns:
+            sqlite3.Connection: The connection.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Other processes may be holding the lock while they write, so be patient with them.
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=60)
+        return conn
+
+    def get_many(self, keys):
+        """
+        Return the values of the given keys that are stored, and mark them as recently used.
+
+        Args:
+            keys (list): The keys to look up.
+        Returns:
+            dict: A mapping of the keys that are stored to their serialized values.
+        """
+        found = {}
+        conn = self._connection()
+        for i in range(0, len(keys), self.batch_size):
+            batch = [six.text_type(key) for key in keys[i:i + self.batch_size]]
+            found.update(conn.execute(
+                'SELECT key, value FROM %s WHERE key IN (%s)' % (
+                    self.table, ', '.join('?' * len(batch))),
+                batch).fetchall())
+        now = time.time()
+        with self._lock:
+            self._used.update((key, now) for key in found)
+            full = len(self._used) >= self.batch_size
+        if full:
+            self.flush()
+        return found
+
+    def set_many(self, values):
+        """
+        Store the given values.
+
+        Args:
+            values (dict): A mapping of keys to serialized values.
+        """
+        now = time.time()
+        with self._connection() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO %s (key, value, last_used) VALUES (?, ?, ?)' % self.table,
+                [(six.text_type(key), value, now) for key, value in values.items()])
+
+    def flush(self):
+        """Write when the values that were read since the last flush were used."""
+        with self._lock:
+            used, self._used = self._used, {}
+        if used:
+            with self._connection() as conn:
+                conn.executemany('UPDATE %s SET last_used = ? WHERE key = ?' % self.table,
+                                 [(last_used, key) for key, last_used in used.items()])
+
+    def evict(self, max_age, max_entries=None):
+        """
+        Evict the values that are too old, and the least recently used ones beyond max_entries.
+
+        Args:
+            max_age (int): How many days to keep values that aren't used.
+            max_entries (int or None): How many values to keep, or None to keep them all.
+        Returns:
+            int: The number of values that were evicted.
+        """
+        self.flush()
+        with self._connection() as conn:
+            evicted = conn.execute(
+                'DELETE FROM %s WHERE last_used < ?' % self.table,
+                (time.time() - max_age * 24 * 60 * 60,)).rowcount
+            if max_entries is not None:
+                evicted += conn.execute(
+                    'DELETE FROM {0} WHERE key NOT IN '
+                    '(SELECT key FROM {0} ORDER BY last_used DESC LIMIT ?)'.format(self.table),
+                    (max_entries,)).rowcount
+        return evicted
+
+    def close(self):
+        """Write the pending use times, and close the current thread's connection."""
+        self.flush()
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class RPMHeaderCache(object):
+    """
+    Cache the RPM headers that :func:`get_rpm_header` retrieves from Koji.
+
+    The headers of a build never change, so the headers of the most recently used builds are kept
+    in memory, and can also be kept in a :class:`SQLiteCache`. Builds that weren't used for max_age
+    days are evicted from the database when it is opened.
+
+    Attributes:
+        hits (int): How many lookups found their build in the cache.
+        misses (int): How many lookups didn't find their build in the cache.
+    """
+
+    def __init__(self, size, path=None, max_age=30):
+        """
+        Initialize the RPMHeaderCache.
+
+        Args:
+            size (int): How many builds to keep in memory. With 0, nothing is kept in memory.
+            path (basestring or None): The path of the SQLite database to also keep the headers in,
+                or None to only keep them in memory.
+            max_age (int): How many days to keep builds that aren't used in the database.
+        """
+        self.size = size
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._headers = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path is not None:
+            self._db = SQLiteCache(path, 'rpm_headers')
+            self._db.evict(max_age)
+
+    def get(self, nvr):
+        """
+        Return the headers of the given build, or None if they aren't cached.
+
+        Args:
+            nvr (basestring): The nvr of the build.
+        Returns:
+            dict or None: A copy of the cached headers.
+        """
+        nvr = six.text_type(nvr)
+        with self._lock:
+            header = self._headers.pop(nvr, None)
+            if header is not None:
+                self._headers[nvr] = header
+        if header is None and self._db is not None:
+            stored = self._db.get_many([nvr]).get(nvr)
+            if stored is not None:
+                header = pickle.loads(bytes(stored))
+                self._remember(nvr, header)
+        with self._lock:
+            if header is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return dict(header)
+
+    def set(self, nvr, header):
+        """
+        Store the headers of the given build.
+
+        Args:
+            nvr (basestring): The nvr of the build.
+            header (dict): The headers, as returned by Koji.
+        """
+        nvr = six.text_type(nvr)
+        header = dict(header)
+        self._remember(nvr, header)
+        if self._db is not None:
+            self._db.set_many({nvr: sqlite3.Binary(pickle.dumps(header, 2))})
+
+    def _remember(self, nvr, header):
+        """
+        Keep the given headers in memory, forgetting the least recently used ones beyond size.
+
+        Args:
+            nvr (six.text_type): The nvr of the build.
+            header (dict): The headers.
+        """
+        if not self.size:
+            return
+        with self._lock:
+            self._headers.pop(nvr, None)
+            self._headers[nvr] = header
+            while len(self._headers) > self.size:
+                self._headers.popitem(last=False)
+
+
+_rpm_header_cache = None
+_rpm_header_cache_lock = threading.Lock()
+
+
+def get_rpm_header_cache():
+    """
+    Return the RPMHeaderCache of this process, creating it from the settings the first time.
+
+    Returns:
+        RPMHeaderCache: The cache that get_rpm_header() uses.
+    """
+    global _rpm_header_cache
+    with _rpm_header_cache_lock:
+        if _rpm_header_cache is None:
+            _rpm_header_cache = RPMHeaderCache(config.get('rpm_header_cache.size'),
+                                               config.get('rpm_header_cache.path'),
+                                               config.get('rpm_header_cache.max_age'))
+        return _rpm_header_cache
+
+
 def get_rpm_header(nvr, tries=0):
     """
     Get the rpm header for a given build.
 
+    The headers are cached by the :class:`RPMHeaderCache` of the process, so each build's headers
+    are only retrieved from Koji once.
+
     Args:
         nvr (basestring): The name-version-release string of the build you want headers for.
         tries (int): The number of attempts that have been made to retrieve the nvr so far. Defaults
@@ -71,6 +320,12 @@ def get_rpm_header(nvr, tries=0):
     Returns:
         dict: A dictionary mapping RPM header names to their values, as returned by the Koji client.
     """
+    cache = get_rpm_header_cache()
+    if not tries:
+        result = cache.get(nvr)
+        if result is not None:
+            return result
+
     tries += 1
     headers = [
         'name', 'summary', 'version', 'release', 'url', 'description',
@@ -91,6 +346,7 @@ def get_rpm_header(nvr, tries=0):
             raise
 
     if result:
+        cache.set(nvr, result)
         return result
 
     raise ValueError("No rpm headers found in koji for %r" % nvr)
@@ -283,18 +539,20 @@ def get_critpath_components(collection='master', component_type='rpm', component
     return critpath_components
 
 
-def sanity_check_repodata(myurl):
+def sanity_check_repodata(myurl, destdir=None):
     """
     Sanity check the repodata for a given repository.
 
     Args:
         myurl (basestring): A path to a repodata directory.
+        destdir (basestring or None): An empty directory for librepo to download the repodata to.
+            If None, a new temporary directory is created.
     Raises:
         bodhi.server.exceptions.RepodataException: If the repodata is not valid or does not exist.
     """
     h = librepo.Handle()
     h.setopt(librepo.LRO_REPOTYPE, librepo.LR_YUMREPO)
-    h.setopt(librepo.LRO_DESTDIR, tempfile.mkdtemp())
+    h.setopt(librepo.LRO_DESTDIR, destdir or tempfile.mkdtemp())
 
     if myurl[-1] != '/':
         myurl += '/'
@@ -867,6 +1125,140 @@ def page_url(context, page):
     return request.path_url + "?" + urllib.urlencode(params)
 
 
+CURSOR_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+def encode_cursor(value, row_id):
+    """
+    Return the opaque cursor pointing right after a row of paginated results.
+
+    Args:
+        value (object): The value of the column the results are ordered by in the row, or None if
+            it is NULL there or the results are only ordered by id.
+        row_id (int): The id of the row.
+    Returns:
+        basestring: A URL safe string that can be given back to decode_cursor().
+    """
+    if isinstance(value, datetime):
+        value = {'datetime': value.strftime(CURSOR_DATETIME_FORMAT)}
+    cursor = json.dumps([value, row_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(cursor).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    Return the ordering value and the id of the row an opaque cursor points after.
+
+    Args:
+        cursor (basestring): A cursor that was returned by encode_cursor().
+    Returns:
+        tuple: The value of the ordering column and the row id that were given to encode_cursor().
+    Raises:
+        ValueError: If the cursor wasn't returned by encode_cursor().
+    """
+    try:
+        value, row_id = json.loads(base64.urlsafe_b64decode(str(cursor)).decode('utf-8'))
+        if isinstance(value, dict):
+            value = datetime.strptime(value['datetime'], CURSOR_DATETIME_FORMAT)
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('Invalid cursor: %s' % cursor)
+    if not isinstance(row_id, six.integer_types):
+        raise ValueError('Invalid cursor: %s' % cursor)
+    return value, row_id
+
+
+def paginate(request, query, model, key, order_by=None):
+    """
+    Return a page of the results of a listing query, selected by page number or by cursor.
+
+    A page that is selected by its ``page`` number makes the database go through the rows of all
+    the previous pages. Every page also comes with a ``next_cursor``, which can be given back as
+    the ``cursor`` to seek directly past the last row of the page instead, so crawling the results
+    costs the same for every page. The results are ordered by the given column, newest first with
+    the rows where it is NULL last, and then by id, so rows sharing a value of the column keep a
+    stable order between pages.
+
+    Counting the results is another query, which is run for page numbers unless ``count`` is
+    false. It is skipped for cursors unless ``count`` is true, and then served from the cache
+    region, since crawlers ask for the same total on every page.
+
+    Args:
+        request (pyramid.request): The current request. Its validated ``page``,
+            ``rows_per_page``, ``cursor`` and ``count`` parameters select the page.
+        query (sqlalchemy.orm.query.Query): The query for the results, without any ordering.
+        model (bodhi.server.models.Base): The class of the results.
+        key (basestring): The key to return the results with.
+        order_by (sqlalchemy.Column or None): The column to order the results by, descending. If
+            None, the results are ordered by ascending id.
+    Returns:
+        dict: A dictionary with the following key value mappings:
+            <key>: The results on the page.
+            page: The current page, or None when the page was selected by cursor.
+            pages: The total number of pages, or None if the results weren't counted.
+            rows_per_page: The number of rows per page.
+            total: The number of results, or None if they weren't counted.
+            next_cursor: The cursor of the next page, or None if this is the last one.
+    """
+    data = request.validated
+    page = data.get('page')
+    rows_per_page = data.get('rows_per_page')
+    cursor = data.get('cursor')
+    count = data.get('count')
+    if count is None:
+        count = cursor is None
+
+    total = pages = None
+    if count:
+        # We can't use ``query.count()`` here because it is naive with respect to
+        # all the joins that the services do.
+        count_query = query.with_labels().statement\
+            .with_only_columns([func.count(distinct(model.id))])\
+            .order_by(None)
+        if cursor is None:
+            total = request.db.execute(count_query).scalar()
+        else:
+            compiled = count_query.compile()
+
+            @request.cache.cache_on_arguments()
+            def count_results(digest):
+                return request.db.execute(count_query).scalar()
+
+            statement = '%s %r' % (compiled, sorted(compiled.params.items()))
+            total = count_results(hashlib.sha1(statement.encode('utf-8')).hexdigest())
+        pages = int(math.ceil(total / float(rows_per_page)))
+
+    if order_by is None:
+        query = query.order_by(model.id)
+    else:
+        # PostgreSQL sorts NULLs first in descending order, which the seek below must agree on.
+        query = query.order_by(order_by.desc().nullslast(), model.id.desc())
+
+    if cursor is None:
+        query = query.offset(rows_per_page * (page - 1))
+    else:
+        page = None
+        value, row_id = cursor
+        if order_by is None:
+            query = query.filter(model.id > row_id)
+        elif value is None:
+            query = query.filter(and_(order_by.is_(None), model.id < row_id))
+        else:
+            query = query.filter(or_(order_by < value, and_(order_by == value, model.id < row_id),
+                                     order_by.is_(None)))
+
+    # One more row tells whether there is a next page.
+    results = query.limit(rows_per_page + 1).all()
+    next_cursor = None
+    if len(results) > rows_per_page:
+        results = results[:rows_per_page]
+        last = results[-1]
+        next_cursor = encode_cursor(
+            getattr(last, order_by.key) if order_by is not None else None, last.id)
+
+    return {key: results, 'page': page, 'pages': pages, 'rows_per_page': rows_per_page,
+            'total': total, 'next_cursor': next_cursor}
+
+
 def bug_link(context, bug, short=False):
     """
     Form a URL to a given bugzilla bug.
@@ -936,6 +1328,36 @@ def testcase_link(context, test, short=False):
     return link
 
 
+class _EVRKey(object):
+    """
+    A sort key that compares NVRs with rpm.labelCompare().
+
+    The NVR is split once when the key is created, rather than on every comparison.
+    """
+
+    __slots__ = ('evr',)
+
+    def __init__(self, nvr):
+        """
+        Initialize the _EVRKey.
+
+        Args:
+            nvr (basestring): The name-version-release string that this key sorts.
+        """
+        self.evr = get_nvr(nvr)
+
+    def __lt__(self, other):
+        """
+        Return whether this key's NVR is lower than the other's.
+
+        Args:
+            other (_EVRKey): The key to compare to.
+        Returns:
+            bool: True if this key's NVR is lower than the other's, False otherwise.
+        """
+        return rpm.labelCompare(self.evr, other.evr) < 0
+
+
 def sorted_builds(builds):
     """
     Sort the given builds by their NVRs.
@@ -945,9 +1367,7 @@ def sorted_builds(builds):
     Returns:
         list: A list of Builds sorted by NVR.
     """
-    return sorted(builds,
-                  cmp=lambda x, y: rpm.labelCompare(get_nvr(x), get_nvr(y)),
-                  reverse=True)
+    return sorted(builds, key=_EVRKey, reverse=True)
 
 
 def sorted_updates(updates):
@@ -966,7 +1386,8 @@ def sorted_updates(updates):
     """
     builds = defaultdict(set)
     build_to_update = {}
-    sync, async = [], []
+    # These are used as ordered sets, so that membership tests and removals don't scan the lists.
+    sync, async = collections.OrderedDict(), collections.OrderedDict()
     for update in updates:
         for build in update.builds:
             n, v, r = get_nvr(build.nvr)
@@ -978,14 +1399,13 @@ def sorted_updates(updates):
             log.debug(builds[package])
             for build in sorted_builds(builds[package])[::-1]:
                 update = build_to_update[build]
-                if update not in sync:
-                    sync.append(update)
-                if update in async:
-                    async.remove(update)
+                sync.setdefault(update)
+                async.pop(update, None)
         else:
             update = build_to_update[builds[package].pop()]
-            if update not in async and update not in sync:
-                async.append(update)
+            if update not in sync:
+                async.setdefault(update)
+    sync, async = list(sync), list(async)
     log.info('sync = %s' % ([up.title for up in sync],))
     log.info('async = %s' % ([up.title for up in async],))
     return sync, async
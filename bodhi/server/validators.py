@@ -207,7 +207,8 @@ def validate_builds(request, **kwargs):
         return
 
     if edited:
-        up = request.db.query(Update).filter_by(title=edited).first()
+        up = request.db.query(Update).options(*Update.loading_profile('validator')).filter_by(
+            title=edited).first()
         if not up:
             request.errors.add('body', 'builds',
                                'Cannot find update to edit: %s' % edited)
@@ -692,10 +693,7 @@ def validate_release(request, **kwargs):
     if releasename is None:
         return
 
-    db = request.db
-    release = db.query(Release).filter(or_(
-        Release.name == releasename, Release.name == releasename.upper(),
-        Release.version == releasename)).first()
+    release = Release.find(releasename, request.db)
 
     if release:
         request.validated["release"] = release
@@ -716,13 +714,11 @@ def validate_releases(request, **kwargs):
     if releases is None:
         return
 
-    db = request.db
     bad_releases = []
     validated_releases = []
 
     for r in releases:
-        release = db.query(Release).filter(or_(Release.name == r, Release.name == r.upper(),
-                                               Release.version == r)).first()
+        release = Release.find(r, request.db)
 
         if not release:
             bad_releases.append(r)
@@ -839,7 +835,7 @@ def validate_update_id(request, **kwargs):
         request (pyramid.util.Request): The current request.
         kwargs (dict): The kwargs of the related service definition. Unused.
     """
-    update = Update.get(request.matchdict['id'], request.db)
+    update = Update.get(request.matchdict['id'], request.db, Update.loading_profile('detail'))
     if update:
         request.validated['update'] = update
     else:
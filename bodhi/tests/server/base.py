@@ -23,7 +23,7 @@ from webtest import TestApp
 from sqlalchemy import event
 import mock
 
-from bodhi.server import bugs, buildsys, models, initialize_db, Session, config, main
+from bodhi.server import bugs, buildsys, models, initialize_db, Session, config, main, util
 from bodhi.tests.server import create_update, populate
 
 
@@ -129,12 +129,18 @@ class BaseTestCase(unittest.TestCase):
         'cors_connect_src': 'http://0.0.0.0:6543',
         'cors_origins_ro': 'http://0.0.0.0:6543',
         'cors_origins_rw': 'http://0.0.0.0:6543',
+        # Compose stages in worker threads use their own database connections, which cannot see
+        # the test's uncommitted transaction.
+        'compose_stage_workers': 0,
+        'tag_actions.delay': 0,
+        # Post-push workers use their own database connections too.
+        'post_push.workers': 0,
     }
 
     def setUp(self):
         # Ensure "cached" objects are cleared before each test.
-        models.Release._all_releases = None
-        models.Release._tag_cache = None
+        models.Release._registry = None
+        util._rpm_header_cache = None
 
         if engine is None:
             self.engine = _configure_test_db()
@@ -252,8 +258,6 @@ class BaseTestCase(unittest.TestCase):
             override_tag=u'f{}-override'.format(version),
             branch=u'f{}'.format(version), state=models.ReleaseState.current)
         self.db.add(release)
-        models.Release._all_releases = None
-        models.Release._tag_cache = None
         self.db.flush()
         return release
 
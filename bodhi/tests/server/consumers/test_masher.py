@@ -16,14 +16,20 @@
 # You should have received a copy of the GNU General Public License
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
-from cStringIO import StringIO
 import datetime
 import dummy_threading
 import errno
+import functools
 import json
+import logging
 import os
+import pickle
 import shutil
+import smtplib
+import socket
+import sys
 import tempfile
+import threading
 import time
 import unittest
 import urllib2
@@ -32,15 +38,18 @@ import urlparse
 from click import testing
 import mock
 import six
+import sqlalchemy
 
-from bodhi.server import buildsys, exceptions, log, push
+from bodhi.server import bugs, buildsys, exceptions, log, push, sync
+from bodhi.server.consumers import masher
 from bodhi.server.config import config
 from bodhi.server.consumers.masher import (
-    checkpoint, Masher, MasherThread, RPMMasherThread, ModuleMasherThread)
+    checkpoint, ComposeScheduler, Masher, MasherProcess, MasherThread, PostPushPool,
+    RPMMasherThread, ModuleMasherThread, Stage, StageExecutor)
 from bodhi.server.exceptions import LockedUpdateException
 from bodhi.server.models import (
-    Build, BuildrootOverride, Compose, ComposeState, Release, ReleaseState, RpmBuild,
-    TestGatingStatus, Update, UpdateRequest, UpdateStatus, UpdateType, User, ModuleBuild,
+    Bug, Build, BuildrootOverride, Compose, ComposeCheckpoint, ComposeState, Release, ReleaseState,
+    RpmBuild, TestGatingStatus, Update, UpdateRequest, UpdateStatus, UpdateType, User, ModuleBuild,
     ContentType, Package)
 from bodhi.server.util import mkmetadatadir
 from bodhi.tests.server import base
@@ -107,6 +116,282 @@ class TestCheckpoint(unittest.TestCase):
         self.assertEqual(str(exc.exception), 'checkpointed functions may not return stuff')
 
 
+class TestComposeScheduler(unittest.TestCase):
+    """Test the ComposeScheduler class."""
+    class FakeThread(object):
+        """A thread that is done as soon as it starts, and remembers what was running then."""
+        def __init__(self, scheduler, name, started):
+            self.scheduler = scheduler
+            self.name = name
+            self.started = started
+            self.finished = None
+            self.join = mock.MagicMock()
+
+        def start(self):
+            self.started.append(
+                (self.name, sorted(t.name for r, t in self.scheduler.running)))
+            self.finished.put(self)
+
+    def _add(self, scheduler, started, name, release_id, request=u'testing', security=False):
+        thread = self.FakeThread(scheduler, name, started)
+        scheduler.add({'release_id': release_id, 'request': request, 'security': security},
+                      thread)
+        return thread
+
+    def test_per_release_limit(self):
+        """A compose waits while its release has max_running_per_release composes running."""
+        scheduler = ComposeScheduler(3, 1, log=mock.MagicMock())
+        started = []
+        self._add(scheduler, started, 'f27-stable', 1, u'stable')
+        self._add(scheduler, started, 'f27-testing', 1)
+        self._add(scheduler, started, 'f28-testing', 2)
+
+        finished = scheduler.run()
+
+        # f27-testing can't run alongside f27-stable, so f28-testing takes its place.
+        self.assertEqual(started, [('f27-stable', ['f27-stable']),
+                                   ('f28-testing', ['f27-stable', 'f28-testing']),
+                                   ('f27-testing', ['f27-testing', 'f28-testing'])])
+        self.assertEqual([t.name for t in finished], ['f27-stable', 'f28-testing', 'f27-testing'])
+
+    def test_priority_and_refill(self):
+        """Composes start in priority order, and a slot is refilled as soon as it is free."""
+        scheduler = ComposeScheduler(2, log=mock.MagicMock())
+        started = []
+        self._add(scheduler, started, 'f27-testing', 1)
+        self._add(scheduler, started, 'f28-testing', 2)
+        self._add(scheduler, started, 'f26-stable', 3, u'stable')
+        self._add(scheduler, started, 'f26-testing-security', 3, security=True)
+        self._add(scheduler, started, 'f28-stable-security', 2, u'stable', True)
+
+        finished = scheduler.run()
+
+        self.assertEqual(
+            started,
+            [('f28-stable-security', ['f28-stable-security']),
+             ('f26-testing-security', ['f26-testing-security', 'f28-stable-security']),
+             ('f26-stable', ['f26-stable', 'f26-testing-security']),
+             ('f27-testing', ['f26-stable', 'f27-testing']),
+             ('f28-testing', ['f27-testing', 'f28-testing'])])
+        self.assertEqual([t.name for t in finished],
+                         ['f28-stable-security', 'f26-testing-security', 'f26-stable',
+                          'f27-testing', 'f28-testing'])
+        for thread in finished:
+            thread.join.assert_called_once_with()
+        self.assertEqual(scheduler.running, [])
+
+
+class TestPostPushPool(unittest.TestCase):
+    """Test the PostPushPool class."""
+    def test_limits(self):
+        """No more calls than the limit of their service run at once."""
+        pool = PostPushPool(4, {'smtp': 1})
+        running = []
+        peak = []
+
+        def call(i):
+            running.append(i)
+            peak.append(len(running))
+            time.sleep(0.01)
+            running.remove(i)
+            return i
+
+        results = pool.run([('smtp', functools.partial(call, i)) for i in range(4)])
+
+        self.assertEqual(results, [0, 1, 2, 3])
+        self.assertEqual(max(peak), 1)
+
+    def test_concurrent(self):
+        """Calls run side by side in the worker threads."""
+        pool = PostPushPool(4, {})
+        started = []
+        all_started = threading.Event()
+
+        def call():
+            # Every call waits for all the others to start.
+            started.append(threading.current_thread().name)
+            if len(started) == 4:
+                all_started.set()
+            return all_started.wait(5)
+
+        self.assertEqual(pool.run([('bugzilla', call) for i in range(4)]), [True] * 4)
+        self.assertEqual(len(set(started)), 4)
+
+    @mock.patch('bodhi.server.consumers.masher.time.sleep')
+    def test_retries(self, sleep):
+        """A call that can't connect is retried with a doubling delay until it runs out."""
+        pool = PostPushPool(0, {}, retries=2, backoff=0.5)
+        flaky = mock.MagicMock(
+            side_effect=[socket.error(errno.ECONNREFUSED, 'Connection refused'), 'sent'])
+        broken = mock.MagicMock(side_effect=socket.gaierror(-2, 'Name or service not known'))
+        working = mock.MagicMock(return_value='sent')
+
+        self.assertEqual(pool.run([('smtp', flaky)]), ['sent'])
+        with self.assertRaises(socket.gaierror) as exc:
+            pool.run([('smtp', broken), ('smtp', working)])
+
+        self.assertEqual(exc.exception.strerror, 'Name or service not known')
+        self.assertEqual(broken.call_count, 3)
+        working.assert_called_once_with()
+        self.assertEqual(sleep.mock_calls,
+                         [mock.call(0.5), mock.call(0.5), mock.call(1.0)])
+
+    @mock.patch('bodhi.server.consumers.masher.time.sleep')
+    def test_retries_bugzilla(self, sleep):
+        """A Bugzilla call that can't connect is retried, since the Bugzilla class lets it out."""
+        pool = PostPushPool(0, {}, retries=2, backoff=0.5)
+        bz = bugs.Bugzilla()
+        bz._bz = mock.MagicMock()
+        bz._bz.getbug.side_effect = [socket.error(errno.ECONNREFUSED, 'Connection refused'),
+                                     bz._bz.getbug.return_value]
+
+        pool.run([('bugzilla', functools.partial(bz.on_qa, 1411188, 'A message.'))])
+
+        self.assertEqual(bz._bz.getbug.call_count, 2)
+        bz._bz.getbug.return_value.setstatus.assert_called_once_with('ON_QA',
+                                                                     comment='A message.')
+        self.assertEqual(sleep.mock_calls, [mock.call(0.5)])
+
+    @mock.patch('bodhi.server.consumers.masher.time.sleep')
+    def test_no_retry_once_connected(self, sleep):
+        """A call that failed after it connected isn't retried, since it may have sent something."""
+        pool = PostPushPool(0, {}, retries=2, backoff=0.5)
+        for exception in (smtplib.SMTPServerDisconnected('gone'),
+                          socket.error(errno.ECONNRESET, 'Connection reset by peer'),
+                          socket.timeout('timed out'), IOError('down')):
+            call = mock.MagicMock(side_effect=exception)
+
+            with self.assertRaises(type(exception)):
+                pool.run([('smtp', call)])
+
+            call.assert_called_once_with()
+        self.assertEqual(sleep.call_count, 0)
+
+    def test_from_config(self):
+        """The pool is configured by the post_push settings."""
+        with mock.patch.dict(config, {'post_push.workers': 6, 'post_push.retries': 1,
+                                      'post_push.backoff': 2.0, 'post_push.smtp_limit': 3}):
+            pool = PostPushPool.from_config()
+
+        self.assertEqual(pool.workers, 6)
+        self.assertEqual(pool.retries, 1)
+        self.assertEqual(pool.backoff, 2.0)
+        self.assertEqual(sorted(pool._limits), ['bugzilla', 'smtp'])
+
+
+class TestStageExecutor(unittest.TestCase):
+    """Test the StageExecutor class."""
+    def setUp(self):
+        self.masher = mock.MagicMock()
+        self.masher.name = 'f17-updates-testing'
+        self.calls = []
+
+    def _stage(self, name, duration=0, result=None, exception=None, **kwargs):
+        """Return a Stage that records its start and end in self.calls."""
+        def func():
+            self.calls.append(('start', name, threading.current_thread().name))
+            time.sleep(duration)
+            self.calls.append(('end', name))
+            if exception is not None:
+                raise exception
+            return result
+        return Stage(name, func, **kwargs)
+
+    def test_pool_stages_run_concurrently(self):
+        """Pool stages run side by side with each other and with the stages of the MasherThread."""
+        stages = [
+            self._stage('tag'),
+            self._stage('mash', duration=0.3, requires=['tag']),
+            self._stage('digest', duration=0.3, requires=['tag'], pool=True, result='digest'),
+            self._stage('updateinfo', duration=0.3, requires=['tag'], pool=True,
+                        result='uinfo'),
+            self._stage('insert', requires=['mash', 'updateinfo'])]
+        executor = StageExecutor(self.masher, stages, 2)
+
+        start = time.time()
+        results = executor.run()
+
+        self.assertTrue(time.time() - start < 0.6)
+        self.assertEqual(results,
+                         {'tag': None, 'mash': None, 'digest': 'digest', 'updateinfo': 'uinfo',
+                          'insert': None})
+        starts = dict((c[1], c[2]) for c in self.calls if c[0] == 'start')
+        self.assertEqual(starts['mash'], threading.current_thread().name)
+        self.assertEqual(starts['digest'], 'f17-updates-testing-digest')
+        self.assertEqual(starts['updateinfo'], 'f17-updates-testing-updateinfo')
+        # The pool stages must see what the MasherThread committed before them.
+        self.masher.db.commit.assert_called_once_with()
+        self.assertEqual(self.masher.worker_session.call_count, 2)
+        # insert waits for both of its requirements.
+        self.assertEqual(self.calls[-2:], [('start', 'insert', mock.ANY), ('end', 'insert')])
+        self.assertEqual(
+            sorted(c[1][0] for c in self.masher.record_stage_timing.mock_calls),
+            ['digest', 'insert', 'mash', 'tag', 'updateinfo'])
+
+    def test_no_workers(self):
+        """With 0 workers, pool stages run in the MasherThread, in order."""
+        stages = [self._stage('one', pool=True), self._stage('two', requires=['one'], pool=True)]
+
+        StageExecutor(self.masher, stages, 0).run()
+
+        self.assertEqual(
+            self.calls,
+            [('start', 'one', threading.current_thread().name), ('end', 'one'),
+             ('start', 'two', threading.current_thread().name), ('end', 'two')])
+        self.assertEqual(self.masher.worker_session.call_count, 0)
+
+    def test_failed_pool_stage(self):
+        """A failing pool stage stops the graph, and its exception is raised."""
+        stages = [
+            self._stage('fails', duration=0.1, pool=True, exception=ValueError('oops')),
+            self._stage('slow', duration=0.2, pool=True),
+            self._stage('after', requires=['fails', 'slow'])]
+
+        with self.assertRaises(ValueError) as exc:
+            StageExecutor(self.masher, stages, 2).run()
+
+        self.assertEqual(str(exc.exception), 'oops')
+        # The stage that was already running was allowed to finish, the dependent one never ran.
+        self.assertIn(('end', 'slow'), self.calls)
+        self.assertNotIn('after', [c[1] for c in self.calls])
+
+    def test_failed_stage(self):
+        """A failing stage in the MasherThread stops the graph, and its exception is raised."""
+        stages = [self._stage('fails', exception=ValueError('oops')),
+                  self._stage('after', requires=['fails'])]
+
+        with self.assertRaises(ValueError):
+            StageExecutor(self.masher, stages, 2).run()
+
+        self.assertEqual(self.calls, [('start', 'fails', mock.ANY), ('end', 'fails')])
+        self.masher.record_stage_timing.assert_called_once_with('fails', mock.ANY, mock.ANY)
+
+    def test_state(self):
+        """The Compose is moved to the stage's state when it starts."""
+        stages = [self._stage('updateinfo', pool=True, state=ComposeState.updateinfo)]
+
+        StageExecutor(self.masher, stages, 2).run()
+
+        self.masher.save_state.assert_called_once_with(ComposeState.updateinfo)
+
+    def test_unknown_requirement(self):
+        """Requiring a stage that isn't in the graph is a ValueError."""
+        with self.assertRaises(ValueError) as exc:
+            StageExecutor(self.masher, [self._stage('one', requires=['zero'])], 2)
+
+        self.assertEqual(str(exc.exception), 'Stage one requires unknown stages: zero')
+
+    def test_circular_requirements(self):
+        """Stages that require each other are a ValueError."""
+        stages = [self._stage('one', requires=['two']), self._stage('two', requires=['one'])]
+
+        with self.assertRaises(ValueError) as exc:
+            StageExecutor(self.masher, stages, 2).run()
+
+        self.assertEqual(str(exc.exception),
+                         'Stages could not be run due to circular requirements: one, two')
+
+
 @mock.patch('bodhi.server.push.initialize_db', mock.MagicMock())
 @mock.patch('bodhi.server.push.bodhi.server.notifications.init', mock.MagicMock())
 def _make_msg(transactional_session_maker, extra_push_args=None):
@@ -172,8 +457,7 @@ class TestMasher(base.BaseTestCase):
         self.masher = Masher(FakeHub(), db_factory=self.db_factory, mash_dir=self.tempdir)
 
         # Reset "cached" objects before each test.
-        Release._all_releases = None
-        Release._tag_cache = None
+        Release._registry = None
 
     def tearDown(self):
         super(TestMasher, self).tearDown()
@@ -363,7 +647,7 @@ class TestMasher(base.BaseTestCase):
         self.masher.consume(self._make_msg())
 
         # Ensure that fedmsg was called 4 times
-        self.assertEquals(len(publish.call_args_list), 3)
+        self.assertEquals(len(publish.call_args_list), 4)
 
         # Also, ensure we reported success
         publish.assert_called_with(
@@ -407,8 +691,8 @@ class TestMasher(base.BaseTestCase):
         # Start the push
         self.masher.consume(self._make_msg())
 
-        # Ensure that fedmsg was called 3 times
-        self.assertEquals(len(publish.call_args_list), 4)
+        # Ensure that fedmsg was called 5 times
+        self.assertEquals(len(publish.call_args_list), 5)
         # Also, ensure we reported success
         publish.assert_called_with(
             topic="mashtask.complete",
@@ -482,8 +766,8 @@ class TestMasher(base.BaseTestCase):
         # Start the push
         self.masher.consume(self._make_msg())
 
-        # Ensure that fedmsg was called 5 times
-        self.assertEquals(len(publish.call_args_list), 5)
+        # Ensure that fedmsg was called 6 times
+        self.assertEquals(len(publish.call_args_list), 6)
         # Also, ensure we reported success
         publish.assert_called_with(
             topic="mashtask.complete",
@@ -787,9 +1071,6 @@ References:
             update.type = UpdateType.security
             db.add(update)
 
-            # Wipe out the tag cache so it picks up our new release
-            Release._tag_cache = None
-
         self.masher.consume(self._make_msg())
 
         # Ensure that F18 runs before F17
@@ -799,9 +1080,11 @@ References:
         # mashing f18
         # complete.stable (for each update)
         # errata.publish
+        # mashtask.stages
         # mashtask.complete
         # mashing f17
         # complete.testing
+        # mashtask.stages
         # mashtask.complete
         self.assertEquals(calls[1], mock.call(
             force=True,
@@ -810,14 +1093,14 @@ References:
                  'updates': [u'bodhi-2.0-1.fc18'],
                  'agent': 'bowlofeggs'},
             topic='mashtask.mashing'))
-        self.assertEquals(calls[4], mock.call(
+        self.assertEquals(calls[5], mock.call(
             force=True,
             msg={'success': True,
                  'ctype': 'rpm',
                  'repo': 'f18-updates',
                  'agent': 'bowlofeggs'},
             topic='mashtask.complete'))
-        self.assertEquals(calls[5], mock.call(
+        self.assertEquals(calls[6], mock.call(
             force=True,
             msg={'repo': u'f17-updates-testing',
                  'ctype': 'rpm',
@@ -873,9 +1156,6 @@ References:
             update.type = UpdateType.enhancement
             db.add(update)
 
-            # Wipe out the tag cache so it picks up our new release
-            Release._tag_cache = None
-
         self.masher.consume(self._make_msg())
 
         # Ensure that F17 updates-testing runs before F18
@@ -887,14 +1167,14 @@ References:
                  'agent': 'bowlofeggs'},
             force=True,
             topic='mashtask.mashing'))
-        self.assertEquals(calls[3], mock.call(
+        self.assertEquals(calls[4], mock.call(
             msg={'success': True,
                  'ctype': 'rpm',
                  'repo': 'f17-updates-testing',
                  'agent': 'bowlofeggs'},
             force=True,
             topic='mashtask.complete'))
-        self.assertEquals(calls[4], mock.call(
+        self.assertEquals(calls[5], mock.call(
             msg={'repo': u'f18-updates',
                  'ctype': 'rpm',
                  'updates': [u'bodhi-2.0-1.fc18'],
@@ -951,9 +1231,6 @@ References:
             update.type = UpdateType.security
             db.add(update)
 
-            # Wipe out the tag cache so it picks up our new release
-            Release._tag_cache = None
-
         self.masher.consume(self._make_msg())
 
         # Ensure that F18 and F17 run in parallel
@@ -1087,6 +1364,15 @@ References:
         publish.assert_any_call(topic='update.complete.stable',
                                 force=True,
                                 msg=mock.ANY)
+        # The timings and counters of the stages are published before the compose completes.
+        stages = publish.mock_calls[-2]
+        self.assertEqual(stages[2]['topic'], 'mashtask.stages')
+        self.assertEqual(stages[2]['msg']['repo'], 'f17-updates')
+        self.assertTrue(stages[2]['msg']['stages']['determine_and_perform_tag_actions']
+                        ['counters']['builds_tagged'] > 0)
+        self.assertTrue(stages[2]['msg']['stages']['insert_updateinfo']['counters']
+                        ['bytes_compressed'] > 0)
+        self.assertTrue(stages[2]['msg']['stages']['mash']['duration'] >= 0)
 
         self.assertEqual(
             Popen.mock_calls,
@@ -1140,9 +1426,6 @@ References:
             update.type = UpdateType.security
             db.add(update)
 
-            # Wipe out the tag cache so it picks up our new release
-            Release._tag_cache = None
-
         msg = self._make_msg(['--releases', 'F27M'])
         t = ModuleMasherThread(msg['body']['msg']['composes'][0],
                                'puiterwijk', log, self.db_factory, self.tempdir)
@@ -1530,8 +1813,8 @@ References:
             self.assertIsNone(up.date_stable)
             up.request = UpdateRequest.stable
 
-        # Ensure that fedmsg was called 3 times
-        self.assertEquals(len(publish.call_args_list), 4)
+        # Ensure that fedmsg was called 5 times
+        self.assertEquals(len(publish.call_args_list), 5)
         # Also, ensure we reported success
         publish.assert_called_with(
             topic="mashtask.complete",
@@ -1676,8 +1959,6 @@ References:
                 test_gating_status=TestGatingStatus.passed)
             update.type = UpdateType.enhancement
             db.add(update)
-            # Wipe out the tag cache so it picks up our new releases
-            Release._tag_cache = None
 
     @mock.patch(**mock_taskotron_results)
     @mock.patch('bodhi.server.consumers.masher.MasherThread.wait_for_mash')
@@ -1698,8 +1979,10 @@ References:
         waiting_messages = [m for m in info_log_messages if 'Waiting on' in m[0]]
         # Since we have max_concurrent_mashes set to 1 and there are 3 mashes to be done, we should
         # see two log messages that say it's waiting on 1 mash to finish.
-        self.assertEqual(waiting_messages, [('Waiting on %d mashes for priority %s', 1, 0),
-                                            ('Waiting on %d mashes for priority %s', 1, 0)])
+        self.assertEqual(
+            waiting_messages,
+            [('Waiting on %d mashes for a free slot, %d mashes queued', 1, 2),
+             ('Waiting on %d mashes for a free slot, %d mashes queued', 1, 1)])
 
     @mock.patch(**mock_taskotron_results)
     @mock.patch('bodhi.server.consumers.masher.MasherThread.wait_for_mash')
@@ -1719,8 +2002,30 @@ References:
         info_log_messages = [c[1] for c in self.masher.log.info.mock_calls]
         waiting_messages = [m for m in info_log_messages if 'Waiting on' in m[0]]
         # Since we have max_concurrent_mashes set to 2 and there are 3 mashes to be done, we should
-        # see one log message that says we are waiting on the first two to finish.
-        self.assertEqual(waiting_messages, [('Waiting on %d mashes for priority %s', 2, 0)])
+        # see one log message that says we are waiting on one of the first two to finish.
+        self.assertEqual(
+            waiting_messages,
+            [('Waiting on %d mashes for a free slot, %d mashes queued', 2, 1)])
+
+    @mock.patch('bodhi.server.consumers.masher.ComposeScheduler')
+    @mock.patch('bodhi.server.consumers.masher.MasherProcess')
+    @mock.patch('bodhi.server.notifications.publish')
+    def test_work_process_mode(self, publish, MasherProcess, ComposeScheduler):
+        """With mash_execution_mode set to process, each compose is run by a MasherProcess."""
+        ComposeScheduler.return_value.run.return_value = []
+        msg = self._make_msg()
+
+        with mock.patch.dict(config, {'mash_execution_mode': 'process'}):
+            self.masher.work(msg)
+
+        compose = ComposeScheduler.return_value.add.call_args[0][0]
+        self.assertEqual(compose['release_id'],
+                         msg['body']['msg']['composes'][0]['release_id'])
+        MasherProcess.assert_called_once_with(
+            RPMMasherThread, compose, 'bowlofeggs', self.masher.log, self.db_factory,
+            self.tempdir, False)
+        ComposeScheduler.return_value.add.assert_called_once_with(
+            compose, MasherProcess.return_value)
 
 
 class MasherThreadBaseTestCase(base.BaseTestCase):
@@ -1754,6 +2059,122 @@ class MasherThreadBaseTestCase(base.BaseTestCase):
         return _make_msg(base.TransactionalSessionMaker(self.Session), extra_push_args)
 
 
+class TestMasherProcess(MasherThreadBaseTestCase):
+    """This test class contains tests for the MasherProcess class."""
+    class FakeProcess(object):
+        """A child process that sends the given messages as soon as it starts."""
+        def __init__(self, messages, exitcode, target, args):
+            self.messages = messages
+            self.exitcode = exitcode
+            self.queue = args[-1]
+
+        def start(self):
+            for message in self.messages:
+                self.queue.put(message)
+
+        def is_alive(self):
+            return False
+
+        def join(self):
+            pass
+
+    def _make_process(self, messages, exitcode):
+        compose = self._make_msg()['body']['msg']['composes'][0]
+        p = MasherProcess(RPMMasherThread, compose, 'bowlofeggs', log,
+                          base.TransactionalSessionMaker(self.Session), self.tempdir)
+        p.finished = six.moves.queue.Queue()
+        process = mock.patch(
+            'bodhi.server.consumers.masher.multiprocessing.Process',
+            side_effect=lambda target, args: self.FakeProcess(messages, exitcode, target, args))
+        return p, process
+
+    def test_crash(self):
+        """The compose is marked as failed when the child process crashes."""
+        p, process = self._make_process([], -11)
+
+        with process:
+            p.run()
+
+        self.assertIs(p.finished.get_nowait(), p)
+        self.assertEqual(p.exitcode, -11)
+        compose = self.db.query(Compose).one()
+        self.db.refresh(compose)
+        self.assertEqual(compose.state, ComposeState.failed)
+        self.assertEqual(compose.error_message, u'The mash process exited with -11')
+        self.assertEqual(list(p.results()), [
+            '  compose:  %s testing  exited with -11' % compose.release_id])
+
+    def test_logs_and_results(self):
+        """The log records and the results of the child process are handled by the parent."""
+        record = logging.LogRecord('bodhi.tests.masher_process', logging.INFO, __file__, 1,
+                                   'Mashing', None, None)
+        p, process = self._make_process(
+            [('log', record), ('results', ['  name:  f17-updates-testing  success:  True'])], 0)
+        handler = mock.MagicMock()
+        handler.level = logging.DEBUG
+        logger = logging.getLogger('bodhi.tests.masher_process')
+        logger.addHandler(handler)
+
+        try:
+            with process:
+                p.run()
+        finally:
+            logger.removeHandler(handler)
+
+        handler.handle.assert_called_once_with(record)
+        self.assertEqual(list(p.results()), ['  name:  f17-updates-testing  success:  True'])
+        self.assertEqual(p.exitcode, 0)
+        self.assertIs(p.finished.get_nowait(), p)
+        self.assertEqual(self.db.query(Compose).one().state, ComposeState.requested)
+
+    @mock.patch('bodhi.server.consumers.masher.bugs.set_bugtracker')
+    @mock.patch('bodhi.server.consumers.masher.buildsys.setup_buildsystem')
+    @mock.patch('bodhi.server.consumers.masher.buildsys.teardown_buildsystem')
+    @mock.patch('bodhi.server.consumers.masher.initialize_db')
+    @mock.patch('bodhi.server.consumers.masher._stream_logs')
+    def test__run_masher_process(self, _stream_logs, initialize_db, teardown_buildsystem,
+                                 setup_buildsystem, set_bugtracker):
+        """The child process sets up its own database engine and Koji session."""
+        messages = six.moves.queue.Queue()
+        masher_class = mock.MagicMock()
+        masher_class.return_value.results.return_value = iter(['result'])
+
+        masher._run_masher_process(masher_class, {'compose': 1}, 'bowlofeggs', log,
+                                   self.tempdir, True, messages)
+
+        _stream_logs.assert_called_once_with(messages)
+        initialize_db.assert_called_once_with(config)
+        teardown_buildsystem.assert_called_once_with()
+        setup_buildsystem.assert_called_once_with(config)
+        set_bugtracker.assert_called_once_with()
+        masher_class.assert_called_once_with({'compose': 1}, 'bowlofeggs', log, mock.ANY,
+                                             self.tempdir, True)
+        masher_class.return_value.run.assert_called_once_with()
+        self.assertEqual(messages.get_nowait(), ('results', ['result']))
+
+
+class TestQueueLogHandler(unittest.TestCase):
+    """This test class contains tests for the _QueueLogHandler class."""
+    def test_emit(self):
+        """Records are made picklable before they are put on the queue."""
+        messages = six.moves.queue.Queue()
+        handler = masher._QueueLogHandler(messages)
+        try:
+            raise ValueError('oops')
+        except ValueError:
+            record = logging.LogRecord('bodhi', logging.ERROR, __file__, 1, 'Failed %s', ('f17',),
+                                       sys.exc_info())
+
+        handler.emit(record)
+
+        kind, record = messages.get_nowait()
+        self.assertEqual(kind, 'log')
+        self.assertEqual(record.getMessage(), 'Failed f17')
+        self.assertIsNone(record.exc_info)
+        self.assertTrue(record.exc_text.endswith('ValueError: oops'))
+        pickle.loads(pickle.dumps(record))
+
+
 class TestMasherThread__get_master_repomd_url(MasherThreadBaseTestCase):
     """This test class contains tests for the MasherThread._get_master_repomd_url() method."""
     @mock.patch.dict(
@@ -1861,6 +2282,7 @@ class TestMasherThread__perform_tag_actions(MasherThreadBaseTestCase):
         t = MasherThread(msg['body']['msg']['composes'][0],
                          'bowlofeggs', log, self.Session, self.tempdir)
         t.compose = Compose.from_dict(self.db, msg['body']['msg']['composes'][0])
+        t.db = self.db
         t.move_tags_async.append(
             (u'f26-updates-candidate', u'f26-updates-testing', u'bodhi-2.3.2-1.fc26'))
 
@@ -1873,6 +2295,227 @@ class TestMasherThread__perform_tag_actions(MasherThreadBaseTestCase):
         self.assertEqual(buildsys.DevBuildsys.__moved__,
                          [('f26-updates-candidate', 'f26-updates-testing', 'bodhi-2.3.2-1.fc26')])
 
+    @mock.patch('bodhi.server.consumers.masher.buildsys.wait_for_tasks')
+    def test_progress(self, wait_for_tasks):
+        """The progress of the Koji tasks is recorded with the stage timings."""
+        def wait(tasks, session, sleep, progress):
+            progress(1, 2)
+            progress(2, 2)
+            return []
+
+        wait_for_tasks.side_effect = wait
+        msg = self._make_msg()
+        t = MasherThread(msg['body']['msg']['composes'][0],
+                         'bowlofeggs', log, self.Session, self.tempdir)
+        t.compose = Compose.from_dict(self.db, msg['body']['msg']['composes'][0])
+        t.db = self.db
+
+        t._perform_tag_actions()
+
+        self.assertEqual(t._stage_timings,
+                         {'determine_and_perform_tag_actions': {
+                             'progress': {'done': 2, 'total': 2}}})
+
+    @mock.patch('bodhi.server.consumers.masher.buildsys.wait_for_tasks')
+    def test_tag_batcher(self, wait_for_tasks):
+        """The async actions are handed to the tag batcher, and the sync ones are done in order."""
+        tag_batcher = mock.MagicMock()
+        tag_batcher.tag.return_value = []
+        msg = self._make_msg()
+        t = MasherThread(msg['body']['msg']['composes'][0],
+                         'bowlofeggs', log, self.Session, self.tempdir, tag_batcher=tag_batcher)
+        t.compose = Compose.from_dict(self.db, msg['body']['msg']['composes'][0])
+        t.db = self.db
+        t.add_tags_sync.append((u'f26-override', u'bodhi-2.3.1-1.fc26'))
+        t.move_tags_async.append(
+            (u'f26-updates-candidate', u'f26-updates-testing', u'bodhi-2.3.2-1.fc26'))
+
+        t._perform_tag_actions()
+
+        self.assertEqual(buildsys.DevBuildsys.__added__,
+                         [(u'f26-override', u'bodhi-2.3.1-1.fc26')])
+        self.assertEqual(buildsys.DevBuildsys.__moved__, [])
+        tag_batcher.tag.assert_called_once_with(
+            [], [(u'f26-updates-candidate', u'f26-updates-testing', u'bodhi-2.3.2-1.fc26')],
+            progress=mock.ANY)
+        self.assertEqual(wait_for_tasks.call_count, 0)
+
+    def test_tag_batcher_failed_tasks(self):
+        """An Exception is raised when the tag batcher returns failed tasks."""
+        tag_batcher = mock.MagicMock()
+        tag_batcher.tag.return_value = [42]
+        msg = self._make_msg()
+        t = MasherThread(msg['body']['msg']['composes'][0],
+                         'bowlofeggs', log, self.Session, self.tempdir, tag_batcher=tag_batcher)
+        t.compose = Compose.from_dict(self.db, msg['body']['msg']['composes'][0])
+        t.db = self.db
+
+        with self.assertRaises(Exception) as exc:
+            t._perform_tag_actions()
+
+        self.assertEqual(six.text_type(exc.exception), "Failed to move builds: [42]")
+
+    @mock.patch('bodhi.server.consumers.masher.buildsys.wait_for_tasks', return_value=[])
+    def test_progress_records(self, wait_for_tasks):
+        """The number of done actions is saved after each sync action, and after the async ones."""
+        msg = self._make_msg()
+        t = MasherThread(msg['body']['msg']['composes'][0],
+                         'bowlofeggs', log, self.Session, self.tempdir)
+        t.compose = Compose.from_dict(self.db, msg['body']['msg']['composes'][0])
+        t.db = self.db
+        t.add_tags_sync.append((u'f26-override', u'bodhi-2.3.1-1.fc26'))
+        t.move_tags_sync.append(
+            (u'f26-updates-candidate', u'f26-updates-testing', u'bodhi-2.3.0-1.fc26'))
+        t.move_tags_async.append(
+            (u'f26-updates-candidate', u'f26-updates-testing', u'bodhi-2.3.2-1.fc26'))
+
+        with mock.patch.object(t, 'save_progress', wraps=t.save_progress) as save_progress:
+            t._perform_tag_actions()
+
+        self.assertEqual(
+            save_progress.mock_calls,
+            [mock.call('determine_and_perform_tag_actions', 'tagged', done) for done in (1, 2, 3)])
+        self.assertEqual(t._progress, {'determine_and_perform_tag_actions.tagged': 3})
+
+    @mock.patch('bodhi.server.consumers.masher.buildsys.wait_for_tasks', return_value=[])
+    def test_resume(self, wait_for_tasks):
+        """A resumed compose skips the actions that were done before."""
+        msg = self._make_msg()
+        t = MasherThread(msg['body']['msg']['composes'][0],
+                         'bowlofeggs', log, self.Session, self.tempdir, resume=True)
+        t.compose = Compose.from_dict(self.db, msg['body']['msg']['composes'][0])
+        t.db = self.db
+        t._progress = {
+            'determine_and_perform_tag_actions.actions': {
+                'add_tags_sync': [[u'f26-override', u'bodhi-2.3.1-1.fc26']],
+                'move_tags_sync': [
+                    [u'f26-updates-candidate', u'f26-updates-testing', u'bodhi-2.3.0-1.fc26']],
+                'add_tags_async': [],
+                'move_tags_async': [
+                    [u'f26-updates-candidate', u'f26-updates-testing', u'bodhi-2.3.2-1.fc26']]},
+            'determine_and_perform_tag_actions.tagged': 1}
+
+        t._determine_tag_actions()
+        t._perform_tag_actions()
+
+        self.assertEqual(t.add_tags_sync, [(u'f26-override', u'bodhi-2.3.1-1.fc26')])
+        self.assertEqual(buildsys.DevBuildsys.__added__, [])
+        self.assertEqual(
+            buildsys.DevBuildsys.__moved__,
+            [(u'f26-updates-candidate', u'f26-updates-testing', u'bodhi-2.3.0-1.fc26'),
+             (u'f26-updates-candidate', u'f26-updates-testing', u'bodhi-2.3.2-1.fc26')])
+        self.assertEqual(t._progress['determine_and_perform_tag_actions.tagged'], 3)
+
+
+class TestMasherThreadPostPush(MasherThreadBaseTestCase):
+    """Test the post-push stages of the MasherThread, which use the PostPushPool."""
+    @mock.patch('bodhi.server.mail._send_mail')
+    def test_status_comments(self, _send_mail):
+        """The comments are written by the MasherThread, and their e-mails are sent by the pool."""
+        pool = mock.MagicMock(wraps=PostPushPool(0, {}))
+        msg = self._make_msg()
+        t = MasherThread(msg['body']['msg']['composes'][0],
+                         'bowlofeggs', log, self.Session, self.tempdir, post_push_pool=pool)
+        t.compose = Compose.from_dict(self.db, msg['body']['msg']['composes'][0])
+        t.db = self.db
+        update = self.db.query(Update).one()
+        update.status = UpdateStatus.testing
+
+        with mock.patch.object(t, 'save_checkpoint'):
+            t.status_comments()
+
+        self.assertEqual(update.comments[-1].text, u'This update has been pushed to testing.')
+        calls = pool.run.mock_calls[0][1][0]
+        self.assertEqual([service for service, func in calls], ['smtp'] * len(calls))
+        self.assertEqual(_send_mail.call_count, len(calls))
+        self.assertTrue(calls)
+
+    def test_update_call_with_workers(self):
+        """With workers, the Update is loaded by a session of the worker's own."""
+        session = mock.MagicMock()
+        db_factory = mock.MagicMock()
+        db_factory.return_value.__enter__.return_value = session
+        msg = self._make_msg()
+        t = MasherThread(msg['body']['msg']['composes'][0],
+                         'bowlofeggs', log, db_factory, self.tempdir,
+                         post_push_pool=PostPushPool(2, {}))
+        update = self.db.query(Update).one()
+
+        call = t._update_call(update, 'modify_bugs')
+        call()
+
+        session.query.assert_called_once_with(Update)
+        session.query.return_value.get.assert_called_once_with(update.id)
+        session.query.return_value.get.return_value.modify_bugs.assert_called_once_with()
+
+    def test_update_call_without_workers(self):
+        """Without workers, the method of the given Update is called."""
+        msg = self._make_msg()
+        t = MasherThread(msg['body']['msg']['composes'][0],
+                         'bowlofeggs', log, self.Session, self.tempdir,
+                         post_push_pool=PostPushPool(0, {}))
+        update = self.db.query(Update).one()
+
+        self.assertEqual(t._update_call(update, 'modify_bugs'), update.modify_bugs)
+
+    def test_update_call_with_bug(self):
+        """With workers, the Bug passed to the method is loaded by the worker's session too."""
+        session = mock.MagicMock()
+        db_factory = mock.MagicMock()
+        db_factory.return_value.__enter__.return_value = session
+        msg = self._make_msg()
+        t = MasherThread(msg['body']['msg']['composes'][0],
+                         'bowlofeggs', log, db_factory, self.tempdir,
+                         post_push_pool=PostPushPool(2, {}))
+        update = self.db.query(Update).one()
+        bug = update.bugs[0]
+
+        t._update_call(update, 'modify_bug', bug)()
+
+        self.assertEqual(session.query.mock_calls[0], mock.call(Bug))
+        session.query.return_value.filter_by.assert_called_once_with(bug_id=bug.bug_id)
+        session.query.return_value.get.return_value.modify_bug.assert_called_once_with(
+            session.query.return_value.filter_by.return_value.one.return_value)
+
+    @mock.patch('bodhi.server.models.Update.modify_bug')
+    def test_modify_bugs(self, modify_bug):
+        """Each bug is modified by a call of its own, so that a retry only affects that bug."""
+        pool = mock.MagicMock(wraps=PostPushPool(0, {}))
+        msg = self._make_msg()
+        t = MasherThread(msg['body']['msg']['composes'][0],
+                         'bowlofeggs', log, self.Session, self.tempdir, post_push_pool=pool)
+        t.compose = Compose.from_dict(self.db, msg['body']['msg']['composes'][0])
+        t.db = self.db
+        bugs = list(t.compose.updates[0].bugs)
+        self.assertTrue(bugs)
+
+        with mock.patch.object(t, 'save_checkpoint'):
+            t.modify_bugs()
+
+        calls = pool.run.mock_calls[0][1][0]
+        self.assertEqual([service for service, func in calls], ['bugzilla'] * len(bugs))
+        self.assertEqual(modify_bug.mock_calls, [mock.call(bug) for bug in bugs])
+
+    @mock.patch('bodhi.server.notifications.publish')
+    def test_send_notifications(self, publish):
+        """The fedmsgs are published by the MasherThread, not by the pool."""
+        pool = mock.MagicMock(wraps=PostPushPool(2, {}))
+        msg = self._make_msg()
+        t = MasherThread(msg['body']['msg']['composes'][0],
+                         'bowlofeggs', log, self.Session, self.tempdir, post_push_pool=pool)
+        t.compose = Compose.from_dict(self.db, msg['body']['msg']['composes'][0])
+        t.db = self.db
+        update = t.compose.updates[0]
+        threads = []
+        publish.side_effect = lambda *args, **kwargs: threads.append(threading.current_thread())
+
+        t.send_notifications()
+
+        self.assertEqual(pool.run.call_count, 0)
+        publish.assert_called_once_with(topic=u'update.complete.testing',
+                                        msg=dict(update=update, agent=mock.ANY), force=True)
+        self.assertEqual(threads, [threading.current_thread()])
+
 
 class TestMasherThread_check_all_karma_thresholds(MasherThreadBaseTestCase):
     """Test the MasherThread.check_all_karma_thresholds() method."""
@@ -1886,11 +2529,220 @@ class TestMasherThread_check_all_karma_thresholds(MasherThreadBaseTestCase):
         t.compose = Compose.from_dict(self.db, msg['body']['msg']['composes'][0])
         t.db = self.db
         t.log.exception = mock.MagicMock()
+        t.compose.updates[0].stable_karma = 1
+        t.compose.updates[0].karma = 1
 
         t.check_all_karma_thresholds()
 
         t.log.exception.assert_called_once_with('Problem checking karma thresholds')
 
+    def test_only_thresholds_checked(self):
+        """Only the updates that reached a threshold, or are locked, are checked without queries."""
+        self.create_update([u'bodhi-2.1-1.fc17'])
+        self.create_update([u'bodhi-2.2-1.fc17'])
+        for up in self.db.query(Update).all():
+            up.request = UpdateRequest.testing
+        self.db.commit()
+        msg = self._make_msg()
+        t = MasherThread(msg['body']['msg']['composes'][0],
+                         'bowlofeggs', log, self.Session, self.tempdir)
+        t.compose = Compose.from_dict(self.db, msg['body']['msg']['composes'][0])
+        t.db = self.db
+        updates = {u.title: u for u in t.compose.updates}
+        self.assertEqual(len(updates), 3)
+        updates[u'bodhi-2.1-1.fc17'].karma = -3
+        updates[u'bodhi-2.2-1.fc17'].locked = True
+        self.db.flush()
+        statements = []
+        checked = []
+
+        def count(*args):
+            statements.append(args)
+
+        def check_karma_thresholds(update, db, agent):
+            checked.append(update.title)
+
+        sqlalchemy.event.listen(t.db.get_bind(), 'before_cursor_execute', count)
+        try:
+            with mock.patch('bodhi.server.models.Update.check_karma_thresholds',
+                            check_karma_thresholds):
+                t.check_all_karma_thresholds()
+        finally:
+            sqlalchemy.event.remove(t.db.get_bind(), 'before_cursor_execute', count)
+
+        self.assertEqual(sorted(checked), [u'bodhi-2.1-1.fc17', u'bodhi-2.2-1.fc17'])
+        self.assertEqual(statements, [])
+
+
+class TestMasherThread_write_pungi_file(MasherThreadBaseTestCase):
+    """This test class contains tests for the MasherThread.write_pungi_file() method."""
+    def setUp(self):
+        super(TestMasherThread_write_pungi_file, self).setUp()
+        self.t = MasherThread(self._make_msg()['body']['msg']['composes'][0],
+                              'bowlofeggs', log, self.Session, self.tempdir)
+        self.path = os.path.join(self.tempdir, 'pungi.conf')
+
+    def test_unchanged(self):
+        """A file is only written again when its content changes."""
+        self.assertTrue(self.t.write_pungi_file(self.tempdir, 'pungi.conf', u'a = 1\n'))
+        mtime = os.path.getmtime(self.path)
+        os.utime(self.path, (mtime - 60, mtime - 60))
+
+        self.assertFalse(self.t.write_pungi_file(self.tempdir, 'pungi.conf', u'a = 1\n'))
+        self.assertEqual(os.path.getmtime(self.path), mtime - 60)
+
+        self.assertTrue(self.t.write_pungi_file(self.tempdir, 'pungi.conf', u'a = 2 \u2603\n'))
+        with open(self.path, 'rb') as conffile:
+            self.assertEqual(conffile.read().decode('utf-8'), u'a = 2 \u2603\n')
+
+    def test_uncached(self):
+        """A file that was written by another process is compared by its digest."""
+        with open(self.path, 'w') as conffile:
+            conffile.write('a = 1\n')
+
+        with mock.patch.dict('bodhi.server.consumers.masher._pungi_file_digests', clear=True):
+            self.assertFalse(self.t.write_pungi_file(self.tempdir, 'pungi.conf', u'a = 1\n'))
+            self.assertTrue(self.t.write_pungi_file(self.tempdir, 'pungi.conf', u'a = 2\n'))
+
+    def test_deleted(self):
+        """A file that was deleted is written again, even if its digest is cached."""
+        self.assertTrue(self.t.write_pungi_file(self.tempdir, 'pungi.conf', u'a = 1\n'))
+        os.remove(self.path)
+
+        self.assertTrue(self.t.write_pungi_file(self.tempdir, 'pungi.conf', u'a = 1\n'))
+        self.assertTrue(os.path.exists(self.path))
+
+
+class TestModuleMasherThread_generate_module_list(MasherThreadBaseTestCase):
+    """This test class contains tests for the ModuleMasherThread._generate_module_list() method."""
+    def test_newest_per_stream(self):
+        """The newest version of each stream of the release is listed, or the one in the update."""
+        release = self.create_release(u'27M')
+        package = Package(name=u'testmodule', type=ContentType.module)
+        self.db.add(package)
+        for nvr in (u'testmodule-master-2', u'testmodule-master-10', u'testmodule-f27-3',
+                    u'testmodule-f27-5', u'testmodule-old-1'):
+            self.db.add(ModuleBuild(nvr=nvr, release=release, signed=True, package=package))
+        # Builds of other types don't belong in the module list.
+        rpm = Package(name=u'testmodule-master', type=ContentType.rpm)
+        self.db.add(RpmBuild(nvr=u'testmodule-master-99', release=release, signed=True,
+                             package=rpm))
+        build = ModuleBuild(nvr=u'testmodule-f27-4', release=release, signed=True,
+                            package=package)
+        update = Update(
+            title=u'testmodule-f27-4', builds=[build], user=self.db.query(User).first(),
+            status=UpdateStatus.testing, request=UpdateRequest.stable, notes=u'Useful details!',
+            release=release, test_gating_status=TestGatingStatus.passed)
+        update.type = UpdateType.bugfix
+        self.db.add(update)
+        self.db.flush()
+        t = ModuleMasherThread({}, 'bowlofeggs', log, self.Session, self.tempdir)
+        t.db = self.db
+        t.compose = mock.MagicMock(release=release, updates=[update])
+
+        self.assertEqual(
+            sorted(t._generate_module_list()),
+            [u'testmodule-f27-4', u'testmodule-master-10', u'testmodule-old-1'])
+
+
+class TestMasherThread__load_compose(MasherThreadBaseTestCase):
+    """This test class contains tests for the MasherThread._load_compose() method."""
+    def test_updates_loaded(self):
+        """The updates of the compose are loaded with their builds and comments."""
+        msg = self._make_msg()
+        t = MasherThread(msg['body']['msg']['composes'][0],
+                         'bowlofeggs', log, self.Session, self.tempdir)
+        self.db.expunge_all()
+
+        compose = t._load_compose(self.db)
+
+        self.assertIn('updates', compose.__dict__)
+        self.assertEqual([u.title for u in compose.updates], [u'bodhi-2.0-1.fc17'])
+        for attr in ('builds', 'bugs', 'comments'):
+            self.assertIn(attr, compose.updates[0].__dict__)
+        self.assertEqual(compose.updates[0].builds[0].nvr, u'bodhi-2.0-1.fc17')
+
+
+class TestMasherThread__get_release(MasherThreadBaseTestCase):
+    """This test class contains tests for the MasherThread._get_release() method."""
+    def setUp(self):
+        super(TestMasherThread__get_release, self).setUp()
+        msg = self._make_msg()
+        self.masher = MasherThread(msg['body']['msg']['composes'][0],
+                                   'bowlofeggs', log, self.Session, self.tempdir)
+        self.masher.db = self.db
+
+    def test_long_name(self):
+        """The release is found by its long name."""
+        self.assertEqual(self.masher._get_release(u'Fedora 17').name, u'F17')
+
+    def test_unknown(self):
+        """NoResultFound is raised for unknown long names, and for names that aren't long names."""
+        for name in (u'Fedora 99', u'F17'):
+            with self.assertRaises(sqlalchemy.orm.exc.NoResultFound) as exc:
+                self.masher._get_release(name)
+
+            self.assertEqual(str(exc.exception), 'There is no release named %s' % name)
+
+
+class TestMasherThread_perform_gating(MasherThreadBaseTestCase):
+    """This test class contains tests for the MasherThread.perform_gating() method."""
+    @mock.patch.dict(config, {'gating.workers': 2})
+    @mock.patch('bodhi.server.consumers.masher.ThreadPool', wraps=masher.ThreadPool)
+    @mock.patch('bodhi.server.notifications.publish')
+    def test_bulk(self, publish, ThreadPool):
+        """The updates are checked concurrently, and the failed ones are ejected together."""
+        def requirements_check(update, settings):
+            if update.title == u'bodhi-2.0-1.fc17':
+                return lambda: (True, 'All checks pass.')
+            return lambda: (False, 'Required task is missing')
+
+        self.create_update([u'bodhi-2.1-1.fc17'])
+        self.create_update([u'bodhi-2.2-1.fc17'])
+        for up in self.db.query(Update).all():
+            up.request = UpdateRequest.testing
+        self.db.commit()
+        msg = self._make_msg()
+        t = MasherThread(msg['body']['msg']['composes'][0],
+                         'bowlofeggs', log, self.Session, self.tempdir)
+        t.compose = Compose.from_dict(self.db, msg['body']['msg']['composes'][0])
+        t.db = self.db
+        t.id = 'f17-updates-testing'
+        self.assertEqual(len(t.compose.updates), 3)
+
+        with mock.patch('bodhi.server.models.Update.requirements_check', requirements_check):
+            with mock.patch('bodhi.server.consumers.masher.buildsys.get_session',
+                            wraps=buildsys.get_session) as get_session:
+                t.perform_gating()
+
+        ThreadPool.assert_called_once_with(2)
+        # The pending tags of both updates were removed with a single Koji session.
+        get_session.assert_called_once_with()
+        self.assertEqual(sorted(buildsys.DevBuildsys.__untag__),
+                         [(u'f17-updates-testing-pending', u'bodhi-2.1-1.fc17'),
+                          (u'f17-updates-testing-pending', u'bodhi-2.2-1.fc17')])
+        self.assertEqual(
+            sorted(c[2]['msg']['update'].title for c in publish.mock_calls),
+            [u'bodhi-2.1-1.fc17', u'bodhi-2.2-1.fc17'])
+        self.assertEqual([u.title for u in t.compose.updates], [u'bodhi-2.0-1.fc17'])
+
+    @mock.patch('bodhi.server.notifications.publish')
+    def test_all_pass(self, publish):
+        """Nothing is ejected if all the updates meet their requirements."""
+        msg = self._make_msg()
+        t = MasherThread(msg['body']['msg']['composes'][0],
+                         'bowlofeggs', log, self.Session, self.tempdir)
+        t.compose = Compose.from_dict(self.db, msg['body']['msg']['composes'][0])
+        t.db = self.db
+
+        with mock.patch('bodhi.server.models.Update.requirements_check',
+                        return_value=lambda: (True, 'All checks pass.')):
+            t.perform_gating()
+
+        self.assertEqual(buildsys.DevBuildsys.__untag__, [])
+        self.assertEqual(publish.call_count, 0)
+        self.assertEqual(len(t.compose.updates), 1)
+
 
 class TestMasherThread_eject_from_mash(MasherThreadBaseTestCase):
     """This test class contains tests for the MasherThread.eject_from_mash() method."""
@@ -1926,6 +2778,46 @@ class TestMasherThread_eject_from_mash(MasherThreadBaseTestCase):
         self.assertEqual(len(t.compose.updates), 0)
 
 
+class TestMasherThread_generate_updateinfo(MasherThreadBaseTestCase):
+    """This test class contains tests for the MasherThread.generate_updateinfo() method."""
+    def _make_thread(self):
+        t = MasherThread(self._make_msg()['body']['msg']['composes'][0],
+                         'bowlofeggs', log, self.Session, self.tempdir)
+        t.compose = self.db.query(Compose).one()
+        t.db = self.db
+        return t
+
+    @mock.patch.dict(config, {'updateinfo_incremental': True})
+    @mock.patch('bodhi.server.consumers.masher.UpdateInfoMetadata')
+    @mock.patch('bodhi.server.consumers.masher.load_updateinfo')
+    def test_incremental(self, load_updateinfo, UpdateInfoMetadata):
+        """The updateinfo of the staged compose is passed on as the previous one."""
+        t = self._make_thread()
+
+        uinfo = t.generate_updateinfo()
+
+        self.assertIs(uinfo, UpdateInfoMetadata.return_value)
+        load_updateinfo.assert_called_once_with(
+            os.path.join(config['mash_stage_dir'], t.id))
+        UpdateInfoMetadata.assert_called_once_with(
+            t.compose.release, t.compose.request, self.db, self.tempdir,
+            previous=load_updateinfo.return_value, verify=False)
+
+    @mock.patch.dict(config, {'updateinfo_incremental': False, 'updateinfo_verify': True})
+    @mock.patch('bodhi.server.consumers.masher.UpdateInfoMetadata')
+    @mock.patch('bodhi.server.consumers.masher.load_updateinfo')
+    def test_not_incremental(self, load_updateinfo, UpdateInfoMetadata):
+        """The previous updateinfo isn't loaded when updateinfo_incremental is off."""
+        t = self._make_thread()
+
+        t.generate_updateinfo()
+
+        self.assertEqual(load_updateinfo.call_count, 0)
+        UpdateInfoMetadata.assert_called_once_with(
+            t.compose.release, t.compose.request, self.db, self.tempdir, previous=None,
+            verify=True)
+
+
 class TestMasherThread_init_state(MasherThreadBaseTestCase):
     """This test class contains tests for the MasherThread.init_state() method."""
     def test_creates_mash_dir(self):
@@ -1950,12 +2842,16 @@ class TestMasherThread_load_state(MasherThreadBaseTestCase):
                          'bowlofeggs', log, self.Session, self.tempdir)
         t._checkpoints = {'cool': 'checkpoint'}
         t.compose = self.db.query(Compose).one()
-        t.compose.checkpoints = json.dumps({'other': 'checkpoint', 'completed_repo': '/path/to/it'})
+        t.compose.checkpoints = [
+            ComposeCheckpoint(key=u'other', value=u'"checkpoint"'),
+            ComposeCheckpoint(key=u'completed_repo', value=u'"/path/to/it"'),
+            ComposeCheckpoint(key=u'mash.done', value=u'3', progress=True)]
         t.db = self.db
 
         t.load_state()
 
         self.assertEqual(t._checkpoints, {'other': 'checkpoint', 'completed_repo': '/path/to/it'})
+        self.assertEqual(t._progress, {'mash.done': 3})
         self.assertEqual(t.path, '/path/to/it')
 
     def test_without_completed_repo(self):
@@ -1964,12 +2860,13 @@ class TestMasherThread_load_state(MasherThreadBaseTestCase):
                          'bowlofeggs', log, self.Session, self.tempdir)
         t._checkpoints = {'cool': 'checkpoint'}
         t.compose = self.db.query(Compose).one()
-        t.compose.checkpoints = json.dumps({'other': 'checkpoint'})
+        t.compose.checkpoints = [ComposeCheckpoint(key=u'other', value=u'"checkpoint"')]
         t.db = self.db
 
         t.load_state()
 
         self.assertEqual(t._checkpoints, {'other': 'checkpoint'})
+        self.assertEqual(t._progress, {})
         self.assertEqual(t.path, None)
 
 
@@ -1988,6 +2885,155 @@ class TestMasherThread_remove_state(MasherThreadBaseTestCase):
         self.assertEqual(self.db.query(Compose).count(), 0)
 
 
+class TestMasherThread_sanity_check_repo(MasherThreadBaseTestCase):
+    """This test class contains tests for the MasherThread.sanity_check_repo() method."""
+    def _make_thread(self):
+        t = MasherThread(self._make_msg()['body']['msg']['composes'][0],
+                         'bowlofeggs', log, self.Session, self.tempdir)
+        t.path = os.path.join(self.tempdir, 'compose')
+        for arch, packages in (('source', ('tree', 'Packages')),
+                               ('x86_64', ('os', 'Packages')),
+                               ('x86_64', ('debug', 'tree', 'Packages'))):
+            for subdir in ('a', 'b'):
+                path = os.path.join(t.path, 'compose', 'Everything', arch, *packages + (subdir,))
+                os.makedirs(path)
+                for name in ('%s1.rpm' % subdir, '%s2.rpm' % subdir, 'README'):
+                    with open(os.path.join(path, name), 'w') as f:
+                        f.write('rpm')
+        return t
+
+    @mock.patch('bodhi.server.consumers.masher.sanity_check_repodata')
+    def test_failure(self, sanity_check_repodata):
+        """Every arch is checked even if one fails, and then the failure is raised."""
+        t = self._make_thread()
+        sanity_check_repodata.side_effect = [exceptions.RepodataException('bad'), None]
+
+        with self.assertRaises(exceptions.RepodataException) as exc:
+            t.sanity_check_repo()
+
+        self.assertEqual(str(exc.exception), 'bad')
+        self.assertEqual(
+            sorted(c[0][0] for c in sanity_check_repodata.call_args_list),
+            [os.path.join(t.path, 'compose', 'Everything', 'source', 'tree', 'repodata'),
+             os.path.join(t.path, 'compose', 'Everything', 'x86_64', 'os', 'repodata')])
+
+    @mock.patch('bodhi.server.consumers.masher.sanity_check_repodata')
+    def test_results(self, sanity_check_repodata):
+        """A result with timings is returned for each arch, and the scratch area is removed."""
+        t = self._make_thread()
+
+        results = t.sanity_check_repo()
+
+        self.assertEqual(sorted(results.keys()), ['source', 'x86_64'])
+        self.assertEqual(results['source']['arch'], 'source')
+        self.assertEqual(results['source']['packages'], 4)
+        self.assertEqual(results['source']['packages_checked'], 2)
+        self.assertEqual(results['x86_64']['packages'], 8)
+        self.assertEqual(results['x86_64']['packages_checked'], 4)
+        for result in results.values():
+            for key in ('duration', 'packages_duration', 'repodata_duration'):
+                self.assertTrue(result[key] >= 0)
+        destdirs = [c[0][1] for c in sanity_check_repodata.call_args_list]
+        self.assertEqual(sorted(os.path.basename(d) for d in destdirs), ['source', 'x86_64'])
+        self.assertEqual(os.path.dirname(destdirs[0]), os.path.dirname(destdirs[1]))
+        self.assertFalse(os.path.exists(os.path.dirname(destdirs[0])))
+
+    @mock.patch.dict(config, {'sanity_check.sampling': 'first'})
+    def test_sample_packages_first(self):
+        """The first package of each subdirectory is checked."""
+        t = self._make_thread()
+        checkdir = os.path.join(t.path, 'compose', 'Everything', 'x86_64', 'os', 'Packages')
+
+        self.assertEqual(
+            t._sample_packages(checkdir),
+            (4, [os.path.join(checkdir, 'a', 'a1.rpm'), os.path.join(checkdir, 'b', 'b1.rpm')]))
+
+    @mock.patch.dict(config, {'sanity_check.sampling': 'full'})
+    def test_sample_packages_full(self):
+        """Every package is checked."""
+        t = self._make_thread()
+        checkdir = os.path.join(t.path, 'compose', 'Everything', 'x86_64', 'os', 'Packages')
+
+        self.assertEqual(
+            t._sample_packages(checkdir),
+            (4, [os.path.join(checkdir, 'a', 'a1.rpm'), os.path.join(checkdir, 'a', 'a2.rpm'),
+                 os.path.join(checkdir, 'b', 'b1.rpm'), os.path.join(checkdir, 'b', 'b2.rpm')]))
+
+    @mock.patch.dict(config, {'sanity_check.sampling': 'random', 'sanity_check.samples': 3})
+    def test_sample_packages_random(self):
+        """sanity_check.samples packages are checked."""
+        t = self._make_thread()
+        checkdir = os.path.join(t.path, 'compose', 'Everything', 'x86_64', 'os', 'Packages')
+
+        total, sample = t._sample_packages(checkdir)
+
+        self.assertEqual(total, 4)
+        self.assertEqual(len(sample), 3)
+        self.assertEqual(len(set(sample)), 3)
+        self.assertTrue(all(os.path.dirname(os.path.dirname(p)) == checkdir for p in sample))
+
+    @mock.patch('bodhi.server.consumers.masher.sanity_check_repodata')
+    def test_symlink_sampled(self, sanity_check_repodata):
+        """A symlink is found when it is sampled."""
+        t = self._make_thread()
+        checkdir = os.path.join(t.path, 'compose', 'Everything', 'x86_64', 'os', 'Packages')
+        os.unlink(os.path.join(checkdir, 'b', 'b2.rpm'))
+        os.symlink('/dev/null', os.path.join(checkdir, 'b', 'b2.rpm'))
+
+        # The symlink isn't the first package of its subdirectory.
+        t.sanity_check_repo()
+
+        with mock.patch.dict(config, {'sanity_check.sampling': 'full'}):
+            with self.assertRaises(Exception) as exc:
+                t.sanity_check_repo()
+
+        self.assertEqual(str(exc.exception), 'Symlinks found')
+
+
+class TestMasherThread_save_checkpoint(MasherThreadBaseTestCase):
+    """This test class contains tests for the MasherThread.save_checkpoint() method."""
+    def test_appends(self):
+        """The checkpoint is appended, and the progress records of its step are deleted."""
+        t = MasherThread(self._make_msg()['body']['msg']['composes'][0],
+                         'bowlofeggs', log, self.Session, self.tempdir)
+        t.compose = self.db.query(Compose).one()
+        t.db = self.db
+        t.save_progress('mash', 'done', 3)
+        t.save_progress('mashed', 'done', 4)
+
+        t.save_checkpoint('mash')
+        t.save_checkpoint('completed_repo', '/path/to/it')
+
+        compose = self.db.query(Compose).one()
+        self.assertEqual(
+            [(c.key, json.loads(c.value), c.progress) for c in compose.checkpoints],
+            [('mashed.done', 4, True), ('mash', True, False),
+             ('completed_repo', '/path/to/it', False)])
+        self.assertEqual(t._checkpoints, {'mash': True, 'completed_repo': '/path/to/it'})
+        self.assertEqual(t._progress, {'mashed.done': 4})
+
+
+class TestMasherThread_save_progress(MasherThreadBaseTestCase):
+    """This test class contains tests for the MasherThread.save_progress() method."""
+    def test_replaces(self):
+        """A progress record is written once and then updated in place."""
+        t = MasherThread(self._make_msg()['body']['msg']['composes'][0],
+                         'bowlofeggs', log, self.Session, self.tempdir)
+        t.compose = self.db.query(Compose).one()
+        t.db = self.db
+
+        t.save_progress('mash', 'done', 1)
+        t.save_progress('mash', 'total', 4)
+        t.save_progress('mash', 'done', 2)
+
+        compose = self.db.query(Compose).one()
+        self.assertEqual(
+            [(c.key, json.loads(c.value), c.progress) for c in compose.checkpoints],
+            [('mash.done', 2, True), ('mash.total', 4, True)])
+        self.assertEqual(t._progress, {'mash.done': 2, 'mash.total': 4})
+        self.assertEqual(t._checkpoints, {})
+
+
 class TestMasherThread_save_state(MasherThreadBaseTestCase):
     """This test class contains tests for the MasherThread.save_state() method."""
     def test_with_state(self):
@@ -1998,12 +3044,20 @@ class TestMasherThread_save_state(MasherThreadBaseTestCase):
         t.compose = self.db.query(Compose).one()
         t.db = self.db
         t.db.commit = mock.MagicMock()
+        t.record_stage_progress('mash', 3, 4)
+        t.record_stage_timing('mash', 0, 1.5)
+        t.record_stage_counter('wait_for_sync', 'mirror_polls')
+        t.record_stage_counter('wait_for_sync', 'mirror_polls', 2)
 
         t.save_state(ComposeState.notifying)
 
         compose = self.db.query(Compose).one()
         self.assertEqual(compose.state, ComposeState.notifying)
-        self.assertEqual(json.loads(compose.checkpoints), {'cool': 'checkpoint'})
+        self.assertEqual(
+            json.loads(compose.stage_timings),
+            {'mash': {'start': '1970-01-01T00:00:00', 'end': '1970-01-01T00:00:01.500000',
+                      'duration': 1.5, 'progress': {'done': 3, 'total': 4}},
+             'wait_for_sync': {'counters': {'mirror_polls': 3}}})
         t.db.commit.assert_called_once_with()
 
     def test_without_state(self):
@@ -2019,37 +3073,62 @@ class TestMasherThread_save_state(MasherThreadBaseTestCase):
 
         compose = self.db.query(Compose).one()
         self.assertEqual(compose.state, ComposeState.requested)
-        self.assertEqual(json.loads(compose.checkpoints), {'cool': 'checkpoint'})
         t.db.commit.assert_called_once_with()
 
 
+@mock.patch.dict(
+    'bodhi.server.sync.config',
+    {'sync_watcher.initial_interval': 0.01, 'sync_watcher.max_interval': 0.05,
+     'sync_watcher.backoff': 2.0})
 class TestMasherThread_wait_for_sync(MasherThreadBaseTestCase):
     """This test class contains tests for the MasherThread.wait_for_sync() method."""
-    @mock.patch.dict(
-        'bodhi.server.consumers.masher.config',
-        {'fedora_testing_master_repomd':
-            'http://example.com/pub/fedora/linux/updates/testing/%s/%s/repodata.repomd.xml'})
-    @mock.patch('bodhi.server.consumers.masher.notifications.publish')
-    @mock.patch('bodhi.server.consumers.masher.time.sleep',
-                mock.MagicMock(side_effect=Exception('This should not happen during this test.')))
-    @mock.patch('bodhi.server.consumers.masher.urllib2.urlopen',
-                return_value=StringIO('---\nyaml: rules'))
-    def test_checksum_match_immediately(self, urlopen, publish):
+    def setUp(self):
+        super(TestMasherThread_wait_for_sync, self).setUp()
+        self.mirror = sync.DevMirror()
+        self.mirror.start()
+        self.repomd_url = self.mirror.url + '/testing/%s/%s/repomd.xml'
+
+    def tearDown(self):
+        self.mirror.stop()
+        super(TestMasherThread_wait_for_sync, self).tearDown()
+
+    def _make_thread(self, arches=('aarch64', 'x86_64')):
         """
-        Assert correct operation when the repomd checksum matches immediately.
+        Return a MasherThread with a composed repository for each of the given arches.
+
+        Args:
+            arches (iterable): The arches to write a repomd.xml for.
+        Returns:
+            MasherThread: A MasherThread ready to wait_for_sync().
         """
         t = MasherThread(self._make_msg()['body']['msg']['composes'][0],
                          'bowlofeggs', log, self.Session, self.tempdir)
         t.compose = self.db.query(Compose).one()
         t.id = 'f26-updates-testing'
         t.path = os.path.join(self.tempdir, t.id + '-' + time.strftime("%y%m%d.%H%M"))
-        for arch in ['aarch64', 'x86_64']:
+        for arch in arches:
             repodata = os.path.join(t.path, 'compose', 'Everything', arch, 'os', 'repodata')
             os.makedirs(repodata)
             with open(os.path.join(repodata, 'repomd.xml'), 'w') as repomd:
                 repomd.write('---\nyaml: rules')
+        return t
 
-        t.wait_for_sync()
+    def _paths(self, status=None):
+        """Return the paths the mirror served, optionally only those served with status."""
+        return [r[1] for r in self.mirror.requests if status is None or r[2] == status]
+
+    @mock.patch('bodhi.server.consumers.masher.notifications.publish')
+    def test_checksum_match_immediately(self, publish):
+        """
+        Assert correct operation when the repomd checksum matches immediately.
+        """
+        for arch in ['aarch64', 'x86_64']:
+            self.mirror.publish('/testing/17/%s/repomd.xml' % arch, '---\nyaml: rules')
+        t = self._make_thread()
+
+        with mock.patch.dict('bodhi.server.consumers.masher.config',
+                             {'fedora_testing_master_repomd': self.repomd_url}):
+            t.wait_for_sync()
 
         expected_calls = [
             mock.call(topic='mashtask.sync.wait', msg={'repo': t.id, 'agent': 'bowlofeggs'},
@@ -2057,158 +3136,92 @@ class TestMasherThread_wait_for_sync(MasherThreadBaseTestCase):
             mock.call(topic='mashtask.sync.done', msg={'repo': t.id, 'agent': 'bowlofeggs'},
                       force=True)]
         publish.assert_has_calls(expected_calls)
-        self.assertEqual(urlopen.call_count, 1)
-        # Since os.listdir() isn't deterministic about the order of the items it returns, the test
-        # won't be deterministic about which of these URLs get called. However, either one of them
-        # would be correct so we will just assert that one of them is called.
-        expected_calls = [
-            mock.call('http://example.com/pub/fedora/linux/updates/testing/17/x86_64/'
-                      'repodata.repomd.xml'),
-            mock.call('http://example.com/pub/fedora/linux/updates/testing/17/aarch64/'
-                      'repodata.repomd.xml')]
-        self.assertTrue(urlopen.mock_calls[0] in expected_calls)
+        # Every arch is checked, and each of them exactly once.
+        self.assertEqual(sorted(self._paths()),
+                         ['/testing/17/aarch64/repomd.xml', '/testing/17/x86_64/repomd.xml'])
 
-    @mock.patch.dict(
-        'bodhi.server.consumers.masher.config',
-        {'fedora_testing_master_repomd':
-            'http://example.com/pub/fedora/linux/updates/testing/%s/%s/repodata.repomd.xml'})
     @mock.patch('bodhi.server.consumers.masher.notifications.publish')
-    @mock.patch('bodhi.server.consumers.masher.time.sleep',
-                mock.MagicMock(side_effect=Exception('This should not happen during this test.')))
-    @mock.patch('bodhi.server.consumers.masher.urllib2.urlopen',
-                return_value=StringIO('---\nyaml: rules'))
-    def test_no_checkarch(self, urlopen, publish):
+    def test_no_checkarch(self, publish):
         """
         Assert error when no checkarch is found.
         """
-        t = MasherThread(self._make_msg()['body']['msg']['composes'][0],
-                         'bowlofeggs', log, self.Session, self.tempdir)
-        t.compose = self.db.query(Compose).one()
-        t.id = 'f26-updates-testing'
-        t.path = os.path.join(self.tempdir, t.id + '-' + time.strftime("%y%m%d.%H%M"))
-        for arch in ['source']:
-            repodata = os.path.join(t.path, 'compose', 'Everything', arch, 'os', 'repodata')
-            os.makedirs(repodata)
-            with open(os.path.join(repodata, 'repomd.xml'), 'w') as repomd:
-                repomd.write('---\nyaml: rules')
+        t = self._make_thread(arches=[])
+        os.makedirs(os.path.join(t.path, 'compose', 'Everything', 'source', 'tree', 'repodata'))
 
-        try:
+        with self.assertRaises(Exception) as exc:
             t.wait_for_sync()
-            assert False, "Compose with just source passed"
-        except Exception as ex:
-            assert str(ex) == "Not found an arch to wait_for_sync with"
 
-    @mock.patch.dict(
-        'bodhi.server.consumers.masher.config',
-        {'fedora_testing_master_repomd':
-            'http://example.com/pub/fedora/linux/updates/testing/%s/%s/repodata.repomd.xml'})
+        self.assertEqual(str(exc.exception), "Not found an arch to wait_for_sync with")
+        self.assertEqual(self.mirror.requests, [])
+
     @mock.patch('bodhi.server.consumers.masher.notifications.publish')
-    @mock.patch('bodhi.server.consumers.masher.time.sleep')
-    @mock.patch(
-        'bodhi.server.consumers.masher.urllib2.urlopen',
-        side_effect=[StringIO('wrong'), StringIO('nope'), StringIO('---\nyaml: rules')])
-    def test_checksum_match_third_try(self, urlopen, sleep, publish):
+    def test_checksum_match_after_sync(self, publish):
         """
-        Assert correct operation when the repomd checksum matches on the third try.
+        Assert that the compose moves on shortly after the mirror gets the new repodata, and that
+        polls of an unchanged mirror are answered with 304 Not Modified.
         """
-        t = MasherThread(self._make_msg()['body']['msg']['composes'][0],
-                         'bowlofeggs', log, self.Session, self.tempdir)
-        t.compose = self.db.query(Compose).one()
-        t.id = 'f26-updates-testing'
-        t.path = os.path.join(self.tempdir, t.id + '-' + time.strftime("%y%m%d.%H%M"))
         for arch in ['aarch64', 'x86_64']:
-            repodata = os.path.join(t.path, 'compose', 'Everything', arch, 'os', 'repodata')
-            os.makedirs(repodata)
-            with open(os.path.join(repodata, 'repomd.xml'), 'w') as repomd:
-                repomd.write('---\nyaml: rules')
-
-        t.wait_for_sync()
+            self.mirror.publish('/testing/17/%s/repomd.xml' % arch, 'old repodata')
+        t = self._make_thread()
+
+        def rsync():
+            for arch in ['aarch64', 'x86_64']:
+                self.mirror.publish('/testing/17/%s/repomd.xml' % arch, '---\nyaml: rules')
+        timer = threading.Timer(0.3, rsync)
+        timer.start()
+
+        start = time.time()
+        with mock.patch.dict('bodhi.server.consumers.masher.config',
+                             {'fedora_testing_master_repomd': self.repomd_url}):
+            t.wait_for_sync()
+        elapsed = time.time() - start
+        timer.join()
 
-        expected_calls = [
-            mock.call(topic='mashtask.sync.wait', msg={'repo': t.id, 'agent': 'bowlofeggs'},
-                      force=True),
+        publish.assert_has_calls([
             mock.call(topic='mashtask.sync.done', msg={'repo': t.id, 'agent': 'bowlofeggs'},
-                      force=True)]
-        publish.assert_has_calls(expected_calls)
-        # Since os.listdir() isn't deterministic about the order of the items it returns, the test
-        # won't be deterministic about which of arch URL gets used. However, either one of them
-        # would be correct so we will just assert that the one that is used is used correctly.
-        arch = 'x86_64' if 'x86_64' in urlopen.mock_calls[0][1][0] else 'aarch64'
-        expected_calls = [
-            mock.call('http://example.com/pub/fedora/linux/updates/testing/17/'
-                      '{}/repodata.repomd.xml'.format(arch))
-            for i in range(3)]
-        urlopen.assert_has_calls(expected_calls)
-        sleep.assert_has_calls([mock.call(200), mock.call(200)])
+                      force=True)])
+        # The old implementation would have slept for 200 seconds here. The watcher's interval
+        # is capped at 0.05 seconds in this test, so it should notice the sync almost at once.
+        self.assertTrue(0.3 <= elapsed < 2, elapsed)
+        self.assertTrue(self._paths(304))
+        for arch in ['aarch64', 'x86_64']:
+            self.assertIn(('/testing/17/%s/repomd.xml' % arch, 200),
+                          [(r[1], r[2]) for r in self.mirror.requests if r[0] >= start + 0.3])
 
-    @mock.patch.dict(
-        'bodhi.server.consumers.masher.config',
-        {'fedora_testing_master_repomd':
-            'http://example.com/pub/fedora/linux/updates/testing/%s/%s/repodata.repomd.xml'})
     @mock.patch('bodhi.server.consumers.masher.notifications.publish')
-    @mock.patch('bodhi.server.consumers.masher.time.sleep')
-    @mock.patch(
-        'bodhi.server.consumers.masher.urllib2.urlopen',
-        side_effect=[urllib2.HTTPError('url', 404, 'Not found', {}, None),
-                     StringIO('---\nyaml: rules')])
-    def test_httperror(self, urlopen, sleep, publish):
+    def test_httperror(self, publish):
         """
         Assert that an HTTPError is properly caught and logged, and that the algorithm continues.
         """
-        t = MasherThread(self._make_msg()['body']['msg']['composes'][0],
-                         'bowlofeggs', log, self.Session, self.tempdir)
-        t.compose = self.db.query(Compose).one()
-        t.id = 'f26-updates-testing'
+        t = self._make_thread(arches=['x86_64'])
         t.log = mock.MagicMock()
-        t.path = os.path.join(self.tempdir, t.id + '-' + time.strftime("%y%m%d.%H%M"))
-        for arch in ['aarch64', 'x86_64']:
-            repodata = os.path.join(t.path, 'compose', 'Everything', arch, 'os', 'repodata')
-            os.makedirs(repodata)
-            with open(os.path.join(repodata, 'repomd.xml'), 'w') as repomd:
-                repomd.write('---\nyaml: rules')
+        timer = threading.Timer(
+            0.1, self.mirror.publish, args=('/testing/17/x86_64/repomd.xml', '---\nyaml: rules'))
+        timer.start()
 
-        t.wait_for_sync()
+        with mock.patch.dict('bodhi.server.consumers.masher.config',
+                             {'fedora_testing_master_repomd': self.repomd_url}):
+            t.wait_for_sync()
+        timer.join()
 
-        expected_calls = [
-            mock.call(topic='mashtask.sync.wait', msg={'repo': t.id, 'agent': 'bowlofeggs'},
-                      force=True),
+        publish.assert_has_calls([
             mock.call(topic='mashtask.sync.done', msg={'repo': t.id, 'agent': 'bowlofeggs'},
-                      force=True)]
-        publish.assert_has_calls(expected_calls)
-        # Since os.listdir() isn't deterministic about the order of the items it returns, the test
-        # won't be deterministic about which of arch URL gets used. However, either one of them
-        # would be correct so we will just assert that the one that is used is used correctly.
-        arch = 'x86_64' if 'x86_64' in urlopen.mock_calls[0][1][0] else 'aarch64'
-        expected_calls = [
-            mock.call('http://example.com/pub/fedora/linux/updates/testing/17/'
-                      '{}/repodata.repomd.xml'.format(arch))
-            for i in range(2)]
-        urlopen.assert_has_calls(expected_calls)
-        t.log.exception.assert_called_once_with('Error fetching repomd.xml')
-        sleep.assert_called_once_with(200)
+                      force=True)])
+        self.assertTrue(self._paths(404))
+        self.assertEqual(self._paths(200), ['/testing/17/x86_64/repomd.xml'])
+        t.log.exception.assert_called_with('Error fetching repomd.xml')
+        self.assertEqual(t._stage_timings['wait_for_sync']['counters']['mirror_polls'],
+                         len(self.mirror.requests))
 
     @mock.patch.dict(
         'bodhi.server.consumers.masher.config',
         {'fedora_testing_master_repomd': None})
     @mock.patch('bodhi.server.consumers.masher.notifications.publish')
-    @mock.patch('bodhi.server.consumers.masher.time.sleep',
-                mock.MagicMock(side_effect=Exception('This should not happen during this test.')))
-    @mock.patch('bodhi.server.consumers.masher.urllib2.urlopen',
-                mock.MagicMock(side_effect=Exception('urlopen should not be called')))
     def test_missing_config_key(self, publish):
         """
         Assert that a ValueError is raised when the needed *_master_repomd config is missing.
         """
-        t = MasherThread(self._make_msg()['body']['msg']['composes'][0],
-                         'bowlofeggs', log, self.Session, self.tempdir)
-        t.compose = self.db.query(Compose).one()
-        t.id = 'f26-updates-testing'
-        t.path = os.path.join(self.tempdir, t.id + '-' + time.strftime("%y%m%d.%H%M"))
-        for arch in ['aarch64', 'x86_64']:
-            repodata = os.path.join(t.path, 'compose', 'Everything', arch, 'os', 'repodata')
-            os.makedirs(repodata)
-            with open(os.path.join(repodata, 'repomd.xml'), 'w') as repomd:
-                repomd.write('---\nyaml: rules')
+        t = self._make_thread()
 
         with self.assertRaises(ValueError) as exc:
             t.wait_for_sync()
@@ -2217,22 +3230,15 @@ class TestMasherThread_wait_for_sync(MasherThreadBaseTestCase):
                          'Could not find fedora_testing_master_repomd in the config file')
         publish.assert_called_once_with(topic='mashtask.sync.wait',
                                         msg={'repo': t.id, 'agent': 'bowlofeggs'}, force=True)
+        self.assertEqual(self.mirror.requests, [])
 
     @mock.patch('bodhi.server.consumers.masher.notifications.publish')
-    @mock.patch('bodhi.server.consumers.masher.time.sleep',
-                mock.MagicMock(side_effect=Exception('This should not happen during this test.')))
-    @mock.patch('bodhi.server.consumers.masher.urllib2.urlopen',
-                mock.MagicMock(side_effect=Exception('urlopen should not be called')))
     def test_missing_repomd(self, publish):
         """
         Assert that an error is logged when the local repomd is missing.
         """
-        t = MasherThread(self._make_msg()['body']['msg']['composes'][0],
-                         'bowlofeggs', log, self.Session, self.tempdir)
-        t.compose = self.db.query(Compose).one()
-        t.id = 'f26-updates-testing'
+        t = self._make_thread(arches=[])
         t.log = mock.MagicMock()
-        t.path = os.path.join(self.tempdir, t.id + '-' + time.strftime("%y%m%d.%H%M"))
         repodata = os.path.join(t.path, 'compose', 'Everything', 'x86_64', 'os', 'repodata')
         os.makedirs(repodata)
 
@@ -2242,52 +3248,63 @@ class TestMasherThread_wait_for_sync(MasherThreadBaseTestCase):
                                         msg={'repo': t.id, 'agent': 'bowlofeggs'}, force=True)
         t.log.error.assert_called_once_with(
             'Cannot find local repomd: %s', os.path.join(repodata, 'repomd.xml'))
+        self.assertEqual(self.mirror.requests, [])
 
     @mock.patch.dict(
         'bodhi.server.consumers.masher.config',
         {'fedora_testing_master_repomd':
             'http://example.com/pub/fedora/linux/updates/testing/%s/%s/repodata.repomd.xml'})
     @mock.patch('bodhi.server.consumers.masher.notifications.publish')
-    @mock.patch('bodhi.server.consumers.masher.time.sleep')
-    @mock.patch(
-        'bodhi.server.consumers.masher.urllib2.urlopen',
-        side_effect=[urllib2.URLError('it broke'),
-                     StringIO('---\nyaml: rules')])
-    def test_urlerror(self, urlopen, sleep, publish):
+    @mock.patch('bodhi.server.sync.urllib.request.urlopen')
+    def test_urlerror(self, urlopen, publish):
         """
         Assert that a URLError is properly caught and logged, and that the algorithm continues.
         """
-        t = MasherThread(self._make_msg()['body']['msg']['composes'][0],
-                         'bowlofeggs', log, self.Session, self.tempdir)
-        t.compose = self.db.query(Compose).one()
-        t.id = 'f26-updates-testing'
+        response = mock.MagicMock()
+        response.read.return_value = '---\nyaml: rules'
+        response.info.return_value = {}
+        urlopen.side_effect = [urllib2.URLError('it broke'), response]
+        t = self._make_thread(arches=['x86_64'])
         t.log = mock.MagicMock()
-        t.path = os.path.join(self.tempdir, t.id + '-' + time.strftime("%y%m%d.%H%M"))
-        for arch in ['aarch64', 'x86_64']:
-            repodata = os.path.join(t.path, 'compose', 'Everything', arch, 'os', 'repodata')
-            os.makedirs(repodata)
-            with open(os.path.join(repodata, 'repomd.xml'), 'w') as repomd:
-                repomd.write('---\nyaml: rules')
 
         t.wait_for_sync()
 
-        expected_calls = [
-            mock.call(topic='mashtask.sync.wait', msg={'repo': t.id, 'agent': 'bowlofeggs'},
-                      force=True),
+        publish.assert_has_calls([
             mock.call(topic='mashtask.sync.done', msg={'repo': t.id, 'agent': 'bowlofeggs'},
-                      force=True)]
-        publish.assert_has_calls(expected_calls)
-        # Since os.listdir() isn't deterministic about the order of the items it returns, the test
-        # won't be deterministic about which of arch URL gets used. However, either one of them
-        # would be correct so we will just assert that the one that is used is used correctly.
-        arch = 'x86_64' if 'x86_64' in urlopen.mock_calls[0][1][0] else 'aarch64'
-        expected_calls = [
-            mock.call('http://example.com/pub/fedora/linux/updates/testing/17/'
-                      '{}/repodata.repomd.xml'.format(arch))
-            for i in range(2)]
-        urlopen.assert_has_calls(expected_calls)
+                      force=True)])
+        self.assertEqual(
+            [c[1][0].get_full_url() for c in urlopen.mock_calls if c[0] == ''],
+            ['http://example.com/pub/fedora/linux/updates/testing/17/x86_64/'
+             'repodata.repomd.xml'] * 2)
         t.log.exception.assert_called_once_with('Error fetching repomd.xml')
-        sleep.assert_called_once_with(200)
+
+    @mock.patch('bodhi.server.consumers.masher.notifications.publish')
+    def test_synced_message(self, publish):
+        """
+        Assert that being told the repo is synced ends the wait even if the mirror never matches.
+        """
+        for arch in ['aarch64', 'x86_64']:
+            self.mirror.publish('/testing/17/%s/repomd.xml' % arch, 'old repodata')
+        t = self._make_thread()
+        notified = []
+
+        def notify():
+            # Keep trying until the watcher has registered itself.
+            while not sync.notify_synced(t.id):
+                time.sleep(0.01)
+            notified.append(True)
+        notifier = threading.Thread(target=notify)
+        notifier.start()
+
+        with mock.patch.dict('bodhi.server.consumers.masher.config',
+                             {'fedora_testing_master_repomd': self.repomd_url}):
+            t.wait_for_sync()
+        notifier.join()
+
+        self.assertEqual(notified, [True])
+        publish.assert_has_calls([
+            mock.call(topic='mashtask.sync.done', msg={'repo': t.id, 'agent': 'bowlofeggs'},
+                      force=True)])
 
 
 class TestMasherThread__mark_status_changes(MasherThreadBaseTestCase):
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2018 Red Hat, Inc.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""This test suite contains tests for the bodhi.server.consumers.synced module."""
+import unittest
+
+import mock
+
+from bodhi.server.consumers import synced
+
+
+class TestSyncedHandler(unittest.TestCase):
+    """This test class contains tests for the SyncedHandler class."""
+    def setUp(self):
+        hub = mock.MagicMock()
+        hub.config = {'synced_handler_topics': ['org.fedoraproject.prod.bodhi.mirror.synced']}
+        self.handler = synced.SyncedHandler(hub)
+
+    def test___init__(self):
+        """The topics come from the hub config."""
+        self.assertEqual(self.handler.topic, ['org.fedoraproject.prod.bodhi.mirror.synced'])
+
+    @mock.patch('bodhi.server.consumers.synced.sync.notify_synced')
+    def test_consume(self, notify_synced):
+        """The repo and arch from the message are passed on to notify_synced()."""
+        self.handler.consume(
+            {'body': {'msg': {'repo': 'f27-updates-testing', 'arch': 'x86_64'}}})
+
+        notify_synced.assert_called_once_with('f27-updates-testing', 'x86_64')
+
+    @mock.patch('bodhi.server.consumers.synced.sync.notify_synced')
+    def test_consume_without_repo(self, notify_synced):
+        """Messages without a repo are ignored."""
+        self.handler.consume({'body': {'msg': {'arch': 'x86_64'}}})
+
+        self.assertEqual(notify_synced.call_count, 0)
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2018 Red Hat, Inc.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""This module contains tests for the bodhi.server.scripts.check_karma module."""
+from click import testing
+import mock
+
+from bodhi.server import models
+from bodhi.server.scripts import check_karma
+from bodhi.tests.server.base import BaseTestCase
+
+
+class TestCheck(BaseTestCase):
+    """This class contains tests for the check() function."""
+    def test_consistent(self):
+        """Nothing should be reported when the stored counters match the comments."""
+        runner = testing.CliRunner()
+
+        result = runner.invoke(check_karma.check, [])
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(result.output, '')
+
+    def test_differing(self):
+        """Updates with wrong counters should be reported, and the command should fail."""
+        runner = testing.CliRunner()
+        update = self.db.query(models.Update).one()
+        update.karma = 5
+        update.comment_count = 0
+        self.db.commit()
+
+        result = runner.invoke(check_karma.check, [])
+
+        self.assertEqual(result.exit_code, 1)
+        self.assertEqual(
+            result.output,
+            u'bodhi-2.0-1.fc17: comment_count is 0 instead of 2, karma is 5 instead of 1\n')
+        update = self.db.query(models.Update).one()
+        self.assertEqual(update.karma, 5)
+
+    def test_fix(self):
+        """With --fix, the recomputed counters should be stored."""
+        runner = testing.CliRunner()
+        update = self.db.query(models.Update).one()
+        update.positive_karma = 0
+        self.db.commit()
+
+        result = runner.invoke(check_karma.check, ['--fix'])
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(result.output, u'bodhi-2.0-1.fc17: positive_karma is 0 instead of 1\n')
+        update = self.db.query(models.Update).one()
+        self.assertEqual(update.positive_karma, 1)
+
+    @mock.patch('bodhi.server.scripts.check_karma.CHUNK_SIZE', 1)
+    def test_fix_chunks(self):
+        """The updates of every chunk should be checked, and fixed with a commit per chunk."""
+        runner = testing.CliRunner()
+        self.create_update([u'ejabberd-16.09-4.fc17'])
+        for update in self.db.query(models.Update):
+            update.comment_count = 7
+        self.db.commit()
+
+        with mock.patch.object(self.db, 'commit', wraps=self.db.commit) as commit:
+            result = runner.invoke(check_karma.check, ['--fix'])
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(result.output,
+                         (u'bodhi-2.0-1.fc17: comment_count is 7 instead of 2\n'
+                          u'ejabberd-16.09-4.fc17: comment_count is 7 instead of 0\n'))
+        self.assertEqual(commit.call_count, 2)
+        self.assertEqual([u.comment_count for u in self.db.query(models.Update).order_by(
+            models.Update.id)], [2, 0])
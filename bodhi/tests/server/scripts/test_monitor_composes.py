@@ -19,7 +19,6 @@
 """
 This module contains tests for the bodhi.server.scripts.monitor_composes module.
 """
-import json
 
 from click import testing
 import mock
@@ -52,7 +51,9 @@ class TestMonitor(BaseTestCase):
         update.request = models.UpdateRequest.testing
         compose_1 = models.Compose(
             release=update.release, request=update.request, state=models.ComposeState.notifying,
-            checkpoints=json.dumps({'check_1': True, 'check_2': True}))
+            checkpoints=[models.ComposeCheckpoint(key=u'check_1', value=u'true'),
+                         models.ComposeCheckpoint(key=u'check_2', value=u'true'),
+                         models.ComposeCheckpoint(key=u'check_3.done', value=u'1', progress=True)])
         ejabberd = self.create_update([u'ejabberd-16.09-4.fc17'])
         ejabberd.locked = True
         ejabberd.status = models.UpdateStatus.testing
@@ -72,6 +73,6 @@ class TestMonitor(BaseTestCase):
             'Locked updates: 2\n\n<Compose: F17 stable>\n\tstate: <failed>\n\tstate_date: {}\n\t'
             'security: True\n\terror_message: y r u so mean nfs\n\tcheckpoints: \n\t'
             'len(updates): 1\n\n<Compose: F17 testing>\n\tstate: <notifying>\n\tstate_date: {}\n\t'
-            'security: False\n\tcheckpoints: check_2, check_1\n\tlen(updates): 1\n\n')
+            'security: False\n\tcheckpoints: check_1, check_2\n\tlen(updates): 1\n\n')
         self.assertEqual(r.output,
                          EXPECTED_OUTPUT.format(compose_2.state_date, compose_1.state_date))
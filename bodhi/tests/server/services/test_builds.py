@@ -60,6 +60,23 @@ class TestBuildsService(base.BaseTestCase):
 
         self.assertNotEquals(build1, build2)
 
+    def test_list_builds_cursor(self):
+        build = RpmBuild(nvr=u'bodhi-3.0-1.fc21',
+                         package=RpmPackage.query.filter_by(name=u'bodhi').one())
+        self.db.add(build)
+        self.db.flush()
+
+        body = self.app.get('/builds/', {"rows_per_page": 1}).json_body
+        self.assertEquals(body['builds'][0]['nvr'], u'bodhi-2.0-1.fc17')
+        self.assertEquals(body['total'], 2)
+
+        body = self.app.get('/builds/', {"rows_per_page": 1,
+                                         "cursor": body['next_cursor']}).json_body
+        self.assertEquals(len(body['builds']), 1)
+        self.assertEquals(body['builds'][0]['nvr'], u'bodhi-3.0-1.fc21')
+        self.assertIsNone(body['total'])
+        self.assertIsNone(body['next_cursor'])
+
     def test_list_builds_by_package(self):
         res = self.app.get('/builds/', {"packages": "bodhi"})
         body = res.json_body
@@ -347,6 +347,42 @@ class TestCommentsService(base.BaseTestCase):
 
         self.assertNotEquals(comment1, comment2)
 
+    def test_list_comments_cursor(self):
+        """Assert that following next_cursor goes through all the comments once, newest first."""
+        query = self.db.query(Comment).order_by(Comment.timestamp.desc(), Comment.id.desc())
+        expected = [c.id for c in query]
+        ids = []
+        params = {"rows_per_page": 1}
+        while True:
+            body = self.app.get('/comments/', params).json_body
+            ids.extend(c['id'] for c in body['comments'])
+            if body['next_cursor'] is None:
+                break
+            params['cursor'] = body['next_cursor']
+
+        self.assertEquals(ids, expected)
+        self.assertIsNone(body['total'])
+
+    def test_list_comments_cursor_null_timestamp(self):
+        """Assert that the crawl goes on past the comments without a timestamp, which come last."""
+        undated = self.db.query(Comment).order_by(Comment.id.desc()).all()
+        for comment in undated:
+            comment.timestamp = None
+        dated = Comment(text=u'dated', user=self.db.query(User).filter_by(name=u'guest').one())
+        Update.get(u'bodhi-2.0-1.fc17', self.db).comments.append(dated)
+        self.db.flush()
+        expected = [dated.id] + [c.id for c in undated]
+        ids = []
+        params = {"rows_per_page": 1}
+        while True:
+            body = self.app.get('/comments/', params).json_body
+            ids.extend(c['id'] for c in body['comments'])
+            if body['next_cursor'] is None:
+                break
+            params['cursor'] = body['next_cursor']
+
+        self.assertEquals(ids, expected)
+
     def test_list_comments_by_since(self):
         tomorrow = datetime.utcnow() + timedelta(days=1)
         fmt = "%Y-%m-%d %H:%M:%S"
@@ -17,6 +17,7 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 """This module contains tests for bodhi.server.services.composes."""
+import json
 
 from pyramid import testing
 from pyramid import security
@@ -73,6 +74,22 @@ class TestComposeCollectionGet(base.BaseTestCase):
             '/composes/{}/{}'.format(compose.release.name, compose.request.value) in response)
         self.assertTrue(compose.state.description in response)
 
+    def test_with_compose_json(self):
+        """Assert correct behavior of the JSON API when there is a compose."""
+        update = models.Update.query.first()
+        compose = models.Compose(release=update.release, request=update.request)
+        compose.stage_timings = json.dumps({'mash': {'duration': 42.0}})
+        self.db.add(compose)
+        self.db.flush()
+
+        response = self.app.get('/composes/', status=200, headers={'Accept': 'application/json'})
+
+        self.assertEqual(len(response.json['composes']), 1)
+        self.assertEqual(response.json['composes'][0]['release_name'], compose.release.name)
+        self.assertEqual(response.json['composes'][0]['request'], compose.request.value)
+        self.assertEqual(response.json['composes'][0]['state'], u'requested')
+        self.assertEqual(response.json['composes'][0]['stages'], {'mash': {'duration': 42.0}})
+
 
 class TestComposeGet(base.BaseTestCase):
     """This class contains tests for the Compose.get() method."""
@@ -109,3 +126,51 @@ class TestComposeGet(base.BaseTestCase):
         self.assertTrue(compose.state.description in response)
         self.assertTrue('{} {}'.format(compose.release.name, compose.request.value) in response)
         self.assertTrue(update.beautify_title(amp=True, nvr=True) in response)
+        self.assertFalse('id="stages"' in response)
+
+    def test_with_stages(self):
+        """Assert that the timings, progress and counters of the stages are rendered."""
+        update = models.Update.query.first()
+        update.locked = True
+        compose = models.Compose(release=update.release, request=update.request)
+        compose.stage_timings = json.dumps(
+            {'wait_for_sync': {'start': '2017-01-02T03:04:05.678000', 'duration': 63.3,
+                               'counters': {'mirror_polls': 12}},
+             'mash': {'progress': {'done': 3, 'total': 8}}})
+        self.db.add(compose)
+        self.db.flush()
+
+        response = self.app.get(
+            '/composes/{}/{}'.format(compose.release.name, compose.request.value),
+            status=200, headers={'Accept': 'text/html'})
+
+        self.assertTrue('id="stages"' in response)
+        self.assertTrue('2017-01-02 03:04:05' in response)
+        self.assertTrue('63.3 s' in response)
+        self.assertTrue('mirror polls: 12' in response)
+        self.assertTrue('3 / 8' in response)
+
+    def test_json(self):
+        """Assert that the JSON API includes the state and the stages of the compose."""
+        update = models.Update.query.first()
+        update.locked = True
+        compose = models.Compose(release=update.release, request=update.request)
+        compose.stage_timings = json.dumps({'mash': {'progress': {'done': 3, 'total': 8}}})
+        self.db.add(compose)
+        self.db.flush()
+
+        response = self.app.get(
+            '/composes/{}/{}'.format(compose.release.name, compose.request.value),
+            status=200, headers={'Accept': 'application/json'})
+
+        self.assertEqual(response.json['compose']['release_name'], compose.release.name)
+        self.assertEqual(response.json['compose']['state'], u'requested')
+        self.assertEqual(response.json['compose']['update_count'], 1)
+        self.assertEqual(response.json['compose']['content_type'], u'rpm')
+        self.assertEqual(response.json['compose']['stages'],
+                         {'mash': {'progress': {'done': 3, 'total': 8}}})
+
+    def test_404_json(self):
+        """Assert a 404 error code from the JSON API when the Compose doesn't exist."""
+        self.app.get('/composes/dne/testing', status=404,
+                     headers={'Accept': 'application/json'})
@@ -93,6 +93,16 @@ class TestReleasesService(base.BaseTestCase):
         self.assertEquals(len(body['releases']), 1)
         self.assertEquals(body['releases'][0]['name'], 'F22')
 
+    def test_list_releases_with_cursor(self):
+        body = self.app.get('/releases/', {'rows_per_page': 1}).json_body
+        self.assertEquals(body['releases'][0]['name'], 'F17')
+
+        body = self.app.get('/releases/', {'rows_per_page': 1,
+                                           'cursor': body['next_cursor']}).json_body
+        self.assertEquals(len(body['releases']), 1)
+        self.assertEquals(body['releases'][0]['name'], 'F22')
+        self.assertIsNone(body['next_cursor'])
+
     def test_list_releases_by_ids_unknown(self):
         res = self.app.get('/releases/', {"ids": [9234872348923467]})
 
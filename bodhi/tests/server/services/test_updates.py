@@ -1274,6 +1274,78 @@ class TestUpdatesService(base.BaseTestCase):
 
         self.assertNotEquals(update1, update2)
 
+    @mock.patch(**mock_valid_requirements)
+    def test_list_updates_cursor(self, *args):
+        """Assert that the next_cursor of a page leads to the next page, without counting."""
+        self.app.post_json('/updates/', self.get_update('bodhi-2.0.0-2.fc17'))
+
+        body = self.app.get('/updates/', {"rows_per_page": 1}).json_body
+
+        self.assertEquals(body['updates'][0]['title'], u'bodhi-2.0.0-2.fc17')
+        self.assertEquals(body['page'], 1)
+        self.assertEquals(body['pages'], 2)
+        self.assertEquals(body['total'], 2)
+
+        body = self.app.get('/updates/', {"rows_per_page": 1,
+                                          "cursor": body['next_cursor']}).json_body
+
+        self.assertEquals(len(body['updates']), 1)
+        self.assertEquals(body['updates'][0]['title'], u'bodhi-2.0-1.fc17')
+        self.assertIsNone(body['page'])
+        self.assertIsNone(body['pages'])
+        self.assertIsNone(body['total'])
+        self.assertIsNone(body['next_cursor'])
+
+    @mock.patch(**mock_valid_requirements)
+    def test_list_updates_cursor_null_date_submitted(self, *args):
+        """Assert that the crawl goes on past the updates that were never submitted."""
+        self.app.post_json('/updates/', self.get_update('bodhi-2.0.0-2.fc17'))
+        for title in (u'bodhi-2.0-1.fc17', u'bodhi-2.0.0-2.fc17'):
+            Update.get(title, self.db).date_submitted = None
+        self.db.flush()
+
+        titles = []
+        params = {"rows_per_page": 1}
+        while True:
+            body = self.app.get('/updates/', params).json_body
+            titles.extend(u['title'] for u in body['updates'])
+            if body['next_cursor'] is None:
+                break
+            params['cursor'] = body['next_cursor']
+
+        # Without a date_submitted, the newest update comes first.
+        self.assertEquals(titles, [u'bodhi-2.0.0-2.fc17', u'bodhi-2.0-1.fc17'])
+
+    @mock.patch(**mock_valid_requirements)
+    def test_list_updates_cursor_count(self, *args):
+        """Assert that the results are counted for a cursor if count is true."""
+        self.app.post_json('/updates/', self.get_update('bodhi-2.0.0-2.fc17'))
+        cursor = self.app.get('/updates/', {"rows_per_page": 1}).json_body['next_cursor']
+
+        body = self.app.get('/updates/', {"rows_per_page": 1, "cursor": cursor,
+                                          "count": "true"}).json_body
+
+        self.assertEquals(body['updates'][0]['title'], u'bodhi-2.0-1.fc17')
+        self.assertEquals(body['pages'], 2)
+        self.assertEquals(body['total'], 2)
+
+    def test_list_updates_page_without_count(self):
+        """Assert that the results are not counted for a page if count is false."""
+        body = self.app.get('/updates/', {"count": "false"}).json_body
+
+        self.assertEquals(len(body['updates']), 1)
+        self.assertEquals(body['page'], 1)
+        self.assertIsNone(body['pages'])
+        self.assertIsNone(body['total'])
+        self.assertIsNone(body['next_cursor'])
+
+    def test_list_updates_invalid_cursor(self):
+        """Assert that a cursor that wasn't given by bodhi is rejected."""
+        res = self.app.get('/updates/', {"cursor": "wat"}, status=400)
+
+        self.assertEquals(res.json_body['errors'][0]['name'], 'cursor')
+        self.assertEquals(res.json_body['errors'][0]['description'], '"wat" is not a valid cursor')
+
     def test_list_updates_by_approved_since(self):
         now = datetime.utcnow()
 
@@ -2341,7 +2413,6 @@ class TestUpdatesService(base.BaseTestCase):
         publish.assert_called_with(topic='update.request.testing', msg=ANY)
 
         # Add another release and package
-        Release._tag_cache = None
         release = Release(
             name=u'F18', long_name=u'Fedora 18',
             id_prefix=u'FEDORA', version=u'18',
@@ -3203,7 +3274,6 @@ class TestUpdatesService(base.BaseTestCase):
     def test_submitting_multi_release_updates(self, publish, *args):
         """ https://github.com/fedora-infra/bodhi/issues/219 """
         # Add another release and package
-        Release._tag_cache = None
         release = Release(
             name=u'F18', long_name=u'Fedora 18',
             id_prefix=u'FEDORA', version=u'18',
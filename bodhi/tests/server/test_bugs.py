@@ -19,6 +19,9 @@
 """This test suite contains tests for bodhi.server.bugs."""
 
 from __future__ import division
+import errno
+import socket
+import threading
 import unittest
 
 import mock
@@ -88,6 +91,24 @@ class TestBugzilla(unittest.TestCase):
         self.assertTrue(return_value is bz._bz)
         self.assertEqual(_connect.call_count, 0)
 
+    @mock.patch('bodhi.server.bugs.bugzilla.Bugzilla')
+    def test_bz_per_thread(self, Bugzilla):
+        """Assert that each thread connects with a client of its own."""
+        Bugzilla.side_effect = lambda **kwargs: mock.MagicMock()
+        bz = bugs.Bugzilla()
+        clients = []
+
+        with mock.patch.dict('bodhi.server.bugs.config', {'bz_server': 'https://example.com/bz'}):
+            clients.append(bz.bz)
+            thread = threading.Thread(target=lambda: clients.append(bz.bz))
+            thread.start()
+            thread.join()
+            clients.append(bz.bz)
+
+        self.assertEqual(Bugzilla.call_count, 2)
+        self.assertTrue(clients[0] is clients[2])
+        self.assertFalse(clients[0] is clients[1])
+
     @mock.patch('bodhi.server.bugs.log.exception')
     def test_close_fault(self, exception):
         """Assert that an xmlrpc Fault is caught and logged by close()."""
@@ -165,6 +186,27 @@ class TestBugzilla(unittest.TestCase):
         bz._bz.getbug.return_value.addcomment.assert_called_once_with('A nice message.')
         exception.assert_called_once_with('Unable to add comment to bug #1411188')
 
+    def test_comment_unreachable(self):
+        """Assert that comment() lets out the error of a refused connection, so it is retried."""
+        bz = bugs.Bugzilla()
+        bz._bz = mock.MagicMock()
+        bz._bz.getbug.side_effect = socket.error(errno.ECONNREFUSED, 'Connection refused')
+
+        with self.assertRaises(socket.error):
+            bz.comment(1411188, 'A nice message.')
+
+    @mock.patch('bodhi.server.bugs.log.exception')
+    def test_comment_connection_reset(self, exception):
+        """Assert that comment() logs a connection error once it may have sent the comment."""
+        bz = bugs.Bugzilla()
+        bz._bz = mock.MagicMock()
+        bz._bz.getbug.return_value.addcomment.side_effect = socket.error(
+            errno.ECONNRESET, 'Connection reset by peer')
+
+        bz.comment(1411188, 'A nice message.')
+
+        exception.assert_called_once_with('Unable to add comment to bug #1411188')
+
     def test_get_url(self):
         """
         Assert correct behavior from the get_url() method.
@@ -228,6 +270,15 @@ class TestBugzilla(unittest.TestCase):
         exception_log.assert_called_once_with("Unable to alter bug #1411188")
         self.assertEqual(bz._bz.getbug.return_value.setstatus.call_count, 0)
 
+    def test_modified_unreachable(self):
+        """Test the modified() method lets out the error of an unknown host, so it is retried."""
+        bz = bugs.Bugzilla()
+        bz._bz = mock.MagicMock()
+        bz._bz.getbug.side_effect = socket.gaierror(-2, 'Name or service not known')
+
+        with self.assertRaises(socket.gaierror):
+            bz.modified(1411188)
+
     @mock.patch('bodhi.server.bugs.log.exception')
     def test_update_details_exception(self, mock_exceptionlog):
         """Test we log an exception if update_details raises one"""
@@ -268,6 +319,17 @@ class TestBugzilla(unittest.TestCase):
                                                                      comment='A mean message.')
         exception.assert_called_once_with('Unable to alter bug #1411188')
 
+    def test_on_qa_unreachable(self):
+        """
+        Test the on_qa() method lets out the error of an unreachable host, so it is retried.
+        """
+        bz = bugs.Bugzilla()
+        bz._bz = mock.MagicMock()
+        bz._bz.getbug.side_effect = socket.error(errno.EHOSTUNREACH, 'No route to host')
+
+        with self.assertRaises(socket.error):
+            bz.on_qa(1411188, 'A message.')
+
     @mock.patch('bodhi.server.bugs.log.exception')
     def test_on_qa_success(self, exception):
         """
@@ -18,7 +18,8 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 """This test suite contains tests for the bodhi.server.buildsys module."""
 
-from threading import Lock
+from threading import Lock, Thread
+import time
 import unittest
 
 import koji
@@ -27,6 +28,9 @@ import mock
 from bodhi.server import buildsys
 
 
+_sleep = time.sleep
+
+
 class TestBuildsystem(unittest.TestCase):
     """This test class contains tests for the Buildsystem class."""
     def test_raises_not_implemented(self):
@@ -200,17 +204,209 @@ class TestSetupBuildsystem(unittest.TestCase):
                           {'buildsystem': 'Something unsupported'})
 
 
+class FakeKoji(object):
+    """
+    A Koji session whose tag actions start tasks, which are done after the given number of polls.
+    """
+    def __init__(self, polls=1, states=None, faults=None):
+        self.polls = polls
+        self.states = states or {}
+        self.faults = faults or {}
+        self.multicall = False
+        self.multicalls = []
+        self._calls = []
+        self._tasks = {}
+
+    def _call(self, method, *args):
+        self._calls.append((method, args))
+
+    def tagBuild(self, tag, build, force=False):
+        self._call('tagBuild', tag, build)
+
+    def moveBuild(self, from_tag, to_tag, build, force=False):
+        self._call('moveBuild', from_tag, to_tag, build)
+
+    def getTaskInfo(self, task):
+        self._call('getTaskInfo', task)
+
+    def multiCall(self):
+        calls, self._calls = self._calls, []
+        self.multicalls.append(calls)
+        self.multicall = False
+        results = []
+        for method, args in calls:
+            if method == 'getTaskInfo':
+                self._tasks[args[0]] -= 1
+                state = koji.TASK_STATES['OPEN']
+                if not self._tasks[args[0]]:
+                    state = self.states.get(args[0], koji.TASK_STATES['CLOSED'])
+                results.append([{'id': args[0], 'state': state}])
+            elif args[-1] in self.faults:
+                results.append({'faultCode': 1000, 'faultString': self.faults[args[-1]]})
+            else:
+                task = len(self._tasks) + 1
+                self._tasks[task] = self.polls
+                results.append([task])
+        return results
+
+
+@mock.patch('bodhi.server.buildsys.time.sleep')
+class TestTagBatcher(unittest.TestCase):
+    """Test the TagBatcher class."""
+    def _tag_concurrently(self, sleep, batcher, *actions):
+        """Call batcher.tag() with each of the given (add, move) tuples in a thread of its own."""
+        results = [None] * len(actions)
+
+        def tag(i):
+            results[i] = batcher.tag(*actions[i])
+
+        def wait_for_the_others(seconds):
+            # Hold the worker thread back until every action has been submitted.
+            if seconds == batcher.delay:
+                while batcher._requests.qsize() < len(actions) - 1:
+                    _sleep(0.01)
+
+        sleep.side_effect = wait_for_the_others
+        threads = [Thread(target=tag, args=(i,)) for i in range(len(actions))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        sleep.side_effect = None
+        return results
+
+    def test_batches(self, sleep):
+        """The actions of all the composes are sent in multicalls of up to batch_size actions."""
+        session = FakeKoji(polls=2)
+        batcher = buildsys.TagBatcher(batch_size=2, delay=0)
+        requests = []
+        for add, move in (([('f27-updates', 'a-1-1.fc27')], [('f27-pending', 'f27', 'b-1-1.fc27')]),
+                          ([], [('f28-pending', 'f28', 'c-1-1.fc28')])):
+            requests.append(buildsys._TagRequest(
+                [('tagBuild', a) for a in add] + [('moveBuild', m) for m in move]))
+        outstanding = {}
+
+        batcher._submit(session, requests, outstanding)
+
+        self.assertEqual(
+            session.multicalls,
+            [[('tagBuild', ('f27-updates', 'a-1-1.fc27')),
+              ('moveBuild', ('f27-pending', 'f27', 'b-1-1.fc27'))],
+             [('moveBuild', ('f28-pending', 'f28', 'c-1-1.fc28'))]])
+        self.assertEqual(outstanding, {1: requests[0], 2: requests[0], 3: requests[1]})
+        self.assertEqual(requests[0].tasks, set([1, 2]))
+        self.assertFalse(requests[0].done.is_set())
+
+    def test_coalesced(self, sleep):
+        """Actions submitted together share multicalls, and their tasks are polled together."""
+        session = FakeKoji(polls=2, states={2: koji.TASK_STATES['FAILED']})
+        batcher = buildsys.TagBatcher(delay=0.5)
+        progress = mock.MagicMock()
+
+        with mock.patch('bodhi.server.buildsys.get_session', return_value=session):
+            results = self._tag_concurrently(
+                sleep, batcher,
+                ([], [('f27-pending', 'f27', 'a-1-1.fc27')]),
+                ([('f28-updates', 'b-1-1.fc28')], [('f28-pending', 'f28', 'c-1-1.fc28')]))
+            self.assertEqual(batcher.tag([], [('f26-pending', 'f26', 'd-1-1.fc26')],
+                                         progress=progress), [])
+
+        self.assertEqual(sorted(results, key=len), [[], [2]])
+        # One multicall for the actions, and two rounds of polling for their tasks.
+        self.assertEqual(len(session.multicalls[0]), 3)
+        self.assertEqual([m[0] for m in session.multicalls[1]], ['getTaskInfo'] * 3)
+        self.assertEqual(len(session.multicalls[2]), 3)
+        self.assertEqual(session.multicalls[3],
+                         [('moveBuild', ('f26-pending', 'f26', 'd-1-1.fc26'))])
+        self.assertEqual(progress.mock_calls, [mock.call(0, 1), mock.call(1, 1)])
+
+    def test_error(self, sleep):
+        """An error talking to Koji is raised in every compose whose actions were affected."""
+        session = mock.MagicMock()
+        session.multiCall.side_effect = IOError('Koji is down')
+        batcher = buildsys.TagBatcher(delay=0)
+
+        with mock.patch('bodhi.server.buildsys.get_session', return_value=session):
+            with self.assertRaises(IOError) as exc:
+                batcher.tag([('f27-updates', 'a-1-1.fc27')], [])
+
+        self.assertEqual(str(exc.exception), 'Koji is down')
+
+    def test_fault(self, sleep):
+        """The faults of the actions that Koji refused are returned to their compose."""
+        session = FakeKoji(faults={'a-1-1.fc27': 'Build already tagged'})
+        batcher = buildsys.TagBatcher(delay=0)
+
+        with mock.patch('bodhi.server.buildsys.get_session', return_value=session):
+            failed = batcher.tag([('f27-updates', 'a-1-1.fc27'), ('f27-updates', 'b-1-1.fc27')],
+                                 [])
+
+        self.assertEqual(failed, ['Build already tagged'])
+
+    def test_idle(self, sleep):
+        """The worker thread exits after idle_timeout seconds without actions, and is restarted."""
+        session = FakeKoji()
+        batcher = buildsys.TagBatcher(delay=0, idle_timeout=0)
+
+        with mock.patch('bodhi.server.buildsys.get_session', return_value=session):
+            self.assertEqual(batcher.tag([('f27-updates', 'a-1-1.fc27')], []), [])
+            for i in range(500):
+                if batcher._thread is None:
+                    break
+                _sleep(0.01)
+            self.assertIsNone(batcher._thread)
+            self.assertEqual(batcher.tag([('f27-updates', 'b-1-1.fc27')], []), [])
+
+        self.assertEqual(len(session.multicalls), 4)
+
+    def test_no_actions(self, sleep):
+        """Nothing is sent to Koji without actions."""
+        batcher = buildsys.TagBatcher()
+
+        with mock.patch('bodhi.server.buildsys.get_session') as get_session:
+            self.assertEqual(batcher.tag([], []), [])
+
+        self.assertEqual(get_session.call_count, 0)
+        self.assertIsNone(batcher._thread)
+
+
 @mock.patch('bodhi.server.buildsys.log.debug')
 class TestWaitForTasks(unittest.TestCase):
     """Test the wait_for_tasks() function."""
+    def setUp(self):
+        buildsys.DevBuildsys.clear()
+
+    def tearDown(self):
+        buildsys.DevBuildsys.clear()
 
     @mock.patch('bodhi.server.buildsys.time.sleep')
-    def test_wait_on_unfinished_task(self, sleep, debug):
-        """Assert that we wait on unfinished tasks for sleep seconds."""
+    def test_adaptive_sleep(self, sleep, debug):
+        """The interval doubles after rounds in which no task finished, up to sleep."""
+        buildsys.DevBuildsys.__tasks__ = {
+            1: [koji.TASK_STATES['OPEN']] * 5 + [koji.TASK_STATES['CLOSED']],
+            2: [koji.TASK_STATES['OPEN'], koji.TASK_STATES['CLOSED']]}
+        progress = mock.MagicMock()
+
+        ret = buildsys.wait_for_tasks([1, 2], buildsys.DevBuildsys(), sleep=4, progress=progress)
+
+        self.assertEqual(ret, [])
+        # The second task finished in the second round, so the interval didn't change then.
+        self.assertEqual(sleep.mock_calls,
+                         [mock.call(1), mock.call(2), mock.call(2), mock.call(4), mock.call(4)])
+        self.assertEqual(progress.mock_calls,
+                         [mock.call(0, 2), mock.call(1, 2), mock.call(1, 2), mock.call(1, 2),
+                          mock.call(1, 2), mock.call(2, 2)])
+
+    @mock.patch('bodhi.server.buildsys.time.sleep')
+    def test_multicall(self, sleep, debug):
+        """Each round retrieves the states of the unfinished tasks with one multicall."""
         tasks = [1, 2, 3]
         session = mock.MagicMock()
-        session.taskFinished.side_effect = [True, False, False, True, True]
-        session.getTaskInfo.return_value = {'state': koji.TASK_STATES['CLOSED']}
+        session.multiCall.side_effect = [
+            [[{'state': koji.TASK_STATES['CLOSED']}], [{'state': koji.TASK_STATES['FREE']}],
+             [{'state': koji.TASK_STATES['ASSIGNED']}]],
+            [[{'state': koji.TASK_STATES['OPEN']}], [{'state': koji.TASK_STATES['OPEN']}]],
+            [[{'state': koji.TASK_STATES['CLOSED']}], [{'state': koji.TASK_STATES['CLOSED']}]]]
 
         ret = buildsys.wait_for_tasks(tasks, session, sleep=0.01)
 
@@ -219,40 +415,48 @@ class TestWaitForTasks(unittest.TestCase):
             debug.mock_calls,
             [mock.call('Waiting for 3 tasks to complete: [1, 2, 3]'),
              mock.call('3 tasks completed successfully, 0 tasks failed.')])
-        self.assertEqual(session.taskFinished.mock_calls,
-                         [mock.call(1), mock.call(2), mock.call(2), mock.call(2), mock.call(3)])
+        self.assertEqual(session.getTaskInfo.mock_calls,
+                         [mock.call(1), mock.call(2), mock.call(3), mock.call(2), mock.call(3),
+                          mock.call(2), mock.call(3)])
+        self.assertEqual(session.multiCall.call_count, 3)
         self.assertEqual(sleep.mock_calls, [mock.call(0.01), mock.call(0.01)])
-        self.assertEqual(session.getTaskInfo.mock_calls, [mock.call(1), mock.call(2), mock.call(3)])
 
-    def test_with_failed_task(self, debug):
+    @mock.patch('bodhi.server.buildsys.log.error')
+    def test_with_failed_task(self, error, debug):
         """Assert that we return a list of failed_tasks."""
-        tasks = [1, 2, 3]
-        session = mock.MagicMock()
-        session.taskFinished.side_effect = [True, True, True]
-        session.getTaskInfo.side_effect = [
-            {'state': koji.TASK_STATES['CLOSED']},
-            {'state': koji.TASK_STATES['FAILED']},
-            {'state': koji.TASK_STATES['CLOSED']}]
+        tasks = [1, 2, 3, 4]
+        buildsys.DevBuildsys.__tasks__ = {2: [koji.TASK_STATES['FAILED']],
+                                          4: [koji.TASK_STATES['CANCELED']]}
 
-        ret = buildsys.wait_for_tasks(tasks, session, sleep=0.01)
+        ret = buildsys.wait_for_tasks(tasks, buildsys.DevBuildsys(), sleep=0.01)
 
-        self.assertEqual(ret, [2])
+        self.assertEqual(ret, [2, 4])
         self.assertEqual(
             debug.mock_calls,
-            [mock.call('Waiting for 3 tasks to complete: [1, 2, 3]'),
-             mock.call('2 tasks completed successfully, 1 tasks failed.')])
-        self.assertEqual(session.taskFinished.mock_calls,
-                         [mock.call(1), mock.call(2), mock.call(3)])
-        self.assertEqual(session.getTaskInfo.mock_calls, [mock.call(1), mock.call(2), mock.call(3)])
+            [mock.call('Waiting for 4 tasks to complete: [1, 2, 3, 4]'),
+             mock.call('2 tasks completed successfully, 2 tasks failed.')])
+        self.assertEqual(error.mock_calls,
+                         [mock.call('Koji task 2 failed'), mock.call('Koji task 4 failed')])
+
+    @mock.patch('bodhi.server.buildsys.log.error')
+    def test_with_fault(self, error, debug):
+        """A task that Koji returns a fault for has failed."""
+        session = mock.MagicMock()
+        session.multiCall.return_value = [
+            [{'state': koji.TASK_STATES['CLOSED']}],
+            {'faultCode': 1000, 'faultString': 'No such task'}]
+
+        ret = buildsys.wait_for_tasks([1, 2], session, sleep=0.01)
+
+        self.assertEqual(ret, [2])
+        error.assert_called_once_with('Koji task 2 failed: No such task')
 
     def test_with_falsey_task(self, debug):
         """Assert that a Falsey entry in the list doesn't raise an Exception."""
         tasks = [1, False, 3]
         session = mock.MagicMock()
-        session.taskFinished.side_effect = [True, True]
-        session.getTaskInfo.side_effect = [
-            {'state': koji.TASK_STATES['CLOSED']},
-            {'state': koji.TASK_STATES['CLOSED']}]
+        session.multiCall.return_value = [[{'state': koji.TASK_STATES['CLOSED']}],
+                                          [{'state': koji.TASK_STATES['CLOSED']}]]
 
         ret = buildsys.wait_for_tasks(tasks, session, sleep=0.01)
 
@@ -262,40 +466,29 @@ class TestWaitForTasks(unittest.TestCase):
             [mock.call('Waiting for 3 tasks to complete: [1, False, 3]'),
              mock.call('Skipping task: False'),
              mock.call('3 tasks completed successfully, 0 tasks failed.')])
-        self.assertEqual(session.taskFinished.mock_calls,
-                         [mock.call(1), mock.call(3)])
         self.assertEqual(session.getTaskInfo.mock_calls, [mock.call(1), mock.call(3)])
 
-    def test_with_successful_tasks(self, debug):
-        """A list of successful tasks should return []."""
+    @mock.patch('bodhi.server.buildsys.time.sleep')
+    def test_with_successful_tasks(self, sleep, debug):
+        """A list of successful tasks should return [], without sleeping."""
         tasks = [1, 2, 3]
-        session = mock.MagicMock()
-        session.taskFinished.side_effect = [True, True, True]
-        session.getTaskInfo.side_effect = [
-            {'state': koji.TASK_STATES['CLOSED']},
-            {'state': koji.TASK_STATES['CLOSED']},
-            {'state': koji.TASK_STATES['CLOSED']}]
+        progress = mock.MagicMock()
 
-        ret = buildsys.wait_for_tasks(tasks, session, sleep=0.01)
+        ret = buildsys.wait_for_tasks(tasks, buildsys.DevBuildsys(), sleep=0.01,
+                                      progress=progress)
 
         self.assertEqual(ret, [])
         self.assertEqual(
             debug.mock_calls,
             [mock.call('Waiting for 3 tasks to complete: [1, 2, 3]'),
              mock.call('3 tasks completed successfully, 0 tasks failed.')])
-        self.assertEqual(session.taskFinished.mock_calls,
-                         [mock.call(1), mock.call(2), mock.call(3)])
-        self.assertEqual(session.getTaskInfo.mock_calls, [mock.call(1), mock.call(2), mock.call(3)])
+        self.assertEqual(sleep.call_count, 0)
+        progress.assert_called_once_with(3, 3)
 
-    @mock.patch('bodhi.server.buildsys.get_session')
+    @mock.patch('bodhi.server.buildsys.get_session', return_value=buildsys.DevBuildsys())
     def test_without_session(self, get_session, debug):
         """Test the function without handing it a Koji session."""
         tasks = [1, 2, 3]
-        get_session.return_value.taskFinished.side_effect = [True, True, True]
-        get_session.return_value.getTaskInfo.side_effect = [
-            {'state': koji.TASK_STATES['CLOSED']},
-            {'state': koji.TASK_STATES['CLOSED']},
-            {'state': koji.TASK_STATES['CLOSED']}]
 
         ret = buildsys.wait_for_tasks(tasks, sleep=0.01)
 
@@ -305,7 +498,3 @@ class TestWaitForTasks(unittest.TestCase):
             [mock.call('Waiting for 3 tasks to complete: [1, 2, 3]'),
              mock.call('3 tasks completed successfully, 0 tasks failed.')])
         get_session.assert_called_once_with()
-        self.assertEqual(get_session.return_value.taskFinished.mock_calls,
-                         [mock.call(1), mock.call(2), mock.call(3)])
-        self.assertEqual(get_session.return_value.getTaskInfo.mock_calls,
-                         [mock.call(1), mock.call(2), mock.call(3)])
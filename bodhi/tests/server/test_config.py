@@ -235,6 +235,23 @@ class BodhiConfigValidate(unittest.TestCase):
         c._validate()
 
 
+class GenerateChoiceValidatorTests(unittest.TestCase):
+    """Tests the _generate_choice_validator() function."""
+    def test_invalid(self):
+        """Test with a value that isn't one of the choices."""
+        with self.assertRaises(ValueError) as exc:
+            config._generate_choice_validator(['first', 'full'])('some')
+
+        self.assertEqual(str(exc.exception), '"some" is not one of first, full.')
+
+    def test_valid(self):
+        """Test with one of the choices."""
+        result = config._generate_choice_validator(['first', 'full'])('full')
+
+        self.assertEqual(result, u'full')
+        self.assertTrue(isinstance(result, six.text_type))
+
+
 class GenerateListValidatorTests(unittest.TestCase):
     """Tests the _generate_list_validator() function."""
     def test_custom_splitter(self):
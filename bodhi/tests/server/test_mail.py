@@ -54,3 +54,22 @@ class TestSend(base.BaseTestCase):
         exception_log.assert_called_once_with('Unable to send mail')
         sendmail = SMTP.return_value.sendmail
         self.assertEqual(sendmail.call_count, 0)
+
+
+class TestCollect(base.BaseTestCase):
+    """Test the collect() function."""
+    @mock.patch('bodhi.server.mail._send_mail')
+    def test_collect(self, _send_mail):
+        """E-mails sent within the context are appended to the outbox instead of being sent."""
+        update = models.Update.query.all()[0]
+        outbox = []
+
+        with mail.collect(outbox):
+            mail.send('fake@news.com', 'comment', update, agent='bowlofeggs')
+        mail.send_mail('updates@fedoraproject.org', 'other@news.com', 'Hello', 'World')
+
+        self.assertEqual(len(outbox), 1)
+        self.assertEqual(outbox[0][:2], ('updates@fedoraproject.org', 'fake@news.com'))
+        self.assertTrue(
+            'Subject: [Fedora Update] [comment] bodhi-2.0-1.fc17' in outbox[0][2])
+        _send_mail.assert_called_once_with('updates@fedoraproject.org', 'other@news.com', mock.ANY)
@@ -24,16 +24,20 @@ import glob
 import os
 import shutil
 import tempfile
+import time
+import unittest
 
 import createrepo_c
+import mock
 
-from bodhi.server.buildsys import (setup_buildsystem, teardown_buildsystem,
+from bodhi.server.buildsys import (multicall_enabled, setup_buildsystem, teardown_buildsystem,
                                    DevBuildsys)
 from bodhi.server.config import config
-from bodhi.server.models import Release, Update, UpdateRequest, UpdateStatus
-from bodhi.server.metadata import UpdateInfoMetadata
+from bodhi.server.models import Bug, Build, Release, RpmBuild, Update, UpdateRequest, UpdateStatus
+from bodhi.server.metadata import (load_updateinfo, modifyrepo, RPMCache, UpdateInfoMetadata,
+                                   UpdateInfoWriter)
 from bodhi.server.util import mkmetadatadir
-from bodhi.tests.server import base
+from bodhi.tests.server import base, create_update
 
 
 class TestAddUpdate(base.BaseTestCase):
@@ -65,11 +69,11 @@ class TestAddUpdate(base.BaseTestCase):
         """
         update = self.db.query(Update).one()
         md = UpdateInfoMetadata(update.release, update.request, self.db, self.temprepo,
-                                close_shelf=False)
+                                close_cache=False)
 
         md.add_update(update)
 
-        md.shelf.close()
+        md.rpm_cache.close()
 
         self.assertEqual(len(md.uinfo.updates), 1)
         self.assertEquals(md.uinfo.updates[0].title, update.title)
@@ -121,6 +125,376 @@ class TestAddUpdate(base.BaseTestCase):
         self.assertEquals(pkg.filename, 'TurboGears-1.0.2.2-2.fc17.noarch.rpm')
 
 
+def _rpms(nvr):
+    """Return a listBuildRPMs() result for the given nvr."""
+    name, version, release = nvr.rsplit('-', 2)
+    return [{'arch': 'src', 'epoch': None, 'name': name, 'nvr': nvr, 'release': release,
+             'version': version}]
+
+
+class TestModifyRepo(unittest.TestCase):
+    """This class contains tests for the modifyrepo() function."""
+    def setUp(self):
+        """Create a compose with a few arches, and a file to insert into it."""
+        self.tempdir = tempfile.mkdtemp('bodhi')
+        self.repodatas = [join(self.tempdir, 'compose', 'Everything', arch, 'os')
+                          for arch in ('aarch64', 'i386', 'x86_64')]
+        self.repodatas.append(join(self.tempdir, 'compose', 'Everything', 'source', 'tree'))
+        for repodata in self.repodatas:
+            mkmetadatadir(repodata)
+        self.source = join(self.tempdir, 'updateinfo.xml')
+        with open(self.source, 'w') as source:
+            source.write('<updates/>' * 1000)
+
+    def tearDown(self):
+        """Clean up the tempdir."""
+        shutil.rmtree(self.tempdir)
+
+    def test_all_arches(self):
+        """The file is compressed once, and inserted into the repodata of every arch."""
+        with mock.patch('bodhi.server.metadata.cr.RepomdRecord',
+                        wraps=createrepo_c.RepomdRecord) as RepomdRecord:
+            modifyrepo(createrepo_c.XZ, self.tempdir, 'updateinfo', 'xml', self.source)
+
+        self.assertEqual(RepomdRecord.call_count, 1)
+        hrefs = set()
+        for repodata in self.repodatas:
+            repomd = createrepo_c.Repomd(join(repodata, 'repodata', 'repomd.xml'))
+            records = [r for r in repomd.records if r.type == 'updateinfo']
+            self.assertEqual(len(records), 1)
+            hrefs.add(records[0].location_href)
+            path = join(repodata, records[0].location_href)
+            self.assertEqual(sha256(open(path, 'rb').read()).hexdigest(), records[0].checksum)
+            self.assertEqual(records[0].size_open, 10000)
+            self.assertFalse(exists(join(repodata, 'repodata', 'updateinfo.xml')))
+        self.assertEqual(len(hrefs), 1)
+        self.assertTrue(hrefs.pop().endswith('-updateinfo.xml.xz'))
+        # The uncompressed source is left alone.
+        self.assertTrue(exists(self.source))
+
+    @mock.patch('bodhi.server.metadata.hashlib.sha256')
+    def test_bad_checksum(self, hasher):
+        """A copy that doesn't match the compressed file's checksum is an error."""
+        hasher.return_value.hexdigest.return_value = 'nope'
+
+        with self.assertRaises(ValueError) as exc:
+            modifyrepo(createrepo_c.XZ, self.tempdir, 'updateinfo', 'xml', self.source)
+
+        self.assertIn('but', str(exc.exception))
+        for repodata in self.repodatas:
+            self.assertEqual(glob.glob(join(repodata, 'repodata', '*updateinfo*')), [])
+
+
+class TestUpdateInfoWriter(unittest.TestCase):
+    """This class contains tests for the UpdateInfoWriter class."""
+    def setUp(self):
+        """Create a temporary directory for the writer."""
+        self.tempdir = tempfile.mkdtemp('bodhi')
+        self.writer = UpdateInfoWriter(self.tempdir)
+
+    def tearDown(self):
+        """Clean up the tempdir."""
+        shutil.rmtree(self.tempdir)
+
+    def _record(self, id):
+        record = createrepo_c.UpdateRecord()
+        record.id = id
+        record.title = 'bodhi-2.0-1.fc17'
+        record.status = 'stable'
+        record.type = 'bugfix'
+        record.issued_date = datetime(2018, 2, 3, 4, 5, 6)
+        return record
+
+    def test_append(self):
+        """Records are written to the file."""
+        self.writer.append(self._record('FEDORA-2018-1'))
+        self.writer.append(self._record('FEDORA-2018-2'))
+        self.writer.close()
+
+        self.assertEqual(self.writer.count, 2)
+        with open(self.writer.path) as updateinfo:
+            self.assertIn('<id>FEDORA-2018-2</id>', updateinfo.read())
+        self.assertEqual([record.id for record in self.writer.updates],
+                         ['FEDORA-2018-1', 'FEDORA-2018-2'])
+        self.assertEqual(self.writer.updates[0].issued_date, datetime(2018, 2, 3, 4, 5, 6))
+
+    def test_empty(self):
+        """A writer without records produces an empty updateinfo."""
+        self.writer.close()
+        self.writer.close()
+
+        self.assertEqual(self.writer.updates, [])
+
+    def test_remove(self):
+        """remove() deletes the file."""
+        self.writer.append(self._record('FEDORA-2018-1'))
+
+        self.writer.remove()
+
+        self.assertFalse(exists(self.writer.path))
+        self.assertEqual(os.listdir(self.tempdir), [])
+
+
+class TestRPMCache(unittest.TestCase):
+    """This class contains tests for the RPMCache class."""
+    def setUp(self):
+        """Create a temporary RPMCache."""
+        self.tempdir = tempfile.mkdtemp('bodhi')
+        self.path = join(self.tempdir, 'rpm-cache.sqlite')
+        self.cache = RPMCache(self.path, max_entries=2, max_age=1)
+
+    def tearDown(self):
+        """Clean up the tempdir."""
+        shutil.rmtree(self.tempdir)
+
+    def test_compact(self):
+        """Only the fields the updateinfo needs are stored, and the nvr is derived from them."""
+        rpms = [dict(_rpms('bodhi-2.0-1.fc17')[0], epoch=1, id=62330, size=761742)]
+
+        self.cache.set('bodhi-2.0-1.fc17', rpms)
+
+        self.assertEqual(self.cache.get('bodhi-2.0-1.fc17'),
+                         [dict(_rpms('bodhi-2.0-1.fc17')[0], epoch=1)])
+        stored = self.cache._db._connection().execute('SELECT value FROM build_rpms').fetchone()[0]
+        self.assertEqual(stored, '[["bodhi","2.0","1.fc17",1,"src"]]')
+
+    def test_get_many(self):
+        """get_many() returns the cached builds, and counts hits and misses."""
+        self.cache.set_many({'bodhi-2.0-1.fc17': _rpms('bodhi-2.0-1.fc17'),
+                             'python-a-1-1.fc17': _rpms('python-a-1-1.fc17')})
+
+        found = self.cache.get_many(['bodhi-2.0-1.fc17', 'python-b-1-1.fc17'])
+
+        self.assertEqual(found, {'bodhi-2.0-1.fc17': _rpms('bodhi-2.0-1.fc17')})
+        self.assertIsNone(self.cache.get('python-b-1-1.fc17'))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 2))
+
+    def test_concurrent(self):
+        """Several RPMCaches can use the same database at the same time."""
+        other = RPMCache(self.path, max_entries=2, max_age=1)
+
+        self.cache.set('bodhi-2.0-1.fc17', _rpms('bodhi-2.0-1.fc17'))
+        other.set('python-a-1-1.fc17', _rpms('python-a-1-1.fc17'))
+
+        self.assertEqual(other.get('bodhi-2.0-1.fc17'), _rpms('bodhi-2.0-1.fc17'))
+        self.assertEqual(self.cache.get('python-a-1-1.fc17'), _rpms('python-a-1-1.fc17'))
+        other.close()
+
+    def test_evict_max_entries(self):
+        """The least recently used builds beyond max_entries are evicted."""
+        with mock.patch('bodhi.server.util.time.time', return_value=1000):
+            self.cache.set('bodhi-2.0-1.fc17', _rpms('bodhi-2.0-1.fc17'))
+        with mock.patch('bodhi.server.util.time.time', return_value=2000):
+            self.cache.set('python-a-1-1.fc17', _rpms('python-a-1-1.fc17'))
+        with mock.patch('bodhi.server.util.time.time', return_value=3000):
+            self.cache.set('python-b-1-1.fc17', _rpms('python-b-1-1.fc17'))
+            # Using the oldest build makes it the most recently used one.
+            self.cache.get('bodhi-2.0-1.fc17')
+        with mock.patch('bodhi.server.util.time.time', return_value=3001):
+            self.assertEqual(self.cache.evict(), 1)
+
+        self.assertIsNone(self.cache.get('python-a-1-1.fc17'))
+        self.assertIsNotNone(self.cache.get('bodhi-2.0-1.fc17'))
+        self.assertIsNotNone(self.cache.get('python-b-1-1.fc17'))
+
+    def test_evict_max_age(self):
+        """Builds that weren't used for max_age days are evicted."""
+        with mock.patch('bodhi.server.util.time.time', return_value=time.time() - 2 * 86400):
+            self.cache.set('bodhi-2.0-1.fc17', _rpms('bodhi-2.0-1.fc17'))
+        self.cache.set('python-a-1-1.fc17', _rpms('python-a-1-1.fc17'))
+
+        self.assertEqual(self.cache.evict(), 1)
+
+        self.assertIsNone(self.cache.get('bodhi-2.0-1.fc17'))
+        self.assertEqual(self.cache.evicted, 1)
+
+    @mock.patch('bodhi.server.metadata.log.info')
+    def test_close(self, info):
+        """close() evicts old builds and logs the statistics."""
+        self.cache.get('bodhi-2.0-1.fc17')
+
+        self.cache.close()
+
+        info.assert_called_once_with(
+            'RPM cache %s: 0 hits, 1 misses, 0 evicted' % self.path)
+
+
+@multicall_enabled
+def _list_build_rpms(self, id, *args, **kw):
+    """Return only the RPMs in DevBuildsys.__rpms__, so the builds of the updates match them."""
+    return list(DevBuildsys.__rpms__)
+
+
+@mock.patch('bodhi.server.metadata.get_session')
+class TestPrefetchRpms(base.BaseTestCase):
+    """This class contains tests for the UpdateInfoMetadata._prefetch_rpms() method."""
+    def setUp(self):
+        """Initialize our temporary mashdir."""
+        super(TestPrefetchRpms, self).setUp()
+        self.tempdir = tempfile.mkdtemp('bodhi')
+
+    def tearDown(self):
+        """Clean up the tempdir."""
+        super(TestPrefetchRpms, self).tearDown()
+        shutil.rmtree(self.tempdir)
+
+    def test_multicall(self, get_session):
+        """The RPMs are retrieved with a multicall before the updateinfo is generated."""
+        koji = get_session.return_value
+        koji.listTagged.return_value = [{'nvr': 'bodhi-2.0-1.fc17', 'id': 42}]
+        koji.multiCall.return_value = [[_rpms('bodhi-2.0-1.fc17')]]
+        update = self.db.query(Update).one()
+
+        md = UpdateInfoMetadata(update.release, UpdateRequest.testing, self.db, self.tempdir,
+                                close_cache=False)
+
+        # add_update() found the RPMs that were prefetched, so listBuildRPMs() was only called once.
+        koji.listBuildRPMs.assert_called_once_with(42)
+        self.assertEqual(koji.getBuild.call_count, 0)
+        self.assertEqual(md.rpm_cache.get('bodhi-2.0-1.fc17'), _rpms('bodhi-2.0-1.fc17'))
+        md.rpm_cache.close()
+        self.assertEqual(len(md.uinfo.updates), 1)
+        self.assertEqual(md.uinfo.updates[0].collections[0].packages[0].filename,
+                         'bodhi-2.0-1.fc17.src.rpm')
+
+    def test_build_not_in_builds(self, get_session):
+        """The ids of builds that aren't in self.builds are retrieved with a multicall first."""
+        update = create_update(self.db, [u'python-a-1-1.fc17', u'python-b-1-1.fc17'])
+        self.db.flush()
+        koji = get_session.return_value
+        koji.listTagged.return_value = [{'nvr': 'python-a-1-1.fc17', 'id': 42}]
+        koji.multiCall.side_effect = [
+            [[{'id': 43}]], [[_rpms('python-a-1-1.fc17')], [_rpms('python-b-1-1.fc17')]]]
+
+        md = UpdateInfoMetadata(update.release, UpdateRequest.testing, self.db, self.tempdir,
+                                close_cache=False)
+
+        koji.getBuild.assert_called_once_with(u'python-b-1-1.fc17')
+        self.assertEqual(koji.listBuildRPMs.mock_calls, [mock.call(42), mock.call(43)])
+        self.assertEqual(md.rpm_cache.get('python-a-1-1.fc17'), _rpms('python-a-1-1.fc17'))
+        self.assertEqual(md.rpm_cache.get('python-b-1-1.fc17'), _rpms('python-b-1-1.fc17'))
+        md.rpm_cache.close()
+
+    @mock.patch.dict(config, {'updateinfo_prefetch.chunk_size': 1,
+                              'updateinfo_prefetch.workers': 2})
+    def test_chunks(self, get_session):
+        """Each chunk of builds is retrieved with its own multicall."""
+        update = create_update(self.db, [u'python-a-1-1.fc17', u'python-b-1-1.fc17'])
+        self.db.flush()
+        koji = get_session.return_value
+        koji.listTagged.return_value = [{'nvr': 'python-a-1-1.fc17', 'id': 42},
+                                        {'nvr': 'python-b-1-1.fc17', 'id': 43}]
+        koji.multiCall.return_value = [[_rpms('python-a-1-1.fc17')]]
+
+        md = UpdateInfoMetadata(update.release, UpdateRequest.testing, self.db, self.tempdir,
+                                close_cache=False)
+
+        self.assertEqual(koji.multiCall.call_count, 2)
+        self.assertEqual(sorted(koji.listBuildRPMs.mock_calls), [mock.call(42), mock.call(43)])
+        self.assertEqual(
+            sorted(md.rpm_cache.get_many(['python-a-1-1.fc17', 'python-b-1-1.fc17']).keys()),
+            ['python-a-1-1.fc17', 'python-b-1-1.fc17'])
+        md.rpm_cache.close()
+
+    def test_cached(self, get_session):
+        """Builds that are already in the RPMCache are not retrieved again."""
+        cache = RPMCache(join(self.tempdir, 'rpm-cache.sqlite'))
+        cache.set('bodhi-2.0-1.fc17', _rpms('bodhi-2.0-1.fc17'))
+        cache.close()
+        koji = get_session.return_value
+        koji.listTagged.return_value = [{'nvr': 'bodhi-2.0-1.fc17', 'id': 42}]
+        update = self.db.query(Update).one()
+
+        md = UpdateInfoMetadata(update.release, UpdateRequest.testing, self.db, self.tempdir)
+
+        self.assertEqual(koji.multiCall.call_count, 0)
+        self.assertEqual(koji.listBuildRPMs.call_count, 0)
+        self.assertEqual(len(md.uinfo.updates), 1)
+
+    def test_cache_path(self, get_session):
+        """The RPMCache is kept at updateinfo_rpm_cache.path if it is set."""
+        path = join(self.tempdir, 'local', 'rpm-cache.sqlite')
+        os.makedirs(os.path.dirname(path))
+        koji = get_session.return_value
+        koji.listTagged.return_value = []
+        update = self.db.query(Update).one()
+
+        with mock.patch.dict(config, {'updateinfo_rpm_cache.path': path}):
+            md = UpdateInfoMetadata(update.release, UpdateRequest.testing, self.db, self.tempdir)
+
+        self.assertEqual(md.rpm_cache.path, path)
+        self.assertTrue(os.path.exists(path))
+        self.assertFalse(os.path.exists(join(self.tempdir, 'rpm-cache.sqlite')))
+
+    def test_fault(self, get_session):
+        """Builds that fail in the multicall are retrieved one at a time by get_rpms()."""
+        koji = get_session.return_value
+        koji.listTagged.return_value = [{'nvr': 'bodhi-2.0-1.fc17', 'id': 42}]
+        koji.multiCall.return_value = [{'faultCode': 1000, 'faultString': 'oops'}]
+        koji.listBuildRPMs.return_value = _rpms('bodhi-2.0-1.fc17')
+        update = self.db.query(Update).one()
+
+        md = UpdateInfoMetadata(update.release, UpdateRequest.testing, self.db, self.tempdir,
+                                close_cache=False)
+
+        self.assertEqual(koji.listBuildRPMs.mock_calls, [mock.call(42), mock.call(42)])
+        self.assertEqual(md.rpm_cache.get('bodhi-2.0-1.fc17'), _rpms('bodhi-2.0-1.fc17'))
+        md.rpm_cache.close()
+        self.assertEqual(len(md.uinfo.updates), 1)
+
+
+@mock.patch('bodhi.server.metadata.get_session')
+class TestFetchUpdates(base.BaseTestCase):
+    """This class contains tests for the UpdateInfoMetadata._fetch_updates() method."""
+    def setUp(self):
+        """Initialize our temporary mashdir."""
+        super(TestFetchUpdates, self).setUp()
+        self.tempdir = tempfile.mkdtemp('bodhi')
+
+    def tearDown(self):
+        """Clean up the tempdir."""
+        super(TestFetchUpdates, self).tearDown()
+        shutil.rmtree(self.tempdir)
+
+    @mock.patch.object(UpdateInfoMetadata, 'query_chunk_size', 2)
+    @mock.patch('bodhi.server.metadata.log.warning')
+    def test_chunks(self, warning, get_session):
+        """The Builds are queried in chunks, and their Updates are collected."""
+        other = create_update(self.db, [u'python-a-1-1.fc17', u'python-b-1-1.fc17'])
+        self.db.flush()
+        update = self.db.query(Update).filter_by(title=u'bodhi-2.0-1.fc17').one()
+        get_session.return_value.listTagged.return_value = [
+            {'nvr': nvr, 'id': i} for i, nvr in enumerate(
+                ['bodhi-2.0-1.fc17', 'python-a-1-1.fc17', 'python-b-1-1.fc17', 'nope-1-1.fc17'])]
+        get_session.return_value.multiCall.return_value = []
+        get_session.return_value.listBuildRPMs.return_value = []
+
+        with mock.patch.object(self.db, 'query', wraps=self.db.query) as query:
+            md = UpdateInfoMetadata(update.release, UpdateRequest.testing, self.db, self.tempdir,
+                                    close_cache=False)
+
+        self.assertEqual(len([c for c in query.mock_calls if c == mock.call(Build)]), 2)
+        self.assertEqual(md.updates, set([update, other]))
+        self.assertEqual(sorted(md.builds.keys()),
+                         ['bodhi-2.0-1.fc17', 'nope-1-1.fc17', 'python-a-1-1.fc17',
+                          'python-b-1-1.fc17'])
+        warning.assert_any_call(
+            "Couldn't find the following koji builds tagged as f17-updates-testing in bodhi: "
+            "['nope-1-1.fc17']")
+        md.rpm_cache.close()
+
+    def test_query_builds(self, get_session):
+        """_query_builds() returns the Builds that exist, keyed by nvr."""
+        update = self.db.query(Update).one()
+        md = UpdateInfoMetadata(update.release, UpdateRequest.testing, self.db, self.tempdir)
+
+        builds = md._query_builds([u'bodhi-2.0-1.fc17', u'nope-1-1.fc17'])
+
+        self.assertEqual(builds, {u'bodhi-2.0-1.fc17': update.builds[0]})
+        self.assertEqual([bug.bug_id for bug in builds[u'bodhi-2.0-1.fc17'].update.bugs],
+                         [12345])
+
+
 class TestUpdateInfoMetadata(base.BaseTestCase):
 
     def setUp(self):
@@ -200,7 +574,7 @@ class TestUpdateInfoMetadata(base.BaseTestCase):
         self._test_extended_metadata(False)
 
     def test_extended_metadata_cache(self):
-        """Asserts that when the same update is retrieved twice, the info is unshelved.
+        """Asserts that when the same update is retrieved twice, the info comes from the cache.
 
         After the first run, we clear the buildsystem.__rpms__ so that there would be no way to
         again retrieve the info from the buildsystem, and it'll have to be returned from the
@@ -230,6 +604,7 @@ class TestUpdateInfoMetadata(base.BaseTestCase):
         # Insert the updateinfo.xml into the repository
         md.insert_updateinfo(self.tempcompdir)
         updateinfo = self._verify_updateinfo(self.repodata)
+        self.assertFalse(exists(md.uinfo.path))
 
         # Read an verify the updateinfo.xml.gz
         uinfo = createrepo_c.UpdateInfo(updateinfo)
@@ -274,3 +649,128 @@ class TestUpdateInfoMetadata(base.BaseTestCase):
         self.assertFalse(pkg.reboot_suggested)
         self.assertEquals(pkg.arch, 'src')
         self.assertEquals(pkg.filename, 'TurboGears-1.0.2.2-2.fc17.src.rpm')
+
+
+@mock.patch.object(DevBuildsys, 'listBuildRPMs', _list_build_rpms)
+class TestIncrementalUpdateInfoMetadata(base.BaseTestCase):
+    """This class contains tests for reusing the records of the previous compose."""
+    def setUp(self):
+        """Generate the updateinfo of a previous compose."""
+        super(TestIncrementalUpdateInfoMetadata, self).setUp()
+        self.tempdir = tempfile.mkdtemp('bodhi')
+        self.tempcompdir = join(self.tempdir, 'f17-updates-testing')
+        mkmetadatadir(join(self.tempcompdir, 'compose', 'Everything', 'i386', 'os'))
+        mkmetadatadir(join(self.tempcompdir, 'compose', 'Everything', 'source', 'tree'))
+        DevBuildsys.__rpms__ = [_rpms('bodhi-2.0-1.fc17')[0]]
+
+        update = self.db.query(Update).one()
+        update.status = UpdateStatus.testing
+        update.request = None
+        update.date_pushed = datetime(2018, 2, 3, 4, 5, 6, 7)
+        DevBuildsys.__tagged__[update.title] = ['f17-updates-testing']
+        md = UpdateInfoMetadata(update.release, update.request, self.db, self.tempcompdir)
+        md.insert_updateinfo(self.tempcompdir)
+        self.previous = load_updateinfo(self.tempcompdir)
+
+    def tearDown(self):
+        """Clean up the tempdir."""
+        super(TestIncrementalUpdateInfoMetadata, self).tearDown()
+        shutil.rmtree(self.tempdir)
+
+    def _generate(self, **kwargs):
+        """Generate the updateinfo again, with the previous compose's."""
+        update = self.db.query(Update).one()
+        return UpdateInfoMetadata(update.release, update.request, self.db, self.tempcompdir,
+                                  close_cache=False, previous=self.previous, **kwargs)
+
+    def test_load_updateinfo(self):
+        """load_updateinfo() finds the updateinfo that was inserted into the compose."""
+        self.assertEqual([record.id for record in self.previous.updates],
+                         [self.db.query(Update).one().alias])
+
+    def test_load_updateinfo_no_compose(self):
+        """load_updateinfo() returns None if there is no compose."""
+        self.assertIsNone(load_updateinfo(join(self.tempdir, 'nothing')))
+
+    def test_unchanged(self):
+        """Unchanged updates reuse their record, which matches a full rebuild."""
+        with mock.patch.object(UpdateInfoMetadata, 'add_update') as add_update:
+            md = self._generate()
+
+        self.assertEqual(add_update.call_count, 0)
+        self.assertEqual(len(md.uinfo.updates), 1)
+        self.assertEqual(md.verify(), [])
+        md.rpm_cache.close()
+
+    def test_date_modified(self):
+        """An update that was modified gets a new record."""
+        update = self.db.query(Update).one()
+        update.date_modified = datetime(2018, 2, 4)
+
+        md = self._generate()
+
+        self.assertEqual(md.uinfo.updates[0].updated_date, datetime(2018, 2, 4))
+        md.rpm_cache.close()
+
+    def test_new_bug(self):
+        """An update with a new bug gets a new record."""
+        update = self.db.query(Update).one()
+        bug = Bug(bug_id=54321)
+        self.db.add(bug)
+        update.bugs.append(bug)
+
+        md = self._generate()
+
+        self.assertEqual(sorted(ref.id for ref in md.uinfo.updates[0].references
+                                if ref.type == 'bugzilla'),
+                         ['12345', '54321'])
+        md.rpm_cache.close()
+
+    def test_bug_title(self):
+        """An update whose bug got a new title gets a new record."""
+        update = self.db.query(Update).one()
+        update.bugs[0].title = u'A better title'
+
+        md = self._generate()
+
+        self.assertEqual([ref.title for ref in md.uinfo.updates[0].references
+                          if ref.type == 'bugzilla'],
+                         ['A better title'])
+        md.rpm_cache.close()
+
+    def test_rights(self):
+        """The records are generated again when the rights changed, such as in a new year."""
+        with mock.patch.dict(config, {'updateinfo_rights': 'Copyright (C) 2099 Red Hat'}):
+            with mock.patch.object(UpdateInfoMetadata, 'add_update') as add_update:
+                self._generate().rpm_cache.close()
+
+        add_update.assert_called_once_with(self.db.query(Update).one())
+
+    def test_new_build(self):
+        """An update whose builds changed gets a new record."""
+        update = self.db.query(Update).one()
+        build = RpmBuild(nvr=u'bodhi-2.0-2.fc17', release=update.release,
+                         package=update.builds[0].package)
+        self.db.add(build)
+        update.builds.append(build)
+
+        with mock.patch.object(UpdateInfoMetadata, 'add_update') as add_update:
+            self._generate().rpm_cache.close()
+
+        add_update.assert_called_once_with(update)
+
+    @mock.patch('bodhi.server.metadata.log.warning')
+    def test_verify(self, warning):
+        """verify() logs the records that differ from a full rebuild, and keeps the latter."""
+        update = self.db.query(Update).one()
+
+        with mock.patch.dict(config, {'file_url': 'https://example.com/pub'}):
+            md = self._generate(verify=True)
+
+        self.assertEqual(warning.call_count, 1)
+        self.assertIn('https://example.com/pub', warning.mock_calls[0][1][0])
+        self.assertIn(update.alias, warning.mock_calls[0][1][0])
+        self.assertTrue(
+            md.uinfo.updates[0].collections[0].packages[0].src.startswith(
+                'https://example.com/pub'))
+        md.rpm_cache.close()
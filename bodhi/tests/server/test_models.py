@@ -158,6 +158,75 @@ class TestBodhiBase(BaseTestCase):
             {'release_id': 1, 'ci_url': b.ci_url, 'epoch': b.epoch, 'nvr': b.nvr,
              'signed': b.signed, 'type': six.text_type(b.type.value)})
 
+    def test_get_json_plan(self):
+        """get_json_plan() should make a class's plan once, and reuse it."""
+        b = model.Build.query.all()[0]
+
+        plan = model.get_json_plan(type(b))
+
+        self.assertEqual(set(plan.columns),
+                         {'ci_url', 'epoch', 'nvr', 'release_id', 'signed', 'type'})
+        self.assertEqual(dict(plan.relationships)['package'], model.Package)
+        self.assertIs(model.get_json_plan(type(b)), plan)
+
+    def test_get_json_plan_exclude_columns_replaced(self):
+        """get_json_plan() should make a new plan if a class's excluded columns are replaced."""
+        plan = model.get_json_plan(model.Package)
+        exclude_columns = list(model.Package.__exclude_columns__)
+        exclude_columns.remove('committers')
+
+        with mock.patch.object(model.Package, '__exclude_columns__', exclude_columns):
+            new_plan = model.get_json_plan(model.Package)
+
+        self.assertIsNot(new_plan, plan)
+        self.assertIn('committers', dict(new_plan.relationships))
+        self.assertNotIn('committers', dict(plan.relationships))
+
+    def test__to_json_reuses_plan(self):
+        """_to_json() should not walk the mapper again for classes it has already serialized."""
+        u = model.Update.query.first()
+        expected = u.__json__()
+
+        with mock.patch('bodhi.server.models.class_mapper', side_effect=AssertionError):
+            self.assertEqual(u.__json__(), expected)
+
+    def test_loading_profile(self):
+        """loading_profile() should load the relationships of the profile up front."""
+        title = model.Update.query.one().title
+        self.db.expunge_all()
+
+        update = model.Update.get(title, self.db, model.Update.loading_profile('list'))
+
+        for attr in ('builds', 'bugs', 'comments', 'user'):
+            self.assertIn(attr, update.__dict__)
+        for comment in update.comments:
+            self.assertIn('user', comment.__dict__)
+
+    def test_loading_profile_lean_default(self):
+        """Without a loading profile, an update's comments and builds should not be loaded."""
+        title = model.Update.query.one().title
+        self.db.expunge_all()
+
+        update = model.Update.get(title, self.db)
+
+        self.assertNotIn('builds', update.__dict__)
+        self.assertNotIn('comments', update.__dict__)
+
+    def test_loading_profile_via(self):
+        """loading_profile() should load the relationship the models are loaded through."""
+        self.db.expunge_all()
+
+        bug = self.db.query(model.Bug).options(
+            *model.Update.loading_profile('validator', via=model.Bug.updates)).one()
+
+        self.assertIn('updates', bug.__dict__)
+        self.assertIn('builds', bug.updates[0].__dict__)
+
+    def test_loading_profile_unknown(self):
+        """loading_profile() should raise a KeyError for profiles the model doesn't have."""
+        with self.assertRaises(KeyError):
+            model.Build.loading_profile('list')
+
     def test_grid_columns(self):
         """Assert correct return value from the grid_columns() method."""
         self.assertEqual(model.Build.grid_columns(), ['nvr', 'release_id', 'signed',
@@ -393,11 +462,37 @@ class TestCompose(BaseTestCase):
 
         self.assertEqual(compose.content_type, model.ContentType.rpm)
 
+    def test___json___masher(self):
+        """With masher set, only what the masher needs is included."""
+        compose = self._generate_compose(model.UpdateRequest.stable, True)
+
+        self.assertEqual(
+            compose.__json__(masher=True),
+            {'content_type': u'rpm', 'release_id': compose.release.id,
+             'request': u'stable', 'security': True})
+
+    def test___json___status(self):
+        """Without masher, the state and the stages of the compose are included."""
+        compose = self._generate_compose(model.UpdateRequest.stable, False)
+        compose.stage_timings = json.dumps(
+            {'wait_for_sync': {'duration': 2.5, 'counters': {'mirror_polls': 3}}})
+        compose.error_message = u'oops'
+
+        result = compose.__json__()
+
+        self.assertEqual(result['release_name'], compose.release.name)
+        self.assertEqual(result['state'], u'requested')
+        self.assertEqual(result['error_message'], u'oops')
+        self.assertEqual(result['update_count'], 1)
+        self.assertEqual(result['stages'],
+                         {'wait_for_sync': {'duration': 2.5, 'counters': {'mirror_polls': 3}}})
+        self.assertEqual(result['state_date'], compose.state_date.strftime('%Y-%m-%d %H:%M:%S'))
+
     def test_from_dict(self):
         """Assert that from_dict() returns a Compose."""
         compose = self._generate_compose(model.UpdateRequest.stable, False)
 
-        reloaded_compose = model.Compose.from_dict(self.db, compose.__json__())
+        reloaded_compose = model.Compose.from_dict(self.db, compose.__json__(masher=True))
 
         self.assertEqual(reloaded_compose.request, compose.request)
         self.assertEqual(reloaded_compose.release, compose.release)
@@ -549,6 +644,90 @@ class TestRelease(ModelTest):
         # Make sure it's the same cached object
         assert releases is model.Release.all_releases(self.db)
 
+    def test_registry_shared_within_transaction(self):
+        """The release stamp should only be checked once per transaction."""
+        registry = model.Release.registry(self.db)
+
+        with mock.patch.object(model, 'ReleaseRegistry') as ReleaseRegistry:
+            self.assertIs(model.Release.registry(self.db), registry)
+            model.Release._registry = None
+            self.assertIs(model.Release.registry(self.db), registry)
+
+        self.assertEqual(ReleaseRegistry.call_count, 0)
+
+    def test_registry_rebuilt_after_edit(self):
+        """Editing a release should increase the stamp and rebuild the registry."""
+        registry = model.Release.registry(self.db)
+
+        self.obj.state = model.ReleaseState.archived
+        self.db.flush()
+
+        new_registry = model.Release.registry(self.db)
+        self.assertEqual(new_registry.stamp, registry.stamp + 1)
+        self.assertEqual(new_registry.states[self.obj.id], model.ReleaseState.archived)
+        self.assertEqual(list(new_registry.all_releases.keys()), ['archived'])
+        # The edit isn't committed, so other sessions must not use the new registry.
+        self.assertIsNot(model.Release._registry, new_registry)
+
+    def test_registry_not_rebuilt_for_new_builds(self):
+        """Adding builds to a release should not increase the stamp."""
+        registry = model.Release.registry(self.db)
+
+        package = model.RpmPackage(name=u'bodhi')
+        self.db.add(model.RpmBuild(nvr=u'bodhi-3.0-1.fc11', package=package, release=self.obj))
+        self.db.flush()
+
+        self.assertIs(model.Release.registry(self.db), registry)
+
+    def test_registry_after_commit(self):
+        """The stamp should be checked again after a commit, and the registry shared."""
+        registry = model.Release.registry(self.db)
+
+        self.obj.long_name = u'Fedora Eleven'
+        self.db.commit()
+
+        new_registry = model.Release.registry(self.db)
+        self.assertIsNot(new_registry, registry)
+        self.assertIs(model.Release._registry, new_registry)
+        self.assertEqual(model.Release.get(u'Fedora Eleven', self.db), self.obj)
+
+    def test_find(self):
+        """find() should match the name, the upper cased name or the version of releases."""
+        for name in (u'F11', u'f11', u'11'):
+            self.assertEqual(model.Release.find(name, self.db), self.obj)
+
+        self.assertIsNone(model.Release.find(u'F12', self.db))
+
+    def test_get(self):
+        """get() should match the name, long name or dist tag of releases."""
+        for name in (u'F11', u'Fedora 11', u'dist-f11'):
+            self.assertEqual(model.Release.get(name, self.db), self.obj)
+
+        self.assertIsNone(model.Release.get(u'11', self.db))
+
+    def test_from_tags(self):
+        """from_tags() should find the release of a tag, and raise KeyError for unknown tags."""
+        self.assertEqual(model.Release.from_tags([u'dist-f11-updates-testing'], self.db), self.obj)
+        self.assertIsNone(model.Release.from_tags([], self.db))
+        self.assertRaises(KeyError, model.Release.from_tags, [u'dist-f12-updates'], self.db)
+
+    def test_registry_sees_new_releases(self):
+        """Releases created in the session should be found right after they are flushed."""
+        model.Release.registry(self.db)
+        release = model.Release(
+            name=u'F12', long_name=u'Fedora 12', id_prefix=u'FEDORA', version=u'12',
+            branch=u'f12', dist_tag=u'dist-f12', stable_tag=u'dist-f12-updates',
+            testing_tag=u'dist-f12-updates-testing',
+            candidate_tag=u'dist-f12-updates-candidate',
+            pending_signing_tag=u'dist-f12-updates-testing-signing',
+            pending_testing_tag=u'dist-f12-updates-testing-pending',
+            pending_stable_tag=u'dist-f12-updates-pending', override_tag=u'dist-f12-override')
+        self.db.add(release)
+        self.db.flush()
+
+        self.assertEqual(model.Release.from_tags([u'dist-f12-updates'], self.db), release)
+        self.assertEqual(model.Release.registry(self.db).tags[1][u'dist-f12-override'], u'F12')
+
 
 class MockWiki(object):
     """ Mocked simplemediawiki.MediaWiki class. """
@@ -1550,6 +1729,23 @@ class TestUpdate(ModelTest):
                 for c in close.mock_calls]),
             True)
 
+    @mock.patch('bodhi.server.models.bugs.bugtracker.close')
+    def test_modify_bug_security_parent(self, close):
+        """modify_bug() only closes the tracker bugs of a stable security update."""
+        update = self.get_update()
+        parent = model.Bug(bug_id=1, parent=True)
+        tracker = model.Bug(bug_id=2)
+        update.bugs.extend([parent, tracker])
+        update.close_bugs = True
+        update.type = UpdateType.security
+        update.status = UpdateStatus.stable
+
+        update.modify_bug(parent)
+        self.assertEqual(close.call_count, 0)
+        update.modify_bug(tracker)
+
+        self.assertEqual([c[1][0] for c in close.mock_calls], [2])
+
     @mock.patch('bodhi.server.models.bugs.bugtracker.close')
     @mock.patch('bodhi.server.models.bugs.bugtracker.comment')
     def test_modify_bugs_stable_no_close(self, comment, close):
@@ -1909,6 +2105,80 @@ class TestUpdate(ModelTest):
 
         self.assertEqual(self.obj._composite_karma, (2, -1))
 
+    def test_karma_counters_stored(self):
+        """The karma and comment counters should be stored as comments are added."""
+        self.obj.comment(self.db, u"foo", 1, u'foo')
+        self.obj.comment(self.db, u"foo", -1, u'bar')
+        self.obj.comment(self.db, u"foo", 1, u'bar')
+        self.db.flush()
+        self.db.expire(self.obj)
+
+        self.assertEqual(
+            (self.obj.karma, self.obj.positive_karma, self.obj.negative_karma,
+             self.obj.comment_count),
+            (2, 2, 0, 3))
+        self.assertEqual(self.obj.count_karma(),
+                         {'karma': 2, 'positive_karma': 2, 'negative_karma': 0,
+                          'comment_count': 3})
+
+    def test_karma_counters_comment_appended(self):
+        """Comments that are appended directly should update the counters too."""
+        user = model.User(name=u'someone')
+        self.db.add(user)
+        comment = model.Comment(text=u'Works for me', karma=1, user=user)
+
+        self.obj.comments.append(comment)
+
+        self.assertEqual((self.obj.karma, self.obj.comment_count), (1, 1))
+
+    def test_karma_counters_replaced(self):
+        """A new karma of a user should replace their earlier karma in the counters."""
+        self.obj.comment(self.db, u"foo", 1, u'foo')
+        self.obj.comment(self.db, u"bar", 1, u'bar')
+
+        self.obj.comment(self.db, u"not anymore", -1, u'foo')
+
+        self.assertEqual(
+            (self.obj.karma, self.obj.positive_karma, self.obj.negative_karma,
+             self.obj.comment_count),
+            (0, 1, -1, 3))
+        self.assertEqual(self.obj.count_karma(),
+                         {'karma': 0, 'positive_karma': 1, 'negative_karma': -1,
+                          'comment_count': 3})
+
+    def test_karma_counters_not_recounted(self):
+        """Appending a comment should update the counters without counting all the comments."""
+        self.obj.comment(self.db, u"foo", 1, u'foo')
+
+        with mock.patch.object(model.Update, 'count_karma') as count_karma:
+            self.obj.comment(self.db, u"bar", -1, u'bar')
+            self.obj.comment(self.db, u"New build", 0, u'bodhi')
+            self.obj.comment(self.db, u"baz", 0, u'baz')
+
+        self.assertEqual(count_karma.call_count, 0)
+        self.assertEqual(
+            (self.obj.karma, self.obj.positive_karma, self.obj.negative_karma,
+             self.obj.comment_count),
+            (0, 0, 0, 4))
+
+    def test_karma_counters_comment_removed(self):
+        """Removing a comment should update the counters."""
+        self.obj.comment(self.db, u"foo", -1, u'foo')
+        self.obj.comment(self.db, u"foo", 1, u'bar')
+
+        self.obj.comments.remove(self.obj.comments[0])
+
+        self.assertEqual((self.obj.karma, self.obj.negative_karma, self.obj.comment_count),
+                         (1, 0, 1))
+
+    def test_karma_counters_reset(self):
+        """The karma counters should be reset by comments about new or removed builds."""
+        self.obj.comment(self.db, u"foo", 1, u'foo')
+        self.obj.comment(self.db, u"New build", 0, u'bodhi')
+
+        self.assertEqual((self.obj.karma, self.obj.positive_karma, self.obj.comment_count),
+                         (0, 0, 2))
+
     @mock.patch('bodhi.server.notifications.publish')
     def test_stable_karma(self, publish):
         update = self.obj
@@ -2506,6 +2776,48 @@ class TestUpdate(ModelTest):
         self.assertIn("Failed retrieving requirements results:", reason)
         self.assertIn("Error retrieving data from Koji for", reason)
 
+    @mock.patch('bodhi.server.util.taskotron_results')
+    def test_requirements_check_reads_update_up_front(self, mock_taskotron_results):
+        """The check returned by requirements_check() doesn't use the update anymore."""
+        update = self.obj
+        update.requirements = 'rpmlint'
+        settings = {'resultsdb_api_url': ''}
+        mock_taskotron_results.return_value = iter(
+            [{'testcase': {'name': 'rpmlint'}, 'data': {}, 'outcome': 'PASSED'}])
+        check = update.requirements_check(settings)
+        update.requirements = u''
+        update.alias = u'FEDORA-2018-0000000000'
+
+        result, reason = check()
+
+        self.assertEqual((result, reason), (True, "All checks pass."))
+        self.assertNotEqual(update.alias, mock_taskotron_results.mock_calls[0][2]['item'])
+        self.assertEqual(mock_taskotron_results.mock_calls[0][2]['testcases'], 'rpmlint')
+
+    def test_reached_karma_threshold(self):
+        """reached_karma_threshold is True when check_karma_thresholds() has something to do."""
+        update = self.obj
+        update.status = UpdateStatus.testing
+        update.stable_karma = 3
+        update.unstable_karma = -3
+        self.assertFalse(update.reached_karma_threshold)
+
+        update.karma = update.positive_karma = 3
+        self.assertTrue(update.reached_karma_threshold)
+
+        update.karma = update.positive_karma = 0
+        update.negative_karma = -1
+        self.assertTrue(update.reached_karma_threshold)
+
+        update.autokarma = False
+        self.assertFalse(update.reached_karma_threshold)
+
+        update.karma = -3
+        self.assertTrue(update.reached_karma_threshold)
+
+        update.status = UpdateStatus.stable
+        self.assertFalse(update.reached_karma_threshold)
+
     def test_test_cases_with_no_dupes(self):
         update = self.get_update(name=u"FullTestCasesWithNoDupes")
         package = update.builds[0].package
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2018 Red Hat, Inc.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""This test suite contains tests for the bodhi.server.sync module."""
+
+import hashlib
+import threading
+import time
+import unittest
+
+import mock
+
+from bodhi.server import sync
+
+
+class SyncTestCase(unittest.TestCase):
+    """Run a DevMirror for the duration of each test."""
+    def setUp(self):
+        self.mirror = sync.DevMirror()
+        self.mirror.start()
+
+    def tearDown(self):
+        self.mirror.stop()
+
+    def _target(self, arch, content):
+        """Return a SyncTarget for the given arch that expects the given content."""
+        return sync.SyncTarget(arch, '%s/%s/repomd.xml' % (self.mirror.url, arch),
+                               hashlib.sha1(content).hexdigest())
+
+
+class TestDevMirror(SyncTestCase):
+    """This test class contains tests for the DevMirror class."""
+    def test_conditional_requests(self):
+        """Unchanged content is answered with 304 as long as the client sends the ETag."""
+        self.mirror.publish('/x86_64/repomd.xml', 'old')
+        target = self._target('x86_64', 'new')
+        watcher = sync.SyncWatcher('f27-updates', [target], initial_interval=1, max_interval=1,
+                                   backoff=1)
+
+        self.assertEqual(watcher.poll(target), (False, True))
+        self.assertEqual(watcher.poll(target), (False, False))
+        self.mirror.publish('/x86_64/repomd.xml', 'new')
+        self.assertEqual(watcher.poll(target), (True, True))
+
+        self.assertEqual([r[2] for r in self.mirror.requests], [200, 304, 200])
+        self.assertEqual(target.polls, 3)
+        self.assertEqual(target.etag, hashlib.sha1('new').hexdigest())
+
+    def test_missing_file(self):
+        """Paths that were never published are a 404."""
+        target = self._target('x86_64', 'new')
+        watcher = sync.SyncWatcher('f27-updates', [target], initial_interval=1, max_interval=1,
+                                   backoff=1)
+
+        with self.assertRaises(sync.urllib.error.HTTPError) as exc:
+            watcher.poll(target)
+
+        self.assertEqual(exc.exception.code, 404)
+
+
+class TestSyncWatcher(SyncTestCase):
+    """This test class contains tests for the SyncWatcher class."""
+    @mock.patch.dict(
+        'bodhi.server.sync.config',
+        {'sync_watcher.initial_interval': 5, 'sync_watcher.max_interval': 200,
+         'sync_watcher.backoff': 1.5})
+    def test_defaults_from_config(self):
+        """The intervals default to the config settings."""
+        watcher = sync.SyncWatcher('f27-updates', [])
+
+        self.assertEqual(watcher.initial_interval, 5)
+        self.assertEqual(watcher.max_interval, 200)
+        self.assertEqual(watcher.backoff, 1.5)
+
+    def test_next_interval(self):
+        """The interval grows up to the maximum, and starts over when the mirror changes."""
+        watcher = sync.SyncWatcher('f27-updates', [], initial_interval=5, max_interval=200,
+                                   backoff=2)
+
+        intervals = [5]
+        for i in range(7):
+            intervals.append(watcher.next_interval(intervals[-1], False))
+
+        self.assertEqual(intervals, [5, 10, 20, 40, 80, 160, 200, 200])
+        self.assertEqual(watcher.next_interval(200, True), 5)
+
+    def test_arches_are_watched_concurrently(self):
+        """All arches are waited on at the same time, so the total wait is that of the slowest."""
+        arches = ['aarch64', 'armhfp', 'ppc64le', 's390x', 'x86_64']
+        for arch in arches:
+            self.mirror.publish('/%s/repomd.xml' % arch, 'old')
+        watcher = sync.SyncWatcher('f27-updates', [self._target(a, 'new') for a in arches],
+                                   initial_interval=0.01, max_interval=0.05, backoff=2)
+
+        def rsync():
+            for arch in arches:
+                self.mirror.publish('/%s/repomd.xml' % arch, 'new')
+                time.sleep(0.1)
+        timer = threading.Timer(0.2, rsync)
+        timer.start()
+
+        start = time.time()
+        watcher.wait()
+        elapsed = time.time() - start
+        timer.join()
+
+        # The last arch is published 0.6 seconds in, and is noticed within one max_interval.
+        self.assertTrue(0.6 <= elapsed < 1.5, elapsed)
+        self.assertTrue(all(t.synced.is_set() for t in watcher.targets))
+        self.assertEqual(sync._watchers, {})
+
+    def test_notify_synced(self):
+        """notify_synced() ends the wait for the given arch, or for all of them."""
+        for arch in ['aarch64', 'x86_64']:
+            self.mirror.publish('/%s/repomd.xml' % arch, 'old')
+        watcher = sync.SyncWatcher(
+            'f27-updates', [self._target(a, 'new') for a in ['aarch64', 'x86_64']],
+            initial_interval=0.01, max_interval=0.05, backoff=2)
+        thread = threading.Thread(target=watcher.wait)
+        thread.start()
+        while 'f27-updates' not in sync._watchers:
+            time.sleep(0.01)
+
+        self.assertTrue(sync.notify_synced('f27-updates', 'aarch64'))
+        time.sleep(0.1)
+        self.assertTrue(thread.is_alive())
+        self.assertTrue(sync.notify_synced('f27-updates'))
+        thread.join(5)
+
+        self.assertFalse(thread.is_alive())
+        self.assertFalse(sync.notify_synced('f27-updates'))
@@ -16,7 +16,14 @@
 # You should have received a copy of the GNU General Public License
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+from datetime import datetime
+import os
+import shutil
+import sqlite3
 import subprocess
+import tempfile
+import threading
+import time
 import unittest
 
 import mock
@@ -272,6 +279,215 @@ class TestComposeState2HTML(unittest.TestCase):
                          "<span class='label label-danger'>Failed</span>")
 
 
+class TestCursor(unittest.TestCase):
+    """Test the encode_cursor() and decode_cursor() functions."""
+    def test_datetime(self):
+        """Assert that datetimes survive the cursor, down to the microsecond."""
+        value = datetime(2018, 2, 7, 12, 34, 56, 789)
+
+        cursor = util.encode_cursor(value, 42)
+
+        self.assertEqual(util.decode_cursor(cursor), (value, 42))
+
+    def test_id_only(self):
+        """Assert that cursors of results ordered by id only carry None as their value."""
+        cursor = util.encode_cursor(None, 42)
+
+        self.assertEqual(util.decode_cursor(cursor), (None, 42))
+
+    def test_url_safe(self):
+        """Assert that cursors can be put in a query string as is."""
+        cursor = util.encode_cursor(u'\u2603?&=/+', 42)
+
+        self.assertRegexpMatches(cursor, r'^[A-Za-z0-9_=-]+$')
+        self.assertEqual(util.decode_cursor(cursor), (u'\u2603?&=/+', 42))
+
+    def test_invalid(self):
+        """Assert that ValueError is raised for strings that aren't cursors."""
+        for cursor in (u'not a cursor', util.encode_cursor(None, u'42')[:-2],
+                       util.encode_cursor(None, u'42'), util.encode_cursor({}, 42)):
+            with self.assertRaises(ValueError) as exc:
+                util.decode_cursor(cursor)
+
+            self.assertEqual(str(exc.exception), 'Invalid cursor: %s' % cursor)
+
+
+class TestSQLiteCache(unittest.TestCase):
+    """Test the SQLiteCache class."""
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'cache.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_tables(self):
+        """Values are shared by the caches of a table, and kept apart from other tables."""
+        util.SQLiteCache(self.path, 'one').set_many({'a': 'A', 'b': 'B'})
+        util.SQLiteCache(self.path, 'two').set_many({'a': 'other'})
+
+        self.assertEqual(util.SQLiteCache(self.path, 'one').get_many(['a', 'b', 'c']),
+                         {'a': 'A', 'b': 'B'})
+        self.assertEqual(util.SQLiteCache(self.path, 'two').get_many(['a', 'b']), {'a': 'other'})
+
+    def test_evict(self):
+        """Old values are evicted, and so are the least recently used ones beyond max_entries."""
+        cache = util.SQLiteCache(self.path, 'entries')
+        with mock.patch('bodhi.server.util.time.time', return_value=time.time() - 2 * 86400):
+            cache.set_many({'old': 'value'})
+        with mock.patch('bodhi.server.util.time.time', return_value=time.time() - 60):
+            cache.set_many({'a': 'A', 'b': 'B'})
+        cache.get_many(['a'])
+
+        self.assertEqual(cache.evict(1, 1), 2)
+
+        self.assertEqual(cache.get_many(['old', 'a', 'b']), {'a': 'A'})
+
+    def test_last_used_batched(self):
+        """Reads don't write to the database until a batch of use times is pending."""
+        cache = util.SQLiteCache(self.path, 'entries')
+        cache.batch_size = 2
+        with mock.patch('bodhi.server.util.time.time', return_value=1000):
+            cache.set_many({'a': 'A', 'b': 'B'})
+
+        def last_used():
+            conn = sqlite3.connect(self.path)
+            try:
+                return dict(conn.execute('SELECT key, last_used FROM entries').fetchall())
+            finally:
+                conn.close()
+
+        with mock.patch('bodhi.server.util.time.time', return_value=2000):
+            cache.get_many(['a'])
+        self.assertEqual(last_used(), {'a': 1000, 'b': 1000})
+        with mock.patch('bodhi.server.util.time.time', return_value=3000):
+            cache.get_many(['b'])
+        self.assertEqual(last_used(), {'a': 2000, 'b': 3000})
+        with mock.patch('bodhi.server.util.time.time', return_value=4000):
+            cache.get_many(['a'])
+        cache.close()
+        self.assertEqual(last_used(), {'a': 4000, 'b': 3000})
+
+    def test_threads(self):
+        """Each thread uses a connection of its own."""
+        cache = util.SQLiteCache(self.path, 'entries')
+        cache.set_many({'a': 'A'})
+        found = []
+        thread = threading.Thread(target=lambda: found.append(cache.get_many(['a'])))
+
+        thread.start()
+        thread.join()
+
+        self.assertEqual(found, [{'a': 'A'}])
+        cache.close()
+        self.assertEqual(cache.get_many(['a']), {'a': 'A'})
+
+
+class TestRPMHeaderCache(unittest.TestCase):
+    """Test the RPMHeaderCache class."""
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_lru(self):
+        """The least recently used builds are forgotten beyond size."""
+        cache = util.RPMHeaderCache(2)
+        cache.set('a-1-1', {'name': 'a'})
+        cache.set('b-1-1', {'name': 'b'})
+        self.assertEqual(cache.get('a-1-1'), {'name': 'a'})
+        cache.set('c-1-1', {'name': 'c'})
+
+        self.assertEqual(cache.get('b-1-1'), None)
+        self.assertEqual(cache.get('a-1-1'), {'name': 'a'})
+        self.assertEqual(cache.get('c-1-1'), {'name': 'c'})
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+    def test_copies(self):
+        """Changing the headers that were returned doesn't change the cached ones."""
+        cache = util.RPMHeaderCache(2)
+        cache.set('a-1-1', {'name': 'a'})
+
+        cache.get('a-1-1')['name'] = 'b'
+
+        self.assertEqual(cache.get('a-1-1'), {'name': 'a'})
+
+    def test_persistent(self):
+        """With a path, the headers are shared with other caches, and old ones are evicted."""
+        path = os.path.join(self.tempdir, 'headers.sqlite')
+        header = {'name': 'a', 'changelogtime': [1, 2], 'changelogtext': ['\xc3\xa9', u'x']}
+        util.RPMHeaderCache(0, path).set('a-1-1', header)
+        util.RPMHeaderCache(0, path).set('b-1-1', {'name': 'b'})
+        with mock.patch('bodhi.server.util.time.time', return_value=time.time() + 2 * 86400):
+            util.RPMHeaderCache(0, path, max_age=3).set('c-1-1', {'name': 'c'})
+
+        with mock.patch('bodhi.server.util.time.time', return_value=time.time() + 4 * 86400):
+            cache = util.RPMHeaderCache(1, path, max_age=3)
+
+        self.assertEqual(cache.get('a-1-1'), None)
+        self.assertEqual(cache.get('c-1-1'), {'name': 'c'})
+        # The headers come back from the database exactly as they were stored.
+        util.RPMHeaderCache(0, path).set('a-1-1', header)
+        self.assertEqual(util.RPMHeaderCache(0, path).get('a-1-1'), header)
+
+    @mock.patch('bodhi.server.util.buildsys.get_session')
+    def test_get_rpm_header(self, get_session):
+        """get_rpm_header() only retrieves the headers of a build from Koji once."""
+        get_session.return_value.getRPMHeaders.return_value = {'name': 'libseccomp'}
+
+        with mock.patch('bodhi.server.util._rpm_header_cache', util.RPMHeaderCache(10)):
+            self.assertEqual(util.get_rpm_header('libseccomp-2.1.0-1.fc20'),
+                             {'name': 'libseccomp'})
+            self.assertEqual(util.get_rpm_header('libseccomp-2.1.0-1.fc20'),
+                             {'name': 'libseccomp'})
+
+        get_session.return_value.getRPMHeaders.assert_called_once_with(
+            rpmID='libseccomp-2.1.0-1.fc20.src', headers=mock.ANY)
+
+
+class TestSortedUpdates(unittest.TestCase):
+    """Test the sorted_updates() function."""
+    @staticmethod
+    def _make_updates(count):
+        """Return count updates, half of which share their first package with another update."""
+        updates = []
+        for i in range(count):
+            update = mock.MagicMock()
+            update.title = 'update-{}'.format(i)
+            update.builds = [mock.MagicMock(nvr='shared{}-1.{}-1.fc27'.format(i % (count // 2), i)),
+                             mock.MagicMock(nvr='single{}-1.0-1.fc27'.format(i))]
+            if i % 2:
+                update.builds = update.builds[1:]
+            updates.append(update)
+        return updates
+
+    def test_many_updates(self):
+        """The updates that share a package are tagged in order, the others asynchronously."""
+        updates = self._make_updates(1000)
+
+        sync, async = util.sorted_updates(updates)
+
+        # Every even update shares its first package with the one 500 updates later.
+        self.assertEqual(sorted(sync, key=updates.index), updates[::2])
+        self.assertEqual(sorted(async, key=updates.index), updates[1::2])
+        for older, newer in zip(updates[:500:2], updates[500::2]):
+            self.assertTrue(sync.index(older) < sync.index(newer))
+
+    def test_order(self):
+        """The updates with several builds of a package are tagged in order of their versions."""
+        updates = []
+        for nvr in ('bodhi-2.0-1.fc27', 'bodhi-1.5-4.fc27', 'bodhi-2.0-2.fc27', 'rpm-4.0-1.fc27'):
+            update = mock.MagicMock()
+            update.builds = [mock.MagicMock(nvr=nvr)]
+            updates.append(update)
+
+        sync, async = util.sorted_updates(updates)
+
+        self.assertEqual(sync, [updates[1], updates[0], updates[2]])
+        self.assertEqual(async, [updates[3]])
+
+
 class TestUtils(base.BaseTestCase):
 
     def setUp(self):
@@ -480,7 +480,6 @@ class TestFrontpageView(base.BaseTestCase):
                            [UpdateType.newpackage, 4]]]]
         _add_updates(addedupdates2, user2, pendingrelease, "fc18")
         self.db.flush()
-        Release._tag_cache = None
 
     def test_home_counts(self):
         """Test the frontpage update counts"""
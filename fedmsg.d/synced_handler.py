@@ -0,0 +1,7 @@
+config = dict(
+    # Enable this to let messages announcing that a repository has reached the master mirror end
+    # the masher's wait_for_sync step early. The messages must carry the repository's tag name as
+    # "repo", and may carry an "arch".
+    synced_handler=False,
+    synced_handler_topics=[],
+)
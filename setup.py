@@ -162,9 +162,11 @@ setup(
     bodhi-approve-testing = bodhi.server.scripts.approve_testing:main
     bodhi-manage-releases = bodhi.server.scripts.manage_releases:main
     bodhi-check-policies = bodhi.server.scripts.check_policies:check
+    bodhi-check-karma = bodhi.server.scripts.check_karma:check
     [moksha.consumer]
     masher = bodhi.server.consumers.masher:Masher
     updates = bodhi.server.consumers.updates:UpdatesHandler
     signed = bodhi.server.consumers.signed:SignedHandler
+    synced = bodhi.server.consumers.synced:SyncedHandler
     """,
     paster_plugins=['pyramid'])
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2018 Red Hat, Inc. and others.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+Compare the per-build and the bulk way of resolving a Koji tag's builds to Bodhi updates.
+
+A synthetic tag is created in a throwaway SQLite database, and UpdateInfoMetadata._fetch_updates()
+is timed against the per-build query it replaced.
+
+    python tools/bench-fetch-updates.py --builds 20000
+"""
+from __future__ import print_function
+
+from datetime import datetime
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from sqlalchemy import event
+import mock
+import six
+
+from bodhi.server import initialize_db, models, Session
+from bodhi.server.metadata import UpdateInfoMetadata
+
+
+class FakeKoji(object):
+    """A Koji session that only knows the synthetic tag."""
+
+    def __init__(self, nvrs):
+        self.nvrs = nvrs
+
+    def listTagged(self, tag, latest=False):
+        return [{'nvr': nvr, 'id': i} for i, nvr in enumerate(self.nvrs)]
+
+
+def populate(db, count):
+    """Create count updates with one build, one bug and two comments each."""
+    user = models.User(name=u'bench')
+    release = models.Release(
+        name=u'F28', long_name=u'Fedora 28', id_prefix=u'FEDORA', version=u'28',
+        dist_tag=u'f28', stable_tag=u'f28-updates', testing_tag=u'f28-updates-testing',
+        candidate_tag=u'f28-updates-candidate', pending_signing_tag=u'f28-signing-pending',
+        pending_testing_tag=u'f28-updates-testing-pending',
+        pending_stable_tag=u'f28-updates-pending', override_tag=u'f28-override', branch=u'f28',
+        state=models.ReleaseState.current)
+    db.add_all([user, release])
+    nvrs = []
+    for i in range(count):
+        nvr = u'package%05d-1.0-1.fc28' % i
+        package = models.RpmPackage(name=u'package%05d' % i)
+        build = models.RpmBuild(nvr=nvr, release=release, package=package, signed=True)
+        update = models.Update(
+            title=nvr, builds=[build], user=user, release=release, alias=u'FEDORA-%05d' % i,
+            request=None, status=models.UpdateStatus.stable, type=models.UpdateType.bugfix,
+            notes=u'Benchmark', date_submitted=datetime(2018, 1, 1))
+        update.bugs.append(models.Bug(bug_id=i + 1))
+        for text in (u'Works for me', u'Me too'):
+            update.comments.append(models.Comment(text=text, karma=1, user=user))
+        db.add(update)
+        nvrs.append(nvr)
+        if i % 1000 == 999:
+            db.flush()
+    db.commit()
+    # Unmatched builds, which only appear in the tag.
+    return nvrs + [u'untracked%05d-1.0-1.fc28' % i for i in range(count // 100)]
+
+
+def fetch_updates_per_build(md):
+    """The per-build implementation of UpdateInfoMetadata._fetch_updates() that was replaced."""
+    for build in md.koji_builds:
+        md.builds[build['nvr']] = build
+        build_obj = md.db.query(models.Build).filter_by(
+            nvr=six.text_type(build['nvr'])).first()
+        if build_obj and build_obj.update:
+            md.updates.add(build_obj.update)
+            # The updateinfo reads these for every update.
+            build_obj.update.bugs, build_obj.update.cves
+
+
+def fetch_updates_bulk(md):
+    """The bulk implementation, followed by the same attribute access as above."""
+    md._fetch_updates()
+    for update in md.updates:
+        update.bugs, update.cves
+
+
+def run(name, func, nvrs, queries):
+    """Time func on a fresh session, and report the number of queries it made."""
+    Session.remove()
+    md = UpdateInfoMetadata.__new__(UpdateInfoMetadata)
+    md.db = Session()
+    md.tag = u'f28-updates'
+    md.builds = {}
+    md.updates = set()
+    md.koji_builds = FakeKoji(nvrs).listTagged(md.tag)
+    del queries[:]
+    with mock.patch('bodhi.server.metadata.get_session', return_value=FakeKoji(nvrs)):
+        start = time.time()
+        func(md)
+        duration = time.time() - start
+    print('%-10s %8.2f s %8d queries %8d updates' % (
+        name, duration, len(queries), len(md.updates)))
+    return len(md.updates)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--builds', type=int, default=20000,
+                        help='The number of builds in the synthetic tag.')
+    args = parser.parse_args()
+
+    tempdir = tempfile.mkdtemp('bodhi-bench')
+    try:
+        engine = initialize_db(
+            {'sqlalchemy.url': 'sqlite:///%s' % os.path.join(tempdir, 'bench.sqlite')})
+        models.Base.metadata.create_all(bind=engine)
+        queries = []
+        event.listen(engine, 'before_cursor_execute',
+                     lambda *args, **kwargs: queries.append(args[2]))
+
+        print('Creating %d updates...' % args.builds)
+        nvrs = populate(Session(), args.builds)
+        per_build = run('per-build', fetch_updates_per_build, nvrs, queries)
+        bulk = run('bulk', fetch_updates_bulk, nvrs, queries)
+        assert per_build == bulk, 'Both paths must find the same updates'
+    finally:
+        shutil.rmtree(tempdir)
+
+
+if __name__ == '__main__':
+    main()
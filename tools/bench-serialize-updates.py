@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2018 Red Hat, Inc. and others.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+Compare the reflective and the planned BodhiBase serializers on /updates/?rows_per_page=100.
+
+Synthetic updates are created in a throwaway SQLite database, and the page is requested from a
+test instance of the web app, once with the serializer that walked the mappers for every object and
+once with the JSONPlan based one.
+
+    python tools/bench-serialize-updates.py --updates 500 --requests 20
+"""
+from __future__ import print_function
+
+from datetime import datetime
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from sqlalchemy.orm import class_mapper
+from sqlalchemy.orm.properties import RelationshipProperty
+from webtest import TestApp
+import mock
+import six
+
+from bodhi.server import models, Session
+import bodhi.server
+from bodhi.tests.server.base import BaseTestCase
+
+
+def legacy_to_json(cls, obj, seen=None, request=None, anonymize=False):
+    """The BodhiBase._to_json() that walked the mapper of every object it serialized."""
+    if not seen:
+        seen = []
+    if not obj:
+        return
+
+    exclude = getattr(obj, '__exclude_columns__', [])
+    properties = list(class_mapper(type(obj)).iterate_properties)
+    rels = [p.key for p in properties if isinstance(p, RelationshipProperty)]
+    attrs = [p.key for p in properties if p.key not in rels]
+    d = dict([(attr, getattr(obj, attr)) for attr in attrs
+              if attr not in exclude and not attr.startswith('_')])
+
+    extras = getattr(obj, '__include_extras__', [])
+    for name in extras:
+        attribute = getattr(obj, name)
+        if callable(attribute):
+            attribute = attribute(request)
+        d[name] = attribute
+
+    for attr in rels:
+        if attr in exclude:
+            continue
+        target = getattr(type(obj), attr).property.mapper.class_
+        if target in seen:
+            continue
+        d[attr] = cls._expand(obj, getattr(obj, attr), seen, request)
+
+    for key, value in six.iteritems(d):
+        if isinstance(value, datetime):
+            d[key] = value.strftime('%Y-%m-%d %H:%M:%S')
+        if isinstance(value, models.EnumSymbol):
+            d[key] = six.text_type(value)
+
+    if anonymize:
+        for key1, key2 in getattr(obj, '__anonymity_map__', {}).items():
+            if getattr(obj, key2):
+                d[key1] = 'anonymous'
+
+    return d
+
+
+def legacy_expand(cls, obj, relation, seen, req):
+    """The BodhiBase._expand() that went with legacy_to_json()."""
+    if hasattr(relation, 'all'):
+        relation = relation.all()
+    if hasattr(relation, '__iter__'):
+        return [cls._expand(obj, item, seen, req) for item in relation]
+    if type(relation) not in seen:
+        return cls._to_json(relation, seen + [type(obj)], req)
+    else:
+        return relation.id
+
+
+def populate(db, count):
+    """Create count updates with two builds, a bug and three comments each."""
+    user = models.User(name=u'bench')
+    release = models.Release(
+        name=u'F28', long_name=u'Fedora 28', id_prefix=u'FEDORA', version=u'28',
+        dist_tag=u'f28', stable_tag=u'f28-updates', testing_tag=u'f28-updates-testing',
+        candidate_tag=u'f28-updates-candidate', pending_signing_tag=u'f28-signing-pending',
+        pending_testing_tag=u'f28-updates-testing-pending',
+        pending_stable_tag=u'f28-updates-pending', override_tag=u'f28-override', branch=u'f28',
+        state=models.ReleaseState.current)
+    db.add_all([user, release])
+    for i in range(count):
+        builds = []
+        for name in (u'package%05d' % i, u'python-package%05d' % i):
+            package = models.RpmPackage(name=name)
+            builds.append(models.RpmBuild(nvr=u'%s-1.0-1.fc28' % name, release=release,
+                                          package=package, signed=True))
+        update = models.Update(
+            title=builds[0].nvr, builds=builds, user=user, release=release,
+            alias=u'FEDORA-%05d' % i, request=None, status=models.UpdateStatus.testing,
+            type=models.UpdateType.bugfix, notes=u'Benchmark', date_submitted=datetime(2018, 1, 1))
+        update.bugs.append(models.Bug(bug_id=i + 1))
+        for text in (u'Works for me', u'Me too', u'Broken'):
+            update.comments.append(models.Comment(text=text, karma=1, user=user))
+        db.add(update)
+        if i % 100 == 99:
+            db.flush()
+    db.commit()
+
+
+def run(name, app, requests):
+    """Request the page the given number of times, and report the time it took."""
+    start = time.time()
+    for i in range(requests):
+        body = app.get('/updates/', {'rows_per_page': 100}).json_body
+    duration = time.time() - start
+    print('%-10s %8.2f s %8.1f ms/request %8d updates' % (
+        name, duration, duration * 1000 / requests, len(body['updates'])))
+    return body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--updates', type=int, default=500,
+                        help='The number of updates in the synthetic database.')
+    parser.add_argument('--requests', type=int, default=20,
+                        help='The number of times to request the page with each serializer.')
+    args = parser.parse_args()
+
+    tempdir = tempfile.mkdtemp('bodhi-bench')
+    try:
+        settings = dict(BaseTestCase.app_settings)
+        settings['sqlalchemy.url'] = 'sqlite:///%s' % os.path.join(tempdir, 'bench.sqlite')
+        app = TestApp(bodhi.server.main({}, testing=u'guest', **settings))
+        models.Base.metadata.create_all(bind=Session().get_bind())
+
+        print('Creating %d updates...' % args.updates)
+        populate(Session(), args.updates)
+        Session.remove()
+
+        with mock.patch.object(models.BodhiBase, '_to_json', classmethod(legacy_to_json)), \
+                mock.patch.object(models.BodhiBase, '_expand', classmethod(legacy_expand)):
+            reflective = run('reflective', app, args.requests)
+        planned = run('planned', app, args.requests)
+        assert reflective == planned, 'Both serializers must produce the same page'
+    finally:
+        shutil.rmtree(tempdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2018 Red Hat, Inc. and others.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+Compare sorted_updates() with the list based implementation it replaced.
+
+A synthetic set of updates is sorted by both implementations, which are timed and must agree.
+
+    python tools/bench-sorted-updates.py --updates 10000
+"""
+from __future__ import print_function
+
+from collections import defaultdict
+import argparse
+import time
+
+import mock
+import rpm
+
+from bodhi.server import util
+
+
+def sorted_updates_with_lists(updates):
+    """The previous implementation of sorted_updates(), with lists and comparison functions."""
+    builds = defaultdict(set)
+    build_to_update = {}
+    sync, async = [], []
+    for update in updates:
+        for build in update.builds:
+            n, v, r = util.get_nvr(build.nvr)
+            builds[n].add(build.nvr)
+            build_to_update[build.nvr] = update
+    for package in builds:
+        if len(builds[package]) > 1:
+            ordered = sorted(
+                builds[package],
+                cmp=lambda x, y: rpm.labelCompare(util.get_nvr(x), util.get_nvr(y)),
+                reverse=True)
+            for build in ordered[::-1]:
+                update = build_to_update[build]
+                if update not in sync:
+                    sync.append(update)
+                if update in async:
+                    async.remove(update)
+        else:
+            update = build_to_update[builds[package].pop()]
+            if update not in async and update not in sync:
+                async.append(update)
+    return sync, async
+
+
+def make_updates(count):
+    """Return count updates, half of which share their first package with another update."""
+    updates = []
+    for i in range(count):
+        update = mock.MagicMock()
+        update.title = 'update-{}'.format(i)
+        update.builds = [mock.MagicMock(nvr='shared{}-1.{}-1.fc27'.format(i % (count // 2), i)),
+                         mock.MagicMock(nvr='single{}-1.0-1.fc27'.format(i))]
+        if i % 2:
+            update.builds = update.builds[1:]
+        updates.append(update)
+    return updates
+
+
+def run(name, func, updates):
+    """Time func on the given updates."""
+    start = time.time()
+    result = func(updates)
+    print('%-10s %8.2f s' % (name, time.time() - start))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--updates', type=int, default=10000,
+                        help='The number of updates to sort.')
+    args = parser.parse_args()
+
+    updates = make_updates(args.updates)
+    lists = run('lists', sorted_updates_with_lists, updates)
+    current = run('current', util.sorted_updates, updates)
+    assert lists == current, 'Both implementations must sort the updates the same way'
+
+
+if __name__ == '__main__':
+    main()
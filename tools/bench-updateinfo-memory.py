@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2018 Red Hat, Inc. and others.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+Compare the peak memory of serializing updateinfo in memory and with the UpdateInfoWriter.
+
+Each way runs in a child process of its own, so that their peak RSS can be measured separately.
+
+    python tools/bench-updateinfo-memory.py --records 20000
+"""
+from __future__ import print_function
+
+from datetime import datetime
+import argparse
+import multiprocessing
+import os
+import resource
+import shutil
+import tempfile
+import time
+
+import createrepo_c as cr
+
+from bodhi.server.metadata import UpdateInfoWriter
+
+
+def make_record(i, packages):
+    """Return a synthetic record, similar in size to a real one."""
+    record = cr.UpdateRecord()
+    record.id = 'FEDORA-2018-%010d' % i
+    record.title = 'package%d-1.0-1.fc28' % i
+    record.status = 'stable'
+    record.type = 'bugfix'
+    record.fromstr = 'updates@fedoraproject.org'
+    record.summary = 'package%d-1.0-1.fc28 bugfix update' % i
+    record.description = 'A long description of what changed. ' * 20
+    record.release = 'Fedora 28'
+    record.issued_date = datetime(2018, 1, 1)
+    collection = cr.UpdateCollection()
+    collection.name = 'Fedora 28'
+    collection.shortname = 'F28'
+    for j in range(packages):
+        package = cr.UpdateCollectionPackage()
+        package.name = 'package%d-sub%d' % (i, j)
+        package.version = '1.0'
+        package.release = '1.fc28'
+        package.epoch = '0'
+        package.arch = 'x86_64'
+        package.filename = '%s-1.0-1.fc28.x86_64.rpm' % package.name
+        package.src = 'https://download.fedoraproject.org/pub/fedora/linux/updates/28/x86_64/' \
+            'p/%s' % package.filename
+        collection.append(package)
+    record.append_collection(collection)
+    reference = cr.UpdateReference()
+    reference.type = 'bugzilla'
+    reference.id = str(i)
+    reference.href = 'https://bugzilla.redhat.com/show_bug.cgi?id=%d' % i
+    record.append_reference(reference)
+    return record
+
+
+def in_memory(count, packages, tempdir):
+    """Build a createrepo_c.UpdateInfo and write its XML at once, as Bodhi used to."""
+    uinfo = cr.UpdateInfo()
+    for i in range(count):
+        uinfo.append(make_record(i, packages))
+    fd, path = tempfile.mkstemp(dir=tempdir)
+    os.write(fd, uinfo.xml_dump().encode('utf-8'))
+    os.close(fd)
+    return os.path.getsize(path)
+
+
+def streaming(count, packages, tempdir):
+    """Write each record with an UpdateInfoWriter as it is produced."""
+    writer = UpdateInfoWriter(tempdir)
+    for i in range(count):
+        writer.append(make_record(i, packages))
+    writer.close()
+    return os.path.getsize(writer.path)
+
+
+def measure(func, count, packages, tempdir, results):
+    """Run func, and report its duration, output size and the peak RSS of this process."""
+    start = time.time()
+    size = func(count, packages, tempdir)
+    duration = time.time() - start
+    # ru_maxrss is in kilobytes on Linux.
+    results.put((duration, size, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--records', type=int, default=20000,
+                        help='The number of records in the updateinfo.')
+    parser.add_argument('--packages', type=int, default=10,
+                        help='The number of packages in each record.')
+    args = parser.parse_args()
+
+    tempdir = tempfile.mkdtemp('bodhi-bench')
+    try:
+        results = multiprocessing.Queue()
+        # The baseline is a child process that does nothing.
+        for name, func in (('baseline', lambda *args: 0), ('in-memory', in_memory),
+                           ('streaming', streaming)):
+            child = multiprocessing.Process(
+                target=measure, args=(func, args.records, args.packages, tempdir, results))
+            child.start()
+            duration, size, maxrss = results.get()
+            child.join()
+            print('%-10s %8.2f s %10d bytes written %8.1f MiB peak RSS' % (
+                name, duration, size, maxrss / 1024.0))
+    finally:
+        shutil.rmtree(tempdir)
+
+
+if __name__ == '__main__':
+    main()